@@ -0,0 +1,265 @@
+"""
+建议结果缓存模块
+按输入指纹缓存完整的建议报告：指纹是股票数据、生成参数（投资期限、风险偏好、报告部分等）
+与代码版本的内容摘要，输入未变化时直接返回已生成的报告，跳过全部计算。
+
+代码版本由建议生成相关模块的源码与当前配置计算，任一模块或 config.json 修改后
+版本改变，旧条目不再命中。报告中依赖实时外部数据（相关性、事件、行业）的部分不在
+股票数据中，因此条目另设有效期（ttl）限制其陈旧程度。
+
+保存与取出时都复制报告，调用方修改返回的报告不会影响缓存中的条目。
+"""
+
+import copy
+import datetime as dt
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+from bars import Bars
+from config_loader import get_setting, load_config
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 影响建议报告内容的模块，其源码参与代码版本计算
+ADVISOR_MODULES = (
+    "get_stock_advice",
+    "get_enhanced_investment_advice",
+    "advice_pipeline",
+    "scoring_rules",
+    "technical_analysis",
+    "indicator_graph",
+    "indicator_kernels",
+    "batch_indicators",
+    "rolling_stats",
+    "resample",
+    "pattern_detection",
+    "risk_engine",
+    "scenario_simulation",
+    "sector_analysis",
+    "correlation_service",
+    "portfolio_optimizer",
+    "bars",
+    "dtype_policy"
+)
+
+# 每次获取都会变化、不影响分析结果的字段，不参与指纹计算
+VOLATILE_KEYS = frozenset({"timestamp", "analysis_date", "advice_date"})
+
+def _feed(digest, value: Any):
+    """按类型标记将值写入摘要（字典按键排序，数组按类型、形状与内容）"""
+    if value is None:
+        digest.update(b"N;")
+    elif isinstance(value, (bool, np.bool_)):
+        digest.update(b"B1;" if value else b"B0;")
+    elif isinstance(value, (int, np.integer)):
+        digest.update(b"I%d;" % int(value))
+    elif isinstance(value, (float, np.floating)):
+        digest.update(b"F" + repr(float(value)).encode() + b";")
+    elif isinstance(value, str):
+        encoded = value.encode()
+        digest.update(b"S%d:" % len(encoded) + encoded)
+    elif isinstance(value, bytes):
+        digest.update(b"Y%d:" % len(value) + value)
+    elif isinstance(value, dict):
+        keys = sorted((k for k in value if k not in VOLATILE_KEYS), key=str)
+        digest.update(b"D%d:" % len(keys))
+        for key in keys:
+            _feed(digest, str(key))
+            _feed(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"L%d:" % len(value))
+        for item in value:
+            _feed(digest, item)
+    elif isinstance(value, (set, frozenset)):
+        _feed(digest, sorted(value, key=repr))
+    elif isinstance(value, Bars):
+        digest.update(b"K")
+        _feed(digest, value.symbol)
+        _feed(digest, value.dates)
+        for field in Bars.FIELDS:
+            _feed(digest, getattr(value, field))
+    elif isinstance(value, np.ndarray):
+        if value.dtype.kind == "O":
+            _feed(digest, value.tolist())
+        else:
+            digest.update(b"A" + value.dtype.str.encode() + repr(value.shape).encode() + b":")
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (dt.datetime, dt.date)):
+        digest.update(b"T" + value.isoformat().encode() + b";")
+    else:
+        digest.update(b"R" + repr(value).encode() + b";")
+
+def fingerprint(*parts: Any) -> str:
+    """输入的内容摘要（与字典键顺序无关，时间戳等易变字段不参与）"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _feed(digest, part)
+    return digest.hexdigest()
+
+def data_field(data: Dict[str, Any], path: str) -> Any:
+    """按 "数据部分" 或 "数据部分.字段" 读取股票数据中的值（不存在时为None）"""
+    part, _, field = path.partition(".")
+    value = data.get(part)
+    if field:
+        value = value.get(field) if isinstance(value, dict) else None
+    return value
+
+def code_version(modules: Sequence[str] = ADVISOR_MODULES) -> str:
+    """建议生成代码与当前配置的版本摘要"""
+    digest = hashlib.blake2b(digest_size=8)
+    for name in modules:
+        path = os.path.join(PROJECT_DIR, f"{name}.py")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(name.encode())
+                digest.update(f.read())
+    _feed(digest, load_config())
+    return digest.hexdigest()
+
+def _pointer(path: str, key: Any) -> str:
+    """JSON Pointer 路径（转义 ~ 与 /）"""
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+def _same(a: Any, b: Any) -> bool:
+    try:
+        return type(a) == type(b) and bool(a == b)
+    except (TypeError, ValueError):
+        return fingerprint(a) == fingerprint(b)
+
+def report_diff(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """两份报告的差异，格式同 JSON Patch（add/remove/replace）；字典逐键比较，其他值整体比较"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in old:
+            if key not in new:
+                changes.append({"op": "remove", "path": _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                changes.append({"op": "add", "path": _pointer(path, key), "value": value})
+            else:
+                changes.extend(report_diff(old[key], value, _pointer(path, key)))
+        return changes
+    
+    if _same(old, new):
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+class AdviceCache:
+    """按输入指纹缓存建议报告（LRU淘汰，条目超过有效期后失效）"""
+    
+    def __init__(self, max_entries: int = 256,
+                 ttl: Optional[float] = 300,
+                 version: Optional[str] = None):
+        if max_entries < 1:
+            raise ValueError("max_entries 必须为正整数")
+        
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._version = version
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @classmethod
+    def from_config(cls, **overrides) -> "AdviceCache":
+        """按 config.json 的 analysis 配置创建，overrides覆盖配置项"""
+        params = {
+            "max_entries": get_setting("analysis", "advice_cache_size", 256),
+            "ttl": get_setting("analysis", "cache_timeout", 300)
+        }
+        params.update(overrides)
+        return cls(**params)
+    
+    @property
+    def version(self) -> str:
+        """代码版本（首次使用时计算）"""
+        if self._version is None:
+            self._version = code_version()
+        return self._version
+    
+    def key(self, namespace: str, *parts: Any) -> str:
+        """条目键：命名空间（报告类型）、代码版本与输入内容的摘要"""
+        return fingerprint(namespace, self.version, *parts)
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查找报告（返回副本），未命中或已过期时返回None"""
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None and time.time() - entry[0] > self.ttl:
+            del self._entries[key]
+            entry = None
+        
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return copy.deepcopy(entry[1])
+    
+    def put(self, key: str, report: Dict[str, Any]):
+        """保存报告（保存副本）"""
+        self._entries[key] = (time.time(), copy.deepcopy(report))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """命中率等统计"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "version": self.version
+        }
+    
+    def clear(self):
+        """清空缓存（统计保留）"""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class RefreshState:
+    """增量刷新状态：按 (股票, 参数) 保存上一次报告及各阶段的输入指纹与结果（LRU淘汰）"""
+    
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()
+    
+    def get(self, key: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        """上一次的状态（副本） {"stages": 阶段名 -> {"hash", "value", "status", "time"}, "report": 报告或None}"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return copy.deepcopy(entry)
+    
+    def put(self, key: Tuple[Any, ...], stages: Dict[str, Dict[str, Any]],
+            report: Optional[Dict[str, Any]] = None):
+        """保存本次状态（本次未涉及的阶段保留上一次的记录）"""
+        previous = self._entries.get(key)
+        merged = dict(previous["stages"]) if previous else {}
+        merged.update(copy.deepcopy(stages))
+        self._entries[key] = {"stages": merged, "report": copy.deepcopy(report)}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
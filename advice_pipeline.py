@@ -0,0 +1,216 @@
+"""
+建议生成流水线模块
+分析步骤以阶段形式注册并声明上游阶段，一次运行中每个阶段只计算一次，
+结果在运行内共享给全部下游阶段；互不依赖的异步阶段并发执行
+
+受保护阶段（guarded，通常是依赖外部数据的异步分析）限制并发数并单独计时，
+超时或出错时以 {"status": "timed_out"/"failed", "error": ...} 作为结果，
+不影响其他阶段；成功时结果中附加 "status": "ok"。
+
+增量刷新：每个阶段的输入指纹由其读取的数据部分（requires）、运行参数、外部输入与上游阶段的
+输入指纹构成，指纹与上一次运行相同的阶段可直接复用上一次的结果。requires 也可写作 "数据部分.字段"，
+只读取部分字段的阶段在该部分其他字段变化时（如只有价格变动）仍可复用。
+"""
+
+import asyncio
+import contextlib
+import inspect
+import logging
+import time
+from typing import Dict, List, Optional, Any, Callable, Sequence
+
+from advice_cache import data_field, fingerprint
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PipelineStage:
+    """流水线阶段"""
+    
+    def __init__(self, name: str, func: Callable, inputs: Sequence[str],
+                 guarded: bool = False, timeout: Optional[float] = None,
+                 requires: Sequence[str] = ()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.guarded = guarded
+        self.timeout = timeout
+        self.requires = tuple(requires)
+    
+    def __repr__(self) -> str:
+        return f"PipelineStage({self.name}, inputs={self.inputs}, guarded={self.guarded})"
+
+class AdvicePipeline:
+    """阶段依赖图（阶段只能依赖已注册的阶段或外部输入，因此天然无环）"""
+    
+    def __init__(self, external_inputs: Sequence[str] = ()):
+        self.stages: Dict[str, PipelineStage] = {}
+        # 由调用方在运行时提供的输入（如已获取的股票数据）
+        self.external_inputs = tuple(external_inputs)
+    
+    def register(self, name: str, inputs: Sequence[str] = (),
+                 guarded: bool = False, timeout: Optional[float] = None,
+                 requires: Sequence[str] = ()):
+        """注册阶段的装饰器，阶段函数签名为 func(run, **上游结果)，可为同步或异步函数；
+        guarded为True时该阶段受并发数与超时限制，timeout为默认超时秒数，
+        requires声明阶段读取的数据部分或 "数据部分.字段"（用于按需获取数据与增量刷新）"""
+        def decorator(func: Callable) -> Callable:
+            if name in self.stages:
+                raise ValueError(f"阶段 {name} 已注册")
+            for dep in inputs:
+                if dep not in self.stages and dep not in self.external_inputs:
+                    raise ValueError(f"阶段 {name} 依赖未注册的阶段 {dep}")
+            
+            self.stages[name] = PipelineStage(name, func, inputs, guarded, timeout, requires)
+            return func
+        return decorator
+    
+    def dependencies(self, names: Sequence[str]) -> List[str]:
+        """按拓扑顺序返回指定阶段的全部上游阶段（含自身）"""
+        ordered = []
+        
+        def visit(stage_name: str):
+            if stage_name in ordered or stage_name in self.external_inputs:
+                return
+            if stage_name not in self.stages:
+                raise KeyError(f"未注册的阶段: {stage_name}")
+            for dep in self.stages[stage_name].inputs:
+                visit(dep)
+            ordered.append(stage_name)
+        
+        for name in names:
+            visit(name)
+        return ordered
+    
+    def requirements(self, names: Sequence[str]) -> List[str]:
+        """指定阶段及其上游阶段读取的全部数据部分（按首次出现顺序）"""
+        required = []
+        for stage_name in self.dependencies(names):
+            for path in self.stages[stage_name].requires:
+                part = path.partition(".")[0]
+                if part not in required:
+                    required.append(part)
+        return required
+    
+    def start(self, owner: Any, inputs: Optional[Dict[str, Any]] = None,
+              max_concurrency: Optional[int] = None,
+              timeouts: Optional[Dict[str, float]] = None, **options) -> "PipelineRun":
+        """创建一次运行，owner为阶段函数中可访问的分析器对象；
+        max_concurrency限制同时执行的受保护阶段数，timeouts按阶段名覆盖默认超时"""
+        return PipelineRun(self, owner, inputs, options, max_concurrency, timeouts)
+
+class PipelineRun:
+    """一次流水线运行：记录各阶段结果，同一阶段被多个下游同时请求时只计算一次"""
+    
+    def __init__(self, pipeline: AdvicePipeline, owner: Any,
+                 inputs: Optional[Dict[str, Any]] = None,
+                 options: Optional[Dict[str, Any]] = None,
+                 max_concurrency: Optional[int] = None,
+                 timeouts: Optional[Dict[str, float]] = None):
+        self.pipeline = pipeline
+        self.owner = owner
+        self.options = dict(options or {})
+        self.timeouts = dict(timeouts or {})
+        self.results: Dict[str, Any] = dict(inputs or {})
+        # 受保护阶段的执行状态：阶段名 -> {"status", "elapsed"}
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    
+    def option(self, name: str, default: Any = None) -> Any:
+        """运行参数（如投资期限、风险偏好）"""
+        return self.options.get(name, default)
+    
+    async def get(self, name: str) -> Any:
+        """获取阶段结果（未计算时先并发计算其上游阶段）"""
+        if name in self.results:
+            return self.results[name]
+        if name not in self.pipeline.stages:
+            raise KeyError(f"未注册的阶段: {name}")
+        
+        task = self._tasks.get(name)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(self.pipeline.stages[name]))
+            self._tasks[name] = task
+        return await task
+    
+    async def _compute(self, stage: PipelineStage) -> Any:
+        values = await asyncio.gather(*(self.get(dep) for dep in stage.inputs))
+        kwargs = dict(zip(stage.inputs, values))
+        if stage.guarded:
+            value = await self._call_guarded(stage, kwargs)
+        else:
+            value = await self._call(stage, kwargs)
+        self.results[stage.name] = value
+        return value
+    
+    async def _call(self, stage: PipelineStage, kwargs: Dict[str, Any]) -> Any:
+        value = stage.func(self, **kwargs)
+        if inspect.isawaitable(value):
+            value = await value
+        return value
+    
+    async def _call_guarded(self, stage: PipelineStage, kwargs: Dict[str, Any]) -> Any:
+        """在并发限制与超时内执行阶段，失败时返回带状态的错误结果"""
+        timeout = self.timeouts.get(stage.name, stage.timeout)
+        limiter = self._semaphore or contextlib.nullcontext()
+        
+        async with limiter:
+            # 超时从获得执行名额后开始计算
+            started = time.perf_counter()
+            try:
+                value = await asyncio.wait_for(self._call(stage, kwargs), timeout)
+                status = "ok"
+            except asyncio.TimeoutError:
+                logger.warning(f"分析阶段 {stage.name} 超时（{timeout}秒）")
+                value, status = {"error": f"分析超时（{timeout}秒）"}, "timed_out"
+            except Exception as e:
+                logger.error(f"分析阶段 {stage.name} 失败: {e}")
+                value, status = {"error": str(e)}, "failed"
+            elapsed = time.perf_counter() - started
+        
+        self.status[stage.name] = {"status": status, "elapsed": round(elapsed, 3)}
+        if isinstance(value, dict):
+            value = {**value, "status": status}
+        return value
+    
+    def input_hashes(self, names: Sequence[str], data: Dict[str, Any],
+                     data_stage: Optional[str] = None) -> Dict[str, str]:
+        """指定阶段及其上游阶段的输入指纹；data为各阶段按 requires 读取的数据，
+        data_stage为提供该数据的阶段（其内容已按数据部分计入各下游阶段，不单独计算指纹）"""
+        hashes = {}
+        for name in self.pipeline.dependencies(names):
+            if name == data_stage:
+                continue
+            stage = self.pipeline.stages[name]
+            external = [self.results.get(dep) for dep in stage.inputs
+                        if dep in self.pipeline.external_inputs and dep != data_stage]
+            upstream = [hashes.get(dep) for dep in stage.inputs]
+            hashes[name] = fingerprint(name, self.options, external, upstream,
+                                       [data_field(data, path) for path in stage.requires])
+        return hashes
+    
+    def reuse(self, previous: Dict[str, Dict[str, Any]], hashes: Dict[str, str],
+              max_age: Optional[float] = None) -> List[str]:
+        """复用上一次运行中输入指纹未变化的阶段结果，返回复用的阶段名；
+        previous为 阶段名 -> {"hash", "value", "status", "time"}，受保护阶段只复用成功且未超过max_age秒的结果"""
+        reused = []
+        now = time.time()
+        for name, digest in hashes.items():
+            entry = previous.get(name)
+            if entry is None or entry["hash"] != digest or name in self.results:
+                continue
+            if self.pipeline.stages[name].guarded:
+                status = entry.get("status") or {}
+                if status.get("status") != "ok" or (max_age is not None and now - entry["time"] > max_age):
+                    continue
+                self.status[name] = status
+            self.results[name] = entry["value"]
+            reused.append(name)
+        return reused
+    
+    async def collect(self, names: Sequence[str]) -> Dict[str, Any]:
+        """并发计算多个阶段，返回 阶段名 -> 结果"""
+        values = await asyncio.gather(*(self.get(name) for name in names))
+        return dict(zip(names, values))
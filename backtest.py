@@ -0,0 +1,274 @@
+"""
+交易信号回测模块
+在历史K线矩阵上按 TechnicalAnalyzer.generate_trading_signals 的规则逐日重放
+RSI/MACD/KDJ/均线投票与综合信号，转换为仓位并计算收益、回撤、换手率与胜率
+
+交易规则（A股）：
+- 只做多，满仓或空仓
+- 第t日收盘产生信号，默认于第t+1日开盘成交（T+1：当日买入的股票最早次日卖出）
+- 停牌日无法成交，仓位保持不变，信号顺延至复牌
+- 买入收取佣金，卖出收取佣金与印花税（未计最低佣金5元）
+"""
+
+import logging
+from typing import Dict, Optional, Any
+
+import numpy as np
+
+from bars import BarPanel, DateLike
+from batch_indicators import BatchIndicatorEngine, forward_fill, table_to_records
+from dtype_policy import to_accumulator
+from history_store import HistoryStore
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 综合信号编码
+SIGNAL_CODES = {"strong_sell": -2, "sell": -1, "hold": 0, "buy": 1, "strong_buy": 2}
+TRADING_DAYS = 252
+
+class SignalBacktester:
+    """交易信号向量化回测器"""
+    
+    def __init__(self, commission: float = 0.00025,
+                 stamp_duty: float = 0.0005,
+                 entry_signal: str = "buy",
+                 exit_signal: str = "sell",
+                 buy_votes: int = 2,
+                 strong_votes: int = 3,
+                 execution: str = "next_open",
+                 engine: Optional[BatchIndicatorEngine] = None):
+        if entry_signal not in ("buy", "strong_buy") or exit_signal not in ("sell", "strong_sell"):
+            raise ValueError("开仓信号须为buy/strong_buy，平仓信号须为sell/strong_sell")
+        if execution not in ("next_open", "next_close"):
+            raise ValueError(f"不支持的成交方式: {execution}")
+        
+        self.commission = commission
+        self.stamp_duty = stamp_duty
+        self.entry_level = SIGNAL_CODES[entry_signal]
+        self.exit_level = SIGNAL_CODES[exit_signal]
+        self.buy_votes = buy_votes
+        self.strong_votes = strong_votes
+        self.execution = execution
+        self.engine = engine or BatchIndicatorEngine()
+    
+    def signals(self, indicators: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """按 generate_trading_signals 的规则计算逐日投票与综合信号（指标缺失时视为观望）"""
+        close = to_accumulator(indicators["close"])
+        rsi = to_accumulator(indicators["rsi"])
+        macd = to_accumulator(indicators["macd"])
+        macd_signal = to_accumulator(indicators["macd_signal"])
+        k = to_accumulator(indicators["kdj_k"])
+        d = to_accumulator(indicators["kdj_d"])
+        ma5 = to_accumulator(indicators["ma5"])
+        ma20 = to_accumulator(indicators["ma20"])
+        
+        buy = np.zeros(close.shape, dtype=np.int8)
+        sell = np.zeros(close.shape, dtype=np.int8)
+        
+        # RSI
+        buy += rsi < 30
+        sell += rsi > 70
+        # MACD
+        buy += (macd > macd_signal) & (macd > 0)
+        sell += (macd < macd_signal) & (macd < 0)
+        # KDJ
+        buy += (k < 20) & (d < 20) & (k > d)
+        sell += (k > 80) & (d > 80) & (k < d)
+        # 均线
+        buy += (close > ma5) & (ma5 > ma20)
+        sell += (close < ma5) & (ma5 < ma20)
+        
+        overall = np.select(
+            [buy >= self.strong_votes, buy >= self.buy_votes,
+             sell >= self.strong_votes, sell >= self.buy_votes],
+            [SIGNAL_CODES["strong_buy"], SIGNAL_CODES["buy"],
+             SIGNAL_CODES["strong_sell"], SIGNAL_CODES["sell"]],
+            SIGNAL_CODES["hold"]
+        ).astype(np.int8)
+        
+        return {"buy_votes": buy, "sell_votes": sell, "overall": overall}
+    
+    def positions(self, overall: np.ndarray, traded: np.ndarray) -> np.ndarray:
+        """由综合信号生成每日收盘持仓（1为持有，0为空仓）"""
+        # 开仓信号后持有，直到出现平仓信号
+        events = np.full(overall.shape, np.nan)
+        events[overall >= self.entry_level] = 1.0
+        events[overall <= self.exit_level] = 0.0
+        target = np.nan_to_num(forward_fill(events), nan=0.0)
+        
+        # 次日成交；停牌日无法成交，沿用前一日仓位
+        position = np.full(overall.shape, np.nan)
+        position[:, 1:] = target[:, :-1]
+        position[:, 0] = 0.0
+        position[~traded] = np.nan
+        position[:, 0] = np.nan_to_num(position[:, 0], nan=0.0)
+        return np.nan_to_num(forward_fill(position), nan=0.0)
+    
+    def daily_returns(self, position: np.ndarray, close: np.ndarray,
+                      open_: Optional[np.ndarray] = None) -> np.ndarray:
+        """策略每日收益（已扣除交易成本）"""
+        prev_close = np.full(close.shape, np.nan)
+        prev_close[:, 1:] = close[:, :-1]
+        prev_position = np.zeros(position.shape)
+        prev_position[:, 1:] = position[:, :-1]
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hold_return = np.nan_to_num(close / prev_close - 1)
+            if self.execution == "next_open" and open_ is not None:
+                entry_return = np.nan_to_num(close / open_ - 1)
+                exit_return = np.nan_to_num(open_ / prev_close - 1)
+            else:
+                entry_return = np.zeros(close.shape)
+                exit_return = hold_return
+        
+        kept = prev_position * position
+        entered = (1 - prev_position) * position
+        exited = prev_position * (1 - position)
+        
+        returns = kept * hold_return + entered * entry_return + exited * exit_return
+        returns -= entered * self.commission
+        returns -= exited * (self.commission + self.stamp_duty)
+        return returns
+    
+    def run(self, panel: BarPanel,
+            indicators: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
+        """回测面板中全部股票，返回逐股票指标与等权组合汇总"""
+        indicators = self.engine.compute(panel) if indicators is None else indicators
+        raw_close = to_accumulator(panel.close)
+        traded = ~np.isnan(raw_close)
+        close = forward_fill(raw_close)
+        open_ = None
+        if "open" in panel.fields:
+            open_ = np.where(traded, to_accumulator(panel.field("open")), close)
+        
+        signals = self.signals(indicators)
+        position = self.positions(signals["overall"], traded)
+        returns = self.daily_returns(position, close, open_)
+        listed = ~np.isnan(close)
+        
+        metrics = self._metrics(returns, position, close, listed)
+        metrics = {"symbol": np.asarray(panel.symbols), **metrics}
+        
+        # 等权组合：每日对已上市股票的策略收益取平均
+        listed_count = listed.sum(axis=0)
+        portfolio_returns = np.where(listed_count > 0,
+                                     returns.sum(axis=0) / np.maximum(listed_count, 1), 0.0)
+        
+        return {
+            "start": str(panel.dates[0].astype("datetime64[D]")) if len(panel.dates) else None,
+            "end": str(panel.dates[-1].astype("datetime64[D]")) if len(panel.dates) else None,
+            "symbols": len(panel.symbols),
+            "metrics": metrics,
+            "portfolio": self.portfolio_summary(portfolio_returns),
+            "portfolio_returns": portfolio_returns,
+            "returns": returns,
+            "positions": position
+        }
+    
+    def _metrics(self, returns: np.ndarray, position: np.ndarray,
+                 close: np.ndarray, listed: np.ndarray) -> Dict[str, np.ndarray]:
+        days = np.maximum(listed.sum(axis=1), 1)
+        equity = np.cumprod(1 + returns, axis=1)
+        total_return = equity[:, -1] - 1 if returns.shape[1] else np.zeros(returns.shape[0])
+        drawdown = 1 - equity / np.maximum.accumulate(equity, axis=1)
+        
+        mean = returns.sum(axis=1) / days
+        variance = np.maximum((returns * returns).sum(axis=1) / days - mean * mean, 0.0)
+        volatility = np.sqrt(variance * TRADING_DAYS)
+        
+        prev_position = np.zeros(position.shape)
+        prev_position[:, 1:] = position[:, :-1]
+        changes = np.abs(position - prev_position)
+        entries = (position > prev_position)
+        
+        trade_returns = self._trade_returns(returns, position, prev_position, entries)
+        
+        first = np.argmax(listed, axis=1)
+        first_close = close[np.arange(close.shape[0]), first]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            annualized = np.power(np.maximum(1 + total_return, 0), TRADING_DAYS / days) - 1
+            sharpe = np.where(volatility > 0, mean * TRADING_DAYS / volatility, 0.0)
+            hit_rate = np.where(trade_returns["count"] > 0,
+                                trade_returns["wins"] / trade_returns["count"], np.nan)
+            benchmark = close[:, -1] / first_close - 1
+        
+        return {
+            "total_return": total_return,
+            "annualized_return": annualized,
+            "volatility": volatility,
+            "sharpe": sharpe,
+            "max_drawdown": drawdown.max(axis=1) if returns.shape[1] else np.zeros(returns.shape[0]),
+            "trades": trade_returns["count"],
+            "hit_rate": hit_rate,
+            # 年化换手率：每年买入与卖出的次数之和
+            "turnover": changes.sum(axis=1) * TRADING_DAYS / days,
+            "exposure": position.sum(axis=1) / days,
+            "benchmark_return": benchmark
+        }
+    
+    def _trade_returns(self, returns: np.ndarray, position: np.ndarray,
+                       prev_position: np.ndarray, entries: np.ndarray) -> Dict[str, np.ndarray]:
+        """按笔汇总收益（含未平仓的最后一笔），返回每只股票的交易笔数与盈利笔数"""
+        n = returns.shape[0]
+        trade_id = np.cumsum(entries, axis=1)
+        # 持仓日与平仓当日的收益计入当前这笔交易
+        in_trade = (position > 0) | (prev_position > 0)
+        max_trades = int(trade_id.max()) + 1 if trade_id.size else 1
+        
+        keys = (np.arange(n)[:, None] * max_trades + trade_id)[in_trade]
+        log_returns = np.log1p(returns[in_trade])
+        totals = np.bincount(keys, weights=log_returns, minlength=n * max_trades).reshape(n, max_trades)
+        exists = np.bincount(keys, minlength=n * max_trades).reshape(n, max_trades) > 0
+        
+        return {
+            "count": exists.sum(axis=1),
+            "wins": (exists & (totals > 0)).sum(axis=1)
+        }
+    
+    def portfolio_summary(self, returns: np.ndarray) -> Dict[str, float]:
+        """组合日收益序列的汇总指标"""
+        if len(returns) == 0:
+            return {}
+        
+        equity = np.cumprod(1 + returns)
+        drawdown = 1 - equity / np.maximum.accumulate(equity)
+        volatility = float(returns.std() * np.sqrt(TRADING_DAYS))
+        annualized = float(equity[-1] ** (TRADING_DAYS / len(returns)) - 1)
+        
+        return {
+            "total_return": float(equity[-1] - 1),
+            "annualized_return": annualized,
+            "volatility": volatility,
+            "sharpe": float(returns.mean() * TRADING_DAYS / volatility) if volatility > 0 else 0.0,
+            "max_drawdown": float(drawdown.max())
+        }
+
+def summarize_backtest(result: Dict[str, Any], top: int = 10) -> Dict[str, Any]:
+    """将回测结果整理为可JSON序列化的摘要（按总收益排序的前后若干只股票）"""
+    metrics = result["metrics"]
+    order = np.argsort(-np.nan_to_num(metrics["total_return"], nan=-np.inf))
+    records = table_to_records(metrics)
+    
+    def median(name: str) -> Optional[float]:
+        values = metrics[name][~np.isnan(metrics[name])]
+        return float(np.median(values)) if len(values) else None
+    
+    return {
+        "start": result["start"],
+        "end": result["end"],
+        "symbols": result["symbols"],
+        "portfolio": result["portfolio"],
+        "median": {name: median(name) for name in
+                   ("total_return", "max_drawdown", "turnover", "hit_rate", "benchmark_return")},
+        "best": [records[i] for i in order[:top]],
+        "worst": [records[i] for i in order[::-1][:top]]
+    }
+
+# 快捷函数
+def backtest_store(store: HistoryStore, start: DateLike = None,
+                   end: DateLike = None, **params) -> Dict[str, Any]:
+    """回测历史存储中的全部股票，返回摘要"""
+    backtester = SignalBacktester(**params)
+    return summarize_backtest(backtester.run(store.panel(start=start, end=end)))
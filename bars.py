@@ -0,0 +1,222 @@
+"""
+K线数据容器模块
+以连续的定长数组存储OHLCV数据，供技术分析各模块直接使用
+"""
+
+from typing import Dict, List, Optional, Any, Sequence, Union
+
+import numpy as np
+
+from dtype_policy import DTypeLike, resolve_dtype
+
+DateLike = Union[str, np.datetime64, None]
+
+class Bars:
+    """OHLCV K线容器
+    
+    open/high/low/close/volume/amount 六个字段存放在同一块连续的二维数组中，
+    各字段属性均为该数组的行视图；按日期或下标切片返回共享内存的新容器，不复制数据。
+    数组精度由 dtype 参数或 dtype_policy 的默认存储精度决定。
+    """
+    
+    FIELDS = ("open", "high", "low", "close", "volume", "amount")
+    
+    def __init__(self, dates: Sequence,
+                 open: Sequence[float],
+                 high: Sequence[float],
+                 low: Sequence[float],
+                 close: Sequence[float],
+                 volume: Optional[Sequence[float]] = None,
+                 amount: Optional[Sequence[float]] = None,
+                 symbol: str = "",
+                 dtype: DTypeLike = None):
+        n = len(close)
+        columns = [open, high, low, close,
+                   volume if volume is not None else np.zeros(n),
+                   amount if amount is not None else np.zeros(n)]
+        
+        block = np.empty((len(self.FIELDS), n), dtype=resolve_dtype(dtype))
+        for row, column in enumerate(columns):
+            if len(column) != n:
+                raise ValueError(f"字段 {self.FIELDS[row]} 长度与收盘价不一致")
+            block[row] = column
+        
+        self._init_views(symbol, np.asarray(dates, dtype="datetime64[s]"), block)
+    
+    @classmethod
+    def _from_block(cls, symbol: str, dates: np.ndarray, block: np.ndarray) -> "Bars":
+        """由已有数组块构造（不复制数据）"""
+        bars = cls.__new__(cls)
+        bars._init_views(symbol, dates, block)
+        return bars
+    
+    def _init_views(self, symbol: str, dates: np.ndarray, block: np.ndarray):
+        if len(dates) != block.shape[1]:
+            raise ValueError("日期索引长度与K线数量不一致")
+        
+        self.symbol = symbol
+        self.dates = dates
+        self._block = block
+        self.open, self.high, self.low, self.close, self.volume, self.amount = block
+    
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]], symbol: str = "") -> "Bars":
+        """由字典列表构造，字典需包含 date/open/high/low/close，可选 volume/amount"""
+        return cls(
+            dates=[r["date"] for r in records],
+            open=[float(r["open"]) for r in records],
+            high=[float(r["high"]) for r in records],
+            low=[float(r["low"]) for r in records],
+            close=[float(r["close"]) for r in records],
+            volume=[float(r.get("volume", 0)) for r in records],
+            amount=[float(r.get("amount", 0)) for r in records],
+            symbol=symbol
+        )
+    
+    @classmethod
+    def from_eastmoney_klines(cls, klines: List[str], symbol: str = "") -> "Bars":
+        """解析东方财富K线接口返回的 "日期,开,收,高,低,量,额" 格式字符串"""
+        rows = [line.split(",") for line in klines]
+        return cls(
+            dates=[r[0] for r in rows],
+            open=[float(r[1]) for r in rows],
+            close=[float(r[2]) for r in rows],
+            high=[float(r[3]) for r in rows],
+            low=[float(r[4]) for r in rows],
+            volume=[float(r[5]) for r in rows],
+            amount=[float(r[6]) for r in rows],
+            symbol=symbol
+        )
+    
+    def __len__(self) -> int:
+        return self._block.shape[1]
+    
+    @property
+    def dtype(self) -> np.dtype:
+        return self._block.dtype
+    
+    @property
+    def nbytes(self) -> int:
+        """K线数据占用的内存字节数"""
+        return self._block.nbytes + self.dates.nbytes
+    
+    def astype(self, dtype: DTypeLike) -> "Bars":
+        """转换存储精度（精度相同时返回自身）"""
+        dtype = resolve_dtype(dtype)
+        if dtype == self.dtype:
+            return self
+        return Bars._from_block(self.symbol, self.dates, self._block.astype(dtype))
+    
+    def __getitem__(self, key: slice) -> "Bars":
+        """按下标切片（仅支持步长为1的切片，返回视图）"""
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("Bars仅支持连续下标切片")
+        return Bars._from_block(self.symbol, self.dates[key], self._block[:, key])
+    
+    def __repr__(self) -> str:
+        if len(self) == 0:
+            return f"Bars(symbol={self.symbol!r}, empty)"
+        return f"Bars(symbol={self.symbol!r}, {len(self)} bars, {self.dates[0]} ~ {self.dates[-1]})"
+    
+    def slice(self, start: DateLike = None, end: DateLike = None) -> "Bars":
+        """按日期区间 [start, end] 切片，返回共享内存的视图"""
+        i = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "s"), "left"))
+        j = len(self) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "s"), "right"))
+        return self[i:j]
+    
+    def tail(self, n: int) -> "Bars":
+        """最近n根K线"""
+        return self[max(0, len(self) - n):]
+    
+    def field(self, name: str) -> np.ndarray:
+        """按字段名获取数据视图"""
+        if name not in self.FIELDS:
+            raise KeyError(f"未知字段: {name}")
+        return self._block[self.FIELDS.index(name)]
+    
+    def to_dict(self) -> Dict[str, List[Any]]:
+        """转换为可JSON序列化的字典"""
+        result = {"symbol": self.symbol,
+                  "dates": np.datetime_as_string(self.dates, unit="auto").tolist()}
+        for name in self.FIELDS:
+            result[name] = self.field(name).tolist()
+        return result
+
+class BarPanel:
+    """股票×日期对齐的K线矩阵
+    
+    每个字段为 (股票数, 日期数) 的二维数组，停牌或未上市的位置为NaN。
+    """
+    
+    def __init__(self, symbols: Sequence[str], dates: np.ndarray,
+                 fields: Dict[str, np.ndarray]):
+        self.symbols = list(symbols)
+        self.dates = np.asarray(dates, dtype="datetime64[s]")
+        self.fields = fields
+        
+        shape = (len(self.symbols), len(self.dates))
+        for name, matrix in fields.items():
+            if matrix.shape != shape:
+                raise ValueError(f"字段 {name} 形状 {matrix.shape} 与面板 {shape} 不一致")
+    
+    @classmethod
+    def from_bars(cls, bars_list: Sequence[Bars],
+                  fields: Sequence[str] = Bars.FIELDS,
+                  dtype: DTypeLike = None) -> "BarPanel":
+        """将多只股票的Bars按日期并集对齐为矩阵"""
+        dtype = resolve_dtype(dtype)
+        if not bars_list:
+            return cls([], np.empty(0, dtype="datetime64[s]"),
+                       {name: np.empty((0, 0), dtype=dtype) for name in fields})
+        
+        dates = np.unique(np.concatenate([bars.dates for bars in bars_list]))
+        matrices = {name: np.full((len(bars_list), len(dates)), np.nan, dtype=dtype) for name in fields}
+        
+        for row, bars in enumerate(bars_list):
+            columns = np.searchsorted(dates, bars.dates)
+            for name in fields:
+                matrices[name][row, columns] = bars.field(name)
+        
+        return cls([bars.symbol for bars in bars_list], dates, matrices)
+    
+    def __len__(self) -> int:
+        return len(self.symbols)
+    
+    def __repr__(self) -> str:
+        return f"BarPanel({len(self.symbols)} symbols x {len(self.dates)} bars)"
+    
+    @property
+    def shape(self):
+        return (len(self.symbols), len(self.dates))
+    
+    @property
+    def nbytes(self) -> int:
+        """矩阵占用的内存字节数"""
+        return sum(matrix.nbytes for matrix in self.fields.values()) + self.dates.nbytes
+    
+    def field(self, name: str) -> np.ndarray:
+        """按字段名获取矩阵"""
+        if name not in self.fields:
+            raise KeyError(f"面板中没有字段: {name}")
+        return self.fields[name]
+    
+    @property
+    def close(self) -> np.ndarray:
+        return self.field("close")
+    
+    def date_index(self, date: DateLike = None) -> int:
+        """不晚于指定日期的最后一个日期下标（默认最新日期）"""
+        if date is None:
+            return len(self.dates) - 1
+        
+        index = int(np.searchsorted(self.dates, np.datetime64(date, "s"), "right")) - 1
+        if index < 0:
+            raise ValueError(f"日期 {date} 早于面板起始日期")
+        return index
+    
+    def slice(self, start: DateLike = None, end: DateLike = None) -> "BarPanel":
+        """按日期区间 [start, end] 切片，返回共享内存的视图"""
+        i = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "s"), "left"))
+        j = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "s"), "right"))
+        return BarPanel(self.symbols, self.dates[i:j],
+                        {name: matrix[:, i:j] for name, matrix in self.fields.items()})
@@ -0,0 +1,231 @@
+"""
+批量技术指标模块
+在股票×日期矩阵上一次性计算全市场技术指标，并输出按日期的横截面表
+计算统一在float64下进行，输出矩阵按存储精度保存（见 dtype_policy）
+
+指标口径与 TechnicalAnalyzer 保持一致。停牌日按前收盘价填充参与计算，
+但输出在停牌日和上市前均为NaN；上市后数据不足指标窗口时同样为NaN。
+"""
+
+import logging
+from typing import Dict, List, Optional, Any, Sequence
+
+import numpy as np
+
+from bars import BarPanel, DateLike
+from config_loader import get_setting
+from dtype_policy import DTypeLike, resolve_dtype, to_accumulator
+from history_store import HistoryStore
+from indicator_kernels import ema, wilder_rsi, kdj_smooth, parabolic_sar
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """沿时间轴向前填充NaN（上市前的NaN保持不变）"""
+    valid = ~np.isnan(matrix)
+    index = np.where(valid, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return matrix[np.arange(matrix.shape[0])[:, None], index]
+
+def rolling_sum(matrix: np.ndarray, window: int) -> np.ndarray:
+    """沿时间轴的滚动求和（NaN按0处理，前window-1列为NaN）"""
+    cumsum = np.cumsum(np.nan_to_num(matrix, nan=0.0), axis=1, dtype=np.float64)
+    result = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] < window:
+        return result
+    
+    result[:, window - 1] = cumsum[:, window - 1]
+    result[:, window:] = cumsum[:, window:] - cumsum[:, :-window]
+    return result
+
+def rolling_extreme(matrix: np.ndarray, window: int, func=np.maximum) -> np.ndarray:
+    """沿时间轴的滚动最大/最小值（func取np.maximum或np.minimum，前window-1列为NaN）"""
+    result = np.full(matrix.shape, np.nan)
+    t_count = matrix.shape[1]
+    if t_count < window:
+        return result
+    
+    extreme = matrix[:, window - 1:].copy()
+    for lag in range(1, window):
+        func(extreme, matrix[:, window - 1 - lag:t_count - lag], out=extreme)
+    
+    result[:, window - 1:] = extreme
+    return result
+
+class BatchIndicatorEngine:
+    """全市场批量技术指标计算引擎"""
+    
+    def __init__(self, ma_periods: Sequence[int] = (5, 10, 20, 60),
+                 rsi_period: int = 14,
+                 macd_fast: int = 12,
+                 macd_slow: int = 26,
+                 macd_signal: int = 9,
+                 kdj_period: int = 9,
+                 rsi_smoothing: str = "simple",
+                 backend: str = "auto",
+                 dtype: DTypeLike = None):
+        if rsi_smoothing not in ("simple", "wilder"):
+            raise ValueError(f"不支持的RSI平滑方式: {rsi_smoothing}")
+        
+        self.ma_periods = tuple(sorted(ma_periods))
+        self.rsi_period = rsi_period
+        self.rsi_smoothing = rsi_smoothing
+        # 递推指标的计算后端，见 indicator_kernels.BACKENDS
+        self.backend = backend
+        self.dtype = resolve_dtype(dtype)
+        self.macd_fast = macd_fast
+        self.macd_slow = macd_slow
+        self.macd_signal = macd_signal
+        self.kdj_period = kdj_period
+    
+    @classmethod
+    def from_config(cls, **overrides) -> "BatchIndicatorEngine":
+        """按 config.json 的 analysis 配置创建引擎，overrides覆盖对应参数"""
+        params = {
+            "ma_periods": tuple(get_setting("analysis", "default_ma_periods", (5, 10, 20, 60))),
+            "rsi_period": get_setting("analysis", "rsi_period", 14),
+            "macd_fast": get_setting("analysis", "macd_fast", 12),
+            "macd_slow": get_setting("analysis", "macd_slow", 26),
+            "macd_signal": get_setting("analysis", "macd_signal", 9)
+        }
+        params.update(overrides)
+        return cls(**params)
+    
+    def compute(self, panel: BarPanel) -> Dict[str, np.ndarray]:
+        """计算全部指标，返回 指标名 -> (股票数, 日期数) 矩阵"""
+        raw_close = panel.close
+        traded = ~np.isnan(raw_close)
+        close = to_accumulator(forward_fill(raw_close))
+        # 上市以来的K线数量（含停牌日）
+        age = np.cumsum(~np.isnan(close), axis=1)
+        
+        indicators = {"close": close}
+        
+        for period in self.ma_periods:
+            indicators[f"ma{period}"] = self._moving_average(close, age, period)
+        
+        indicators["rsi"] = self._rsi(close, age)
+        indicators.update(self._macd(close, age))
+        
+        if "high" in panel.fields and "low" in panel.fields:
+            high = to_accumulator(forward_fill(panel.field("high")))
+            low = to_accumulator(forward_fill(panel.field("low")))
+            indicators.update(self._kdj(close, high, low, age))
+            indicators["sar"] = parabolic_sar(high, low, backend=self.backend)
+        
+        indicators["ma_alignment"] = self._ma_alignment(indicators)
+        
+        # 停牌日不输出指标
+        for name, matrix in indicators.items():
+            matrix[~traded] = np.nan
+        
+        return {name: matrix.astype(self.dtype, copy=False) for name, matrix in indicators.items()}
+    
+    def _moving_average(self, close: np.ndarray, age: np.ndarray, period: int) -> np.ndarray:
+        ma = rolling_sum(close, period) / period
+        ma[age < period] = np.nan
+        return ma
+    
+    def _rsi(self, close: np.ndarray, age: np.ndarray) -> np.ndarray:
+        """RSI：默认简单平均口径（与 TechnicalAnalyzer.calculate_rsi 一致），可选Wilder平滑"""
+        period = self.rsi_period
+        if self.rsi_smoothing == "wilder":
+            return wilder_rsi(close, period, backend=self.backend)
+        
+        change = np.full(close.shape, np.nan)
+        change[:, 1:] = close[:, 1:] - close[:, :-1]
+        
+        gains = rolling_sum(np.where(change > 0, change, 0.0), period)
+        losses = rolling_sum(np.where(change < 0, -change, 0.0), period)
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(losses == 0, 100.0, 100 - 100 / (1 + gains / losses))
+        
+        rsi[age < period + 1] = np.nan
+        return np.clip(rsi, 0, 100)
+    
+    def _macd(self, close: np.ndarray, age: np.ndarray) -> Dict[str, np.ndarray]:
+        """MACD（信号线为MACD的简单平均，与 TechnicalAnalyzer.calculate_macd 一致）"""
+        macd = ema(close, self.macd_fast, self.backend) - ema(close, self.macd_slow, self.backend)
+        macd[age < self.macd_slow] = np.nan
+        
+        signal = rolling_sum(macd, self.macd_signal) / self.macd_signal
+        signal[age < self.macd_slow + self.macd_signal - 1] = np.nan
+        
+        return {"macd": macd, "macd_signal": signal, "macd_histogram": macd - signal}
+    
+    def _kdj(self, close: np.ndarray, high: np.ndarray, low: np.ndarray,
+             age: np.ndarray) -> Dict[str, np.ndarray]:
+        """KDJ（K、D以50为初值按1/3权重平滑）"""
+        period = self.kdj_period
+        period_high = rolling_extreme(high, period, np.maximum)
+        period_low = rolling_extreme(low, period, np.minimum)
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            value = (close - period_low) / (period_high - period_low) * 100
+        rsv = np.where(period_high == period_low, 50.0, value)
+        rsv[age < period] = np.nan
+        
+        k, d = kdj_smooth(rsv, self.backend)
+        j = 3 * k - 2 * d
+        return {"kdj_k": np.clip(k, 0, 100), "kdj_d": np.clip(d, 0, 100), "kdj_j": np.clip(j, 0, 100)}
+    
+    def _ma_alignment(self, indicators: Dict[str, np.ndarray]) -> np.ndarray:
+        """均线排列：多头排列为1，空头排列为-1，其余为0"""
+        close = indicators["close"]
+        averages = [indicators[f"ma{p}"] for p in self.ma_periods[:3]]
+        
+        bullish = close > averages[0]
+        bearish = close < averages[0]
+        for shorter, longer in zip(averages, averages[1:]):
+            bullish &= shorter > longer
+            bearish &= shorter < longer
+        
+        alignment = bullish.astype(np.float64) - bearish.astype(np.float64)
+        missing = np.isnan(close)
+        for average in averages:
+            missing |= np.isnan(average)
+        alignment[missing] = np.nan
+        return alignment
+    
+    def cross_section(self, panel: BarPanel,
+                      date: DateLike = None,
+                      indicators: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
+        """指定日期全部股票的指标横截面表（按列组织）"""
+        indicators = self.compute(panel) if indicators is None else indicators
+        t = panel.date_index(date)
+        
+        table = {"symbol": np.asarray(panel.symbols)}
+        for name, matrix in indicators.items():
+            table[name] = matrix[:, t]
+        
+        return {
+            "date": str(panel.dates[t].astype("datetime64[D]")),
+            "count": int((~np.isnan(table["close"])).sum()),
+            "table": table
+        }
+
+def table_to_records(table: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """将按列组织的表转换为记录列表（NaN转为None，便于JSON序列化）"""
+    columns = list(table.keys())
+    records = []
+    for row in range(len(table[columns[0]]) if columns else 0):
+        record = {}
+        for name in columns:
+            value = table[name][row]
+            if isinstance(value, (float, np.floating)):
+                value = None if np.isnan(value) else float(value)
+            elif isinstance(value, np.generic):
+                value = value.item()
+            record[name] = value
+        records.append(record)
+    return records
+
+# 快捷函数
+def universe_cross_section(store: HistoryStore, date: DateLike = None,
+                           **params) -> Dict[str, Any]:
+    """计算历史存储中全部股票在指定日期的指标横截面"""
+    engine = BatchIndicatorEngine(**params)
+    return engine.cross_section(store.panel(end=date), date)
@@ -0,0 +1,40 @@
+"""
+配置加载模块
+读取项目根目录下的 config.json，缺失或损坏时使用空配置，由调用方提供默认值
+"""
+
+import json
+import logging
+import os
+from typing import Dict, Any, Optional
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+_config_cache: Dict[str, Dict[str, Any]] = {}
+
+def load_config(path: Optional[str] = None, reload: bool = False) -> Dict[str, Any]:
+    """加载配置文件（按路径缓存）"""
+    path = path or os.environ.get("STOCK_ADVISOR_CONFIG", CONFIG_PATH)
+    if path in _config_cache and not reload:
+        return _config_cache[path]
+    
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"配置文件不存在: {path}，使用默认配置")
+        config = {}
+    except json.JSONDecodeError as e:
+        logger.error(f"配置文件格式错误: {path}: {e}，使用默认配置")
+        config = {}
+    
+    _config_cache[path] = config
+    return config
+
+def get_setting(section: str, key: str, default: Any = None) -> Any:
+    """读取配置项，不存在时返回默认值"""
+    return load_config().get(section, {}).get(key, default)
@@ -0,0 +1,335 @@
+"""
+相关性服务模块
+为股票池（历史K线存储中的全部股票或配置的股票篮子）维护滚动收益协方差与相关系数矩阵，
+每个交易日的收益到达时增量更新（加入新一天、移出窗口最旧一天），不从头重算
+
+矩阵按 (股票集合, 窗口长度) 缓存，支持"与X最相关/最不相关"查询，
+并为组合优化提供收缩协方差、为分散化建议提供相关股票。
+缺失收益（停牌、上市前）按成对有效样本处理：每对股票只使用两者都有收益的交易日。
+"""
+
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Any, Sequence, Tuple, Union
+
+import numpy as np
+
+from config_loader import get_setting
+from dtype_policy import to_accumulator
+from history_store import HistoryStore
+from portfolio_optimizer import shrink_covariance
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOWS = (60, 120, 250)
+
+def close_returns(closes: np.ndarray) -> np.ndarray:
+    """收盘价矩阵 (股票数, 期数) 的简单收益率矩阵，缺失为NaN"""
+    closes = to_accumulator(closes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return closes[:, 1:] / closes[:, :-1] - 1
+
+class RollingCovariance:
+    """增量维护的滚动协方差/相关系数矩阵
+    
+    保存成对有效样本数、成对和、成对平方和与交叉乘积和四个矩阵，
+    加入或移出k天只做秩k更新（O(N²·k)），每滑过一个完整窗口按窗口内容重算一次以消除累积舍入误差。
+    """
+    
+    def __init__(self, symbols: Sequence[str], window: int, min_periods: int = 20):
+        if window < 2:
+            raise ValueError("窗口长度至少为2")
+        
+        self.symbols = list(symbols)
+        self.window = window
+        self.min_periods = min_periods
+        self.last_date: Optional[np.datetime64] = None
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._days = deque()
+        self._removals = 0
+        self._clear()
+    
+    def _clear(self):
+        n = len(self.symbols)
+        # count[i, j]: 两者都有收益的天数；total[i, j]: 这些天中 i 的收益和；
+        # squares[i, j]: 这些天中 i 的收益平方和；cross[i, j]: 这些天中 i、j 收益乘积和
+        self._count = np.zeros((n, n))
+        self._total = np.zeros((n, n))
+        self._squares = np.zeros((n, n))
+        self._cross = np.zeros((n, n))
+    
+    def __len__(self) -> int:
+        return len(self._days)
+    
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+    
+    def __repr__(self) -> str:
+        return f"RollingCovariance({len(self.symbols)} symbols, window={self.window}, days={len(self)})"
+    
+    def update(self, returns: Sequence[float], date: Any = None):
+        """加入一天的收益向量（顺序与symbols一致，缺失为NaN），窗口已满时移出最旧一天"""
+        x = np.asarray(returns, dtype=np.float64)
+        if x.shape != (len(self.symbols),):
+            raise ValueError(f"收益向量长度 {x.shape} 与股票数 {len(self.symbols)} 不一致")
+        self.extend(x[:, None], [date])
+    
+    def extend(self, returns: np.ndarray, dates: Sequence[Any]):
+        """加入多天的收益矩阵 (股票数, 天数)，并移出滑出窗口的最旧天数（按块做秩k更新）"""
+        returns = to_accumulator(returns)
+        if returns.shape[1] >= self.window:
+            self.rebuild(returns, dates)
+            return
+        
+        valid = ~np.isnan(returns)
+        x = np.where(valid, returns, 0.0)
+        overflow = len(self._days) + x.shape[1] - self.window
+        if overflow > 0:
+            removed = [self._days.popleft() for _ in range(overflow)]
+            self._accumulate(np.stack([day[1] for day in removed], axis=1),
+                             np.stack([day[2] for day in removed], axis=1), -1.0)
+        
+        for date, column, mask in zip(dates, x.T, valid.T):
+            self._days.append((date, column, mask))
+        self._accumulate(x, valid, 1.0)
+        if dates[-1] is not None:
+            self.last_date = np.datetime64(dates[-1], "s")
+        
+        # 每滑过一个完整窗口重新精确计算一次，消除累积舍入误差
+        self._removals += max(overflow, 0)
+        if self._removals >= self.window:
+            self._resync()
+    
+    def _accumulate(self, x: np.ndarray, valid: np.ndarray, sign: float):
+        """累加（sign=-1时扣除）若干天的贡献，x与valid为 (股票数, 天数)"""
+        mask = valid.astype(np.float64)
+        self._count += sign * (mask @ mask.T)
+        self._total += sign * (x @ mask.T)
+        self._squares += sign * ((x * x) @ mask.T)
+        self._cross += sign * (x @ x.T)
+    
+    def _resync(self):
+        """基于当前窗口内容重算全部矩阵"""
+        self._removals = 0
+        self._clear()
+        if self._days:
+            self._accumulate(np.stack([day[1] for day in self._days], axis=1),
+                             np.stack([day[2] for day in self._days], axis=1), 1.0)
+    
+    def rebuild(self, returns: np.ndarray, dates: Optional[Sequence[Any]] = None):
+        """由收益率矩阵 (股票数, 期数) 的最近window期重建"""
+        returns = to_accumulator(returns)[:, -self.window:]
+        dates = list(dates)[-self.window:] if dates is not None else [None] * returns.shape[1]
+        
+        self._days.clear()
+        for date, column in zip(dates, returns.T):
+            valid = ~np.isnan(column)
+            self._days.append((date, np.where(valid, column, 0.0), valid))
+        self._resync()
+        self.last_date = np.datetime64(dates[-1], "s") if dates and dates[-1] is not None else None
+    
+    def observations(self) -> np.ndarray:
+        """各股票窗口内的有效收益数"""
+        return np.diag(self._count).copy()
+    
+    def mean(self) -> np.ndarray:
+        """各股票窗口内的日收益均值"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.diag(self._total) / np.diag(self._count)
+    
+    def covariance(self) -> np.ndarray:
+        """成对样本协方差矩阵（有效样本不足min_periods的位置为NaN）"""
+        count = self._count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = (self._cross - self._total * self._total.T / count) / (count - 1)
+        covariance[count < max(self.min_periods, 2)] = np.nan
+        return covariance
+    
+    def correlation(self) -> np.ndarray:
+        """成对样本相关系数矩阵（有效样本不足min_periods的位置为NaN）"""
+        count = self._count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            centered = self._cross - self._total * self._total.T / count
+            variance = self._squares - self._total ** 2 / count
+            correlation = centered / np.sqrt(variance * variance.T)
+        correlation = np.clip(correlation, -1.0, 1.0)
+        correlation[count < max(self.min_periods, 2)] = np.nan
+        return correlation
+    
+    def pair_observations(self, symbol: str) -> np.ndarray:
+        """单只股票与其他股票的成对有效样本数"""
+        return self._count[self._index[symbol]].copy()
+    
+    def correlation_row(self, symbol: str) -> np.ndarray:
+        """单只股票与其他股票的相关系数（O(N)，不构造整个矩阵）"""
+        i = self._index[symbol]
+        count = self._count[i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            centered = self._cross[i] - self._total[i] * self._total[:, i] / count
+            variance_i = self._squares[i] - self._total[i] ** 2 / count
+            variance_j = self._squares[:, i] - self._total[:, i] ** 2 / count
+            row = np.clip(centered / np.sqrt(variance_i * variance_j), -1.0, 1.0)
+        row[count < max(self.min_periods, 2)] = np.nan
+        return row
+    
+    def shrunk_covariance(self, symbols: Optional[Sequence[str]] = None,
+                          min_observations: int = 60) -> Dict[str, Any]:
+        """Ledoit-Wolf收缩后的日协方差及日收益均值（有效收益不足min_observations的股票被排除）"""
+        symbols = self.symbols if symbols is None else [s for s in symbols if s in self._index]
+        rows = np.array([self._index[s] for s in symbols], dtype=np.int64)
+        usable = self.observations()[rows] >= min_observations if len(rows) else np.zeros(0, dtype=bool)
+        included = rows[usable]
+        
+        covariance = np.nan_to_num(self.covariance()[np.ix_(included, included)])
+        mean = self.mean()[included]
+        # 收缩强度所需的四阶矩按窗口内去均值收益计算
+        x = np.stack([day[1][included] for day in self._days], axis=1) if self._days else np.zeros((len(included), 0))
+        valid = np.stack([day[2][included] for day in self._days], axis=1) if self._days else x.astype(bool)
+        centered = np.where(valid, x - mean[:, None], 0.0)
+        t = max(len(self._days), 1)
+        shrunk, shrinkage = (shrink_covariance(covariance * (t - 1) / t, float(np.sum(np.sum(centered ** 2, axis=0) ** 2)), t)
+                             if len(included) else (covariance, 1.0))
+        return {
+            "symbols": [self.symbols[i] for i in included],
+            "excluded": [self.symbols[i] for i in rows[~usable]],
+            "mean": mean,
+            "covariance": shrunk,
+            "shrinkage": shrinkage,
+            "observations": len(self._days)
+        }
+
+class CorrelationService:
+    """滚动相关性服务：按 (股票集合, 窗口) 缓存矩阵，从历史K线存储增量追加新交易日"""
+    
+    def __init__(self, store: Optional[HistoryStore] = None,
+                 windows: Sequence[int] = DEFAULT_WINDOWS,
+                 default_window: Optional[int] = None,
+                 min_periods: int = 20,
+                 max_symbols: int = 1000,
+                 cache_size: int = 16,
+                 baskets: Optional[Dict[str, Sequence[str]]] = None):
+        self.store = store if store is not None else HistoryStore()
+        self.windows = tuple(windows)
+        self.default_window = default_window or self.windows[len(self.windows) // 2]
+        self.min_periods = min_periods
+        # 矩阵占用 4·N² 个float64，限制单个矩阵的股票数
+        self.max_symbols = max_symbols
+        self.cache_size = cache_size
+        self.baskets = {name: list(symbols) for name, symbols in (baskets or {}).items()}
+        self._matrices: "OrderedDict[Tuple[Tuple[str, ...], int], RollingCovariance]" = OrderedDict()
+    
+    @classmethod
+    def from_config(cls, store: Optional[HistoryStore] = None, **overrides) -> "CorrelationService":
+        """按 config.json 的 correlation 配置创建，overrides覆盖配置项"""
+        params = {}
+        for name in ("windows", "default_window", "min_periods", "max_symbols", "cache_size", "baskets"):
+            value = get_setting("correlation", name, None)
+            if value is not None:
+                params[name] = value
+        params.update(overrides)
+        return cls(store, **params)
+    
+    def resolve(self, symbols: Union[None, str, Sequence[str]] = None) -> List[str]:
+        """股票集合：None为存储中的全部股票，字符串为配置的股票篮子名"""
+        if symbols is None:
+            return self.store.symbols()
+        if isinstance(symbols, str):
+            if symbols not in self.baskets:
+                raise ValueError(f"未配置的股票篮子: {symbols}")
+            return self.baskets[symbols]
+        return list(symbols)
+    
+    def matrix(self, symbols: Union[None, str, Sequence[str]] = None,
+               window: Optional[int] = None) -> RollingCovariance:
+        """获取（必要时构建或增量追加后的）滚动协方差矩阵"""
+        window = window or self.default_window
+        present = sorted({s for s in self.resolve(symbols) if s in self.store})
+        if len(present) > self.max_symbols:
+            raise ValueError(f"股票数 {len(present)} 超过上限 {self.max_symbols}")
+        
+        key = (tuple(present), window)
+        matrix = self._matrices.get(key)
+        if matrix is None:
+            matrix = RollingCovariance(present, window, self.min_periods)
+            self._rebuild(matrix)
+            self._matrices[key] = matrix
+            while len(self._matrices) > self.cache_size:
+                self._matrices.popitem(last=False)
+        else:
+            self._matrices.move_to_end(key)
+            self.advance(matrix)
+        return matrix
+    
+    def _rebuild(self, matrix: RollingCovariance):
+        panel = self.store.panel(matrix.symbols, fields=("close",))
+        if len(panel.dates) > 1:
+            matrix.rebuild(close_returns(panel.close), panel.dates[1:])
+    
+    def advance(self, matrix: RollingCovariance) -> int:
+        """从存储中追加矩阵最后日期之后的交易日，返回追加的天数"""
+        if matrix.last_date is None:
+            self._rebuild(matrix)
+            return len(matrix)
+        
+        panel = self.store.panel(matrix.symbols, start=matrix.last_date, fields=("close",))
+        if len(panel.dates) == 0 or panel.dates[0] != matrix.last_date:
+            # 存储中已没有矩阵最后一天（如历史被替换），重新构建
+            self._rebuild(matrix)
+            return len(matrix)
+        
+        returns = close_returns(panel.close)
+        if returns.shape[1]:
+            matrix.extend(returns, panel.dates[1:])
+        return returns.shape[1]
+    
+    def update(self, date: Any, returns: Dict[str, float]) -> int:
+        """推送一个交易日的收益（股票代码 -> 收益率）到全部已缓存矩阵，返回更新的矩阵数"""
+        date = np.datetime64(date, "s")
+        updated = 0
+        for matrix in self._matrices.values():
+            if matrix.last_date is not None and date <= matrix.last_date:
+                continue
+            matrix.update([returns.get(s, np.nan) for s in matrix.symbols], date)
+            updated += 1
+        return updated
+    
+    def correlated(self, symbol: str, n: int = 10,
+                   symbols: Union[None, str, Sequence[str]] = None,
+                   window: Optional[int] = None,
+                   least: bool = False) -> Dict[str, Any]:
+        """与指定股票最相关（least=True时最不相关）的n只股票"""
+        matrix = self.matrix(symbols, window)
+        if symbol not in matrix:
+            return {"error": f"股票 {symbol} 不在相关性矩阵中"}
+        
+        row = matrix.correlation_row(symbol)
+        row[matrix.symbols.index(symbol)] = np.nan
+        candidates = np.flatnonzero(~np.isnan(row))
+        order = candidates[np.argsort(row[candidates] if least else -row[candidates], kind="stable")][:n]
+        observations = matrix.pair_observations(symbol)
+        return {
+            "symbol": symbol,
+            "window": matrix.window,
+            "universe": len(matrix.symbols),
+            "results": [
+                {"symbol": matrix.symbols[j], "correlation": float(row[j]), "observations": int(observations[j])}
+                for j in order
+            ]
+        }
+    
+    def shrunk_covariance(self, symbols: Sequence[str], window: Optional[int] = None,
+                          min_observations: int = 60) -> Dict[str, Any]:
+        """指定股票的收缩日协方差与日收益均值，供组合优化使用"""
+        return self.matrix(symbols, window).shrunk_covariance(symbols, min_observations)
+    
+    def clear_cache(self):
+        """清空矩阵缓存"""
+        self._matrices.clear()
+
+# 快捷函数
+def most_correlated(store: HistoryStore, symbol: str, n: int = 10,
+                    window: Optional[int] = None, least: bool = False) -> Dict[str, Any]:
+    """在存储的全部股票中查找与指定股票最相关（或最不相关）的股票"""
+    return CorrelationService.from_config(store).correlated(symbol, n, window=window, least=least)
@@ -0,0 +1,53 @@
+"""
+数值精度策略模块
+K线、历史存储、批量指标结果及指标缓存按存储精度保存（默认float64，
+可配置为float32以减半内存），求和、递推等计算统一在float64下进行
+
+存储精度由 config.json 中 analysis.storage_dtype 指定，也可在运行时调用
+set_storage_dtype 修改；各组件构造时传入 dtype 参数可单独覆盖。
+"""
+
+from typing import Any, Optional, Union
+
+import numpy as np
+
+from config_loader import get_setting
+
+# 支持的存储精度
+STORAGE_DTYPES = {"float64": np.dtype(np.float64), "float32": np.dtype(np.float32)}
+# 累加、递推等计算使用的精度
+ACCUMULATOR_DTYPE = np.dtype(np.float64)
+
+DTypeLike = Union[str, np.dtype, type, None]
+
+_storage_dtype: Optional[np.dtype] = None
+
+def _parse_dtype(dtype: DTypeLike) -> np.dtype:
+    name = dtype if isinstance(dtype, str) else np.dtype(dtype).name
+    if name not in STORAGE_DTYPES:
+        raise ValueError(f"不支持的存储精度: {name}，可选: {', '.join(STORAGE_DTYPES)}")
+    return STORAGE_DTYPES[name]
+
+def storage_dtype() -> np.dtype:
+    """当前默认存储精度"""
+    global _storage_dtype
+    if _storage_dtype is None:
+        _storage_dtype = _parse_dtype(get_setting("analysis", "storage_dtype", "float64"))
+    return _storage_dtype
+
+def set_storage_dtype(dtype: DTypeLike):
+    """修改默认存储精度（传None时重新读取配置）"""
+    global _storage_dtype
+    _storage_dtype = None if dtype is None else _parse_dtype(dtype)
+
+def resolve_dtype(dtype: DTypeLike = None) -> np.dtype:
+    """解析组件的存储精度，未指定时使用默认存储精度"""
+    return storage_dtype() if dtype is None else _parse_dtype(dtype)
+
+def to_storage(array: np.ndarray, dtype: DTypeLike = None) -> np.ndarray:
+    """转换为存储精度（精度相同时不复制）"""
+    return np.asarray(array).astype(resolve_dtype(dtype), copy=False)
+
+def to_accumulator(array: Any) -> np.ndarray:
+    """转换为计算精度（已是float64时不复制）"""
+    return np.asarray(array).astype(ACCUMULATOR_DTYPE, copy=False)
@@ -9,101 +9,236 @@ import logging
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import math
+import time
 
-from stock_data_fetcher import StockDataFetcher
-from technical_analysis import TechnicalAnalyzer
-from get_stock_advice import StockAdvisor
+import numpy as np
+
+from stock_data_fetcher import StockDataFetcher, STOCK_DATA_PARTS
+from technical_analysis import TechnicalAnalyzer, history_closes, last_value, macd_snapshot
+from resample import resample
+from pattern_detection import PatternDetector, latest_event
+from bars import Bars
+from rolling_stats import rolling_moments, simple_returns
+from get_stock_advice import StockAdvisor, SCORE_SECTIONS
+from advice_pipeline import AdvicePipeline, PipelineRun
+from config_loader import get_setting
+from scenario_simulation import ScenarioSimulator
+from correlation_service import CorrelationService
+from market_snapshot import MarketSnapshotProvider
+from sector_analysis import SectorAnalyzer
+from advice_cache import AdviceCache, RefreshState, report_diff
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 动量分析各时间框架对应的K线周期
+MOMENTUM_TIMEFRAMES = {"short": "daily", "medium": "weekly", "long": "monthly"}
+# 重采样后至少需要的K线数量，不足时退回快照指标
+MIN_TIMEFRAME_BARS = 10
+# 转折点分析关注的最近K线数量
+TURNING_POINT_LOOKBACK = 20
+
+# 无风险利率与股权资本成本（年化）
+RISK_FREE_RATE = 0.02
+COST_OF_EQUITY = 0.10
+TRADING_DAYS = 252
+# 仓位建议的参考年化波动率：波动率更高的股票按比例降低仓位上限
+POSITION_REFERENCE_VOLATILITY = 0.30
+
+# 各情景的典型驱动因素
+SCENARIO_CATALYSTS = {
+    "bull_scenario": ["业绩超预期", "政策利好", "行业景气度提升"],
+    "bear_scenario": ["业绩不及预期", "政策收紧", "行业竞争加剧"],
+    "base_scenario": ["稳健增长", "行业平均表现"]
+}
+
+# 增强版报告的各部分（按输出顺序）
+REPORT_SECTIONS = (
+    "base_analysis",
+    "enhanced_analysis",
+    "personalized_advice",
+    "scenario_analysis",
+    "portfolio_advice",
+    "advanced_metrics",
+    "market_timing",
+    "sector_analysis",
+    "competitive_analysis",
+    "valuation_models"
+)
+# 增强分析（enhanced_analysis）包含的子分析
+ENHANCED_ANALYSIS_SECTIONS = (
+    "momentum_analysis",
+    "volatility_analysis",
+    "correlation_analysis",
+    "seasonal_analysis",
+    "event_analysis",
+    "behavioral_analysis"
+)
+# 可通过 include 单独选择的部分
+SELECTABLE_SECTIONS = REPORT_SECTIONS + ENHANCED_ANALYSIS_SECTIONS
+
 class EnhancedStockAdvisor:
     """增强版股票投资建议生成器"""
     
-    def __init__(self):
-        self.data_fetcher = StockDataFetcher()
+    def __init__(self, section_timeout: Optional[float] = None,
+                 max_concurrent_sections: Optional[int] = None,
+                 data_fetcher: Optional[StockDataFetcher] = None,
+                 correlation_service: Optional[CorrelationService] = None,
+                 market_snapshots: Optional[MarketSnapshotProvider] = None,
+                 sector_analyzer: Optional[SectorAnalyzer] = None,
+                 advice_cache: Optional[AdviceCache] = None,
+                 refresh_state: Optional[RefreshState] = None):
+        self.data_fetcher = data_fetcher or StockDataFetcher()
+        # 按输入指纹缓存的报告（基础建议共用同一缓存）
+        self.advice_cache = advice_cache if advice_cache is not None else AdviceCache.from_config()
+        # 上一次报告的各阶段输入指纹与结果，增量刷新时只重算输入变化的阶段
+        self.refresh_state = refresh_state if refresh_state is not None else RefreshState()
+        # 可选的全市场快照提供器，行业分析以其作为股票主数据
+        self.market_snapshots = market_snapshots
+        self.sector_analyzer = sector_analyzer or SectorAnalyzer()
+        # 可选的滚动相关性服务，提供与股票池中其他股票的相关性
+        self.correlation_service = correlation_service
         self.tech_analyzer = TechnicalAnalyzer()
-        self.base_advisor = StockAdvisor()
+        self.base_advisor = StockAdvisor(advice_cache=self.advice_cache)
+        self.pattern_detector = PatternDetector()
+        self.scenario_simulator = ScenarioSimulator.from_config()
+        # 外部数据分析（相关性、事件、行业、竞争地位）的单项超时与并发上限
+        self.section_timeout = (section_timeout if section_timeout is not None
+                                else get_setting("analysis", "section_timeout", 10))
+        self.max_concurrent_sections = (max_concurrent_sections if max_concurrent_sections is not None
+                                        else get_setting("analysis", "max_concurrent_sections", 4))
+    
+    def start_pipeline(self, inputs: Dict[str, Any], **options) -> PipelineRun:
+        """创建一次报告流水线运行"""
+        guarded = [name for name, stage in ENHANCED_PIPELINE.stages.items() if stage.guarded]
+        return ENHANCED_PIPELINE.start(self, inputs,
+                                       max_concurrency=self.max_concurrent_sections,
+                                       timeouts={name: self.section_timeout for name in guarded},
+                                       **options)
         
     async def get_enhanced_advice(self, symbol: str, 
                                  investment_horizon: str = "medium", 
-                                 risk_tolerance: str = "moderate") -> Dict[str, Any]:
-        """获取增强版投资建议"""
+                                 risk_tolerance: str = "moderate",
+                                 stock_data: Optional[Dict[str, Any]] = None,
+                                 include: Optional[List[str]] = None,
+                                 incremental: bool = False) -> Dict[str, Any]:
+        """获取增强版投资建议
+        
+        股票数据只获取一次，各分析阶段按依赖关系并发执行；include指定只生成的报告部分
+        （见 SELECTABLE_SECTIONS），此时只计算这些部分及其依赖，也只获取它们需要的数据。
+        股票数据与参数相同的请求直接返回缓存的报告（见 advice_cache）。
+        
+        incremental为True时与同一股票、同一参数、同一组报告部分的上一次报告比较：输入数据部分未变化的阶段
+        直接复用上一次的结果（如只有价格变动时不重算资金流与情绪分析），报告附加 refresh：
+        重算与复用的阶段，以及相对上一次报告的差异（JSON Patch 格式）。
+        """
+        sections = list(REPORT_SECTIONS) if include is None else list(dict.fromkeys(include))
+        unknown = [name for name in sections if name not in SELECTABLE_SECTIONS]
+        if unknown:
+            return {"error": f"不支持的报告部分: {', '.join(unknown)}，可选: {', '.join(SELECTABLE_SECTIONS)}"}
+        
         try:
-            # 获取基础数据
-            stock_data = await self.data_fetcher.fetch_stock_data(symbol)
+            inputs = {"symbol": symbol}
+            if stock_data is not None:
+                inputs["stock_data"] = stock_data
+            run = self.start_pipeline(inputs,
+                                      investment_horizon=investment_horizon,
+                                      risk_tolerance=risk_tolerance,
+                                      data_parts=ENHANCED_PIPELINE.requirements(sections))
             
+            # 获取基础数据
+            stock_data = await run.get("stock_data")
             if "error" in stock_data:
                 return {"error": stock_data["error"]}
             
-            # 获取基础建议
-            base_advice = await self.base_advisor.get_professional_advice(symbol)
+            # 股票数据与参数均未变化时返回已生成的报告
+            key = self.advice_cache.key("enhanced_advice", symbol, stock_data,
+                                        investment_horizon, risk_tolerance, sections)
+            # 上一次报告按所选部分区分，差异只在范围相同的报告之间比较
+            state_key = (symbol, investment_horizon, risk_tolerance, tuple(sections))
+            previous = self.refresh_state.get(state_key) if incremental else None
+            hashes = run.input_hashes(sections, stock_data, data_stage="stock_data")
+            cached = self.advice_cache.get(key)
+            if cached is not None:
+                report = {**cached, "cached": True}
+                if incremental:
+                    report["refresh"] = self.refresh_summary(previous, cached, [], list(hashes))
+                return report
             
-            # 增强分析
-            enhanced_analysis = await self.perform_enhanced_analysis(stock_data)
+            # 输入指纹未变化的阶段复用上一次的结果
+            reused = []
+            if previous is not None:
+                reused = run.reuse(previous["stages"], hashes, max_age=self.advice_cache.ttl)
             
-            # 个性化建议
-            personalized_advice = self.generate_personalized_advice(
-                stock_data, investment_horizon, risk_tolerance
-            )
-            
-            # 情景分析
-            scenario_analysis = self.perform_scenario_analysis(stock_data)
+            results = await run.collect(sections)
             
-            # 投资组合建议
-            portfolio_advice = self.generate_portfolio_advice(
-                stock_data, investment_horizon, risk_tolerance
-            )
-            
-            return {
+            report = {
                 "symbol": symbol,
                 "analysis_date": datetime.now().isoformat(),
                 "investment_horizon": investment_horizon,
                 "risk_tolerance": risk_tolerance,
-                "base_analysis": base_advice,
-                "enhanced_analysis": enhanced_analysis,
-                "personalized_advice": personalized_advice,
-                "scenario_analysis": scenario_analysis,
-                "portfolio_advice": portfolio_advice,
-                "advanced_metrics": self.calculate_advanced_metrics(stock_data),
-                "market_timing": self.analyze_market_timing(stock_data),
-                "sector_analysis": await self.analyze_sector_performance(symbol),
-                "competitive_analysis": await self.analyze_competitive_position(symbol),
-                "valuation_models": self.perform_valuation_analysis(stock_data)
+                **results,
+                "section_status": run.status
             }
             
+            now = time.time()
+            stages = {}
+            for name, digest in hashes.items():
+                if name in reused:
+                    stages[name] = previous["stages"][name]
+                elif name in run.results:
+                    stages[name] = {"hash": digest, "value": run.results[name],
+                                    "status": run.status.get(name), "time": now}
+            self.refresh_state.put(state_key, stages, report)
+            
+            # 有部分超时或失败的报告不缓存，下次请求重新计算
+            if all(s["status"] == "ok" for s in run.status.values()):
+                self.advice_cache.put(key, report)
+            
+            report = {**report, "cached": False}
+            if incremental:
+                recomputed = [name for name in hashes if name in run.results and name not in reused]
+                report["refresh"] = self.refresh_summary(previous, report, recomputed, reused)
+            return report
+            
         except Exception as e:
             logger.error(f"生成增强版投资建议失败: {e}")
             return {"error": str(e)}
     
+    @staticmethod
+    def refresh_summary(previous: Optional[Dict[str, Any]], report: Dict[str, Any],
+                        recomputed: List[str], reused: List[str]) -> Dict[str, Any]:
+        """增量刷新说明：重算与复用的阶段，以及相对上一次报告的差异（无上一次报告时为None）"""
+        changes = None
+        if previous is not None:
+            current = {k: v for k, v in report.items() if k not in ("cached", "refresh")}
+            changes = report_diff(previous["report"], current)
+        return {"recomputed": list(recomputed), "reused": list(reused), "changes": changes}
+    
     async def perform_enhanced_analysis(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
         """执行增强分析"""
-        return {
-            "momentum_analysis": self.analyze_momentum_patterns(stock_data),
-            "volatility_analysis": self.analyze_volatility_patterns(stock_data),
-            "correlation_analysis": await self.analyze_market_correlations(stock_data),
-            "seasonal_analysis": self.analyze_seasonal_patterns(stock_data),
-            "event_analysis": await self.analyze_market_events(stock_data),
-            "behavioral_analysis": self.analyze_investor_behavior(stock_data)
-        }
+        run = self.start_pipeline({"symbol": stock_data.get("symbol", ""), "stock_data": stock_data})
+        return await run.get("enhanced_analysis")
     
     def analyze_momentum_patterns(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
         """分析动量模式"""
         technical = stock_data.get("technical_indicators", {})
+        bars = stock_data.get("price_history")
+        bars = bars if isinstance(bars, Bars) else None
         
-        # 多时间框架动量
+        # 多时间框架动量（有日K线历史时按日/周/月线分别计算）
         momentum_scores = {
-            "short_term": self.calculate_momentum_score(technical, "short"),
-            "medium_term": self.calculate_momentum_score(technical, "medium"),
-            "long_term": self.calculate_momentum_score(technical, "long")
+            "short_term": self.calculate_momentum_score(technical, "short", bars),
+            "medium_term": self.calculate_momentum_score(technical, "medium", bars),
+            "long_term": self.calculate_momentum_score(technical, "long", bars)
         }
         
         # 动量持续性
         momentum_sustainability = self.assess_momentum_sustainability(technical)
         
         # 动量转折点
-        momentum_turning_points = self.identify_momentum_turning_points(technical)
+        momentum_turning_points = self.identify_momentum_turning_points(technical, bars)
         
         return {
             "momentum_scores": momentum_scores,
@@ -112,8 +247,88 @@ class EnhancedStockAdvisor:
             "momentum_strength": self.calculate_overall_momentum_strength(momentum_scores)
         }
     
-    def calculate_momentum_score(self, technical: Dict[str, Any], timeframe: str) -> float:
-        """计算动量评分"""
+    def analyze_volatility_patterns(self, stock_data: Dict[str, Any], 
+                                  window: int = 20) -> Dict[str, Any]:
+        """分析波动率模式"""
+        closes = history_closes(stock_data)
+        
+        if len(closes) < window + 1:
+            # 无历史数据时以布林带宽近似
+            technical = stock_data.get("technical_indicators", {})
+            middle = technical.get("boll_middle", 0)
+            upper = technical.get("boll_upper", 0)
+            lower = technical.get("boll_lower", 0)
+            bandwidth = (upper - lower) / middle if middle else 0.0
+            
+            # 随机游走下窗口内价格标准差约为日波动率的sqrt(窗口/3)倍
+            implied_daily = bandwidth / 4 / math.sqrt(window / 3)
+            
+            return {
+                "data_source": "snapshot",
+                "bandwidth": bandwidth,
+                "volatility_regime": self.classify_volatility_regime(implied_daily)
+            }
+        
+        returns = simple_returns(closes)
+        return_moments = rolling_moments(returns, window)
+        price_moments = rolling_moments(closes, window)
+        
+        rolling_std = return_moments["std"][window - 1:]
+        current_std = float(rolling_std[-1])
+        bandwidth = price_moments["bandwidth"][window - 1:]
+        current_bandwidth = float(bandwidth[-1])
+        
+        # 当前值在历史分布中的分位
+        volatility_percentile = float((rolling_std <= current_std).mean() * 100)
+        bandwidth_percentile = float((bandwidth <= current_bandwidth).mean() * 100)
+        
+        return {
+            "data_source": "history",
+            "daily_volatility": current_std,
+            "annualized_volatility": current_std * math.sqrt(252),
+            "volatility_percentile": volatility_percentile,
+            "volatility_trend": "上升" if current_std > float(np.nanmean(rolling_std)) else "下降",
+            "price_zscore": float(price_moments["zscore"][-1]),
+            "bandwidth": current_bandwidth,
+            "bandwidth_percentile": bandwidth_percentile,
+            "squeeze": bandwidth_percentile <= 20,
+            "volatility_regime": self.classify_volatility_regime(current_std)
+        }
+    
+    def classify_volatility_regime(self, daily_volatility: float) -> str:
+        """按日波动率划分波动环境"""
+        if daily_volatility < 0.015:
+            return "低波动"
+        elif daily_volatility < 0.03:
+            return "中等波动"
+        else:
+            return "高波动"
+    
+    def timeframe_indicators(self, bars: Bars, timeframe: str) -> Optional[Dict[str, Any]]:
+        """将日K线重采样到指定周期后计算动量相关指标，K线不足时返回None"""
+        period_bars = resample(bars, timeframe)
+        if len(period_bars) < MIN_TIMEFRAME_BARS:
+            return None
+        
+        ctx = self.tech_analyzer.indicator_context(period_bars, symbol=bars.symbol)
+        technical = {
+            "timeframe": timeframe,
+            "bars": len(period_bars),
+            "rsi": last_value(ctx.get("rsi"), 50.0),
+            "kdj_k": last_value(ctx.get("kdj")["k"], 50.0),
+            "macd": macd_snapshot(ctx.get("macd"))
+        }
+        for period in (5, 10, 20, 60):
+            technical[f"ma{period}"] = last_value(ctx.get("ma", period=period), 0.0)
+        
+        return technical
+    
+    def calculate_momentum_score(self, technical: Dict[str, Any], timeframe: str,
+                                 bars: Optional[Bars] = None) -> float:
+        """计算动量评分（传入日K线时使用对应周期的真实指标）"""
+        if bars is not None and timeframe in MOMENTUM_TIMEFRAMES:
+            technical = self.timeframe_indicators(bars, MOMENTUM_TIMEFRAMES[timeframe]) or technical
+        
         base_score = 50
         
         if timeframe == "short":
@@ -150,6 +365,11 @@ class EnhancedStockAdvisor:
             ma20 = technical.get("ma20", 0)
             ma60 = technical.get("ma60", 0)
             
+            # 月线通常不足60根，改用月线MA5与MA10
+            if technical.get("timeframe") == "monthly" and not ma60:
+                ma20 = technical.get("ma5", 0)
+                ma60 = technical.get("ma10", 0)
+            
             if ma20 > ma60:
                 base_score += 20
             else:
@@ -200,8 +420,9 @@ class EnhancedStockAdvisor:
         
         return max(0, min(100, score))
     
-    def identify_momentum_turning_points(self, technical: Dict[str, Any]) -> Dict[str, Any]:
-        """识别动量转折点"""
+    def identify_momentum_turning_points(self, technical: Dict[str, Any],
+                                         bars: Optional[Bars] = None) -> Dict[str, Any]:
+        """识别动量转折点（有日K线历史时基于完整指标序列检测形态）"""
         rsi = technical.get("rsi", 50)
         macd = technical.get("macd", {})
         
@@ -209,10 +430,15 @@ class EnhancedStockAdvisor:
         oversold_signal = rsi < 30
         overbought_signal = rsi > 70
         
+        # 最近的形态事件
+        events = None
+        if bars is not None and len(bars) > TURNING_POINT_LOOKBACK:
+            events = self.pattern_detector.scan_bars(bars, TURNING_POINT_LOOKBACK)
+        
         # MACD背离检测
-        macd_divergence = self.detect_macd_divergence(macd)
+        macd_divergence = self.detect_macd_divergence(macd, events)
         
-        return {
+        result = {
             "oversold_signal": oversold_signal,
             "overbought_signal": overbought_signal,
             "macd_divergence": macd_divergence,
@@ -220,9 +446,24 @@ class EnhancedStockAdvisor:
                 oversold_signal, overbought_signal, macd_divergence
             )
         }
+        
+        if events is not None:
+            result["recent_patterns"] = [
+                {"pattern": e["description"], "date": e["date"], "bars_ago": len(bars) - 1 - e["index"]}
+                for e in events
+            ]
+        
+        return result
     
-    def detect_macd_divergence(self, macd: Dict[str, Any]) -> str:
-        """检测MACD背离"""
+    def detect_macd_divergence(self, macd: Dict[str, Any],
+                               events: Optional[List[Dict[str, Any]]] = None) -> str:
+        """检测MACD背离（传入形态事件时取最近一次MACD背离）"""
+        if events is not None:
+            event = latest_event(events, ("macd_top_divergence", "macd_bottom_divergence"))
+            if event is None:
+                return "无背离"
+            return "顶背离" if event["pattern"] == "macd_top_divergence" else "底背离"
+        
         if not isinstance(macd, dict):
             return "无数据"
         
@@ -266,12 +507,180 @@ class EnhancedStockAdvisor:
         
         return max(0, min(100, total_strength))
     
+    @staticmethod
+    def _price_history(stock_data: Dict[str, Any]) -> Optional[Bars]:
+        bars = stock_data.get("price_history")
+        return bars if isinstance(bars, Bars) and len(bars) > 1 else None
+    
+    async def analyze_market_correlations(self, stock_data: Dict[str, Any],
+                                          min_returns: int = 20) -> Dict[str, Any]:
+        """分析收益率的自相关、量价相关性以及与股票池中其他股票的相关性"""
+        bars = self._price_history(stock_data)
+        returns = simple_returns(bars.close) if bars is not None else np.array([])
+        if len(returns) < min_returns:
+            return {"data_source": "unavailable", "note": "历史数据不足，无法计算相关性"}
+        
+        autocorrelation = float(np.corrcoef(returns[1:], returns[:-1])[0, 1])
+        volume = bars.volume[1:].astype(np.float64)
+        price_volume = float(np.corrcoef(np.abs(returns), volume)[0, 1]) if np.std(volume) > 0 else 0.0
+        
+        if autocorrelation > 0.1:
+            persistence = "趋势延续"
+        elif autocorrelation < -0.1:
+            persistence = "均值回复"
+        else:
+            persistence = "随机游走"
+        
+        return {
+            "data_source": "history",
+            "return_autocorrelation": autocorrelation,
+            "price_volume_correlation": price_volume,
+            "trend_persistence": persistence,
+            "volume_confirmation": price_volume > 0.3,
+            "peer_correlations": self.peer_correlations(stock_data)
+        }
+    
+    def peer_correlations(self, stock_data: Dict[str, Any], n: int = 5) -> Optional[Dict[str, Any]]:
+        """与股票池中其他股票的收益相关性（未配置相关性服务或股票池不足时返回None）"""
+        service = self.correlation_service
+        symbol = stock_data.get("symbol")
+        if service is None or not symbol:
+            return None
+        
+        bars = self._price_history(stock_data)
+        if symbol not in service.store and bars is not None:
+            service.store.put(bars, symbol)
+        if symbol not in service.store or len(service.store) < 2:
+            return None
+        
+        try:
+            most = service.correlated(symbol, n)
+            least = service.correlated(symbol, n, least=True)
+        except ValueError as e:
+            logger.warning(f"相关性查询失败: {e}")
+            return None
+        if "error" in most or not most["results"]:
+            return None
+        return {
+            "window": most["window"],
+            "universe": most["universe"],
+            "most_correlated": most["results"],
+            "least_correlated": least["results"]
+        }
+    
+    def analyze_seasonal_patterns(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        """分析月份与星期的收益季节性"""
+        bars = self._price_history(stock_data)
+        if bars is None or len(bars) < 40:
+            return {"data_source": "unavailable", "note": "历史数据不足，无法分析季节性"}
+        
+        # 星期效应（1970-01-01为周四，+3后周一为0）
+        daily_returns = simple_returns(bars.close)
+        days = bars.dates[1:].astype("datetime64[D]").astype(np.int64)
+        weekdays = (days + 3) % 7
+        weekday_counts = np.bincount(weekdays, minlength=7)
+        weekday_means = np.bincount(weekdays, weights=daily_returns, minlength=7) / np.maximum(weekday_counts, 1)
+        weekday_names = ["周一", "周二", "周三", "周四", "周五"]
+        
+        # 月份效应
+        monthly = resample(bars, "monthly")
+        monthly_returns = simple_returns(monthly.close)
+        months = monthly.dates[1:].astype("datetime64[M]").astype(np.int64) % 12
+        month_counts = np.bincount(months, minlength=12)
+        month_means = np.bincount(months, weights=monthly_returns, minlength=12) / np.maximum(month_counts, 1)
+        observed = np.flatnonzero(month_counts)
+        
+        result = {
+            "data_source": "history",
+            "weekday_average_returns": {
+                weekday_names[d]: float(weekday_means[d]) for d in range(5) if weekday_counts[d]
+            },
+            "monthly_average_returns": {f"{m + 1}月": float(month_means[m]) for m in observed},
+            "monthly_samples": {f"{m + 1}月": int(month_counts[m]) for m in observed}
+        }
+        if len(observed):
+            result["best_month"] = f"{observed[np.argmax(month_means[observed])] + 1}月"
+            result["worst_month"] = f"{observed[np.argmin(month_means[observed])] + 1}月"
+        return result
+    
+    async def analyze_market_events(self, stock_data: Dict[str, Any],
+                                    lookback: int = 60,
+                                    gap_threshold: float = 0.05) -> Dict[str, Any]:
+        """分析新闻事件与近期异常波动"""
+        news = stock_data.get("news") or []
+        positive = sum(1 for n in news if n.get("sentiment") == "positive")
+        negative = sum(1 for n in news if n.get("sentiment") == "negative")
+        
+        if positive > negative:
+            impact = "正面"
+        elif positive < negative:
+            impact = "负面"
+        else:
+            impact = "中性"
+        
+        # 近期单日涨跌幅超过阈值的交易日
+        price_moves = []
+        bars = self._price_history(stock_data)
+        if bars is not None:
+            recent = bars.tail(lookback + 1)
+            returns = simple_returns(recent.close)
+            dates = np.datetime_as_string(recent.dates[1:], unit="D")
+            for i in np.flatnonzero(np.abs(returns) >= gap_threshold):
+                price_moves.append({"date": str(dates[i]), "change": float(returns[i])})
+        
+        return {
+            "news_count": len(news),
+            "positive_news": positive,
+            "negative_news": negative,
+            "news_impact": impact,
+            "key_events": [n.get("title", "") for n in news if n.get("importance") == "high"],
+            "abnormal_price_moves": price_moves
+        }
+    
+    def analyze_investor_behavior(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        """分析主力与散户资金行为及市场情绪"""
+        money_flow = stock_data.get("money_flow", {})
+        sentiment = stock_data.get("sentiment", {})
+        
+        institutional_flow = money_flow.get("super_large_net", 0) + money_flow.get("large_net", 0)
+        retail_flow = money_flow.get("small_net", 0)
+        
+        if institutional_flow > 0 and retail_flow < 0:
+            behavior = "主力吸筹"
+        elif institutional_flow < 0 and retail_flow > 0:
+            behavior = "主力派发"
+        else:
+            behavior = "多空分歧"
+        
+        fear_greed = sentiment.get("fear_greed_index", 50)
+        if fear_greed >= 75:
+            mood = "极度贪婪"
+        elif fear_greed >= 55:
+            mood = "贪婪"
+        elif fear_greed > 45:
+            mood = "中性"
+        elif fear_greed > 25:
+            mood = "恐惧"
+        else:
+            mood = "极度恐惧"
+        
+        return {
+            "capital_behavior": behavior,
+            "institutional_net_flow": institutional_flow,
+            "retail_net_flow": retail_flow,
+            "flow_trend": "持续流入" if money_flow.get("net_flow_5d", 0) > 0 else "持续流出",
+            "market_mood": mood,
+            "institutional_holding": sentiment.get("institutional_holding"),
+            "contrarian_signal": mood in ("极度贪婪", "极度恐惧")
+        }
+    
     def generate_personalized_advice(self, stock_data: Dict[str, Any], 
                                    investment_horizon: str, 
-                                   risk_tolerance: str) -> Dict[str, Any]:
-        """生成个性化建议"""
+                                   risk_tolerance: str,
+                                   risk_level: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """生成个性化建议（risk_level为已计算的风险等级）"""
         risk_assessment = self.assess_personalized_risk(
-            stock_data, investment_horizon, risk_tolerance
+            stock_data, investment_horizon, risk_tolerance, risk_level
         )
         
         allocation_advice = self.recommend_allocation(
@@ -293,9 +702,11 @@ class EnhancedStockAdvisor:
     
     def assess_personalized_risk(self, stock_data: Dict[str, Any], 
                                investment_horizon: str, 
-                               risk_tolerance: str) -> Dict[str, Any]:
+                               risk_tolerance: str,
+                               base_risk: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """评估个性化风险"""
-        base_risk = self.calculate_risk_level(stock_data)
+        if base_risk is None:
+            base_risk = self.calculate_risk_level(stock_data)
         
         # 根据投资期限调整风险
         horizon_multiplier = {
@@ -323,6 +734,10 @@ class EnhancedStockAdvisor:
             "risk_warnings": self.generate_risk_warnings(stock_data, adjusted_risk)
         }
     
+    def calculate_risk_level(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        """计算风险等级（与基础建议相同的规则）"""
+        return self.base_advisor.calculate_risk_level(stock_data)
+    
     def determine_suitability(self, risk_score: float, risk_tolerance: str) -> str:
         """确定适合度"""
         tolerance_map = {
@@ -520,6 +935,48 @@ class EnhancedStockAdvisor:
         
         return strategies
     
+    def generate_strategies(self, stock_data: Dict[str, Any], 
+                          investment_horizon: str, 
+                          risk_tolerance: str) -> List[Dict[str, Any]]:
+        """生成与投资期限、风险偏好匹配的操作策略"""
+        rsi = stock_data.get("technical_indicators", {}).get("rsi", 50)
+        strategies = []
+        
+        if investment_horizon == "short":
+            strategies.append({
+                "strategy": "波段操作",
+                "description": "围绕20日均线高抛低吸，严格执行止损"
+            })
+        elif investment_horizon == "long":
+            strategies.append({
+                "strategy": "长期持有",
+                "description": "关注基本面变化，回调时逐步加仓"
+            })
+        else:
+            strategies.append({
+                "strategy": "趋势跟踪",
+                "description": "趋势向上时持有，跌破60日均线时减仓"
+            })
+        
+        if risk_tolerance == "conservative":
+            strategies.append({
+                "strategy": "控制仓位",
+                "description": "单只股票仓位不超过10%，搭配低波动资产"
+            })
+        elif risk_tolerance == "aggressive" and rsi < 30:
+            strategies.append({
+                "strategy": "超卖反弹",
+                "description": "RSI超卖时小仓位博取反弹"
+            })
+        
+        if rsi > 70:
+            strategies.append({
+                "strategy": "分批止盈",
+                "description": "RSI超买，已有盈利可分批兑现"
+            })
+        
+        return strategies
+    
     def assess_market_conditions(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
         """评估市场条件"""
         technical = stock_data.get("technical_indicators", {})
@@ -580,34 +1037,54 @@ class EnhancedStockAdvisor:
             return "流动性较差"
     
     def perform_scenario_analysis(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """执行情景分析"""
+        """执行情景分析（有历史K线时由蒙特卡洛路径估计情景概率与目标价）"""
         current_price = stock_data.get("basic_info", {}).get("price", 0)
+        bars = self._price_history(stock_data)
+        simulation = self.scenario_simulator.simulate(bars) if bars is not None else None
+        
+        if simulation is not None and "error" not in simulation:
+            timeframe = f"{simulation['horizon_days']}个交易日"
+            scenarios = {
+                name: {**simulation[name], "catalysts": SCENARIO_CATALYSTS[name], "timeframe": timeframe}
+                for name in ("bull_scenario", "bear_scenario", "base_scenario")
+            }
+            return {
+                "data_source": "simulation",
+                **scenarios,
+                "expected_value": simulation["expected_value"],
+                "simulation": {
+                    key: simulation[key] for key in (
+                        "model", "n_paths", "horizon_days", "start_price", "expected_return",
+                        "probability_of_loss", "value_at_risk_95", "expected_shortfall_95",
+                        "median_max_drawdown", "price_bands"
+                    )
+                }
+            }
         
-        # 牛市情景
+        # 无历史数据时使用固定情景假设
         bull_scenario = {
             "probability": 25,
             "price_target": current_price * 1.3,
-            "catalysts": ["业绩超预期", "政策利好", "行业景气度提升"],
+            "catalysts": SCENARIO_CATALYSTS["bull_scenario"],
             "timeframe": "3-6个月"
         }
         
-        # 熊市情景
         bear_scenario = {
             "probability": 20,
             "price_target": current_price * 0.7,
-            "catalysts": ["业绩不及预期", "政策收紧", "行业竞争加剧"],
+            "catalysts": SCENARIO_CATALYSTS["bear_scenario"],
             "timeframe": "3-6个月"
         }
         
-        # 基准情景
         base_scenario = {
             "probability": 55,
             "price_target": current_price * 1.1,
-            "catalysts": ["稳健增长", "行业平均表现"],
+            "catalysts": SCENARIO_CATALYSTS["base_scenario"],
             "timeframe": "6-12个月"
         }
         
         return {
+            "data_source": "assumption",
             "bull_scenario": bull_scenario,
             "bear_scenario": bear_scenario,
             "base_scenario": base_scenario,
@@ -629,11 +1106,12 @@ class EnhancedStockAdvisor:
     
     def generate_portfolio_advice(self, stock_data: Dict[str, Any], 
                                 investment_horizon: str, 
-                                risk_tolerance: str) -> Dict[str, Any]:
+                                risk_tolerance: str,
+                                sector: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """生成投资组合建议"""
         return {
             "diversification_strategy": self.recommend_diversification(
-                stock_data, investment_horizon
+                stock_data, investment_horizon, sector
             ),
             "hedging_strategy": self.recommend_hedging(stock_data, risk_tolerance),
             "rebalancing_frequency": self.recommend_rebalancing_frequency(investment_horizon),
@@ -641,15 +1119,41 @@ class EnhancedStockAdvisor:
         }
     
     def recommend_diversification(self, stock_data: Dict[str, Any], 
-                              investment_horizon: str) -> Dict[str, Any]:
-        """推荐分散化策略"""
-        sector = "科技"  # 模拟行业
-        
+                              investment_horizon: str,
+                              sector: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """推荐分散化策略：仓位上限按配置与个股波动率确定，行业上限取配置，行业取自行业分析"""
+        industry = ((sector or {}).get("industry")
+                    or stock_data.get("basic_info", {}).get("industry") or "所属")
+        max_position = get_setting("risk_management", "max_position_size", 0.1)
+        max_sector = get_setting("risk_management", "max_sector_weight", 0.3)
+        
+        # 波动率高于参考水平时按比例降低仓位，使单只股票的风险敞口不超过上限仓位的参考风险
+        closes = history_closes(stock_data)
+        volatility = None
+        position = max_position
+        if len(closes) >= 21:
+            volatility = float(np.std(simple_returns(np.asarray(closes, dtype=np.float64))) * math.sqrt(TRADING_DAYS))
+            if volatility > POSITION_REFERENCE_VOLATILITY:
+                position = max_position * POSITION_REFERENCE_VOLATILITY / volatility
+        
+        equity_range = {"short": "40-60%", "medium": "60-80%", "long": "70-90%"}.get(investment_horizon, "60-80%")
+        peers = self.peer_correlations(stock_data, n=3)
+        if peers:
+            correlation = {
+                "avoid_pairing": [p["symbol"] for p in peers["most_correlated"] if p["correlation"] > 0.7],
+                "diversifiers": [p["symbol"] for p in peers["least_correlated"]]
+            }
+        else:
+            correlation = {}
         return {
-            "sector_allocation": f"{sector}行业不超过30%",
+            "position_limit": position,
+            "annualized_volatility": volatility,
+            "minimum_holdings": math.ceil(1 / position),
+            "sector_allocation": f"{industry}行业不超过{max_sector:.0%}",
             "stock_correlation": "选择相关性低于0.7的股票",
-            "geographic_diversification": "考虑港股和美股标的",
-            "asset_allocation": "股票占60-80%，债券占20-40%"
+            **correlation,
+            "asset_allocation": f"股票占{equity_range}，其余配置债券与现金",
+            "optimization": "多只股票的具体权重可用 optimize_portfolio 按协方差求解"
         }
     
     def recommend_hedging(self, stock_data: Dict[str, Any], 
@@ -683,21 +1187,312 @@ class EnhancedStockAdvisor:
             "行业相对表现",
             "重要财报发布日期"
         ]
+    
+    def calculate_advanced_metrics(self, stock_data: Dict[str, Any],
+                                   volatility: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """计算年化收益、夏普比率、索提诺比率与最大回撤等绩效指标"""
+        closes = np.asarray(history_closes(stock_data), dtype=np.float64)
+        if len(closes) < 21:
+            return {"data_source": "unavailable", "note": "历史数据不足，无法计算绩效指标"}
+        
+        returns = simple_returns(closes)
+        annual_return = float((closes[-1] / closes[0]) ** (TRADING_DAYS / len(returns)) - 1)
+        annual_volatility = float(np.std(returns) * math.sqrt(TRADING_DAYS))
+        downside = float(np.sqrt(np.mean(np.minimum(returns, 0) ** 2)) * math.sqrt(TRADING_DAYS))
+        max_drawdown = float(np.max(1 - closes / np.maximum.accumulate(closes)))
+        
+        metrics = {
+            "data_source": "history",
+            "annualized_return": annual_return,
+            "annualized_volatility": annual_volatility,
+            "sharpe_ratio": (annual_return - RISK_FREE_RATE) / annual_volatility if annual_volatility else 0.0,
+            "sortino_ratio": (annual_return - RISK_FREE_RATE) / downside if downside else 0.0,
+            "max_drawdown": max_drawdown,
+            "calmar_ratio": annual_return / max_drawdown if max_drawdown else 0.0,
+            "win_rate": float(np.mean(returns > 0))
+        }
+        if volatility:
+            metrics["volatility_regime"] = volatility.get("volatility_regime")
+        return metrics
+    
+    def analyze_market_timing(self, stock_data: Dict[str, Any],
+                              momentum: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """结合入场时机评分与动量强度判断择时"""
+        technical = stock_data.get("technical_indicators", {})
+        momentum = momentum or self.analyze_momentum_patterns(stock_data)
+        
+        entry_score = self.calculate_entry_timing_score(technical, "medium")
+        momentum_strength = momentum.get("momentum_strength", 50)
+        timing_score = entry_score * 0.5 + momentum_strength * 0.5
+        
+        return {
+            "timing_score": timing_score,
+            "timing": self.determine_entry_timing(timing_score),
+            "entry_score": entry_score,
+            "momentum_strength": momentum_strength,
+            "market_regime": self.determine_market_regime(technical)
+        }
+    
+    async def analyze_sector_performance(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        """分析所属行业表现（由全市场快照的行业统计表查得）"""
+        basic_info = stock_data.get("basic_info", {})
+        snapshot = await self.market_snapshots.get(self.data_fetcher) if self.market_snapshots else None
+        if snapshot is None:
+            return {
+                "data_source": "unavailable",
+                "industry": basic_info.get("industry", ""),
+                "note": "暂无行业行情数据"
+            }
+        return self.sector_analyzer.analyze(snapshot, stock_data.get("symbol") or basic_info.get("symbol", ""))
+    
+    async def analyze_competitive_position(self, stock_data: Dict[str, Any],
+                                           sector: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """根据盈利能力、成长性与财务稳健性评估竞争地位"""
+        financial = stock_data.get("financial_data", {})
+        
+        checks = [
+            (financial.get("roe", 0) >= 15, "净资产收益率较高", "净资产收益率偏低"),
+            (financial.get("profit_margin", 0) >= 10, "利润率较高", "利润率偏低"),
+            (financial.get("revenue_growth", 0) >= 10, "营收增长较快", "营收增长放缓"),
+            (financial.get("debt_ratio", 100) <= 60, "负债率合理", "负债率偏高"),
+            (financial.get("current_ratio", 0) >= 1.5, "短期偿债能力较强", "短期偿债能力偏弱")
+        ]
+        strengths = [good for passed, good, _ in checks if passed]
+        weaknesses = [bad for passed, _, bad in checks if not passed]
+        score = len(strengths) / len(checks) * 100
+        
+        if score >= 80:
+            position = "行业领先"
+        elif score >= 60:
+            position = "具备竞争优势"
+        elif score >= 40:
+            position = "竞争力一般"
+        else:
+            position = "竞争力较弱"
+        
+        market_cap_percentile = (sector or {}).get("stock_position", {}).get("market_cap_percentile")
+        if market_cap_percentile is not None and market_cap_percentile >= 80:
+            strengths.append("行业内市值领先")
+        
+        return {
+            "industry": (sector or {}).get("industry", ""),
+            "market_cap_percentile": market_cap_percentile,
+            "competitive_score": score,
+            "competitive_position": position,
+            "strengths": strengths,
+            "weaknesses": weaknesses
+        }
+    
+    def perform_valuation_analysis(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        """PEG、PB-ROE与格雷厄姆公式估值"""
+        basic_info = stock_data.get("basic_info", {})
+        financial = stock_data.get("financial_data", {})
+        price = basic_info.get("price", 0)
+        pe_ratio = basic_info.get("pe_ratio", 0)
+        pb_ratio = basic_info.get("pb_ratio", 0)
+        
+        eps = price / pe_ratio if pe_ratio > 0 else None
+        bvps = price / pb_ratio if pb_ratio > 0 else None
+        models = {}
+        
+        if eps is not None:
+            # PEG=1：合理市盈率等于利润增速（限定在8-30倍）
+            fair_pe = min(30, max(8, financial.get("profit_growth", 0)))
+            models["peg"] = {"fair_pe": fair_pe, "fair_value": eps * fair_pe}
+        
+        roe = financial.get("roe", 0)
+        if bvps is not None and roe > 0:
+            fair_pb = roe / 100 / COST_OF_EQUITY
+            models["pb_roe"] = {"fair_pb": fair_pb, "fair_value": bvps * fair_pb}
+        
+        if eps is not None and bvps is not None:
+            models["graham"] = {"fair_value": math.sqrt(22.5 * eps * bvps)}
+        
+        if not models or price <= 0:
+            return {"models": models, "note": "估值数据不足"}
+        
+        fair_value = float(np.mean([m["fair_value"] for m in models.values()]))
+        upside = fair_value / price - 1
+        
+        if upside > 0.2:
+            level = "低估"
+        elif upside < -0.2:
+            level = "高估"
+        else:
+            level = "合理"
+        
+        return {
+            "models": models,
+            "fair_value": fair_value,
+            "upside": upside,
+            "valuation_level": level
+        }
+
+# 增强版报告流水线：各阶段在一次运行内只计算一次，结果共享给下游阶段
+ENHANCED_PIPELINE = AdvicePipeline(external_inputs=("symbol",))
+
+@ENHANCED_PIPELINE.register("stock_data", inputs=("symbol",))
+async def _stock_data_stage(run: PipelineRun, symbol: str) -> Dict[str, Any]:
+    """股票综合数据（只获取一次，且只获取所选报告部分需要的数据）"""
+    return await run.owner.data_fetcher.fetch_stock_data(symbol, run.option("data_parts"))
+
+@ENHANCED_PIPELINE.register("risk_level", inputs=("stock_data",),
+                            requires=("basic_info", "technical_indicators", "price_history"))
+def _risk_level_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """风险等级（基础建议与个性化建议共用）"""
+    return run.owner.calculate_risk_level(stock_data)
+
+@ENHANCED_PIPELINE.register("fundamental_score", inputs=("stock_data",),
+                            requires=SCORE_SECTIONS["fundamental"][2])
+def _fundamental_score_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> float:
+    """基本面评分加分（只读取估值与财务数据，价格变动时复用）"""
+    return run.owner.base_advisor.section_points("fundamental", stock_data)
+
+@ENHANCED_PIPELINE.register("technical_score", inputs=("stock_data",),
+                            requires=SCORE_SECTIONS["technical"][2])
+def _technical_score_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> float:
+    """技术面评分加分"""
+    return run.owner.base_advisor.section_points("technical", stock_data)
+
+@ENHANCED_PIPELINE.register("sentiment_score", inputs=("stock_data",),
+                            requires=SCORE_SECTIONS["sentiment"][2])
+def _sentiment_score_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> float:
+    """市场情绪评分加分"""
+    return run.owner.base_advisor.section_points("sentiment", stock_data)
+
+@ENHANCED_PIPELINE.register("money_flow_score", inputs=("stock_data",),
+                            requires=SCORE_SECTIONS["money_flow"][2])
+def _money_flow_score_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> float:
+    """资金流向评分加分"""
+    return run.owner.base_advisor.section_points("money_flow", stock_data)
+
+@ENHANCED_PIPELINE.register("base_analysis",
+                            inputs=("symbol", "stock_data", "risk_level",
+                                    *(f"{name}_score" for name in SCORE_SECTIONS)),
+                            requires=tuple(STOCK_DATA_PARTS))
+async def _base_analysis_stage(run: PipelineRun, symbol: str, stock_data: Dict[str, Any],
+                               risk_level: Dict[str, Any], **section_scores: float) -> Dict[str, Any]:
+    """基础投资建议（由各评分分段阶段的加分合成评分，报告其余内容按当前数据生成）"""
+    points = {name: section_scores[f"{name}_score"] for name in SCORE_SECTIONS}
+    return await run.owner.base_advisor.get_professional_advice(symbol, stock_data, risk_level, points)
+
+@ENHANCED_PIPELINE.register("momentum_analysis", inputs=("stock_data",),
+                            requires=("technical_indicators", "price_history"))
+def _momentum_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """动量分析"""
+    return run.owner.analyze_momentum_patterns(stock_data)
+
+@ENHANCED_PIPELINE.register("volatility_analysis", inputs=("stock_data",),
+                            requires=("technical_indicators", "price_history"))
+def _volatility_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """波动率分析"""
+    return run.owner.analyze_volatility_patterns(stock_data)
+
+@ENHANCED_PIPELINE.register("correlation_analysis", inputs=("stock_data",), guarded=True,
+                            requires=("price_history",))
+async def _correlation_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """相关性分析"""
+    return await run.owner.analyze_market_correlations(stock_data)
+
+@ENHANCED_PIPELINE.register("seasonal_analysis", inputs=("stock_data",),
+                            requires=("price_history",))
+def _seasonal_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """季节性分析"""
+    return run.owner.analyze_seasonal_patterns(stock_data)
+
+@ENHANCED_PIPELINE.register("event_analysis", inputs=("stock_data",), guarded=True,
+                            requires=("news", "price_history"))
+async def _event_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """事件分析"""
+    return await run.owner.analyze_market_events(stock_data)
+
+@ENHANCED_PIPELINE.register("behavioral_analysis", inputs=("stock_data",),
+                            requires=("money_flow", "sentiment"))
+def _behavioral_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """投资者行为分析"""
+    return run.owner.analyze_investor_behavior(stock_data)
+
+@ENHANCED_PIPELINE.register("enhanced_analysis", inputs=ENHANCED_ANALYSIS_SECTIONS)
+def _enhanced_analysis_stage(run: PipelineRun, **sections) -> Dict[str, Any]:
+    """增强分析汇总"""
+    return sections
+
+@ENHANCED_PIPELINE.register("personalized_advice", inputs=("stock_data", "risk_level"),
+                            requires=("basic_info", "technical_indicators"))
+def _personalized_stage(run: PipelineRun, stock_data: Dict[str, Any],
+                        risk_level: Dict[str, Any]) -> Dict[str, Any]:
+    """个性化建议"""
+    return run.owner.generate_personalized_advice(
+        stock_data, run.option("investment_horizon", "medium"),
+        run.option("risk_tolerance", "moderate"), risk_level
+    )
+
+@ENHANCED_PIPELINE.register("scenario_analysis", inputs=("stock_data",),
+                            requires=("basic_info", "price_history"))
+def _scenario_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """情景分析"""
+    return run.owner.perform_scenario_analysis(stock_data)
+
+@ENHANCED_PIPELINE.register("advanced_metrics", inputs=("stock_data", "volatility_analysis"),
+                            requires=("price_history",))
+def _advanced_metrics_stage(run: PipelineRun, stock_data: Dict[str, Any],
+                            volatility_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """绩效指标"""
+    return run.owner.calculate_advanced_metrics(stock_data, volatility_analysis)
+
+@ENHANCED_PIPELINE.register("market_timing", inputs=("stock_data", "momentum_analysis"),
+                            requires=("technical_indicators",))
+def _market_timing_stage(run: PipelineRun, stock_data: Dict[str, Any],
+                         momentum_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """择时分析"""
+    return run.owner.analyze_market_timing(stock_data, momentum_analysis)
+
+@ENHANCED_PIPELINE.register("sector_analysis", inputs=("stock_data",), guarded=True,
+                            requires=("basic_info",))
+async def _sector_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """行业分析"""
+    return await run.owner.analyze_sector_performance(stock_data)
+
+@ENHANCED_PIPELINE.register("competitive_analysis", inputs=("stock_data", "sector_analysis"), guarded=True,
+                            requires=("financial_data",))
+async def _competitive_stage(run: PipelineRun, stock_data: Dict[str, Any],
+                             sector_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """竞争地位分析"""
+    return await run.owner.analyze_competitive_position(stock_data, sector_analysis)
+
+@ENHANCED_PIPELINE.register("portfolio_advice", inputs=("stock_data", "sector_analysis"),
+                            requires=("basic_info", "price_history"))
+def _portfolio_stage(run: PipelineRun, stock_data: Dict[str, Any],
+                     sector_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """投资组合建议"""
+    return run.owner.generate_portfolio_advice(
+        stock_data, run.option("investment_horizon", "medium"), run.option("risk_tolerance", "moderate"),
+        sector_analysis
+    )
+
+@ENHANCED_PIPELINE.register("valuation_models", inputs=("stock_data",),
+                            requires=("basic_info", "financial_data"))
+def _valuation_stage(run: PipelineRun, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """估值模型"""
+    return run.owner.perform_valuation_analysis(stock_data)
 
 # 快捷函数
 async def get_enhanced_investment_advice(symbol: str, 
                                        investment_horizon: str = "medium", 
-                                       risk_tolerance: str = "moderate") -> Dict[str, Any]:
+                                       risk_tolerance: str = "moderate",
+                                       include: Optional[List[str]] = None) -> Dict[str, Any]:
     """获取增强版投资建议"""
-    advisor = EnhancedStockAdvisor()
-    return await advisor.get_enhanced_advice(symbol, investment_horizon, risk_tolerance)
+    async with StockDataFetcher() as fetcher:
+        advisor = EnhancedStockAdvisor(data_fetcher=fetcher)
+        return await advisor.get_enhanced_advice(symbol, investment_horizon, risk_tolerance, include=include)
 
 def get_enhanced_advice_sync(symbol: str, 
                            investment_horizon: str = "medium", 
-                           risk_tolerance: str = "moderate") -> Dict[str, Any]:
+                           risk_tolerance: str = "moderate",
+                           include: Optional[List[str]] = None) -> Dict[str, Any]:
     """同步获取增强版投资建议"""
     import asyncio
-    return asyncio.run(get_enhanced_investment_advice(symbol, investment_horizon, risk_tolerance))
+    return asyncio.run(get_enhanced_investment_advice(symbol, investment_horizon, risk_tolerance, include))
 
 if __name__ == "__main__":
     # 测试代码
@@ -6,38 +6,86 @@
 import asyncio
 import json
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Sequence, Tuple
 from datetime import datetime, timedelta
+import math
 import random
 
+import numpy as np
+
 from stock_data_fetcher import StockDataFetcher
-from technical_analysis import TechnicalAnalyzer
+from technical_analysis import TechnicalAnalyzer, history_closes
+from rolling_stats import rolling_moments, simple_returns
+from bars import Bars
+from risk_engine import RiskEngine
+from advice_cache import AdviceCache, RefreshState, data_field, fingerprint
+from scoring_rules import ADVISOR_RULES, scoring_plan
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 综合评分对应的建议等级：(最低分, 建议, 操作, 信心)，最后一项为兜底
+RECOMMENDATION_LEVELS = [
+    (80, "强烈推荐", "买入", "高"),
+    (65, "推荐", "买入", "中高"),
+    (50, "中性", "持有", "中"),
+    (35, "谨慎", "减仓", "中低"),
+    (None, "卖出", "卖出", "低")
+]
+
+# score_many 的输入列及缺失时的默认值（评分规则见 scoring_rules.ADVISOR_RULES）
+SCORE_COLUMNS = ADVISOR_RULES["columns"]
+
+# 评分分段：分段 -> (评分部分, 规则名（None为该部分全部规则）, 读取的数据部分或 "数据部分.字段")
+# 各分段单独计算加分，读取的数据未变化的分段复用上一次的结果（只有价格变动时不重算基本面、情绪与资金流）
+SCORE_SECTIONS = {
+    "fundamental": ("fundamental", None, ("basic_info.pe_ratio", "basic_info.pb_ratio", "financial_data")),
+    "technical": ("technical", None, ("technical_indicators",)),
+    "sentiment": ("sentiment", ("news_sentiment", "social_sentiment", "analyst_rating"), ("sentiment",)),
+    "money_flow": ("sentiment", ("main_net_inflow",), ("money_flow",))
+}
+
 class StockAdvisor:
     """股票投资建议生成器"""
     
-    def __init__(self):
+    def __init__(self, advice_cache: Optional[AdviceCache] = None,
+                 refresh_state: Optional[RefreshState] = None):
         self.data_fetcher = StockDataFetcher()
+        self.risk_engine = RiskEngine.from_config()
+        # 编译好的评分规则，单只与批量评分共用
+        self.scoring = scoring_plan("advisor")
+        # 按输入指纹缓存的建议报告，输入未变时直接返回
+        self.advice_cache = advice_cache if advice_cache is not None else AdviceCache.from_config()
+        # 各股票上一次评分的分段输入指纹与加分，输入未变化的分段直接复用
+        self.refresh_state = refresh_state if refresh_state is not None else RefreshState()
         self.tech_analyzer = TechnicalAnalyzer()
         
-    async def get_professional_advice(self, symbol: str) -> Dict[str, Any]:
-        """获取专业投资建议"""
+    async def get_professional_advice(self, symbol: str,
+                                      stock_data: Optional[Dict[str, Any]] = None,
+                                      risk_level: Optional[Dict[str, Any]] = None,
+                                      section_points: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """获取专业投资建议（可传入已获取的股票数据、已计算的风险等级与评分分段加分，避免重复获取与计算）"""
         try:
             # 获取股票综合数据
-            stock_data = await self.data_fetcher.fetch_stock_data(symbol)
+            if stock_data is None:
+                stock_data = await self.data_fetcher.fetch_stock_data(symbol)
             
             if "error" in stock_data:
                 return {"error": stock_data["error"]}
             
+            # 输入（股票数据与传入的风险等级）未变化时返回已生成的报告
+            key = self.advice_cache.key("professional_advice", symbol, stock_data, risk_level)
+            cached = self.advice_cache.get(key)
+            if cached is not None:
+                return {**cached, "cached": True}
+            
             # 生成投资建议
-            advice = await self.generate_investment_advice(stock_data)
+            advice = await self.generate_investment_advice(stock_data, section_points)
             
             # 计算风险等级
-            risk_level = self.calculate_risk_level(stock_data)
+            if risk_level is None:
+                risk_level = self.calculate_risk_level(stock_data)
             
             # 生成买卖信号
             trading_signals = self.generate_trading_signals(stock_data)
@@ -45,7 +93,7 @@ class StockAdvisor:
             # 计算目标价位
             target_prices = self.calculate_target_prices(stock_data)
             
-            return {
+            report = {
                 "symbol": symbol,
                 "advice_date": datetime.now().isoformat(),
                 "current_price": stock_data.get("basic_info", {}).get("price", 0),
@@ -57,48 +105,24 @@ class StockAdvisor:
                 "market_outlook": self.analyze_market_outlook(stock_data),
                 "recommendations": self.generate_recommendations(stock_data, risk_level)
             }
+            self.advice_cache.put(key, report)
+            return {**report, "cached": False}
             
         except Exception as e:
             logger.error(f"生成投资建议失败: {e}")
             return {"error": str(e)}
     
-    async def generate_investment_advice(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """生成投资建议"""
-        basic_info = stock_data.get("basic_info", {})
-        technical = stock_data.get("technical_indicators", {})
-        financial = stock_data.get("financial_data", {})
-        money_flow = stock_data.get("money_flow", {})
-        sentiment = stock_data.get("sentiment", {})
-        
-        # 基础评分
-        fundamental_score = self.calculate_fundamental_score(basic_info, financial)
-        technical_score = self.calculate_technical_score(technical)
-        sentiment_score = self.calculate_sentiment_score(sentiment, money_flow)
-        
-        # 综合评分
-        total_score = (fundamental_score * 0.4 + technical_score * 0.35 + sentiment_score * 0.25)
+    async def generate_investment_advice(self, stock_data: Dict[str, Any],
+                                         section_points: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """生成投资建议（section_points为已计算的各评分分段加分，未提供时按分段计算）"""
+        # 各部分评分与综合评分
+        if section_points is None:
+            section_points, _ = self.score_sections(stock_data)
+        scores = self.combine_sections(section_points)
+        total_score = scores["total"]
         
         # 投资建议
-        if total_score >= 80:
-            recommendation = "强烈推荐"
-            action = "买入"
-            confidence = "高"
-        elif total_score >= 65:
-            recommendation = "推荐"
-            action = "买入"
-            confidence = "中高"
-        elif total_score >= 50:
-            recommendation = "中性"
-            action = "持有"
-            confidence = "中"
-        elif total_score >= 35:
-            recommendation = "谨慎"
-            action = "减仓"
-            confidence = "中低"
-        else:
-            recommendation = "卖出"
-            action = "卖出"
-            confidence = "低"
+        recommendation, action, confidence = self.classify_score(total_score)
         
         return {
             "recommendation": recommendation,
@@ -106,125 +130,194 @@ class StockAdvisor:
             "confidence": confidence,
             "score": total_score,
             "scores": {
-                "fundamental": fundamental_score,
-                "technical": technical_score,
-                "sentiment": sentiment_score
+                "fundamental": scores["fundamental"],
+                "technical": scores["technical"],
+                "sentiment": scores["sentiment"]
             },
             "reasoning": self.generate_reasoning(stock_data, total_score)
         }
     
-    def calculate_fundamental_score(self, basic_info: Dict, financial: Dict) -> float:
-        """计算基本面评分"""
-        score = 50  # 基础分
+    def generate_reasoning(self, stock_data: Dict[str, Any], total_score: float) -> List[str]:
+        """生成评分依据说明"""
+        basic_info = stock_data.get("basic_info", {})
+        technical = stock_data.get("technical_indicators", {})
+        financial = stock_data.get("financial_data", {})
+        money_flow = stock_data.get("money_flow", {})
         
-        # 估值指标
-        pe_ratio = basic_info.get("pe_ratio", 0)
-        pb_ratio = basic_info.get("pb_ratio", 0)
+        reasons = []
         
+        pe_ratio = basic_info.get("pe_ratio", 0)
         if 0 < pe_ratio < 20:
-            score += 15
-        elif 20 <= pe_ratio < 30:
-            score += 10
+            reasons.append(f"市盈率{pe_ratio:.1f}倍，估值较低")
         elif pe_ratio >= 50 or pe_ratio < 0:
-            score -= 20
-        
-        if 0 < pb_ratio < 2:
-            score += 10
-        elif pb_ratio >= 5:
-            score -= 15
+            reasons.append(f"市盈率{pe_ratio:.1f}倍，估值偏高或处于亏损")
         
-        # 财务指标
         roe = financial.get("roe", 0)
-        profit_margin = financial.get("profit_margin", 0)
-        debt_ratio = financial.get("debt_ratio", 0)
-        
         if roe > 15:
-            score += 10
-        elif roe > 10:
-            score += 5
-        
-        if profit_margin > 15:
-            score += 10
-        elif profit_margin > 10:
-            score += 5
-        
-        if debt_ratio < 30:
-            score += 5
-        elif debt_ratio > 70:
-            score -= 10
+            reasons.append(f"净资产收益率{roe:.1f}%，盈利能力较强")
+        elif 0 < roe <= 10:
+            reasons.append(f"净资产收益率{roe:.1f}%，盈利能力一般")
         
-        return max(0, min(100, score))
-    
-    def calculate_technical_score(self, technical: Dict) -> float:
-        """计算技术面评分"""
-        score = 50  # 基础分
-        
-        # RSI指标
         rsi = technical.get("rsi", 50)
         if rsi < 30:
-            score += 15
+            reasons.append(f"RSI为{rsi:.1f}，处于超卖区域")
         elif rsi > 70:
-            score -= 15
-        elif 30 <= rsi <= 70:
-            score += 5
+            reasons.append(f"RSI为{rsi:.1f}，处于超买区域")
         
-        # MACD指标
-        macd = technical.get("macd", {})
-        if isinstance(macd, dict):
-            macd_value = macd.get("macd", 0)
-            signal = macd.get("signal", 0)
-            
-            if macd_value > signal and macd_value > 0:
-                score += 10
-            elif macd_value < signal and macd_value < 0:
-                score -= 10
-        
-        # 移动平均线
-        ma5 = technical.get("ma5", 0)
-        ma20 = technical.get("ma20", 0)
-        current_price = technical.get("current_price", 0)
-        
-        if current_price > ma5 > ma20:
-            score += 10
-        elif current_price < ma5 < ma20:
-            score -= 10
-        
-        return max(0, min(100, score))
-    
-    def calculate_sentiment_score(self, sentiment: Dict, money_flow: Dict) -> float:
-        """计算情绪评分"""
-        score = 50  # 基础分
+        current_price = basic_info.get("price", 0)
+        ma5, ma20 = technical.get("ma5", 0), technical.get("ma20", 0)
+        if current_price > ma5 > ma20 > 0:
+            reasons.append("股价位于5日、20日均线之上，短期趋势向上")
+        elif 0 < current_price < ma5 < ma20:
+            reasons.append("股价位于5日、20日均线之下，短期趋势向下")
         
-        # 资金流向
         main_net_inflow = money_flow.get("main_net_inflow", 0)
         if main_net_inflow > 0:
-            score += 15
+            reasons.append(f"主力资金净流入{main_net_inflow / 10000:,.0f}万元")
         elif main_net_inflow < 0:
-            score -= 15
-        
-        # 市场情绪
-        news_sentiment = sentiment.get("news_sentiment", 0.5)
-        social_sentiment = sentiment.get("social_sentiment", 0.5)
-        
-        score += (news_sentiment - 0.5) * 30
-        score += (social_sentiment - 0.5) * 20
+            reasons.append(f"主力资金净流出{-main_net_inflow / 10000:,.0f}万元")
         
-        # 分析师评级
-        analyst_rating = sentiment.get("analyst_rating", "hold")
-        if analyst_rating == "buy":
-            score += 10
-        elif analyst_rating == "sell":
-            score -= 10
+        reasons.append(f"综合评分{total_score:.1f}分")
+        return reasons
+    
+    def section_points(self, section: str, stock_data: Dict[str, Any]) -> float:
+        """某一评分分段的加分合计（见 SCORE_SECTIONS）"""
+        component, rules, _ = SCORE_SECTIONS[section]
+        return self.scoring.points(component, self.score_inputs(stock_data), rules)
+    
+    def score_sections(self, stock_data: Dict[str, Any]) -> Tuple[Dict[str, float], List[str]]:
+        """各评分分段的加分，与同一股票上一次评分相比读取的数据未变化的分段直接复用；
+        返回 (分段 -> 加分, 复用的分段)"""
+        key = (stock_data.get("symbol", ""),)
+        previous = self.refresh_state.get(key)
+        previous = previous["stages"] if previous else {}
+        
+        points, reused, stages = {}, [], {}
+        for name, (_, _, inputs) in SCORE_SECTIONS.items():
+            digest = fingerprint(name, [data_field(stock_data, path) for path in inputs])
+            entry = previous.get(name)
+            if entry is not None and entry["hash"] == digest:
+                points[name] = entry["value"]
+                reused.append(name)
+            else:
+                points[name] = self.section_points(name, stock_data)
+            stages[name] = {"hash": digest, "value": points[name]}
+        self.refresh_state.put(key, stages)
+        return points, reused
+    
+    def combine_sections(self, section_points: Dict[str, float]) -> Dict[str, float]:
+        """由各评分分段的加分合成各部分得分与加权综合分（键 "total"）"""
+        totals: Dict[str, float] = {}
+        for name, (component, _, _) in SCORE_SECTIONS.items():
+            totals[component] = totals.get(component, 0.0) + section_points[name]
+        scores = {component: self.scoring.combine(component, points) for component, points in totals.items()}
+        scores["total"] = self.scoring.total(scores)
+        return scores
+    
+    @staticmethod
+    def classify_score(total_score: float) -> tuple:
+        """综合评分对应的 (建议, 操作, 信心)"""
+        for threshold, recommendation, action, confidence in RECOMMENDATION_LEVELS:
+            if threshold is None or total_score >= threshold:
+                return recommendation, action, confidence
+    
+    def calculate_fundamental_score(self, basic_info: Dict, financial: Dict) -> float:
+        """计算基本面评分"""
+        return self.scoring.component("fundamental", self.score_inputs(
+            {"basic_info": basic_info, "financial_data": financial}))
+    
+    def calculate_technical_score(self, technical: Dict) -> float:
+        """计算技术面评分"""
+        return self.scoring.component("technical", self.score_inputs({"technical_indicators": technical}))
+    
+    def calculate_sentiment_score(self, sentiment: Dict, money_flow: Dict) -> float:
+        """计算情绪评分"""
+        return self.scoring.component("sentiment", self.score_inputs(
+            {"sentiment": sentiment, "money_flow": money_flow}))
+    
+    @staticmethod
+    def score_inputs(stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        """将单只股票的数据展开为 score_many 的一行输入"""
+        basic_info = stock_data.get("basic_info", {})
+        technical = stock_data.get("technical_indicators", {})
+        financial = stock_data.get("financial_data", {})
+        money_flow = stock_data.get("money_flow", {})
+        sentiment = stock_data.get("sentiment", {})
+        macd = technical.get("macd", {})
+        macd = macd if isinstance(macd, dict) else {}
+        
+        row = {}
+        for name in ("pe_ratio", "pb_ratio"):
+            row[name] = basic_info.get(name, SCORE_COLUMNS[name])
+        for name in ("roe", "profit_margin", "debt_ratio"):
+            row[name] = financial.get(name, SCORE_COLUMNS[name])
+        for name in ("rsi", "ma5", "ma20", "current_price"):
+            row[name] = technical.get(name, SCORE_COLUMNS[name])
+        row["macd"] = macd.get("macd", SCORE_COLUMNS["macd"])
+        row["macd_signal"] = macd.get("signal", SCORE_COLUMNS["macd_signal"])
+        row["main_net_inflow"] = money_flow.get("main_net_inflow", SCORE_COLUMNS["main_net_inflow"])
+        for name in ("news_sentiment", "social_sentiment"):
+            row[name] = sentiment.get(name, SCORE_COLUMNS[name])
+        row["analyst_rating"] = sentiment.get("analyst_rating", SCORE_COLUMNS["analyst_rating"])
+        return row
+    
+    def score_many(self, table: Dict[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+        """批量评分：输入按列组织的N只股票数据（列名见 SCORE_COLUMNS），
+        按与单只股票评分相同的规则返回各项评分与建议等级，缺失列或NaN取默认值"""
+        scores = self.scoring.score_many(table)
+        total = scores["total"]
+        
+        # 建议等级
+        conditions = [total >= threshold for threshold, *_ in RECOMMENDATION_LEVELS[:-1]]
+        labels = {}
+        for position, name in enumerate(("recommendation", "action", "confidence"), 1):
+            choices = [level[position] for level in RECOMMENDATION_LEVELS]
+            labels[name] = np.select(conditions, choices[:-1], choices[-1])
         
-        return max(0, min(100, score))
+        return {
+            "fundamental_score": scores["fundamental"],
+            "technical_score": scores["technical"],
+            "sentiment_score": scores["sentiment"],
+            "total_score": total,
+            **labels
+        }
+    
+    def score_stock_data(self, stock_data_list: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """对一组股票数据批量评分"""
+        rows = [self.score_inputs(stock_data) for stock_data in stock_data_list]
+        table = {name: [row[name] for row in rows] for name in SCORE_COLUMNS}
+        return self.score_many(table)
     
     def calculate_risk_level(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
         """计算风险等级"""
         basic_info = stock_data.get("basic_info", {})
-        technical = stock_data.get("technical_indicators", {})
         
-        # 波动率风险
-        volatility = abs(technical.get("rsi", 50) - 50) / 50 * 100
+        # 市场风险：有足够历史数据时由风险引擎计算波动率、尾部损失与回撤，
+        # 历史较短时退化为20日年化波动率，没有历史数据时取中性值
+        metrics = self.calculate_risk_metrics(stock_data)
+        warnings = []
+        if metrics is not None:
+            volatility = min(100, metrics["annualized_volatility"] / 0.6 * 100)
+            tail_loss = self.tail_loss(metrics)
+            tail_risk = (min(100, tail_loss / self.risk_engine.stop_loss * 50)
+                         if tail_loss is not None else volatility)
+            drawdown_risk = min(100, metrics["max_drawdown"] / self.risk_engine.max_drawdown_threshold * 50)
+            market_risk = (volatility + tail_risk + drawdown_risk) / 3
+            
+            if tail_loss is not None and tail_loss > self.risk_engine.stop_loss:
+                warnings.append(f"极端情形下的预期亏损{tail_loss:.1%}超过止损线{self.risk_engine.stop_loss:.0%}")
+            if metrics["drawdown_breached"]:
+                warnings.append(f"区间最大回撤{metrics['max_drawdown']:.1%}超过阈值"
+                                f"{self.risk_engine.max_drawdown_threshold:.0%}")
+        else:
+            realized_volatility = self.calculate_realized_volatility(stock_data)
+            if realized_volatility is not None:
+                volatility = min(100, realized_volatility / 0.6 * 100)
+            else:
+                volatility = 50
+                warnings.append("缺少历史行情，波动率风险按中性值估计")
+            tail_risk = drawdown_risk = volatility
+            market_risk = volatility
         
         # 估值风险
         pe_ratio = basic_info.get("pe_ratio", 0)
@@ -235,7 +328,7 @@ class StockAdvisor:
         volume_risk = max(0, 100 - min(100, volume / 1000000 * 10))
         
         # 综合风险
-        total_risk = (volatility * 0.4 + pe_risk * 0.3 + volume_risk * 0.3)
+        total_risk = (market_risk * 0.4 + pe_risk * 0.3 + volume_risk * 0.3)
         
         if total_risk < 30:
             risk_level = "低风险"
@@ -253,11 +346,46 @@ class StockAdvisor:
             "risk_score": total_risk,
             "risk_factors": {
                 "volatility_risk": volatility,
+                "tail_risk": tail_risk,
+                "drawdown_risk": drawdown_risk,
                 "valuation_risk": pe_risk,
                 "liquidity_risk": volume_risk
-            }
+            },
+            "risk_metrics": metrics,
+            "warnings": warnings
         }
     
+    def calculate_risk_metrics(self, stock_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """由历史行情计算风险引擎指标，历史数据不足时返回None"""
+        history = stock_data.get("price_history")
+        if history is None or len(history) == 0:
+            return None
+        
+        symbol = stock_data.get("symbol", "")
+        data = history if isinstance(history, Bars) else history_closes(stock_data)
+        metrics = self.risk_engine.evaluate(data, symbol)
+        return None if "error" in metrics else metrics
+    
+    @staticmethod
+    def tail_loss(metrics: Dict[str, Any]) -> Optional[float]:
+        """最长持有期、最低置信度下的历史模拟CVaR（风险引擎的持有期与置信度均按升序保存）"""
+        if not metrics.get("cvar"):
+            return None
+        levels = list(metrics["cvar"].values())[-1]
+        return next(iter(levels.values()))["historical"]
+    
+    def calculate_realized_volatility(self, stock_data: Dict[str, Any], 
+                                    window: int = 20) -> Optional[float]:
+        """计算年化已实现波动率，历史数据不足时返回None"""
+        closes = history_closes(stock_data)
+        if len(closes) < window + 1:
+            return None
+        
+        returns = simple_returns(closes[-(window + 1):])
+        daily_std = rolling_moments(returns, window)["std"][-1]
+        
+        return float(daily_std * math.sqrt(252))
+    
     def generate_trading_signals(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
         """生成交易信号"""
         technical = stock_data.get("technical_indicators", {})
@@ -0,0 +1,82 @@
+"""
+历史行情存储模块
+按股票代码缓存历史K线，并可对齐为股票×日期矩阵供批量计算使用
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from bars import Bars, BarPanel, DateLike
+from dtype_policy import DTypeLike, resolve_dtype
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class HistoryStore:
+    """历史K线存储（按存储精度保存，默认取 dtype_policy 的配置）"""
+    
+    def __init__(self, dtype: DTypeLike = None):
+        self.dtype = resolve_dtype(dtype)
+        self._bars: Dict[str, Bars] = {}
+    
+    def __len__(self) -> int:
+        return len(self._bars)
+    
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._bars
+    
+    def put(self, bars: Bars, symbol: Optional[str] = None):
+        """保存一只股票的历史K线（覆盖旧数据）"""
+        symbol = symbol or bars.symbol
+        if not symbol:
+            raise ValueError("保存历史K线需要股票代码")
+        
+        bars = bars.astype(self.dtype)
+        bars.symbol = symbol
+        self._bars[symbol] = bars
+    
+    def get(self, symbol: str) -> Optional[Bars]:
+        """获取一只股票的历史K线"""
+        return self._bars.get(symbol)
+    
+    def symbols(self) -> List[str]:
+        """已存储的股票代码"""
+        return list(self._bars.keys())
+    
+    @property
+    def nbytes(self) -> int:
+        """全部K线占用的内存字节数"""
+        return sum(bars.nbytes for bars in self._bars.values())
+    
+    def panel(self, symbols: Optional[Sequence[str]] = None,
+              start: DateLike = None,
+              end: DateLike = None,
+              fields: Sequence[str] = Bars.FIELDS) -> BarPanel:
+        """将指定股票的历史K线对齐为矩阵（默认全部股票）"""
+        symbols = self.symbols() if symbols is None else symbols
+        bars_list = [self._bars[s].slice(start, end) for s in symbols if s in self._bars]
+        return BarPanel.from_bars(bars_list, fields, self.dtype)
+    
+    async def load(self, symbols: Sequence[str], fetcher,
+                   days: int = 250, concurrency: int = 8) -> int:
+        """通过数据获取器批量加载历史K线，返回成功加载的数量"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def load_one(symbol: str) -> bool:
+            async with semaphore:
+                try:
+                    bars = await fetcher.get_historical_bars(symbol, days)
+                except Exception as e:
+                    logger.error(f"加载 {symbol} 历史K线失败: {e}")
+                    return False
+            
+            if bars is None or len(bars) == 0:
+                return False
+            
+            self.put(bars, symbol)
+            return True
+        
+        results = await asyncio.gather(*(load_one(s) for s in symbols))
+        return sum(results)
@@ -0,0 +1,186 @@
+"""
+指标依赖图模块
+指标以节点形式注册并声明输入与参数，计算时共享中间结果并按
+（股票、K线区间、参数）缓存，避免同一次分析中重复计算
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Callable, Sequence
+
+import numpy as np
+
+from bars import Bars
+from dtype_policy import DTypeLike, resolve_dtype, to_accumulator
+
+# K线基础字段，可直接作为节点输入
+BASE_FIELDS = Bars.FIELDS
+
+class IndicatorNode:
+    """指标节点"""
+    
+    def __init__(self, name: str, func: Callable, inputs: Sequence[str], params: Dict[str, Any]):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = dict(params)
+    
+    def __repr__(self) -> str:
+        return f"IndicatorNode({self.name}, inputs={self.inputs}, params={self.params})"
+
+class IndicatorGraph:
+    """指标依赖图（节点只能依赖已注册的节点，因此天然无环）"""
+    
+    def __init__(self):
+        self.nodes: Dict[str, IndicatorNode] = {}
+    
+    def register(self, name: str, inputs: Sequence[str] = (), **params):
+        """注册指标节点的装饰器，params为节点参数及默认值"""
+        def decorator(func: Callable) -> Callable:
+            if name in self.nodes:
+                raise ValueError(f"指标 {name} 已注册")
+            for dep in inputs:
+                if dep not in self.nodes and dep not in BASE_FIELDS:
+                    raise ValueError(f"指标 {name} 依赖未注册的指标 {dep}")
+            
+            self.nodes[name] = IndicatorNode(name, func, inputs, params)
+            return func
+        return decorator
+    
+    def dependencies(self, name: str) -> List[str]:
+        """按拓扑顺序返回指标的全部上游节点（含自身）"""
+        ordered = []
+        
+        def visit(node_name: str):
+            if node_name in ordered or node_name in BASE_FIELDS:
+                return
+            for dep in self.nodes[node_name].inputs:
+                visit(dep)
+            ordered.append(node_name)
+        
+        if name not in self.nodes:
+            raise KeyError(f"未注册的指标: {name}")
+        visit(name)
+        return ordered
+
+class IndicatorContext:
+    """单组K线上的计算上下文"""
+    
+    def __init__(self, engine: "IndicatorEngine", bars: Bars, has_range: bool = True):
+        self.engine = engine
+        self.bars = bars
+        # 是否包含真实的最高价/最低价（仅由收盘价构造时为False）
+        self.has_range = has_range
+        self.key = self._bars_key(bars)
+        self._stack: List[str] = []
+    
+    @staticmethod
+    def _bars_key(bars: Bars) -> tuple:
+        digest = hashlib.blake2b(np.ascontiguousarray(bars._block).tobytes(), digest_size=16)
+        digest.update(bars.dates.tobytes())
+        start = str(bars.dates[0]) if len(bars) else ""
+        end = str(bars.dates[-1]) if len(bars) else ""
+        return (bars.symbol, start, end, digest.hexdigest())
+    
+    def __len__(self) -> int:
+        return len(self.bars)
+    
+    def _check_declared(self, name: str):
+        if self._stack and name not in self.engine.graph.nodes[self._stack[-1]].inputs:
+            raise ValueError(f"指标 {self._stack[-1]} 未声明依赖 {name}")
+    
+    def field(self, name: str) -> np.ndarray:
+        """读取K线基础字段（按float64精度参与计算）"""
+        self._check_declared(name)
+        return to_accumulator(self.bars.field(name))
+    
+    def get(self, name: str, **params) -> Any:
+        """计算（或从缓存读取）指标"""
+        graph = self.engine.graph
+        if name not in graph.nodes:
+            raise KeyError(f"未注册的指标: {name}")
+        self._check_declared(name)
+        
+        node = graph.nodes[name]
+        unknown = set(params) - set(node.params)
+        if unknown:
+            raise ValueError(f"指标 {name} 不支持参数: {', '.join(sorted(unknown))}")
+        
+        resolved = {**node.params, **params}
+        key = (self.key, name, tuple(sorted(resolved.items())))
+        
+        found, value = self.engine._lookup(key)
+        if found:
+            return value
+        
+        self._stack.append(name)
+        try:
+            value = node.func(self, **resolved)
+        finally:
+            self._stack.pop()
+        
+        value = _compact(value, self.engine.dtype)
+        self.engine._store(key, value)
+        return value
+
+class IndicatorEngine:
+    """指标计算引擎，维护跨调用共享的有界缓存（缓存数组按存储精度保存）"""
+    
+    def __init__(self, graph: IndicatorGraph, max_entries: int = 4096,
+                 dtype: DTypeLike = None):
+        self.graph = graph
+        self.max_entries = max_entries
+        self.dtype = resolve_dtype(dtype)
+        self._memo: "OrderedDict[tuple, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def context(self, bars: Bars, has_range: bool = True) -> IndicatorContext:
+        """为一组K线创建计算上下文"""
+        return IndicatorContext(self, bars, has_range)
+    
+    def _lookup(self, key: tuple):
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            self.hits += 1
+            return True, self._memo[key]
+        
+        self.misses += 1
+        return False, None
+    
+    def _store(self, key: tuple, value: Any):
+        self._memo[key] = value
+        if len(self._memo) > self.max_entries:
+            self._memo.popitem(last=False)
+    
+    def clear(self):
+        """清空缓存"""
+        self._memo.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._memo),
+            "nbytes": sum(_nbytes(value) for value in self._memo.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+def _compact(value: Any, dtype: np.dtype) -> Any:
+    """将缓存中的浮点数组转换为存储精度并设为只读，防止调用方修改共享结果"""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == "f":
+            value = value.astype(dtype, copy=False)
+        value.flags.writeable = False
+    elif isinstance(value, dict):
+        return {key: _compact(item, dtype) for key, item in value.items()}
+    return value
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(item) for item in value.values())
+    return 0
@@ -0,0 +1,395 @@
+"""
+递推指标计算核心模块
+EMA、Wilder RSI、KDJ平滑、抛物线SAR、滚动均值/标准差等递推型指标难以直接向量化，
+这里每个核心提供两种实现：
+- 逐元素循环版：安装numba时JIT编译为机器码，未安装时即纯Python循环
+- NumPy版：沿股票维度向量化、沿时间维度递推，作为未安装numba时的默认实现
+
+所有核心的输入输出均为 (股票数, 日期数) 矩阵，上市前的NaN保持为NaN；
+上市后的停牌日应预先前向填充。
+"""
+
+import logging
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    JIT_AVAILABLE = True
+except ImportError:
+    JIT_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        """未安装numba时的空装饰器"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# 可选的计算后端：auto按环境自动选择，jit/python使用循环版，numpy使用向量化版
+BACKENDS = ("auto", "jit", "python", "numpy")
+
+def _resolve_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的计算后端: {backend}")
+    if backend == "auto":
+        return "jit" if JIT_AVAILABLE else "numpy"
+    if backend == "jit" and not JIT_AVAILABLE:
+        raise ValueError("未安装numba，无法使用jit后端")
+    return backend
+
+def _loop_function(func, backend: str):
+    """jit后端返回编译版本，python后端返回原始Python函数"""
+    if backend == "python":
+        return getattr(func, "py_func", func)
+    return func
+
+def _as_matrix(values) -> np.ndarray:
+    return np.ascontiguousarray(np.atleast_2d(np.asarray(values, dtype=np.float64)))
+
+@njit(cache=True)
+def _ema_loop(matrix, alpha):
+    n, t_count = matrix.shape
+    result = np.empty_like(matrix)
+    for i in range(n):
+        prev = np.nan
+        for t in range(t_count):
+            x = matrix[i, t]
+            value = prev * (1 - alpha) + alpha * x
+            if np.isnan(value):
+                value = x
+            result[i, t] = value
+            prev = value
+    return result
+
+def _ema_numpy(matrix: np.ndarray, alpha: float) -> np.ndarray:
+    # 转置为 (日期数, 股票数) 的连续数组，使每步递推访问连续内存
+    series = np.ascontiguousarray(matrix.T)
+    result = np.empty_like(series)
+    prev = np.full(series.shape[1], np.nan)
+    
+    for t in range(series.shape[0]):
+        x = series[t]
+        prev *= 1 - alpha
+        prev += alpha * x
+        np.copyto(prev, x, where=np.isnan(prev))
+        result[t] = prev
+    
+    return result.T
+
+def ema(matrix, period: int, backend: str = "auto") -> np.ndarray:
+    """指数移动平均，以每只股票首个有效价格为初值"""
+    matrix = _as_matrix(matrix)
+    alpha = 2 / (period + 1)
+    backend = _resolve_backend(backend)
+    if backend == "numpy":
+        return _ema_numpy(matrix, alpha)
+    return _loop_function(_ema_loop, backend)(matrix, alpha)
+
+@njit(cache=True)
+def _wilder_rsi_loop(close, period):
+    n, t_count = close.shape
+    result = np.full(close.shape, np.nan)
+    for i in range(n):
+        count = 0
+        avg_gain = 0.0
+        avg_loss = 0.0
+        for t in range(1, t_count):
+            change = close[i, t] - close[i, t - 1]
+            if np.isnan(change):
+                continue
+            gain = change if change > 0 else 0.0
+            loss = -change if change < 0 else 0.0
+            count += 1
+            if count <= period:
+                avg_gain += gain / period
+                avg_loss += loss / period
+            else:
+                avg_gain = (avg_gain * (period - 1) + gain) / period
+                avg_loss = (avg_loss * (period - 1) + loss) / period
+            if count >= period:
+                if avg_loss == 0:
+                    result[i, t] = 100.0
+                else:
+                    result[i, t] = 100 - 100 / (1 + avg_gain / avg_loss)
+    return result
+
+def _wilder_rsi_numpy(close: np.ndarray, period: int) -> np.ndarray:
+    series = np.ascontiguousarray(close.T)
+    t_count, n = series.shape
+    result = np.full(series.shape, np.nan)
+    count = np.zeros(n, dtype=np.int64)
+    avg_gain = np.zeros(n)
+    avg_loss = np.zeros(n)
+    
+    for t in range(1, t_count):
+        change = series[t] - series[t - 1]
+        valid = ~np.isnan(change)
+        gain = np.where(change > 0, change, 0.0)
+        loss = np.where(change < 0, -change, 0.0)
+        count += valid
+        
+        seeding = valid & (count <= period)
+        smoothing = valid & (count > period)
+        np.copyto(avg_gain, avg_gain + gain / period, where=seeding)
+        np.copyto(avg_loss, avg_loss + loss / period, where=seeding)
+        np.copyto(avg_gain, (avg_gain * (period - 1) + gain) / period, where=smoothing)
+        np.copyto(avg_loss, (avg_loss * (period - 1) + loss) / period, where=smoothing)
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+        np.copyto(result[t], rsi, where=valid & (count >= period))
+    
+    return result.T
+
+def wilder_rsi(close, period: int = 14, backend: str = "auto") -> np.ndarray:
+    """Wilder平滑口径RSI（前period个变化取简单平均作为初值）"""
+    close = _as_matrix(close)
+    backend = _resolve_backend(backend)
+    if backend == "numpy":
+        return _wilder_rsi_numpy(close, period)
+    return _loop_function(_wilder_rsi_loop, backend)(close, period)
+
+@njit(cache=True)
+def _kdj_loop(rsv):
+    n, t_count = rsv.shape
+    k = np.full(rsv.shape, np.nan)
+    d = np.full(rsv.shape, np.nan)
+    for i in range(n):
+        prev_k = 50.0
+        prev_d = 50.0
+        for t in range(t_count):
+            x = rsv[i, t]
+            if np.isnan(x):
+                continue
+            prev_k = (2 / 3) * prev_k + (1 / 3) * x
+            prev_d = (2 / 3) * prev_d + (1 / 3) * prev_k
+            k[i, t] = prev_k
+            d[i, t] = prev_d
+    return k, d
+
+def _kdj_numpy(rsv: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    series = np.ascontiguousarray(rsv.T)
+    t_count, n = series.shape
+    k = np.empty_like(series)
+    d = np.empty_like(series)
+    prev_k = np.full(n, 50.0)
+    prev_d = np.full(n, 50.0)
+    
+    for t in range(t_count):
+        x = series[t]
+        has_value = ~np.isnan(x)
+        np.copyto(prev_k, (2 / 3) * prev_k + (1 / 3) * x, where=has_value)
+        np.copyto(prev_d, (2 / 3) * prev_d + (1 / 3) * prev_k, where=has_value)
+        k[t] = prev_k
+        d[t] = prev_d
+    
+    k, d = k.T, d.T
+    missing = np.isnan(rsv)
+    k[missing] = np.nan
+    d[missing] = np.nan
+    return k, d
+
+def kdj_smooth(rsv, backend: str = "auto") -> Tuple[np.ndarray, np.ndarray]:
+    """由RSV递推K、D值（以50为初值按1/3权重平滑，RSV为NaN处输出NaN）"""
+    rsv = _as_matrix(rsv)
+    backend = _resolve_backend(backend)
+    if backend == "numpy":
+        return _kdj_numpy(rsv)
+    return _loop_function(_kdj_loop, backend)(rsv)
+
+@njit(cache=True)
+def _sar_loop(high, low, step, maximum):
+    n, t_count = high.shape
+    result = np.full(high.shape, np.nan)
+    for i in range(n):
+        start = -1
+        for t in range(t_count):
+            if not np.isnan(high[i, t]) and not np.isnan(low[i, t]):
+                start = t
+                break
+        if start < 0:
+            continue
+        
+        # 以上涨趋势开始，SAR取首日最低价
+        rising = True
+        sar = low[i, start]
+        extreme = high[i, start]
+        af = step
+        result[i, start] = sar
+        
+        for t in range(start + 1, t_count):
+            prev2 = t - 2 if t - 2 >= start else t - 1
+            sar = sar + af * (extreme - sar)
+            if rising:
+                sar = min(sar, low[i, t - 1], low[i, prev2])
+                if low[i, t] < sar:
+                    rising = False
+                    sar = extreme
+                    extreme = low[i, t]
+                    af = step
+                elif high[i, t] > extreme:
+                    extreme = high[i, t]
+                    af = min(af + step, maximum)
+            else:
+                sar = max(sar, high[i, t - 1], high[i, prev2])
+                if high[i, t] > sar:
+                    rising = True
+                    sar = extreme
+                    extreme = high[i, t]
+                    af = step
+                elif low[i, t] < extreme:
+                    extreme = low[i, t]
+                    af = min(af + step, maximum)
+            result[i, t] = sar
+    return result
+
+def _sar_numpy(high: np.ndarray, low: np.ndarray, step: float, maximum: float) -> np.ndarray:
+    high_t = np.ascontiguousarray(high.T)
+    low_t = np.ascontiguousarray(low.T)
+    t_count, n = high_t.shape
+    result = np.full(high_t.shape, np.nan)
+    
+    # 每只股票的首个有效日（无有效数据时为t_count）
+    valid = ~(np.isnan(high_t) | np.isnan(low_t))
+    start = np.where(valid.any(axis=0), valid.argmax(axis=0), t_count)
+    
+    rising = np.ones(n, dtype=bool)
+    sar = np.full(n, np.nan)
+    extreme = np.full(n, np.nan)
+    af = np.full(n, step)
+    
+    for t in range(t_count):
+        first = start == t
+        sar[first] = low_t[t, first]
+        extreme[first] = high_t[t, first]
+        
+        active = start < t
+        if active.any():
+            prev1 = t - 1
+            prev2 = np.where(t - 2 >= start, t - 2, t - 1)
+            columns = np.arange(n)
+            high_now, low_now = high_t[t], low_t[t]
+            
+            candidate = sar + af * (extreme - sar)
+            candidate = np.where(
+                rising,
+                np.minimum(candidate, np.minimum(low_t[prev1], low_t[prev2, columns])),
+                np.maximum(candidate, np.maximum(high_t[prev1], high_t[prev2, columns]))
+            )
+            
+            reverse = np.where(rising, low_now < candidate, high_now > candidate)
+            extend = ~reverse & np.where(rising, high_now > extreme, low_now < extreme)
+            
+            new_sar = np.where(reverse, extreme, candidate)
+            new_extreme = np.where(reverse, np.where(rising, low_now, high_now),
+                                   np.where(extend, np.where(rising, high_now, low_now), extreme))
+            new_af = np.where(reverse, step, np.where(extend, np.minimum(af + step, maximum), af))
+            new_rising = rising ^ reverse
+            
+            np.copyto(sar, new_sar, where=active)
+            np.copyto(extreme, new_extreme, where=active)
+            np.copyto(af, new_af, where=active)
+            np.copyto(rising, new_rising, where=active)
+        
+        result[t] = np.where(start <= t, sar, np.nan)
+    
+    return result.T
+
+def parabolic_sar(high, low, step: float = 0.02, maximum: float = 0.2,
+                  backend: str = "auto") -> np.ndarray:
+    """抛物线转向指标SAR（以上涨趋势开始，首日取最低价）"""
+    high = _as_matrix(high)
+    low = _as_matrix(low)
+    backend = _resolve_backend(backend)
+    if backend == "numpy":
+        return _sar_numpy(high, low, step, maximum)
+    return _loop_function(_sar_loop, backend)(high, low, step, maximum)
+
+# 滚动方差相对本次重算以来的峰值缩小到该比例以下时（如价格水平跳变后的窗口）按窗口重算，
+# 避免大数相消造成的精度损失
+MOMENT_RESYNC_RATIO = 1e-6
+
+@njit(cache=True)
+def _rolling_moments_loop(matrix, window):
+    n, t_count = matrix.shape
+    mean = np.full(matrix.shape, np.nan)
+    std = np.full(matrix.shape, np.nan)
+    for i in range(n):
+        # 均值记为相对参考值（重算时取窗口首值）的偏移，价格水平较高时仍保留小数精度
+        ref = matrix[i, 0]
+        offset = 0.0
+        m2 = 0.0
+        peak = 0.0
+        steps = 0
+        for t in range(t_count):
+            d = matrix[i, t] - ref
+            if t < window:
+                delta = d - offset
+                offset += delta / (t + 1)
+                m2 += delta * (d - offset)
+            else:
+                # 滑动Welford：新值进入、最旧值滑出合为一步
+                d_old = matrix[i, t - window] - ref
+                delta = d - d_old
+                new_offset = offset + delta / window
+                m2 += delta * (d - new_offset + d_old - offset)
+                offset = new_offset
+                steps += 1
+            if m2 > peak:
+                peak = m2
+            if t < window - 1:
+                continue
+            
+            # 每滑过一个完整窗口、方差大幅缩小或出现NaN时按当前窗口两遍法重算
+            if steps >= window or not m2 >= MOMENT_RESYNC_RATIO * peak:
+                ref = matrix[i, t - window + 1]
+                offset = 0.0
+                for k in range(t - window + 1, t + 1):
+                    offset += matrix[i, k] - ref
+                offset /= window
+                m2 = 0.0
+                for k in range(t - window + 1, t + 1):
+                    m2 += (matrix[i, k] - ref - offset) ** 2
+                peak = m2
+                steps = 0
+            mean[i, t] = ref + offset
+            std[i, t] = np.sqrt(max(m2, 0.0) / window)
+    return mean, std
+
+def _rolling_moments_numpy(matrix: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    # 窗口视图（不复制数据）上两遍法：先求相对窗口首值的平均偏移，再求相对本窗口均值的离差平方和
+    mean = np.full(matrix.shape, np.nan)
+    std = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] < window:
+        return mean, std
+    
+    windows = np.lib.stride_tricks.sliding_window_view(matrix, window, axis=1)
+    ref = windows[..., 0]
+    offset = (windows - ref[..., None]).mean(axis=2)
+    deviations = windows - ref[..., None] - offset[..., None]
+    mean[:, window - 1:] = ref + offset
+    std[:, window - 1:] = np.sqrt(np.einsum("ijk,ijk->ij", deviations, deviations) / window)
+    return mean, std
+
+def rolling_mean_std(matrix, window: int, backend: str = "auto") -> Tuple[np.ndarray, np.ndarray]:
+    """滚动均值与总体标准差，窗口未填满或含NaN的位置为NaN；
+    循环版为一次遍历的滑动Welford递推，NumPy版为窗口视图上的两遍法"""
+    if window < 1:
+        raise ValueError("窗口长度必须为正整数")
+    matrix = _as_matrix(matrix)
+    backend = _resolve_backend(backend)
+    if backend == "numpy":
+        return _rolling_moments_numpy(matrix, window)
+    return _loop_function(_rolling_moments_loop, backend)(matrix, window)
+
+def backend_info() -> Dict[str, Any]:
+    """当前环境下的计算后端信息"""
+    return {
+        "jit_available": JIT_AVAILABLE,
+        "default_backend": _resolve_backend("auto")
+    }
@@ -0,0 +1,262 @@
+"""
+全市场行情快照模块
+一次请求获取沪深A股全部股票的最新行情，按列存储供批量筛选与评分使用
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 东方财富行情列表接口
+CLIST_URL = "https://push2.eastmoney.com/api/qt/clist/get"
+# 东方财富指定股票批量行情接口（secids 以逗号分隔）
+ULIST_URL = "https://push2.eastmoney.com/api/qt/ulist.np/get"
+# 沪深A股（深市主板、创业板，沪市主板、科创板）
+A_SHARE_MARKETS = "m:0+t:6,m:0+t:80,m:1+t:2,m:1+t:23"
+
+# 接口字段 -> 快照列名
+SNAPSHOT_FIELDS = {
+    "f12": "symbol",
+    "f14": "name",
+    "f100": "industry",
+    "f2": "price",
+    "f3": "change_percent",
+    "f24": "change_60d",
+    "f25": "change_ytd",
+    "f5": "volume",
+    "f6": "amount",
+    "f8": "turnover_rate",
+    "f10": "volume_ratio",
+    "f9": "pe_ratio",
+    "f23": "pb_ratio",
+    "f20": "market_cap",
+    "f62": "main_net_inflow"
+}
+TEXT_COLUMNS = ("symbol", "name", "industry")
+
+# 批量报价的字段（快照字段的子集，报价可直接取自有效期内的快照）
+QUOTE_FIELDS = {
+    "f12": "symbol",
+    "f14": "name",
+    "f2": "price",
+    "f3": "change_percent",
+    "f5": "volume",
+    "f6": "amount",
+    "f20": "market_cap",
+    "f9": "pe_ratio"
+}
+
+def to_secid(symbol: str) -> str:
+    """A股代码转为东方财富 secid（沪市 1.，深市 0.）"""
+    return f"1.{symbol}" if symbol.startswith(("5", "6", "9")) else f"0.{symbol}"
+
+class MarketSnapshot:
+    """全市场行情快照（按列存储，数值列缺失为NaN）"""
+    
+    def __init__(self, columns: Dict[str, np.ndarray], timestamp: Optional[float] = None):
+        self.columns = columns
+        self.timestamp = timestamp or time.time()
+        self.version = self._digest(columns)
+        self._index = {symbol: i for i, symbol in enumerate(columns.get("symbol", []))}
+    
+    @staticmethod
+    def _digest(columns: Dict[str, np.ndarray]) -> str:
+        """快照内容摘要，内容相同的快照版本相同"""
+        digest = hashlib.blake2b(digest_size=12)
+        for name in sorted(columns):
+            values = columns[name]
+            digest.update(name.encode())
+            if values.dtype.kind == "f":
+                digest.update(np.ascontiguousarray(values).tobytes())
+            else:
+                digest.update("\x1f".join(map(str, values)).encode())
+        return digest.hexdigest()
+    
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]],
+                     timestamp: Optional[float] = None) -> "MarketSnapshot":
+        """由接口返回的记录列表构造（"-"等无效值转为NaN）"""
+        columns = {}
+        for field, name in SNAPSHOT_FIELDS.items():
+            values = [record.get(field) for record in records]
+            if name in TEXT_COLUMNS:
+                columns[name] = np.array(["" if v in (None, "-") else str(v) for v in values], dtype=object)
+            else:
+                columns[name] = np.array([_to_float(v) for v in values], dtype=np.float64)
+        return cls(columns, timestamp)
+    
+    def __len__(self) -> int:
+        return len(self.columns.get("symbol", []))
+    
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+    
+    def __repr__(self) -> str:
+        return f"MarketSnapshot({len(self)} symbols, version={self.version})"
+    
+    def column(self, name: str) -> np.ndarray:
+        """按列名获取数据"""
+        if name not in self.columns:
+            raise KeyError(f"快照中没有字段: {name}")
+        return self.columns[name]
+    
+    def index_of(self, symbols: Sequence[str]) -> np.ndarray:
+        """股票代码对应的行下标（不在快照中的为-1）"""
+        return np.array([self._index.get(s, -1) for s in symbols], dtype=np.int64)
+    
+    def row(self, i: int) -> Dict[str, Any]:
+        """单只股票的行情（NaN转为None）"""
+        record = {}
+        for name, values in self.columns.items():
+            value = values[i]
+            if isinstance(value, (float, np.floating)):
+                value = None if np.isnan(value) else float(value)
+            record[name] = value
+        return record
+    
+    def age(self) -> float:
+        """快照距今的秒数"""
+        return time.time() - self.timestamp
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+class MarketSnapshotProvider:
+    """行情快照提供器，在有效期内复用同一份快照"""
+    
+    def __init__(self, ttl: float = 60.0, page_size: int = 6000):
+        self.ttl = ttl
+        self.page_size = page_size
+        self._snapshot: Optional[MarketSnapshot] = None
+    
+    async def get(self, fetcher, force: bool = False) -> Optional[MarketSnapshot]:
+        """获取快照（过期或强制刷新时重新请求，请求失败时沿用旧快照）"""
+        if not force and self._snapshot is not None and self._snapshot.age() < self.ttl:
+            return self._snapshot
+        
+        records = await fetcher.get_market_snapshot(self.page_size)
+        if records:
+            snapshot = MarketSnapshot.from_records(records)
+            if self._snapshot is None or snapshot.version != self._snapshot.version:
+                logger.info(f"行情快照已更新: {len(snapshot)} 只股票，版本 {snapshot.version}")
+                self._snapshot = snapshot
+            else:
+                # 内容未变化时只刷新时间，保持版本不变
+                self._snapshot.timestamp = snapshot.timestamp
+        elif self._snapshot is None:
+            logger.error("获取行情快照失败")
+        
+        return self._snapshot
+    
+    @property
+    def snapshot(self) -> Optional[MarketSnapshot]:
+        """最近一次获取的快照"""
+        return self._snapshot
+
+class QuoteProvider:
+    """批量报价提供器
+    
+    按股票缓存报价（有效期ttl秒）；未命中的股票优先取自有效期内的全市场快照，
+    其余按 chunk_size 分批请求批量行情接口，最多 concurrency 批同时进行。
+    每只股票单独返回结果，请求失败或无行情的股票返回 {"error": ...}，不影响其他股票。
+    """
+    
+    def __init__(self, ttl: float = 10.0, chunk_size: int = 100, concurrency: int = 4,
+                 snapshots: Optional[MarketSnapshotProvider] = None,
+                 max_entries: int = 10000):
+        if chunk_size < 1 or concurrency < 1:
+            raise ValueError("chunk_size 与 concurrency 必须为正整数")
+        
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.snapshots = snapshots
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    def _remember(self, symbol: str, quote: Dict[str, Any], timestamp: float):
+        self._cache[symbol] = (timestamp, quote)
+        self._cache.move_to_end(symbol)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+    
+    @staticmethod
+    def _quote(record: Dict[str, Any]) -> Dict[str, Any]:
+        """接口记录转为报价（无效值为None）"""
+        quote = {}
+        for field, name in QUOTE_FIELDS.items():
+            value = record.get(field)
+            if name in TEXT_COLUMNS:
+                quote[name] = "" if value in (None, "-") else str(value)
+            else:
+                value = _to_float(value)
+                quote[name] = None if np.isnan(value) else value
+        return quote
+    
+    async def get(self, symbols: Sequence[str], fetcher) -> Dict[str, Dict[str, Any]]:
+        """批量获取报价，返回 股票代码 -> 报价或错误信息（顺序与输入一致）"""
+        now = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            entry = self._cache.get(symbol)
+            if entry is not None and now - entry[0] < self.ttl:
+                results[symbol] = entry[1]
+            else:
+                missing.append(symbol)
+        
+        # 有效期内的全市场快照中已有的股票不再请求
+        snapshot = self.snapshots.snapshot if self.snapshots is not None else None
+        if missing and snapshot is not None and snapshot.age() < self.ttl:
+            remaining = []
+            for symbol, i in zip(missing, snapshot.index_of(missing)):
+                if i < 0:
+                    remaining.append(symbol)
+                    continue
+                row = snapshot.row(int(i))
+                quote = {name: row.get(name) for name in QUOTE_FIELDS.values()}
+                results[symbol] = quote
+                self._remember(symbol, quote, snapshot.timestamp)
+            missing = remaining
+        
+        if missing:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            
+            async def load(chunk: List[str]):
+                async with semaphore:
+                    try:
+                        return chunk, await fetcher.get_quotes(chunk), None
+                    except Exception as e:
+                        logger.error(f"批量获取 {len(chunk)} 只股票行情失败: {e}")
+                        return chunk, [], str(e)
+            
+            chunks = [missing[i:i + self.chunk_size] for i in range(0, len(missing), self.chunk_size)]
+            for chunk, records, error in await asyncio.gather(*(load(chunk) for chunk in chunks)):
+                fetched = time.time()
+                for record in records:
+                    quote = self._quote(record)
+                    if quote["symbol"] in chunk:
+                        results[quote["symbol"]] = quote
+                        self._remember(quote["symbol"], quote, fetched)
+                for symbol in chunk:
+                    if symbol not in results:
+                        results[symbol] = {"symbol": symbol,
+                                           "error": f"行情请求失败: {error}" if error else "未找到该股票的行情"}
+        
+        return {symbol: results[symbol] for symbol in dict.fromkeys(symbols)}
+    
+    def clear_cache(self):
+        """清空报价缓存"""
+        self._cache.clear()
@@ -0,0 +1,317 @@
+"""
+参数寻优模块
+对指标参数（RSI/MACD/KDJ周期等）与信号投票阈值做网格或随机搜索，
+在进程池中并行回测，价格矩阵放入共享内存由各进程只读访问而不复制；
+支持滚动前推（walk-forward）划分，结果逐条追加写入JSONL文件，中断后可续跑
+
+参数只按训练段（不划分时为全样本）的指标选择，测试段指标只用于报告所选参数的样本外表现。
+
+推荐评级阈值（config.json 的 recommendation_thresholds）依赖基本面与资金流数据，
+历史K线无法回测，因此不在搜索空间内。
+"""
+
+import itertools
+import json
+import logging
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+from backtest import SignalBacktester
+from bars import BarPanel
+from batch_indicators import BatchIndicatorEngine
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 可搜索的参数：指标引擎参数与回测器参数
+ENGINE_PARAMS = ("rsi_period", "rsi_smoothing", "macd_fast", "macd_slow", "macd_signal", "kdj_period")
+BACKTEST_PARAMS = ("buy_votes", "strong_votes", "entry_signal", "exit_signal", "execution",
+                   "commission", "stamp_duty")
+# 回测所需的价格字段
+PRICE_FIELDS = ("open", "high", "low", "close")
+# 随机搜索每个待抽组合的最多抽取次数（重复或无效的组合不计入结果）
+RANDOM_DRAW_ATTEMPTS = 20
+
+def grid_combinations(space: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """参数空间的全部组合（剔除无效组合）"""
+    names = sorted(space)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    return [params for params in combinations if _is_valid(params)]
+
+def random_combinations(space: Dict[str, Sequence[Any]], n_iter: int,
+                        seed: int = 0) -> List[Dict[str, Any]]:
+    """从参数空间中随机抽取最多n_iter个不重复的有效组合
+    
+    各参数独立抽取，不枚举整个网格；空间不大于n_iter时直接返回全部有效组合。
+    抽取次数以 n_iter * RANDOM_DRAW_ATTEMPTS 为上限，有效组合较少时可能少于n_iter个。
+    """
+    values = {name: list(space[name]) for name in sorted(space)}
+    if math.prod(len(v) for v in values.values()) <= n_iter:
+        return grid_combinations(space)
+    
+    rng = random.Random(seed)
+    chosen: Dict[str, Dict[str, Any]] = {}
+    for _ in range(n_iter * RANDOM_DRAW_ATTEMPTS):
+        if len(chosen) >= n_iter:
+            break
+        params = {name: rng.choice(options) for name, options in values.items()}
+        key = params_key(params)
+        if key not in chosen and _is_valid(params):
+            chosen[key] = params
+    return list(chosen.values())
+
+def _is_valid(params: Dict[str, Any]) -> bool:
+    if params.get("macd_fast", 12) >= params.get("macd_slow", 26):
+        return False
+    if params.get("buy_votes", 2) > params.get("strong_votes", 3):
+        return False
+    return True
+
+def params_key(params: Dict[str, Any]) -> str:
+    """参数组合的规范化键"""
+    return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+def walk_forward_splits(n_dates: int, train: int, test: int,
+                        step: Optional[int] = None) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    """滚动前推划分，返回 ((训练起, 训练止), (测试起, 测试止)) 下标区间列表（左闭右开）"""
+    step = step or test
+    splits = []
+    start = 0
+    while start + train + test <= n_dates:
+        splits.append(((start, start + train), (start + train, start + train + test)))
+        start += step
+    return splits
+
+def evaluate(panel: BarPanel, params: Dict[str, Any],
+             split: Optional[Tuple[Tuple[int, int], Tuple[int, int]]] = None) -> Dict[str, Any]:
+    """用一组参数回测面板，返回训练段与测试段的组合指标（不划分时只有全样本 full）"""
+    unknown = set(params) - set(ENGINE_PARAMS) - set(BACKTEST_PARAMS)
+    if unknown:
+        raise ValueError(f"不支持的搜索参数: {', '.join(sorted(unknown))}")
+    
+    engine = BatchIndicatorEngine.from_config(**{k: v for k, v in params.items() if k in ENGINE_PARAMS})
+    backtester = SignalBacktester(engine=engine, **{k: v for k, v in params.items() if k in BACKTEST_PARAMS})
+    
+    if split is None:
+        result = backtester.run(panel)
+        return {"full": result["portfolio"]}
+    
+    (train_start, train_end), (test_start, test_end) = split
+    # 指标在训练段与测试段上连续计算，测试段的指标可使用训练段数据预热
+    result = backtester.run(panel.slice(panel.dates[train_start], panel.dates[test_end - 1]))
+    returns = result["portfolio_returns"]
+    train_days = train_end - train_start
+    return {
+        "train": backtester.portfolio_summary(returns[:train_days]),
+        "test": backtester.portfolio_summary(returns[train_days:])
+    }
+
+# 工作进程中共享的面板
+_worker_panel: Optional[BarPanel] = None
+_worker_memory: Optional[shared_memory.SharedMemory] = None
+
+def _init_worker(memory_name: str, shape: Tuple[int, ...], dtype: str,
+                 fields: Sequence[str], symbols: Sequence[str], dates: np.ndarray):
+    """工作进程初始化：挂载共享内存中的价格矩阵（只读视图）"""
+    global _worker_panel, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    block = np.ndarray(shape, dtype=dtype, buffer=_worker_memory.buf)
+    block.flags.writeable = False
+    _worker_panel = BarPanel(symbols, dates, {name: block[i] for i, name in enumerate(fields)})
+
+def _evaluate_in_worker(params: Dict[str, Any], split_index: int,
+                        split: Optional[Tuple[Tuple[int, int], Tuple[int, int]]]) -> Dict[str, Any]:
+    return _record(params, split_index, split, evaluate(_worker_panel, params, split))
+
+def _record(params: Dict[str, Any], split_index: int, split, metrics: Dict[str, Any]) -> Dict[str, Any]:
+    return {"key": params_key(params), "params": params, "split": split_index,
+            "range": split, **metrics}
+
+class ParameterSearch:
+    """并行参数搜索"""
+    
+    def __init__(self, panel: BarPanel,
+                 space: Dict[str, Sequence[Any]],
+                 metric: str = "sharpe",
+                 method: str = "grid",
+                 n_iter: int = 50,
+                 seed: int = 0,
+                 walk_forward: Optional[Dict[str, int]] = None,
+                 results_path: Optional[str] = None,
+                 max_workers: Optional[int] = None):
+        if method not in ("grid", "random"):
+            raise ValueError(f"不支持的搜索方式: {method}")
+        
+        self.panel = panel
+        self.space = space
+        self.metric = metric
+        self.method = method
+        self.n_iter = n_iter
+        self.seed = seed
+        self.results_path = results_path
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        
+        if walk_forward:
+            self.splits = walk_forward_splits(len(panel.dates), walk_forward["train"],
+                                              walk_forward["test"], walk_forward.get("step"))
+            if not self.splits:
+                raise ValueError("K线数量不足以进行滚动前推划分")
+        else:
+            self.splits = [None]
+    
+    def combinations(self) -> List[Dict[str, Any]]:
+        """待评估的参数组合"""
+        if self.method == "random":
+            return random_combinations(self.space, self.n_iter, self.seed)
+        return grid_combinations(self.space)
+    
+    def pending_tasks(self, completed: Dict[Tuple[str, int], Dict[str, Any]]) -> List[Tuple[Dict[str, Any], int]]:
+        """尚未完成的 (参数组合, 划分下标) 任务"""
+        return [(params, i) for params in self.combinations() for i in range(len(self.splits))
+                if (params_key(params), i) not in completed]
+    
+    def run(self) -> List[Dict[str, Any]]:
+        """执行搜索（跳过结果文件中已完成的任务），返回排名表"""
+        records = load_results(self.results_path) if self.results_path else []
+        if self.results_path:
+            _end_line(self.results_path)
+        completed = {(r["key"], r["split"]): r for r in records}
+        tasks = self.pending_tasks(completed)
+        logger.info(f"参数搜索: {len(tasks)} 个任务待评估，{len(completed)} 个已完成")
+        
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            for params, i in tasks:
+                self._save(records, _record(params, i, self.splits[i],
+                                            evaluate(self.panel, params, self.splits[i])))
+        else:
+            self._run_parallel(tasks, records)
+        
+        return rank_results(records, self.metric)
+    
+    def _run_parallel(self, tasks: List[Tuple[Dict[str, Any], int]], records: List[Dict[str, Any]]):
+        fields = [name for name in PRICE_FIELDS if name in self.panel.fields]
+        dtype = self.panel.close.dtype
+        shape = (len(fields),) + self.panel.shape
+        memory = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        
+        try:
+            block = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+            for i, name in enumerate(fields):
+                block[i] = self.panel.field(name)
+            
+            initargs = (memory.name, shape, dtype.str, fields, self.panel.symbols, self.panel.dates)
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=initargs) as executor:
+                futures = [executor.submit(_evaluate_in_worker, params, i, self.splits[i])
+                           for params, i in tasks]
+                for future in as_completed(futures):
+                    try:
+                        self._save(records, future.result())
+                    except Exception as e:
+                        logger.error(f"参数评估失败: {e}")
+        finally:
+            memory.close()
+            memory.unlink()
+    
+    def _save(self, records: List[Dict[str, Any]], record: Dict[str, Any]):
+        records.append(record)
+        if self.results_path:
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def _end_line(path: str):
+    """中断时末行可能只写了一半，续写前补上换行，新记录不与损坏的末行连在一起"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """读取结果文件（忽略中断时写坏的末行）"""
+    if not os.path.exists(path):
+        return []
+    
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"跳过结果文件中的损坏记录: {line[:80]}")
+    return records
+
+def _segment_values(group: Sequence[Dict[str, Any]], segment: str, metric: str) -> List[float]:
+    values = [r[segment].get(metric) for r in group if r.get(segment)]
+    return [v for v in values if v is not None]
+
+def rank_results(records: Sequence[Dict[str, Any]], metric: str = "sharpe") -> List[Dict[str, Any]]:
+    """按训练段指标的均值对参数组合排名（不划分时按全样本指标），
+    滚动前推时同时给出这些参数的测试段均值与最差测试段，测试段不参与排名"""
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        grouped.setdefault(record["key"], []).append(record)
+    
+    table = []
+    for key, group in grouped.items():
+        segment = "train" if any(r.get("train") for r in group) else "full"
+        selection_values = _segment_values(group, segment, metric)
+        if not selection_values:
+            continue
+        row = {
+            "params": group[0]["params"],
+            "splits": len(group),
+            f"{segment}_{metric}": float(np.mean(selection_values))
+        }
+        test_values = _segment_values(group, "test", metric)
+        if test_values:
+            row[f"test_{metric}"] = float(np.mean(test_values))
+            row[f"worst_test_{metric}"] = float(np.min(test_values))
+        table.append(row)
+    
+    table.sort(key=lambda row: row.get(f"train_{metric}", row.get(f"full_{metric}")), reverse=True)
+    for rank, row in enumerate(table, 1):
+        row["rank"] = rank
+    return table
+
+def walk_forward_selection(records: Sequence[Dict[str, Any]], metric: str = "sharpe") -> Dict[str, Any]:
+    """逐个划分按训练段指标选出最优参数，报告其测试段指标及各测试段的均值（样本外表现）"""
+    by_split: Dict[int, List[Dict[str, Any]]] = {}
+    for record in records:
+        if record.get("train") and record["train"].get(metric) is not None:
+            by_split.setdefault(record["split"], []).append(record)
+    
+    selections = []
+    for split in sorted(by_split):
+        best = max(by_split[split], key=lambda r: r["train"][metric])
+        selections.append({
+            "split": split,
+            "range": best["range"],
+            "params": best["params"],
+            f"train_{metric}": best["train"][metric],
+            f"test_{metric}": best.get("test", {}).get(metric)
+        })
+    
+    test_values = [s[f"test_{metric}"] for s in selections if s[f"test_{metric}"] is not None]
+    return {
+        "splits": selections,
+        f"test_{metric}": float(np.mean(test_values)) if test_values else None
+    }
+
+# 快捷函数
+def grid_search(panel: BarPanel, space: Dict[str, Sequence[Any]], **options) -> List[Dict[str, Any]]:
+    """网格搜索"""
+    return ParameterSearch(panel, space, method="grid", **options).run()
+
+def random_search(panel: BarPanel, space: Dict[str, Sequence[Any]],
+                  n_iter: int = 50, **options) -> List[Dict[str, Any]]:
+    """随机搜索"""
+    return ParameterSearch(panel, space, method="random", n_iter=n_iter, **options).run()
@@ -0,0 +1,243 @@
+"""
+形态与背离检测模块
+在完整的指标序列上以数组运算识别金叉/死叉、MACD/RSI与价格的背离、
+布林带收口与突破，支持在 (股票数, 日期数) 矩阵上对全市场一次性检测
+
+所有检测结果为与输入同形状的布尔矩阵，事件位于形态成立的K线下标；
+背离依赖前后各order根K线确认高低点，因此最近order根K线内不会出现背离事件。
+"""
+
+import logging
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+from bars import Bars, BarPanel
+from batch_indicators import BatchIndicatorEngine, rolling_sum, rolling_extreme
+from dtype_policy import to_accumulator
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 形态名称 -> 中文描述
+PATTERN_NAMES = {
+    "golden_cross": "均线金叉",
+    "death_cross": "均线死叉",
+    "macd_golden_cross": "MACD金叉",
+    "macd_death_cross": "MACD死叉",
+    "macd_top_divergence": "MACD顶背离",
+    "macd_bottom_divergence": "MACD底背离",
+    "rsi_top_divergence": "RSI顶背离",
+    "rsi_bottom_divergence": "RSI底背离",
+    "bollinger_squeeze": "布林带收口",
+    "bollinger_breakout_up": "向上突破布林带",
+    "bollinger_breakout_down": "向下跌破布林带"
+}
+
+def _shift(matrix: np.ndarray, periods: int) -> np.ndarray:
+    """沿时间轴平移（正数向后平移），空出的位置为NaN"""
+    result = np.full(matrix.shape, np.nan)
+    if periods > 0:
+        result[:, periods:] = matrix[:, :-periods]
+    elif periods < 0:
+        result[:, :periods] = matrix[:, -periods:]
+    else:
+        result[:] = matrix
+    return result
+
+def crossovers(fast: np.ndarray, slow: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """快线上穿/下穿慢线，返回 (金叉, 死叉) 布尔矩阵"""
+    fast = np.atleast_2d(to_accumulator(fast))
+    slow = np.atleast_2d(to_accumulator(slow))
+    diff = fast - slow
+    prev = _shift(diff, 1)
+    golden = (diff > 0) & (prev <= 0)
+    death = (diff < 0) & (prev >= 0)
+    return golden, death
+
+def local_extrema(series: np.ndarray, order: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """局部高点/低点：高于（低于）前order根K线，且不低于（不高于）后order根K线"""
+    x = np.atleast_2d(to_accumulator(series))
+    left_max = _shift(rolling_extreme(x, order, np.maximum), 1)
+    left_min = _shift(rolling_extreme(x, order, np.minimum), 1)
+    right_max = _shift(rolling_extreme(x, order + 1, np.maximum), -order)
+    right_min = _shift(rolling_extreme(x, order + 1, np.minimum), -order)
+    peaks = (x > left_max) & (x >= right_max)
+    troughs = (x < left_min) & (x <= right_min)
+    return peaks, troughs
+
+def _previous_pivot(pivots: np.ndarray) -> np.ndarray:
+    """每个位置之前最近一个拐点的下标（没有时为-1）"""
+    index = np.where(pivots, np.arange(pivots.shape[1]), -1)
+    np.maximum.accumulate(index, axis=1, out=index)
+    previous = np.full(pivots.shape, -1, dtype=np.int64)
+    previous[:, 1:] = index[:, :-1]
+    return previous
+
+def divergences(price: np.ndarray, indicator: np.ndarray,
+                order: int = 5, max_gap: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """价格与指标背离，返回 (顶背离, 底背离) 布尔矩阵
+    
+    顶背离：相邻两个价格高点中后者更高，而指标在对应位置更低；底背离反之。
+    两个拐点相距超过max_gap根K线时不比较。
+    """
+    price = np.atleast_2d(to_accumulator(price))
+    indicator = np.atleast_2d(to_accumulator(indicator))
+    peaks, troughs = local_extrema(price, order)
+    rows = np.arange(price.shape[0])[:, None]
+    columns = np.arange(price.shape[1])
+    
+    def compare(pivots: np.ndarray, higher_price: bool) -> np.ndarray:
+        previous = _previous_pivot(pivots)
+        has_previous = pivots & (previous >= 0) & (columns - previous <= max_gap)
+        anchor = np.maximum(previous, 0)
+        prev_price = price[rows, anchor]
+        prev_indicator = indicator[rows, anchor]
+        if higher_price:
+            diverging = (price > prev_price) & (indicator < prev_indicator)
+        else:
+            diverging = (price < prev_price) & (indicator > prev_indicator)
+        return has_previous & diverging
+    
+    return compare(peaks, True), compare(troughs, False)
+
+def bollinger_matrix(close: np.ndarray, period: int = 20,
+                     num_std: float = 2.0) -> Dict[str, np.ndarray]:
+    """矩阵形式的布林带（总体标准差，与 TechnicalAnalyzer 一致）"""
+    close = np.atleast_2d(to_accumulator(close))
+    # 以每只股票首个有效价格为参考点平移，避免平方和相减的精度损失
+    first = np.argmax(~np.isnan(close), axis=1)
+    reference = close[np.arange(close.shape[0]), first][:, None]
+    shifted = close - np.nan_to_num(reference)
+    
+    mean = rolling_sum(shifted, period) / period
+    mean_square = rolling_sum(shifted * shifted, period) / period
+    std = np.sqrt(np.maximum(mean_square - mean * mean, 0.0))
+    # 窗口内存在NaN时不输出
+    incomplete = rolling_sum(np.isnan(close).astype(np.float64), period) > 0
+    middle = mean + reference
+    middle[incomplete] = np.nan
+    std[incomplete] = np.nan
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bandwidth = 2 * num_std * std / middle
+    return {
+        "upper": middle + num_std * std,
+        "middle": middle,
+        "lower": middle - num_std * std,
+        "bandwidth": bandwidth
+    }
+
+class PatternDetector:
+    """全市场形态与背离检测器"""
+    
+    def __init__(self, fast_ma: int = 5, slow_ma: int = 20,
+                 pivot_order: int = 5,
+                 max_divergence_gap: int = 60,
+                 bollinger_period: int = 20,
+                 bollinger_std: float = 2.0,
+                 squeeze_lookback: int = 120,
+                 engine: Optional[BatchIndicatorEngine] = None):
+        self.fast_ma = fast_ma
+        self.slow_ma = slow_ma
+        self.pivot_order = pivot_order
+        self.max_divergence_gap = max_divergence_gap
+        self.bollinger_period = bollinger_period
+        self.bollinger_std = bollinger_std
+        self.squeeze_lookback = squeeze_lookback
+        ma_periods = tuple(sorted({5, 10, 20, 60, fast_ma, slow_ma}))
+        self.engine = engine or BatchIndicatorEngine(ma_periods=ma_periods)
+    
+    def detect(self, panel: BarPanel,
+               indicators: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+        """检测全部形态，返回 形态名 -> (股票数, 日期数) 布尔矩阵"""
+        indicators = self.engine.compute(panel) if indicators is None else indicators
+        close = to_accumulator(indicators["close"])
+        patterns = {}
+        
+        patterns["golden_cross"], patterns["death_cross"] = crossovers(
+            indicators[f"ma{self.fast_ma}"], indicators[f"ma{self.slow_ma}"])
+        patterns["macd_golden_cross"], patterns["macd_death_cross"] = crossovers(
+            indicators["macd"], indicators["macd_signal"])
+        
+        order, gap = self.pivot_order, self.max_divergence_gap
+        patterns["macd_top_divergence"], patterns["macd_bottom_divergence"] = divergences(
+            close, indicators["macd"], order, gap)
+        patterns["rsi_top_divergence"], patterns["rsi_bottom_divergence"] = divergences(
+            close, indicators["rsi"], order, gap)
+        
+        patterns.update(self._bollinger_patterns(close))
+        return patterns
+    
+    def _bollinger_patterns(self, close: np.ndarray) -> Dict[str, np.ndarray]:
+        bands = bollinger_matrix(close, self.bollinger_period, self.bollinger_std)
+        bandwidth = bands["bandwidth"]
+        
+        # 带宽降至回看期内最低时进入收口，只在进入当根记为事件
+        lowest = rolling_extreme(bandwidth, self.squeeze_lookback, np.minimum)
+        squeezed = bandwidth <= lowest
+        entering = squeezed & ~np.concatenate([np.zeros((close.shape[0], 1), dtype=bool),
+                                               squeezed[:, :-1]], axis=1)
+        
+        breakout_up, _ = crossovers(close, bands["upper"])
+        _, breakout_down = crossovers(close, bands["lower"])
+        return {
+            "bollinger_squeeze": entering,
+            "bollinger_breakout_up": breakout_up,
+            "bollinger_breakout_down": breakout_down
+        }
+    
+    def events(self, panel: BarPanel,
+               patterns: Optional[Dict[str, np.ndarray]] = None,
+               since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """将检测结果展开为事件列表（按股票、K线下标排序），since为起始K线下标"""
+        patterns = self.detect(panel) if patterns is None else patterns
+        dates = np.datetime_as_string(panel.dates, unit="D")
+        events = []
+        
+        for name, mask in patterns.items():
+            rows, columns = np.nonzero(mask)
+            if since is not None:
+                keep = columns >= since
+                rows, columns = rows[keep], columns[keep]
+            for row, column in zip(rows.tolist(), columns.tolist()):
+                events.append({
+                    "symbol": panel.symbols[row],
+                    "pattern": name,
+                    "description": PATTERN_NAMES[name],
+                    "index": column,
+                    "date": str(dates[column])
+                })
+        
+        events.sort(key=lambda e: (e["symbol"], e["index"], e["pattern"]))
+        return events
+    
+    def summary(self, panel: BarPanel,
+                patterns: Optional[Dict[str, np.ndarray]] = None,
+                lookback: int = 20) -> Dict[str, Dict[str, int]]:
+        """各股票最近lookback根K线内各形态的出现次数"""
+        patterns = self.detect(panel) if patterns is None else patterns
+        start = max(0, len(panel.dates) - lookback)
+        counts = {name: mask[:, start:].sum(axis=1) for name, mask in patterns.items()}
+        return {
+            symbol: {name: int(values[row]) for name, values in counts.items() if values[row]}
+            for row, symbol in enumerate(panel.symbols)
+        }
+    
+    def scan_bars(self, bars: Bars, lookback: Optional[int] = None) -> List[Dict[str, Any]]:
+        """检测单只股票的形态事件，lookback限定只返回最近若干根K线内的事件"""
+        panel = BarPanel.from_bars([bars])
+        since = None if lookback is None else max(0, len(bars) - lookback)
+        return self.events(panel, since=since)
+
+def latest_event(events: Sequence[Dict[str, Any]],
+                 patterns: Sequence[str]) -> Optional[Dict[str, Any]]:
+    """事件列表中指定形态的最近一次事件"""
+    matched = [e for e in events if e["pattern"] in patterns]
+    return max(matched, key=lambda e: e["index"]) if matched else None
+
+# 快捷函数
+def detect_patterns(bars: Bars, lookback: Optional[int] = None) -> List[Dict[str, Any]]:
+    """检测单只股票的形态事件"""
+    return PatternDetector().scan_bars(bars, lookback)
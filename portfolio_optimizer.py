@@ -0,0 +1,325 @@
+"""
+投资组合优化模块
+由历史收益率估计Ledoit-Wolf收缩协方差矩阵，求解最小方差、均值-方差与风险平价组合，
+支持单只股票仓位上限（config.json 的 risk_management.max_position_size）与行业仓位上限
+
+最小方差与均值-方差使用加速投影梯度（FISTA），每步精确投影到
+{权重和为1、0≤权重≤仓位上限、行业权重≤行业上限} 的可行域；
+风险平价使用循环坐标下降求解对数障碍形式，数百只股票可在交互延迟内完成。
+"""
+
+import logging
+import math
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+from bars import BarPanel
+from config_loader import get_setting
+from dtype_policy import to_accumulator
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OPTIMIZATION_METHODS = ("min_variance", "mean_variance", "risk_parity")
+TRADING_DAYS = 252
+# 参与优化所需的最少有效收益率数量
+MIN_OBSERVATIONS = 60
+
+def panel_returns(panel: BarPanel, lookback: int = 250) -> np.ndarray:
+    """面板最近lookback期的简单收益率矩阵 (股票数, 期数)，缺失为NaN"""
+    close = to_accumulator(panel.close)[:, -(lookback + 1):]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return close[:, 1:] / close[:, :-1] - 1
+
+def shrink_covariance(sample: np.ndarray, fourth_moment: float, t: int) -> Tuple[np.ndarray, float]:
+    """按Ledoit-Wolf最优强度将样本协方差向等方差对角阵收缩，返回 (协方差, 收缩强度)
+    
+    fourth_moment为各期收益向量模长四次方之和 Σ_t||x_t||⁴，t为期数。
+    """
+    n = len(sample)
+    mu = np.trace(sample) / n
+    target_distance = np.sum((sample - mu * np.eye(n)) ** 2)
+    # sum_t ||x_t x_t' - S||² = sum_t ||x_t||⁴ - T·||S||²
+    estimation_error = (fourth_moment - t * np.sum(sample ** 2)) / t ** 2
+    
+    shrinkage = float(min(1.0, max(0.0, estimation_error / target_distance))) if target_distance > 0 else 1.0
+    return shrinkage * mu * np.eye(n) + (1 - shrinkage) * sample, shrinkage
+
+def ledoit_wolf_covariance(returns: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Ledoit-Wolf收缩协方差（目标为等方差对角阵），返回 (协方差, 收缩强度)
+    
+    returns为 (股票数, 期数) 矩阵，缺失值按该股票均值填补（去均值后为0）。
+    """
+    x = to_accumulator(returns)
+    counts = np.maximum((~np.isnan(x)).sum(axis=1), 1)
+    x = np.nan_to_num(x - np.nansum(x, axis=1, keepdims=True) / counts[:, None])
+    t = x.shape[1]
+    norms = np.sum(x * x, axis=0)
+    return shrink_covariance(x @ x.T / t, float(np.sum(norms ** 2)), t)
+
+def project_capped_simplex(v: np.ndarray, upper: float, total: float = 1.0) -> np.ndarray:
+    """投影到 {sum(w)=total, 0≤w≤upper}
+    
+    投影为 clip(v - τ, 0, upper)，φ(τ) = Σclip(v - τ, 0, upper) 是以 v 与 v - upper
+    为折点的分段线性递减函数：排序后用前缀和一次求出全部折点处的φ，
+    在跨过total的区间内线性插值得到精确的τ。
+    """
+    n = len(v)
+    ordered = np.sort(v)
+    prefix = np.r_[0.0, np.cumsum(ordered)]
+    breakpoints = np.sort(np.r_[ordered - upper, ordered])
+    # 折点b处：v > b 且 v < b+upper 的部分贡献 v-b，v ≥ b+upper 的部分贡献upper
+    above = np.searchsorted(ordered, breakpoints, side="right")
+    full = np.searchsorted(ordered, breakpoints + upper, side="left")
+    phi = upper * (n - full) + (prefix[full] - prefix[above]) - breakpoints * (full - above)
+    
+    k = min(max(int(np.searchsorted(-phi, -total, side="right")) - 1, 0), len(phi) - 2)
+    slope = phi[k] - phi[k + 1]
+    tau = breakpoints[k] + ((phi[k] - total) * (breakpoints[k + 1] - breakpoints[k]) / slope if slope > 0 else 0.0)
+    return np.clip(v - tau, 0, upper)
+
+def project_sector_caps(v: np.ndarray, upper: float, groups: np.ndarray,
+                        caps: np.ndarray, iterations: int = 60) -> np.ndarray:
+    """投影到 {sum(w)=1, 0≤w≤upper, 各行业权重和≤行业上限}
+    
+    KKT条件给出 w = clip(v - τ - η_行业, 0, upper)：τ固定时各行业权重和为
+    min(该行业Σclip(v - τ, 0, upper), 行业上限)，对τ二分使总和为1，
+    再把超限行业投影到和等于上限的带上界单纯形。
+    """
+    low, high = v.min() - upper, v.max()
+    for _ in range(iterations):
+        tau = (low + high) / 2
+        sums = np.bincount(groups, weights=np.clip(v - tau, 0, upper), minlength=len(caps))
+        if np.minimum(sums, caps).sum() > 1:
+            low = tau
+        else:
+            high = tau
+    
+    tau = (low + high) / 2
+    w = np.clip(v - tau, 0, upper)
+    sums = np.bincount(groups, weights=w, minlength=len(caps))
+    for group in np.flatnonzero(sums > caps):
+        members = groups == group
+        w[members] = project_capped_simplex(v[members], upper, caps[group])
+    return w
+
+def risk_contributions(weights: np.ndarray, covariance: np.ndarray) -> Dict[str, np.ndarray]:
+    """组合波动率、边际风险贡献与各资产风险贡献（占比之和为1）"""
+    marginal_variance = covariance @ weights
+    volatility = math.sqrt(max(float(weights @ marginal_variance), 0.0))
+    marginal = marginal_variance / volatility if volatility > 0 else np.zeros_like(weights)
+    contribution = weights * marginal
+    return {
+        "volatility": volatility,
+        "marginal": marginal,
+        "contribution": contribution,
+        "share": contribution / volatility if volatility > 0 else np.zeros_like(weights)
+    }
+
+class PortfolioOptimizer:
+    """投资组合优化器"""
+    
+    def __init__(self, method: str = "min_variance",
+                 max_position_size: Optional[float] = None,
+                 sector_caps: Optional[Dict[str, float]] = None,
+                 max_sector_weight: Optional[float] = None,
+                 risk_aversion: float = 3.0,
+                 return_shrinkage: float = 0.5,
+                 lookback: int = 250,
+                 max_iter: int = 3000,
+                 tol: float = 1e-9):
+        if method not in OPTIMIZATION_METHODS:
+            raise ValueError(f"不支持的优化方法: {method}，可选: {', '.join(OPTIMIZATION_METHODS)}")
+        
+        self.method = method
+        self.max_position_size = (max_position_size if max_position_size is not None
+                                  else get_setting("risk_management", "max_position_size", 0.1))
+        self.sector_caps = dict(sector_caps or {})
+        self.max_sector_weight = max_sector_weight
+        self.risk_aversion = risk_aversion
+        self.return_shrinkage = return_shrinkage
+        self.lookback = lookback
+        self.max_iter = max_iter
+        self.tol = tol
+    
+    def estimate(self, returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+        """年化预期收益（向截面均值收缩）与年化收缩协方差"""
+        covariance, shrinkage = ledoit_wolf_covariance(returns)
+        mean, covariance = self._annualize(np.nanmean(to_accumulator(returns), axis=1), covariance)
+        return mean, covariance, shrinkage
+    
+    def _annualize(self, mean: np.ndarray, covariance: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        mean = (1 - self.return_shrinkage) * mean + self.return_shrinkage * mean.mean()
+        return mean * TRADING_DAYS, covariance * TRADING_DAYS
+    
+    def _group_caps(self, symbols: Sequence[str],
+                    sectors: Optional[Dict[str, str]]) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], List[str]]:
+        """行业下标与行业上限（未设置行业约束时返回None）"""
+        if not sectors or (not self.sector_caps and self.max_sector_weight is None):
+            return None, None, []
+        names = sorted({sectors.get(s) or "未知" for s in symbols})
+        index = {name: i for i, name in enumerate(names)}
+        groups = np.array([index[sectors.get(s) or "未知"] for s in symbols], dtype=np.int64)
+        default = self.max_sector_weight if self.max_sector_weight is not None else 1.0
+        caps = np.array([self.sector_caps.get(name, default) for name in names], dtype=np.float64)
+        return groups, caps, names
+    
+    def _projector(self, groups: Optional[np.ndarray], caps: Optional[np.ndarray]):
+        upper = self.max_position_size
+        if groups is None:
+            return lambda v: project_capped_simplex(v, upper)
+        return lambda v: project_sector_caps(v, upper, groups, caps)
+    
+    def _solve_quadratic(self, mean: np.ndarray, covariance: np.ndarray, project) -> Tuple[np.ndarray, int, bool]:
+        """FISTA求解 min λ/2·w'Σw - μ'w（最小方差时μ=0、λ=1）"""
+        if self.method == "min_variance":
+            scale, linear = 1.0, np.zeros_like(mean)
+        else:
+            scale, linear = self.risk_aversion, mean
+        
+        # 步长取Hessian最大特征值的倒数（幂迭代估计并留余量）
+        vector = np.ones(len(mean)) / math.sqrt(len(mean))
+        for _ in range(30):
+            vector = covariance @ vector
+            vector /= np.linalg.norm(vector)
+        lipschitz = 1.1 * scale * float(vector @ covariance @ vector)
+        step = 1.0 / lipschitz if lipschitz > 0 else 1.0
+        
+        w = project(np.full(len(mean), 1.0 / len(mean)))
+        z, t = w.copy(), 1.0
+        for iteration in range(1, self.max_iter + 1):
+            w_next = project(z - step * (scale * (covariance @ z) - linear))
+            if np.max(np.abs(w_next - w)) < self.tol:
+                return w_next, iteration, True
+            # 动量方向与下降方向相反时重置动量（自适应重启）
+            if np.dot(z - w_next, w_next - w) > 0:
+                t = 1.0
+            t_next = (1 + math.sqrt(1 + 4 * t * t)) / 2
+            z = w_next + ((t - 1) / t_next) * (w_next - w)
+            w, t = w_next, t_next
+        return w, self.max_iter, False
+    
+    def _solve_risk_parity(self, covariance: np.ndarray, project,
+                           sweeps: int = 500) -> Tuple[np.ndarray, int, bool]:
+        """循环坐标下降求解 min ½y'Σy - Σ b·log(y)，归一化后各资产风险贡献相等"""
+        n = len(covariance)
+        budget = np.full(n, 1.0 / n)
+        diagonal = np.diag(covariance)
+        y = 1.0 / np.sqrt(diagonal)
+        y /= y.sum()
+        sigma_y = covariance @ y
+        
+        converged, sweep = False, 0
+        for sweep in range(1, sweeps + 1):
+            previous = y.copy()
+            for i in range(n):
+                off_diagonal = sigma_y[i] - diagonal[i] * y[i]
+                value = (-off_diagonal + math.sqrt(off_diagonal ** 2 + 4 * diagonal[i] * budget[i])) / (2 * diagonal[i])
+                sigma_y += covariance[:, i] * (value - y[i])
+                y[i] = value
+            if np.max(np.abs(y - previous) / previous) < 1e-8:
+                converged = True
+                break
+        
+        # 仓位或行业上限生效时投影到可行域（风险贡献不再严格相等）
+        return project(y / y.sum()), sweep, converged
+    
+    def optimize_returns(self, returns: np.ndarray, symbols: Sequence[str],
+                         sectors: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """对收益率矩阵 (股票数, 期数) 求解组合权重"""
+        symbols = list(symbols)
+        returns = to_accumulator(returns)
+        usable = (~np.isnan(returns)).sum(axis=1) >= MIN_OBSERVATIONS
+        excluded = [s for s, ok in zip(symbols, usable) if not ok]
+        returns = returns[usable]
+        if len(returns) < 2:
+            return {"error": "有效历史数据的股票不足2只", "excluded": excluded}
+        
+        covariance, shrinkage = ledoit_wolf_covariance(returns)
+        return self.optimize_covariance([s for s, ok in zip(symbols, usable) if ok],
+                                        np.nanmean(returns, axis=1), covariance, sectors,
+                                        shrinkage=shrinkage, observations=returns.shape[1],
+                                        excluded=excluded)
+    
+    def optimize_covariance(self, symbols: Sequence[str], mean: np.ndarray, covariance: np.ndarray,
+                            sectors: Optional[Dict[str, str]] = None,
+                            shrinkage: Optional[float] = None,
+                            observations: Optional[int] = None,
+                            excluded: Sequence[str] = ()) -> Dict[str, Any]:
+        """由日收益均值与（已收缩的）日协方差求解组合权重，供外部维护的协方差矩阵使用"""
+        symbols = list(symbols)
+        excluded = list(excluded)
+        if len(symbols) < 2:
+            return {"error": "有效历史数据的股票不足2只", "excluded": excluded}
+        if self.max_position_size * len(symbols) < 1 - 1e-9:
+            return {"error": f"单只仓位上限{self.max_position_size:.0%}下，{len(symbols)}只股票无法满仓配置",
+                    "excluded": excluded}
+        
+        groups, caps, sector_names = self._group_caps(symbols, sectors)
+        if groups is not None:
+            capacity = np.minimum(caps, np.bincount(groups, minlength=len(caps)) * self.max_position_size)
+            if capacity.sum() < 1 - 1e-9:
+                return {"error": "行业上限过严，无法满仓配置", "excluded": excluded}
+        
+        mean, covariance = self._annualize(to_accumulator(mean), to_accumulator(covariance))
+        project = self._projector(groups, caps)
+        if self.method == "risk_parity":
+            weights, iterations, converged = self._solve_risk_parity(covariance, project)
+        else:
+            weights, iterations, converged = self._solve_quadratic(mean, covariance, project)
+        
+        weights = np.where(weights < 1e-8, 0.0, weights)
+        weights /= weights.sum()
+        risk = risk_contributions(weights, covariance)
+        expected_return = float(mean @ weights)
+        individual_volatility = np.sqrt(np.diag(covariance))
+        
+        order = np.argsort(-weights, kind="stable")
+        holdings = [
+            {
+                "symbol": symbols[i],
+                "weight": float(weights[i]),
+                "expected_return": float(mean[i]),
+                "volatility": float(individual_volatility[i]),
+                "marginal_risk": float(risk["marginal"][i]),
+                "risk_contribution": float(risk["contribution"][i]),
+                "risk_share": float(risk["share"][i]),
+                **({"sector": sector_names[groups[i]]} if groups is not None else {})
+            }
+            for i in order if weights[i] > 0
+        ]
+        
+        result = {
+            "method": self.method,
+            "holdings": holdings,
+            "expected_return": expected_return,
+            "expected_volatility": risk["volatility"],
+            "sharpe_ratio": expected_return / risk["volatility"] if risk["volatility"] > 0 else 0.0,
+            "diversification_ratio": float(weights @ individual_volatility / risk["volatility"]) if risk["volatility"] > 0 else 0.0,
+            "effective_holdings": float(1 / np.sum(weights ** 2)),
+            "constraints": {
+                "max_position_size": self.max_position_size,
+                "sector_caps": {name: float(cap) for name, cap in zip(sector_names, caps)} if groups is not None else {}
+            },
+            "shrinkage": shrinkage,
+            "observations": observations,
+            "iterations": iterations,
+            "converged": converged,
+            "excluded": excluded
+        }
+        if groups is not None:
+            sector_weights = np.bincount(groups, weights=weights, minlength=len(sector_names))
+            result["sector_weights"] = {name: float(w) for name, w in zip(sector_names, sector_weights) if w > 0}
+        return result
+    
+    def optimize(self, panel: BarPanel, sectors: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """对面板中的股票求解组合权重，sectors为 股票代码 -> 行业"""
+        return self.optimize_returns(panel_returns(panel, self.lookback), panel.symbols, sectors)
+
+# 快捷函数
+def optimize_portfolio(panel: BarPanel, method: str = "min_variance",
+                       sectors: Optional[Dict[str, str]] = None, **options) -> Dict[str, Any]:
+    """求解面板中股票的优化组合"""
+    return PortfolioOptimizer(method, **options).optimize(panel, sectors)
@@ -0,0 +1,49 @@
+"""
+分段推送模块
+长耗时的报告按部分逐个完成，每完成一部分即通过 MCP 进度通知推送该部分的结构化结果，
+客户端无需等待最慢的数据源即可先展示已完成的部分；全部完成后工具仍返回汇总的完整结果。
+
+进度通知的 message 为 JSON 字符串：{"section": 部分名, "data": 部分结果}，
+progress/total 为已完成部分数与部分总数。
+"""
+
+import json
+import logging
+from typing import Dict, List, Optional, Any, Sequence
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SectionStream:
+    """按完成顺序推送报告部分"""
+    
+    def __init__(self, ctx, sections: Sequence[str]):
+        self.ctx = ctx
+        self.sections = tuple(sections)
+        self.results: Dict[str, Any] = {}
+    
+    @property
+    def completed(self) -> int:
+        return len(self.results)
+    
+    def pending(self) -> List[str]:
+        """尚未推送的部分"""
+        return [name for name in self.sections if name not in self.results]
+    
+    async def emit(self, section: str, data: Any, message: Optional[str] = None):
+        """记录并推送一个已完成的部分（推送失败只记录日志，不影响报告生成）"""
+        if section not in self.sections:
+            raise ValueError(f"未声明的报告部分: {section}")
+        if section in self.results:
+            raise ValueError(f"报告部分 {section} 已推送")
+        
+        self.results[section] = data
+        payload = {"section": section, "data": data}
+        if message:
+            payload["message"] = message
+        try:
+            await self.ctx.report_progress(self.completed, len(self.sections),
+                                           json.dumps(payload, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning(f"推送报告部分 {section} 失败: {e}")
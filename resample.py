@@ -0,0 +1,142 @@
+"""
+多周期K线重采样模块
+将低周期K线聚合为高周期（分钟线 → 5/15/30/60分钟 → 日/周/月线），
+分钟级聚合按A股交易时段划分，支持批量与增量两种模式
+"""
+
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from bars import Bars
+
+# 分钟周期（分钟数）
+MINUTE_TIMEFRAMES = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "60m": 60}
+# 日及以上周期
+CALENDAR_TIMEFRAMES = ("daily", "weekly", "monthly")
+
+# A股连续竞价时段（距零点的分钟数）：上午 9:30-11:30，下午 13:00-15:00
+MORNING_OPEN = 9 * 60 + 30
+MORNING_CLOSE = 11 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+SESSION_MINUTES = 120
+
+def _session_minutes(dates: np.ndarray) -> np.ndarray:
+    """K线结束时刻对应的当日已交易分钟数（上午1-120，下午121-240）"""
+    minute_of_day = ((dates - dates.astype("datetime64[D]")) // np.timedelta64(1, "m")).astype(np.int64)
+    morning = np.clip(minute_of_day - MORNING_OPEN, 0, SESSION_MINUTES)
+    afternoon = np.clip(minute_of_day - AFTERNOON_OPEN, 0, SESSION_MINUTES)
+    elapsed = np.where(minute_of_day > MORNING_CLOSE, SESSION_MINUTES + afternoon, morning)
+    # 集合竞价产生的9:30K线并入第一个区间
+    return np.maximum(elapsed, 1)
+
+def group_keys(dates: np.ndarray, timeframe: str) -> np.ndarray:
+    """计算每根K线所属高周期分组的键，相邻K线键相同即属于同一根高周期K线"""
+    dates = np.asarray(dates, dtype="datetime64[s]")
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    
+    if timeframe in MINUTE_TIMEFRAMES:
+        bucket = (_session_minutes(dates) - 1) // MINUTE_TIMEFRAMES[timeframe]
+        return days * 1000 + bucket
+    if timeframe == "daily":
+        return days
+    if timeframe == "weekly":
+        # 1970-01-01为周四，平移3天后按周一为一周起点
+        return (days + 3) // 7
+    if timeframe == "monthly":
+        return dates.astype("datetime64[M]").astype(np.int64)
+    
+    raise ValueError(f"不支持的周期: {timeframe}")
+
+def resample(bars: Bars, timeframe: str) -> Bars:
+    """将K线批量聚合为高周期K线（以各组最后一根K线的时间为标签）"""
+    if len(bars) == 0:
+        return bars
+    
+    keys = group_keys(bars.dates, timeframe)
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    ends = np.concatenate((starts[1:], [len(bars)])) - 1
+    
+    return Bars(
+        dates=bars.dates[ends],
+        open=bars.open[starts],
+        high=np.maximum.reduceat(bars.high, starts),
+        low=np.minimum.reduceat(bars.low, starts),
+        close=bars.close[ends],
+        volume=np.add.reduceat(bars.volume, starts, dtype=np.float64),
+        amount=np.add.reduceat(bars.amount, starts, dtype=np.float64),
+        symbol=bars.symbol,
+        dtype=bars.dtype
+    )
+
+class IncrementalResampler:
+    """增量重采样器：随低周期K线到达维护高周期K线"""
+    
+    def __init__(self, timeframe: str, symbol: str = ""):
+        group_keys(np.empty(0, dtype="datetime64[s]"), timeframe)
+        self.timeframe = timeframe
+        self.symbol = symbol
+        self._completed: Dict[str, List[Any]] = {name: [] for name in ("date",) + Bars.FIELDS}
+        self._current: Optional[Dict[str, Any]] = None
+        self._current_key = None
+    
+    def __len__(self) -> int:
+        return len(self._completed["date"]) + (1 if self._current else 0)
+    
+    def update(self, date, open: float, high: float, low: float, close: float,
+               volume: float = 0.0, amount: float = 0.0) -> Optional[Dict[str, Any]]:
+        """加入一根低周期K线；若因此完成了一根高周期K线则返回该K线"""
+        date = np.datetime64(date, "s")
+        key = group_keys(np.array([date]), self.timeframe)[0]
+        finished = None
+        
+        if self._current is not None and key != self._current_key:
+            finished = self._finalize()
+        
+        if self._current is None:
+            self._current = {"date": date, "open": open, "high": high, "low": low,
+                             "close": close, "volume": volume, "amount": amount}
+            self._current_key = key
+        else:
+            bar = self._current
+            bar["date"] = date
+            bar["high"] = max(bar["high"], high)
+            bar["low"] = min(bar["low"], low)
+            bar["close"] = close
+            bar["volume"] += volume
+            bar["amount"] += amount
+        
+        return finished
+    
+    def extend(self, bars: Bars) -> List[Dict[str, Any]]:
+        """依次加入一组K线，返回期间完成的高周期K线"""
+        finished = []
+        for i in range(len(bars)):
+            bar = self.update(bars.dates[i], bars.open[i], bars.high[i], bars.low[i],
+                              bars.close[i], bars.volume[i], bars.amount[i])
+            if bar is not None:
+                finished.append(bar)
+        return finished
+    
+    def _finalize(self) -> Dict[str, Any]:
+        bar = self._current
+        for name, values in self._completed.items():
+            values.append(bar[name])
+        self._current = None
+        self._current_key = None
+        return bar
+    
+    @property
+    def current(self) -> Optional[Dict[str, Any]]:
+        """尚未完成的高周期K线"""
+        return dict(self._current) if self._current else None
+    
+    def bars(self, include_current: bool = True) -> Bars:
+        """当前全部高周期K线（默认包含未完成的最后一根）"""
+        columns = {name: list(values) for name, values in self._completed.items()}
+        if include_current and self._current:
+            for name in columns:
+                columns[name].append(self._current[name])
+        
+        return Bars(columns["date"], columns["open"], columns["high"], columns["low"],
+                    columns["close"], columns["volume"], columns["amount"], symbol=self.symbol)
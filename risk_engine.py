@@ -0,0 +1,276 @@
+"""
+风险引擎模块
+由历史收盘价计算已实现波动率、下行偏差、最大回撤，以及多个持有期的历史模拟法与参数法
+VaR/CVaR，并对照 config.json 中 risk_management 的止损比例与最大回撤阈值
+
+计算按 (股票数, 期数) 矩阵向量化进行，单只股票、全市场批量与组合（按权重合成净值）共用同一实现；
+单只股票结果按 (股票代码, 最后交易日) 缓存，同一交易日内重复查询直接返回。
+"""
+
+import logging
+import math
+from collections import OrderedDict
+from statistics import NormalDist
+from typing import Dict, List, Optional, Any, Sequence, Tuple, Union
+
+import numpy as np
+
+from bars import Bars, BarPanel
+from config_loader import get_setting
+from dtype_policy import to_accumulator
+from portfolio_optimizer import ledoit_wolf_covariance, risk_contributions
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+DEFAULT_CONFIDENCES = (0.95, 0.99)
+DEFAULT_HORIZONS = (1, 5, 21)
+
+class RiskEngine:
+    """风险引擎"""
+    
+    def __init__(self, confidences: Sequence[float] = DEFAULT_CONFIDENCES,
+                 horizons: Sequence[int] = DEFAULT_HORIZONS,
+                 lookback: int = 250,
+                 min_returns: int = 30,
+                 stop_loss: float = 0.08,
+                 max_drawdown_threshold: float = 0.2,
+                 cache_size: int = 4096):
+        if any(not 0.5 < c < 1 for c in confidences):
+            raise ValueError("置信度必须在 0.5 到 1 之间")
+        if any(h < 1 for h in horizons):
+            raise ValueError("持有期必须为正整数")
+        
+        self.confidences = tuple(sorted(set(confidences)))
+        self.horizons = tuple(sorted(set(horizons)))
+        self.lookback = lookback
+        self.min_returns = min_returns
+        self.stop_loss = stop_loss
+        self.max_drawdown_threshold = max_drawdown_threshold
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, int], Dict[str, Any]]" = OrderedDict()
+    
+    @classmethod
+    def from_config(cls, **overrides) -> "RiskEngine":
+        """按 config.json 的 risk_management 配置创建，overrides覆盖配置项"""
+        params = {
+            "stop_loss": get_setting("risk_management", "stop_loss_percentage", 0.08),
+            "max_drawdown_threshold": get_setting("risk_management", "max_drawdown_threshold", 0.2)
+        }
+        for name, key in (("confidences", "var_confidences"), ("horizons", "var_horizons"),
+                          ("lookback", "risk_lookback")):
+            value = get_setting("risk_management", key, None)
+            if value is not None:
+                params[name] = value
+        params.update(overrides)
+        return cls(**params)
+    
+    def measure(self, closes: np.ndarray) -> List[Dict[str, Any]]:
+        """计算收盘价矩阵 (股票数, 期数) 每一行的风险指标（有效收益不足时该行为错误信息）"""
+        closes = to_accumulator(np.atleast_2d(closes))[:, -(self.lookback + 1):]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_returns = np.log(closes[:, 1:] / closes[:, :-1])
+        valid = ~np.isnan(log_returns)
+        counts = valid.sum(axis=1)
+        enough = counts >= self.min_returns
+        
+        with np.errstate(invalid="ignore", divide="ignore"):
+            simple = np.expm1(log_returns)
+            mean_log = np.nansum(log_returns, axis=1) / counts
+            std_log = np.sqrt(np.nansum((log_returns - mean_log[:, None]) ** 2, axis=1) / (counts - 1))
+            std_simple = np.sqrt(np.nansum((simple - (np.nansum(simple, axis=1) / counts)[:, None]) ** 2, axis=1)
+                                 / (counts - 1))
+            downside = np.sqrt(np.nansum(np.minimum(simple, 0) ** 2, axis=1) / counts)
+            
+            # 回撤（相对区间内最高收盘价）
+            peak = np.fmax.accumulate(closes, axis=1)
+            drawdown = 1 - closes / peak
+        max_drawdown = np.nanmax(np.where(np.isnan(drawdown), -np.inf, drawdown), axis=1)
+        last_column = closes.shape[1] - 1 - np.argmax(~np.isnan(closes[:, ::-1]), axis=1)
+        current_drawdown = drawdown[np.arange(len(closes)), last_column]
+        
+        # 各持有期的重叠区间收益（只使用区间内收益完整的窗口），按行排序后一次求出全部分位
+        cumulative = np.concatenate([np.zeros((len(closes), 1)), np.cumsum(np.nan_to_num(log_returns), axis=1)], axis=1)
+        valid_cumulative = np.concatenate([np.zeros((len(closes), 1)), np.cumsum(valid, axis=1)], axis=1)
+        tails = {}
+        for h in self.horizons:
+            if h > log_returns.shape[1]:
+                continue
+            complete = (valid_cumulative[:, h:] - valid_cumulative[:, :-h]) == h
+            period = np.sort(np.where(complete, np.expm1(cumulative[:, h:] - cumulative[:, :-h]), np.nan), axis=1)
+            windows = complete.sum(axis=1)
+            tails[f"{h}d"] = self._tail_metrics(period, windows, mean_log * h, std_log * math.sqrt(h))
+        
+        results = []
+        for i in range(len(closes)):
+            if not enough[i]:
+                results.append({"error": f"历史数据不足（至少需要{self.min_returns}个收益率）",
+                                "observations": int(counts[i])})
+                continue
+            
+            var, cvar, stop_loss_probability = {}, {}, {}
+            for key, tail in tails.items():
+                if tail["windows"][i] < self.min_returns // 2:
+                    continue
+                var[key] = {level: {"historical": float(values["historical_var"][i]),
+                                    "parametric": float(values["parametric_var"][i])}
+                            for level, values in tail["levels"].items()}
+                cvar[key] = {level: {"historical": float(values["historical_cvar"][i]),
+                                     "parametric": float(values["parametric_cvar"][i])}
+                             for level, values in tail["levels"].items()}
+                stop_loss_probability[key] = float(tail["stop_loss_probability"][i])
+            
+            results.append({
+                "observations": int(counts[i]),
+                "annualized_volatility": float(std_simple[i] * math.sqrt(TRADING_DAYS)),
+                "downside_deviation": float(downside[i] * math.sqrt(TRADING_DAYS)),
+                "max_drawdown": float(max_drawdown[i]),
+                "current_drawdown": float(np.nan_to_num(current_drawdown[i])),
+                "var": var,
+                "cvar": cvar,
+                "stop_loss_probability": stop_loss_probability,
+                "thresholds": {"stop_loss": self.stop_loss, "max_drawdown": self.max_drawdown_threshold},
+                "drawdown_breached": bool(max_drawdown[i] > self.max_drawdown_threshold)
+            })
+        return results
+    
+    def _tail_metrics(self, period: np.ndarray, windows: np.ndarray,
+                      mu: np.ndarray, sigma: np.ndarray) -> Dict[str, Any]:
+        """由按行升序排列（NaN在末尾）的区间收益矩阵计算各置信度的VaR/CVaR"""
+        rows = np.arange(len(period))
+        n = np.maximum(windows, 1)
+        filled = np.nan_to_num(period)
+        running = np.cumsum(filled, axis=1)
+        
+        levels = {}
+        for c in self.confidences:
+            # 历史模拟法：左尾分位（线性插值，与np.percentile一致）与不高于分位的收益均值
+            position = (1 - c) * (n - 1)
+            low = np.floor(position).astype(np.int64)
+            high = np.minimum(low + 1, n - 1)
+            fraction = position - low
+            quantile = filled[rows, low] * (1 - fraction) + filled[rows, high] * fraction
+            in_tail = np.maximum(np.sum((period <= quantile[:, None]) & (np.arange(period.shape[1]) < n[:, None]), axis=1), 1)
+            tail_mean = running[rows, in_tail - 1] / in_tail
+            
+            # 参数法：对数收益服从正态分布
+            z = NormalDist().inv_cdf(c)
+            density = math.exp(-z * z / 2) / math.sqrt(2 * math.pi)
+            with np.errstate(invalid="ignore"):
+                levels[f"{round(c * 100):d}"] = {
+                    "historical_var": -quantile,
+                    "historical_cvar": -tail_mean,
+                    "parametric_var": -np.expm1(mu - z * sigma),
+                    "parametric_cvar": -np.expm1(mu - sigma * density / (1 - c))
+                }
+        
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stop_loss_probability = np.sum(period <= -self.stop_loss, axis=1) / n
+        return {"windows": windows, "levels": levels, "stop_loss_probability": stop_loss_probability}
+    
+    def evaluate(self, data: Union[Bars, Sequence[float]], symbol: str = "") -> Dict[str, Any]:
+        """单只股票的风险指标（输入为Bars时按最后交易日缓存）"""
+        if isinstance(data, Bars):
+            symbol = symbol or data.symbol
+            if len(data) == 0:
+                return {"error": "没有历史数据"}
+            key = (symbol, str(data.dates[-1]), self.lookback)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            result = self.measure(data.close[None, :])[0]
+            self._remember(key, result)
+            return result
+        
+        closes = np.asarray(data, dtype=np.float64)
+        if closes.size == 0:
+            return {"error": "没有历史数据"}
+        return self.measure(closes[None, :])[0]
+    
+    def _remember(self, key: Tuple[str, str, int], result: Dict[str, Any]):
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def evaluate_many(self, panel: BarPanel) -> Dict[str, Dict[str, Any]]:
+        """批量计算面板中全部股票的风险指标（已缓存的股票只查表，其余一次矩阵计算）"""
+        if len(panel) == 0:
+            return {}
+        close = panel.close
+        has_data = ~np.isnan(close)
+        last_column = close.shape[1] - 1 - np.argmax(has_data[:, ::-1], axis=1)
+        keys = [(symbol, str(panel.dates[last_column[i]]), self.lookback)
+                for i, symbol in enumerate(panel.symbols)]
+        
+        results = {}
+        pending = []
+        for i, key in enumerate(keys):
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                results[key[0]] = self._cache[key]
+            elif has_data[i].any():
+                pending.append(i)
+            else:
+                results[key[0]] = {"error": "没有历史数据", "observations": 0}
+        
+        # 按各股票的最后交易日截取窗口，保证与单只计算一致
+        if pending:
+            rows = np.array(pending)
+            width = self.lookback + 1
+            offsets = last_column[rows][:, None] - np.arange(width)[::-1]
+            window = np.where(offsets >= 0, close[rows[:, None], np.maximum(offsets, 0)], np.nan)
+            for i, result in zip(pending, self.measure(window)):
+                results[keys[i][0]] = result
+                self._remember(keys[i], result)
+        
+        return {symbol: results[symbol] for symbol in panel.symbols}
+    
+    def portfolio(self, weights: Dict[str, float], panel: BarPanel) -> Dict[str, Any]:
+        """按权重合成组合日收益（缺失收益按0计）并计算组合风险与各成分的VaR贡献"""
+        rows = [panel.symbols.index(s) for s in weights if s in panel.symbols]
+        missing = [s for s in weights if s not in panel.symbols]
+        if not rows:
+            return {"error": "组合中的股票均无历史数据", "missing": missing}
+        
+        w = np.array([weights[panel.symbols[r]] for r in rows], dtype=np.float64)
+        total = w.sum()
+        if total <= 0:
+            return {"error": "组合权重之和必须为正"}
+        w = w / total
+        
+        close = to_accumulator(panel.close[rows])[:, -(self.lookback + 1):]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = close[:, 1:] / close[:, :-1] - 1
+        portfolio_returns = w @ np.nan_to_num(returns)
+        nav = np.concatenate([[1.0], np.cumprod(1 + portfolio_returns)])
+        result = self.measure(nav[None, :])[0]
+        if "error" in result:
+            return {**result, "missing": missing}
+        
+        covariance, _ = ledoit_wolf_covariance(returns)
+        risk = risk_contributions(w, covariance)
+        z = NormalDist().inv_cdf(self.confidences[0])
+        symbols = [panel.symbols[r] for r in rows]
+        return {
+            **result,
+            "weights": dict(zip(symbols, w.tolist())),
+            "component_var": {
+                "confidence": self.confidences[0],
+                "horizon": "1d",
+                "total": float(z * risk["volatility"]),
+                "contributions": {s: float(z * c) for s, c in zip(symbols, risk["contribution"])},
+                "shares": {s: float(share) for s, share in zip(symbols, risk["share"])}
+            },
+            "missing": missing
+        }
+    
+    def clear_cache(self):
+        """清空风险指标缓存"""
+        self._cache.clear()
+
+# 快捷函数
+def evaluate_risk(bars: Bars, **options) -> Dict[str, Any]:
+    """按配置计算单只股票的风险指标"""
+    return RiskEngine.from_config(**options).evaluate(bars)
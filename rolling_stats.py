@@ -0,0 +1,152 @@
+"""
+滚动统计模块
+提供数值稳定的滚动均值/标准差计算，包括批量序列与逐个加入新值的流式两种形式
+"""
+
+from collections import deque
+from typing import Dict, Sequence
+
+import numpy as np
+
+from indicator_kernels import MOMENT_RESYNC_RATIO, rolling_mean_std
+
+MOMENT_KEYS = ("mean", "std", "zscore", "upper", "lower", "bandwidth")
+
+class RollingMoments:
+    """流式滚动矩计算器：与 rolling_moments 的循环版使用同一滑动Welford递推，
+    逐个加入新值后的统计量与批量计算在对应位置一致"""
+    
+    def __init__(self, window: int, num_std: float = 2.0):
+        if window < 1:
+            raise ValueError("窗口长度必须为正整数")
+        
+        self.window = window
+        self.num_std = num_std
+        self._values = deque(maxlen=window)
+        # 均值记为相对参考值的偏移（见 indicator_kernels._rolling_moments_loop）
+        self._ref = None
+        self._offset = 0.0
+        self._m2 = 0.0
+        self._peak = 0.0
+        self._steps = 0
+    
+    def __len__(self) -> int:
+        return len(self._values)
+    
+    @property
+    def ready(self) -> bool:
+        """窗口是否已填满"""
+        return len(self._values) == self.window
+    
+    @property
+    def mean(self) -> float:
+        """当前窗口均值"""
+        return self._ref + self._offset if self._values else float("nan")
+    
+    def update(self, value: float) -> Dict[str, float]:
+        """加入新值并返回当前窗口的统计量"""
+        value = float(value)
+        if self._ref is None:
+            self._ref = value
+        d = value - self._ref
+        
+        if self.ready:
+            d_old = self._values[0] - self._ref
+            self._values.append(value)
+            delta = d - d_old
+            new_offset = self._offset + delta / self.window
+            self._m2 += delta * (d - new_offset + d_old - self._offset)
+            self._offset = new_offset
+            self._steps += 1
+        else:
+            self._values.append(value)
+            delta = d - self._offset
+            self._offset += delta / len(self._values)
+            self._m2 += delta * (d - self._offset)
+        if self._m2 > self._peak:
+            self._peak = self._m2
+        
+        # 每滑过一个完整窗口、方差大幅缩小或出现NaN时按当前窗口重算
+        if self.ready and (self._steps >= self.window or not self._m2 >= MOMENT_RESYNC_RATIO * self._peak):
+            self._resync()
+        return self.snapshot()
+    
+    def _resync(self):
+        """以窗口首值为参考值，两遍法重算均值偏移和二阶矩"""
+        ref = self._values[0]
+        offset = 0.0
+        for v in self._values:
+            offset += v - ref
+        offset /= len(self._values)
+        m2 = 0.0
+        for v in self._values:
+            m2 += (v - ref - offset) ** 2
+        self._ref, self._offset, self._m2, self._peak, self._steps = ref, offset, m2, m2, 0
+    
+    def snapshot(self) -> Dict[str, float]:
+        """当前窗口的均值、标准差、Z值和布林带（窗口未填满时为NaN，与 rolling_moments 一致）"""
+        if not self.ready:
+            return {key: float("nan") for key in MOMENT_KEYS}
+        
+        mean = self.mean
+        std = float(np.sqrt(max(self._m2, 0.0) / self.window))
+        upper = mean + std * self.num_std
+        lower = mean - std * self.num_std
+        
+        return {
+            "mean": mean,
+            "std": std,
+            "zscore": (self._values[-1] - mean) / std if std > 0 else 0.0,
+            "upper": upper,
+            "lower": lower,
+            "bandwidth": (upper - lower) / mean if mean != 0 else 0.0
+        }
+
+def rolling_moments(values: Sequence[float], window: int,
+                    num_std: float = 2.0, backend: str = "auto") -> Dict[str, np.ndarray]:
+    """
+    批量计算滚动均值、标准差、Z值和布林带宽序列
+    
+    均值与标准差由 indicator_kernels.rolling_mean_std 计算：循环版（安装numba时JIT编译）一次遍历
+    做滑动Welford递推，方差相对峰值大幅缩小时按窗口重算，价格水平跳变后精度不受影响；
+    NumPy版为窗口视图上的两遍法。窗口未填满的位置为NaN，标准差为总体标准差。
+    """
+    if window < 1:
+        raise ValueError("窗口长度必须为正整数")
+    
+    x = np.asarray(values, dtype=np.float64)
+    n = x.size
+    
+    result = {key: np.full(n, np.nan) for key in MOMENT_KEYS}
+    if n < window:
+        return result
+    
+    mean, std = (row[0] for row in rolling_mean_std(x, window, backend))
+    mean, std = mean[window - 1:], std[window - 1:]
+    
+    upper = mean + std * num_std
+    lower = mean - std * num_std
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zscore = np.where(std > 0, (x[window - 1:] - mean) / std, 0.0)
+        bandwidth = np.where(mean != 0, (upper - lower) / mean, 0.0)
+    
+    result["mean"][window - 1:] = mean
+    result["std"][window - 1:] = std
+    result["zscore"][window - 1:] = zscore
+    result["upper"][window - 1:] = upper
+    result["lower"][window - 1:] = lower
+    result["bandwidth"][window - 1:] = bandwidth
+    
+    return result
+
+def simple_returns(prices: Sequence[float], percent: bool = False) -> np.ndarray:
+    """计算简单收益率序列"""
+    x = np.asarray(prices, dtype=np.float64)
+    if x.size < 2:
+        return np.empty(0)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = x[1:] / x[:-1] - 1.0
+    
+    return returns * 100 if percent else returns
@@ -0,0 +1,195 @@
+"""
+蒙特卡洛情景模拟模块
+根据历史收益率统计量为每只股票生成数万条价格路径（几何布朗运动、历史收益自助抽样、
+t分布厚尾），由路径分布得到牛/熊/基准情景概率、分位价格带与期望值
+
+同一随机种子下结果可复现；随机数流由 (种子, 股票代码) 派生，
+因此单只股票模拟与批量模拟的结果一致，与批量中的股票顺序无关。
+"""
+
+import logging
+import zlib
+from typing import Dict, List, Optional, Any, Sequence, Union
+
+import numpy as np
+
+from bars import Bars, BarPanel
+from config_loader import get_setting
+from dtype_policy import to_accumulator
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SIMULATION_MODELS = ("gbm", "bootstrap", "student_t")
+DRIFT_MODES = ("historical", "zero")
+# 价格带输出的分位数
+BAND_PERCENTILES = (5, 25, 50, 75, 95)
+# 估计收益率统计量所需的最少样本数
+MIN_RETURNS = 30
+# 路径矩阵的存储精度：单条路径不超过数百期，float32累加误差远小于抽样误差，
+# 而内存带宽减半（统计量仍以float64计算）
+PATH_DTYPE = np.float32
+
+def log_returns(closes: Sequence[float]) -> np.ndarray:
+    """对数收益率（忽略NaN与非正价格）"""
+    prices = to_accumulator(np.asarray(closes, dtype=np.float64))
+    prices = prices[~np.isnan(prices) & (prices > 0)]
+    return np.diff(np.log(prices)) if len(prices) > 1 else np.array([])
+
+class ScenarioSimulator:
+    """蒙特卡洛情景模拟器"""
+    
+    def __init__(self, n_paths: int = 20000,
+                 horizon: int = 63,
+                 model: str = "gbm",
+                 drift: str = "historical",
+                 df: float = 4.0,
+                 lookback: int = 250,
+                 bull_threshold: float = 0.15,
+                 bear_threshold: float = -0.15,
+                 checkpoints: Sequence[int] = (5, 21, 63),
+                 seed: Optional[int] = 0):
+        if model not in SIMULATION_MODELS:
+            raise ValueError(f"不支持的模拟模型: {model}，可选: {', '.join(SIMULATION_MODELS)}")
+        if drift not in DRIFT_MODES:
+            raise ValueError(f"不支持的漂移设定: {drift}")
+        if model == "student_t" and df <= 2:
+            raise ValueError("t分布自由度必须大于2")
+        
+        self.n_paths = n_paths
+        self.horizon = horizon
+        self.model = model
+        self.drift = drift
+        self.df = df
+        self.lookback = lookback
+        self.bull_threshold = bull_threshold
+        self.bear_threshold = bear_threshold
+        self.checkpoints = tuple(sorted({c for c in checkpoints if 0 < c <= horizon} | {horizon}))
+        self.seed = seed
+    
+    @classmethod
+    def from_config(cls, **overrides) -> "ScenarioSimulator":
+        """按 config.json 的 simulation 配置创建，overrides覆盖配置项"""
+        params = {}
+        for name in ("n_paths", "horizon", "model", "drift", "df", "lookback",
+                     "bull_threshold", "bear_threshold", "seed"):
+            value = get_setting("simulation", name, None)
+            if value is not None:
+                params[name] = value
+        params.update(overrides)
+        return cls(**params)
+    
+    def _rng(self, symbol: str) -> np.random.Generator:
+        if self.seed is None:
+            return np.random.default_rng()
+        return np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+    
+    def _path_returns(self, returns: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """生成 (期数, 路径数) 的单期对数收益率（按时间排列行，沿时间累加时访问连续内存）"""
+        shape = (self.horizon, self.n_paths)
+        mu = float(returns.mean()) if self.drift == "historical" else 0.0
+        
+        if self.model == "bootstrap":
+            # 自助抽样保留历史收益的厚尾与偏度，零漂移时先去均值
+            sample = (returns - returns.mean() + mu).astype(PATH_DTYPE)
+            return sample[rng.integers(0, len(sample), size=shape)]
+        
+        sigma = float(returns.std(ddof=1))
+        if self.model == "student_t":
+            # 缩放t分布使其方差等于历史方差
+            shocks = rng.standard_t(self.df, size=shape).astype(PATH_DTYPE)
+            sigma *= np.sqrt((self.df - 2) / self.df)
+        else:
+            shocks = rng.standard_normal(size=shape, dtype=PATH_DTYPE)
+        shocks *= PATH_DTYPE(sigma)
+        shocks += PATH_DTYPE(mu)
+        return shocks
+    
+    def simulate(self, closes: Union[Sequence[float], Bars], symbol: str = "") -> Dict[str, Any]:
+        """模拟单只股票，返回情景概率、价格带与期望值"""
+        if isinstance(closes, Bars):
+            symbol = symbol or closes.symbol
+            closes = closes.close
+        prices = to_accumulator(np.asarray(closes, dtype=np.float64))
+        prices = prices[~np.isnan(prices)]
+        returns = log_returns(prices)[-self.lookback:]
+        if len(returns) < MIN_RETURNS:
+            return {"error": f"历史数据不足（至少需要{MIN_RETURNS}个收益率）"}
+        
+        start_price = float(prices[-1])
+        rng = self._rng(symbol)
+        cumulative = self._path_returns(returns, rng)
+        np.cumsum(cumulative, axis=0, out=cumulative)
+        terminal_return = np.expm1(cumulative[-1].astype(np.float64))
+        terminal_price = start_price * (1 + terminal_return)
+        
+        bull = terminal_return >= self.bull_threshold
+        bear = terminal_return <= self.bear_threshold
+        base = ~bull & ~bear
+        
+        def scenario(mask: np.ndarray) -> Dict[str, Any]:
+            probability = float(mask.mean())
+            return {
+                "probability": probability * 100,
+                "price_target": float(terminal_price[mask].mean()) if probability else None,
+                "expected_return": float(terminal_return[mask].mean()) if probability else None
+            }
+        
+        # 各检查点的分位价格带
+        rows = [c - 1 for c in self.checkpoints]
+        band_prices = start_price * np.exp(np.percentile(cumulative[rows].astype(np.float64),
+                                                         BAND_PERCENTILES, axis=1))
+        bands = {
+            f"{c}d": {f"p{p}": float(band_prices[i, j]) for i, p in enumerate(BAND_PERCENTILES)}
+            for j, c in enumerate(self.checkpoints)
+        }
+        
+        # 路径最大回撤（相对起始价与路径高点），逐期更新避免再分配整个路径矩阵
+        peak = np.zeros(self.n_paths, dtype=PATH_DTYPE)
+        deepest = np.zeros(self.n_paths, dtype=PATH_DTYPE)
+        for row in cumulative:
+            np.maximum(peak, row, out=peak)
+            np.minimum(deepest, row - peak, out=deepest)
+        max_drawdown = -np.expm1(deepest.astype(np.float64))
+        var_95 = float(-np.percentile(terminal_return, 5))
+        
+        return {
+            "symbol": symbol,
+            "model": self.model,
+            "n_paths": self.n_paths,
+            "horizon_days": self.horizon,
+            "start_price": start_price,
+            "daily_drift": float(returns.mean()) if self.drift == "historical" else 0.0,
+            "daily_volatility": float(returns.std(ddof=1)),
+            "bull_scenario": scenario(bull),
+            "bear_scenario": scenario(bear),
+            "base_scenario": scenario(base),
+            "expected_value": float(terminal_price.mean()),
+            "expected_return": float(terminal_return.mean()),
+            "probability_of_loss": float((terminal_return < 0).mean()),
+            "value_at_risk_95": var_95,
+            "expected_shortfall_95": float(-terminal_return[terminal_return <= -var_95].mean()),
+            "median_max_drawdown": float(np.median(max_drawdown)),
+            "price_bands": bands
+        }
+    
+    def simulate_many(self, data: Union[BarPanel, Dict[str, Sequence[float]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量模拟：输入面板或 股票代码 -> 收盘价序列，返回 股票代码 -> 模拟结果
+        
+        仅为便于调用的包装，按股票逐只调用 simulate，不一次生成 (股票, 期数, 路径) 三维矩阵：
+        单只股票的计算已在 (期数, 路径) 矩阵上向量化，而三维矩阵在默认参数下
+        每500只股票约占2.5GB；且每只股票使用各自派生的随机数流，结果与批量顺序无关。
+        """
+        if isinstance(data, BarPanel):
+            close = data.close
+            series = {symbol: close[i] for i, symbol in enumerate(data.symbols)}
+        else:
+            series = data
+        return {symbol: self.simulate(closes, symbol) for symbol, closes in series.items()}
+
+# 快捷函数
+def simulate_scenarios(bars: Bars, **options) -> Dict[str, Any]:
+    """按配置模拟单只股票的情景"""
+    return ScenarioSimulator.from_config(**options).simulate(bars)
@@ -0,0 +1,403 @@
+"""
+评分规则模块
+评分规则以声明式的阈值表描述：每个评分部分（基本面、技术面等）由基础分、若干规则与取值范围组成，
+综合评分为各部分的加权和，权重可在 config.json 的 scoring 配置中覆盖。
+
+规则有两种：
+- 阈值表 {"name", "cases": [(条件列表, 分值), ...], "default": 分值}：按顺序取第一个条件全部成立的分值，
+  条件为 (输入列, 比较符, 常数或 Ref(另一输入列))
+- 线性项 {"name", "field", "center", "scale"}：加 (值 - center) * scale
+
+规则表编译为评分计划（ScoringPlan），同一份计划既提供单只股票的标量求值，也提供按列批量的向量求值，
+两者逐项结果一致；各条件只编译一次，批量求值时同一条件的布尔掩码在各规则间共用。
+同一部分的规则也可分组分别求加分后再合成得分（points/combine），便于只重算输入变化的分组。
+"""
+
+import logging
+import math
+import operator
+from typing import Dict, List, Optional, Any, Callable, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from config_loader import get_setting
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class Ref(NamedTuple):
+    """条件右侧引用另一输入列（如 价格 > MA5）"""
+    field: str
+
+OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne
+}
+
+# StockAdvisor 的评分规则（单只股票建议与全市场排名共用）
+ADVISOR_RULES = {
+    "columns": {
+        "pe_ratio": 0.0,
+        "pb_ratio": 0.0,
+        "roe": 0.0,
+        "profit_margin": 0.0,
+        "debt_ratio": 0.0,
+        "rsi": 50.0,
+        "macd": 0.0,
+        "macd_signal": 0.0,
+        "ma5": 0.0,
+        "ma20": 0.0,
+        "current_price": 0.0,
+        "main_net_inflow": 0.0,
+        "news_sentiment": 0.5,
+        "social_sentiment": 0.5,
+        "analyst_rating": "hold"
+    },
+    "components": {
+        "fundamental": {
+            "base": 50,
+            "rules": [
+                {"name": "pe_valuation", "cases": [
+                    ([("pe_ratio", ">", 0), ("pe_ratio", "<", 20)], 15),
+                    ([("pe_ratio", ">=", 20), ("pe_ratio", "<", 30)], 10),
+                    ([("pe_ratio", ">=", 50)], -20),
+                    ([("pe_ratio", "<", 0)], -20)
+                ]},
+                {"name": "pb_valuation", "cases": [
+                    ([("pb_ratio", ">", 0), ("pb_ratio", "<", 2)], 10),
+                    ([("pb_ratio", ">=", 5)], -15)
+                ]},
+                {"name": "roe", "cases": [
+                    ([("roe", ">", 15)], 10),
+                    ([("roe", ">", 10)], 5)
+                ]},
+                {"name": "profit_margin", "cases": [
+                    ([("profit_margin", ">", 15)], 10),
+                    ([("profit_margin", ">", 10)], 5)
+                ]},
+                {"name": "debt_ratio", "cases": [
+                    ([("debt_ratio", "<", 30)], 5),
+                    ([("debt_ratio", ">", 70)], -10)
+                ]}
+            ]
+        },
+        "technical": {
+            "base": 50,
+            "rules": [
+                {"name": "rsi", "cases": [
+                    ([("rsi", "<", 30)], 15),
+                    ([("rsi", ">", 70)], -15)
+                ], "default": 5},
+                {"name": "macd", "cases": [
+                    ([("macd", ">", Ref("macd_signal")), ("macd", ">", 0)], 10),
+                    ([("macd", "<", Ref("macd_signal")), ("macd", "<", 0)], -10)
+                ]},
+                {"name": "moving_average", "cases": [
+                    ([("current_price", ">", Ref("ma5")), ("ma5", ">", Ref("ma20"))], 10),
+                    ([("current_price", "<", Ref("ma5")), ("ma5", "<", Ref("ma20"))], -10)
+                ]}
+            ]
+        },
+        "sentiment": {
+            "base": 50,
+            "rules": [
+                {"name": "main_net_inflow", "cases": [
+                    ([("main_net_inflow", ">", 0)], 15),
+                    ([("main_net_inflow", "<", 0)], -15)
+                ]},
+                {"name": "news_sentiment", "field": "news_sentiment", "center": 0.5, "scale": 30},
+                {"name": "social_sentiment", "field": "social_sentiment", "center": 0.5, "scale": 20},
+                {"name": "analyst_rating", "cases": [
+                    ([("analyst_rating", "==", "buy")], 10),
+                    ([("analyst_rating", "==", "sell")], -10)
+                ]}
+            ]
+        }
+    },
+    "weights": {"fundamental": 0.4, "technical": 0.35, "sentiment": 0.25}
+}
+
+# MCP服务专业投资建议的评分规则
+PROFESSIONAL_RULES = {
+    "columns": {
+        "pe_ratio": 0.0,
+        "market_cap": 0.0,
+        "roe": 0.0,
+        "profit": 0.0,
+        "current_price": 0.0,
+        "ma5": 0.0,
+        "ma10": 0.0,
+        "ma20": 0.0,
+        "rsi": 50.0,
+        "mfi": 50.0,
+        "main_net_inflow": 0.0,
+        "super_large_net": 0.0,
+        "large_net": 0.0,
+        "news_count": 0.0,
+        "market_attention": "medium"
+    },
+    "components": {
+        "fundamental": {
+            "base": 50,
+            "rules": [
+                {"name": "pe_valuation", "cases": [
+                    ([("pe_ratio", ">", 0), ("pe_ratio", "<", 15)], 20),
+                    ([("pe_ratio", ">=", 15), ("pe_ratio", "<", 25)], 10),
+                    ([("pe_ratio", ">=", 40)], -15)
+                ]},
+                {"name": "market_cap", "cases": [
+                    ([("market_cap", ">", 50000000000)], 10),
+                    ([("market_cap", ">", 10000000000)], 5)
+                ]},
+                {"name": "has_roe", "cases": [([("roe", "!=", 0)], 10)]},
+                {"name": "has_profit", "cases": [([("profit", "!=", 0)], 5)]}
+            ]
+        },
+        "technical": {
+            "base": 50,
+            "rules": [
+                {"name": "moving_average", "cases": [
+                    ([("ma5", ">", 0), ("ma10", ">", 0), ("ma20", ">", 0), ("current_price", ">", Ref("ma5")),
+                      ("ma5", ">", Ref("ma10")), ("ma10", ">", Ref("ma20"))], 20),
+                    ([("ma5", ">", 0), ("ma10", ">", 0), ("ma20", ">", 0), ("current_price", ">", Ref("ma5")),
+                      ("ma5", ">", Ref("ma10"))], 10),
+                    ([("ma5", ">", 0), ("ma10", ">", 0), ("ma20", ">", 0), ("current_price", "<", Ref("ma5")),
+                      ("ma5", "<", Ref("ma10")), ("ma10", "<", Ref("ma20"))], -20)
+                ]},
+                {"name": "rsi", "cases": [
+                    ([("rsi", ">=", 30), ("rsi", "<=", 70)], 10),
+                    ([("rsi", "<", 30)], 15),
+                    ([("rsi", ">", 70)], -10)
+                ]},
+                {"name": "mfi", "cases": [
+                    ([("mfi", ">=", 20), ("mfi", "<=", 80)], 5),
+                    ([("mfi", "<", 20)], 10),
+                    ([("mfi", ">", 80)], -10)
+                ]}
+            ]
+        },
+        "money_flow": {
+            "base": 50,
+            "rules": [
+                {"name": "main_net_inflow", "cases": [
+                    ([("main_net_inflow", ">", 10000000)], 30),
+                    ([("main_net_inflow", ">", 0)], 20)
+                ], "default": -15},
+                {"name": "super_large_net", "cases": [
+                    ([("super_large_net", ">", 0)], 15),
+                    ([("super_large_net", "<", -5000000)], -10)
+                ]},
+                {"name": "large_net", "cases": [([("large_net", ">", 0)], 10)]}
+            ]
+        },
+        "sentiment": {
+            "base": 50,
+            "rules": [
+                {"name": "news_count", "cases": [
+                    ([("news_count", ">", 5)], 10),
+                    ([("news_count", ">", 2)], 5)
+                ]},
+                {"name": "market_attention", "cases": [
+                    ([("market_attention", "==", "high")], 15),
+                    ([("market_attention", "==", "low")], -5)
+                ]}
+            ]
+        }
+    },
+    "weights": {"fundamental": 0.3, "technical": 0.3, "money_flow": 0.25, "sentiment": 0.15}
+}
+
+SCORING_RULES = {
+    "advisor": ADVISOR_RULES,
+    "professional": PROFESSIONAL_RULES
+}
+
+class ScoringPlan:
+    """编译后的评分计划"""
+    
+    def __init__(self, columns: Dict[str, Any],
+                 components: Dict[str, Dict[str, Any]],
+                 weights: Dict[str, float]):
+        if set(weights) != set(components):
+            raise ValueError(f"评分权重必须覆盖且只覆盖评分部分: {', '.join(components)}")
+        
+        self.columns = dict(columns)
+        self.categorical = {name for name, default in self.columns.items() if isinstance(default, str)}
+        self.weights = {name: float(weights[name]) for name in components}
+        
+        # 去重后的条件：(输入列, 比较函数, 常数或引用列, 是否为引用)
+        self.clauses: List[Tuple[str, Callable, Any, bool]] = []
+        self._clause_index: Dict[Tuple[str, str, Any], int] = {}
+        
+        # 评分部分：名称 -> (基础分, 规则, 下限, 上限)
+        self.components: Dict[str, Tuple[float, tuple, float, float]] = {}
+        # 各评分部分的规则名（与规则一一对应）
+        self.rule_names: Dict[str, Tuple[str, ...]] = {}
+        for name, spec in components.items():
+            rules = []
+            for rule in spec["rules"]:
+                if "cases" in rule:
+                    cases = tuple((tuple(self._compile_clause(clause) for clause in clauses), points)
+                                  for clauses, points in rule["cases"])
+                    rules.append(("table", cases, rule.get("default", 0)))
+                else:
+                    self._check_field(rule["field"])
+                    rules.append(("linear", rule["field"], rule.get("center", 0), rule["scale"]))
+            low, high = spec.get("range", (0, 100))
+            self.components[name] = (spec.get("base", 50), tuple(rules), low, high)
+            self.rule_names[name] = tuple(rule.get("name") for rule in spec["rules"])
+    
+    def _check_field(self, field: str):
+        if field not in self.columns:
+            raise ValueError(f"评分规则引用了未声明的输入列: {field}")
+    
+    def _compile_clause(self, clause: Sequence[Any]) -> int:
+        """编译条件，返回其在去重条件表中的下标"""
+        field, op, operand = clause
+        if op not in OPERATORS:
+            raise ValueError(f"不支持的比较符: {op}")
+        self._check_field(field)
+        is_ref = isinstance(operand, Ref)
+        if is_ref:
+            self._check_field(operand.field)
+        
+        key = (field, op, operand)
+        if key not in self._clause_index:
+            self._clause_index[key] = len(self.clauses)
+            self.clauses.append((field, OPERATORS[op], operand.field if is_ref else operand, is_ref))
+        return self._clause_index[key]
+    
+    def normalize(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """单行输入补齐默认值（缺失、None、NaN或无法转换为数值时取默认值）"""
+        values = {}
+        for name, default in self.columns.items():
+            value = row.get(name)
+            if name in self.categorical:
+                values[name] = default if value is None else value
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = default
+            values[name] = default if math.isnan(value) else value
+        return values
+    
+    def _test(self, index: int, values: Dict[str, Any], memo: Dict[int, bool]) -> bool:
+        if index not in memo:
+            field, compare, operand, is_ref = self.clauses[index]
+            memo[index] = bool(compare(values[field], values[operand] if is_ref else operand))
+        return memo[index]
+    
+    def _component(self, name: str, values: Dict[str, Any], memo: Dict[int, bool]) -> float:
+        base, rules, low, high = self.components[name]
+        score = base
+        for rule in rules:
+            score += self._rule_points(rule, values, memo)
+        return max(low, min(high, score))
+    
+    def _rule_points(self, rule: tuple, values: Dict[str, Any], memo: Dict[int, bool]) -> float:
+        if rule[0] == "table":
+            for clause_ids, points in rule[1]:
+                if all(self._test(i, values, memo) for i in clause_ids):
+                    return points
+            return rule[2]
+        return (values[rule[1]] - rule[2]) * rule[3]
+    
+    def component(self, name: str, row: Dict[str, Any]) -> float:
+        """单只股票某一评分部分的得分"""
+        return self._component(name, self.normalize(row), {})
+    
+    def points(self, name: str, row: Dict[str, Any], rules: Optional[Sequence[str]] = None) -> float:
+        """单只股票某一评分部分中指定规则（默认全部规则）的加分合计，不含基础分、不截断；
+        同一部分的规则分组求得的加分经 combine 合成该部分的得分"""
+        values = self.normalize(row)
+        memo: Dict[int, bool] = {}
+        selected = self.rule_names[name] if rules is None else rules
+        unknown = set(selected) - set(self.rule_names[name])
+        if unknown:
+            raise ValueError(f"评分部分 {name} 没有规则: {', '.join(sorted(unknown))}")
+        
+        total = 0.0
+        for rule_name, rule in zip(self.rule_names[name], self.components[name][1]):
+            if rule_name in selected:
+                total += self._rule_points(rule, values, memo)
+        return total
+    
+    def combine(self, name: str, points: float) -> float:
+        """基础分加上规则加分合计，截断到该部分的取值范围"""
+        base, _, low, high = self.components[name]
+        return max(low, min(high, base + points))
+    
+    def score(self, row: Dict[str, Any]) -> Dict[str, float]:
+        """单只股票的各部分得分与加权综合分（键 "total"）"""
+        values = self.normalize(row)
+        memo: Dict[int, bool] = {}
+        scores = {name: self._component(name, values, memo) for name in self.components}
+        scores["total"] = self.total(scores)
+        return scores
+    
+    def total(self, scores: Dict[str, float]) -> float:
+        """各部分得分的加权综合分"""
+        total = 0.0
+        for name, weight in self.weights.items():
+            total += scores[name] * weight
+        return total
+    
+    def column(self, table: Dict[str, Sequence[Any]], name: str, n: int) -> np.ndarray:
+        """批量输入的一列（缺失列或NaN/None取默认值）"""
+        default = self.columns[name]
+        if name not in table:
+            return np.full(n, default, dtype=object if name in self.categorical else np.float64)
+        if name in self.categorical:
+            values = np.asarray(table[name], dtype=object)
+            return np.where(values == None, default, values)  # noqa: E711
+        values = np.asarray(table[name], dtype=np.float64)
+        return np.where(np.isnan(values), default, values)
+    
+    def score_many(self, table: Dict[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+        """按列组织的N只股票批量评分，结果与逐只调用 score 一致"""
+        n = len(next(iter(table.values()))) if table else 0
+        values = {name: self.column(table, name, n) for name in self.columns}
+        masks: List[Optional[np.ndarray]] = [None] * len(self.clauses)
+        
+        def mask(index: int) -> np.ndarray:
+            if masks[index] is None:
+                field, compare, operand, is_ref = self.clauses[index]
+                masks[index] = np.asarray(compare(values[field], values[operand] if is_ref else operand), dtype=bool)
+            return masks[index]
+        
+        scores = {}
+        for name, (base, rules, low, high) in self.components.items():
+            score = np.full(n, float(base))
+            for rule in rules:
+                if rule[0] == "table":
+                    conditions = [np.logical_and.reduce([mask(i) for i in clause_ids]) for clause_ids, _ in rule[1]]
+                    score += np.select(conditions, [points for _, points in rule[1]], rule[2])
+                else:
+                    score += (values[rule[1]] - rule[2]) * rule[3]
+            scores[name] = np.clip(score, low, high)
+        
+        total = np.zeros(n)
+        for name, weight in self.weights.items():
+            total = total + scores[name] * weight
+        scores["total"] = total
+        return scores
+
+def compile_rules(rules: Dict[str, Any], weights: Optional[Dict[str, float]] = None) -> ScoringPlan:
+    """将规则表编译为评分计划（weights覆盖规则表中的默认权重）"""
+    return ScoringPlan(rules["columns"], rules["components"], weights or rules["weights"])
+
+_plans: Dict[str, ScoringPlan] = {}
+
+def scoring_plan(name: str) -> ScoringPlan:
+    """按名称获取编译好的评分计划（权重取自 config.json 的 scoring 配置，编译结果按名称缓存）"""
+    if name not in SCORING_RULES:
+        raise ValueError(f"未知的评分规则: {name}，可选: {', '.join(SCORING_RULES)}")
+    if name not in _plans:
+        _plans[name] = compile_rules(SCORING_RULES[name], get_setting("scoring", name, None))
+    return _plans[name]
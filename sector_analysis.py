@@ -0,0 +1,280 @@
+"""
+行业分析模块
+以全市场行情快照为股票主数据（股票代码 -> 所属行业），一次遍历为全部行业计算
+市值加权/等权收益、涨跌家数、相对强弱、资金流与估值中位数，以及个股在行业内的分位排名
+
+全部统计通过分组向量化归约（bincount、按 (行业, 值) 排序）得到，不逐行业循环；
+结果按快照版本缓存，快照更新后首次查询时重算，之后的查询只是查表。
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from market_snapshot import MarketSnapshot
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 快照涨跌幅列 -> 统计周期
+RETURN_HORIZONS = {"change_percent": "1d", "change_60d": "60d", "change_ytd": "ytd"}
+# 可用于行业排名的统计量
+SECTOR_METRICS = ("cap_weighted_return", "equal_weighted_return", "relative_strength",
+                  "advance_ratio", "main_net_inflow", "inflow_ratio")
+# 相对强弱超过该值（百分点）视为强于/弱于大盘
+RELATIVE_STRENGTH_BAND = {"1d": 0.5, "60d": 5.0, "ytd": 5.0}
+
+def group_sum(values: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """分组求和（NaN视为0）"""
+    return np.bincount(groups, weights=np.nan_to_num(values), minlength=n_groups)
+
+def group_median(values: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """分组中位数（忽略NaN，无有效值的组为NaN）"""
+    valid = ~np.isnan(values)
+    v, g = values[valid], groups[valid]
+    order = np.lexsort((v, g))
+    v, g = v[order], g[order]
+    counts = np.bincount(g, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    
+    result = np.full(n_groups, np.nan)
+    present = counts > 0
+    low = starts[present] + (counts[present] - 1) // 2
+    high = starts[present] + counts[present] // 2
+    result[present] = (v[low] + v[high]) / 2
+    return result
+
+def group_percentile(values: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """各值在所属组内的百分位（0-100，并列取平均名次，组内只有一个值时为50，NaN保持NaN）"""
+    result = np.full(len(values), np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return result
+    
+    order = valid[np.lexsort((values[valid], groups[valid]))]
+    v, g = values[order], groups[order]
+    counts = np.bincount(g, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    
+    # 并列区间的首尾位置
+    positions = np.arange(len(order))
+    new_run = np.r_[True, (v[1:] != v[:-1]) | (g[1:] != g[:-1])]
+    first = np.maximum.accumulate(np.where(new_run, positions, 0))
+    end_run = np.r_[new_run[1:], True]
+    last = np.minimum.accumulate(np.where(end_run, positions, len(order))[::-1])[::-1]
+    
+    size = counts[g]
+    rank = (first + last) / 2 - starts[g]
+    result[order] = np.where(size > 1, rank / np.maximum(size - 1, 1) * 100, 50.0)
+    return result
+
+class SectorTable:
+    """一个快照版本的行业统计表"""
+    
+    def __init__(self, snapshot: MarketSnapshot, min_members: int = 5):
+        self.version = snapshot.version
+        self.timestamp = snapshot.timestamp
+        self.min_members = min_members
+        self._snapshot = snapshot
+        
+        industry = snapshot.column("industry")
+        assigned = industry != ""
+        self.names, inverse = np.unique(industry[assigned].astype(str), return_inverse=True)
+        n = len(self.names)
+        # 每只股票所属行业下标（无行业为-1）
+        self.groups = np.full(len(snapshot), -1, dtype=np.int64)
+        self.groups[assigned] = inverse
+        self._index = {name: i for i, name in enumerate(self.names)}
+        
+        rows = np.flatnonzero(assigned)
+        groups = inverse
+        cap = np.nan_to_num(snapshot.column("market_cap")[rows])
+        self.members = np.bincount(groups, minlength=n)
+        self.total_market_cap = group_sum(cap, groups, n)
+        
+        self.returns: Dict[str, Dict[str, np.ndarray]] = {}
+        self.market_returns: Dict[str, float] = {}
+        self.stock_percentiles: Dict[str, np.ndarray] = {}
+        for column, horizon in RETURN_HORIZONS.items():
+            if column not in snapshot.columns:
+                continue
+            r = snapshot.column(column)[rows]
+            valid = ~np.isnan(r)
+            weights = np.where(valid, cap, 0.0)
+            valid_counts = np.bincount(groups, weights=valid, minlength=n)
+            valid_cap = group_sum(weights, groups, n)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                equal = group_sum(r, groups, n) / valid_counts
+                weighted = group_sum(r * weights, groups, n) / valid_cap
+            market = float(np.nansum(r * weights) / weights.sum()) if weights.sum() > 0 else np.nan
+            
+            self.returns[horizon] = {
+                "cap_weighted_return": weighted,
+                "equal_weighted_return": equal,
+                "relative_strength": weighted - market
+            }
+            self.market_returns[horizon] = market
+            percentiles = np.full(len(snapshot), np.nan)
+            percentiles[rows] = group_percentile(r, groups, n)
+            self.stock_percentiles[horizon] = percentiles
+        
+        change = snapshot.column("change_percent")[rows]
+        self.advancers = np.bincount(groups, weights=change > 0, minlength=n)
+        self.decliners = np.bincount(groups, weights=change < 0, minlength=n)
+        amount = group_sum(snapshot.column("amount")[rows], groups, n)
+        self.main_net_inflow = group_sum(snapshot.column("main_net_inflow")[rows], groups, n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.advance_ratio = self.advancers / np.bincount(groups, weights=~np.isnan(change), minlength=n)
+            self.inflow_ratio = self.main_net_inflow / amount
+        self.amount = amount
+        
+        pe = snapshot.column("pe_ratio")[rows]
+        self.median_pe = group_median(np.where(pe > 0, pe, np.nan), groups, n)
+        self.median_pb = group_median(snapshot.column("pb_ratio")[rows], groups, n)
+        
+        cap_percentile = np.full(len(snapshot), np.nan)
+        cap_percentile[rows] = group_percentile(np.where(cap > 0, cap, np.nan), groups, n)
+        self.market_cap_percentile = cap_percentile
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def metric(self, name: str, horizon: str = "1d") -> np.ndarray:
+        """按名称获取各行业的统计量"""
+        if name in ("cap_weighted_return", "equal_weighted_return", "relative_strength"):
+            if horizon not in self.returns:
+                raise ValueError(f"不支持的统计周期: {horizon}")
+            return self.returns[horizon][name]
+        if name not in SECTOR_METRICS:
+            raise ValueError(f"不支持的行业统计量: {name}，可选: {', '.join(SECTOR_METRICS)}")
+        return getattr(self, name)
+    
+    def sector_rank(self, horizon: str = "1d") -> np.ndarray:
+        """各行业按市值加权收益的名次（1为最强，成员不足的行业不参与排名）"""
+        values = np.where(self.members >= self.min_members,
+                          np.nan_to_num(self.returns[horizon]["cap_weighted_return"], nan=-np.inf), -np.inf)
+        ranks = np.empty(len(values), dtype=np.int64)
+        ranks[np.argsort(-values, kind="stable")] = np.arange(1, len(values) + 1)
+        return ranks
+    
+    def sector(self, name: str) -> Optional[Dict[str, Any]]:
+        """单个行业的统计（行业不存在时返回None）"""
+        i = self._index.get(name)
+        if i is None:
+            return None
+        
+        ranked = int((self.members >= self.min_members).sum())
+        performance = {}
+        for horizon, values in self.returns.items():
+            performance[horizon] = {
+                **{key: _float(values[key][i]) for key in values},
+                "market_return": _float(self.market_returns[horizon]),
+                "rank": int(self.sector_rank(horizon)[i]) if self.members[i] >= self.min_members else None
+            }
+        return {
+            "industry": name,
+            "members": int(self.members[i]),
+            "ranked_sectors": ranked,
+            "total_market_cap": float(self.total_market_cap[i]),
+            "performance": performance,
+            "breadth": {
+                "advancers": int(self.advancers[i]),
+                "decliners": int(self.decliners[i]),
+                "advance_ratio": _float(self.advance_ratio[i])
+            },
+            "money_flow": {
+                "amount": float(self.amount[i]),
+                "main_net_inflow": float(self.main_net_inflow[i]),
+                "inflow_ratio": _float(self.inflow_ratio[i])
+            },
+            "valuation": {
+                "median_pe": _float(self.median_pe[i]),
+                "median_pb": _float(self.median_pb[i])
+            }
+        }
+    
+    def stock(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """个股所属行业及其在行业内的分位排名（不在快照中或无行业时返回None）"""
+        row = self._snapshot.index_of([symbol])[0]
+        if row < 0 or self.groups[row] < 0:
+            return None
+        
+        sector = self.sector(str(self.names[self.groups[row]]))
+        sector["stock_position"] = {
+            "return_percentile": {h: _float(p[row]) for h, p in self.stock_percentiles.items()},
+            "market_cap_percentile": _float(self.market_cap_percentile[row])
+        }
+        return sector
+    
+    def ranking(self, by: str = "cap_weighted_return", horizon: str = "1d",
+                n: int = 10, ascending: bool = False) -> List[Dict[str, Any]]:
+        """按统计量排序的行业列表（成员不足min_members的行业不参与）"""
+        values = self.metric(by, horizon)
+        eligible = np.flatnonzero((self.members >= self.min_members) & ~np.isnan(values))
+        order = eligible[np.argsort(values[eligible] if ascending else -values[eligible], kind="stable")][:n]
+        return [
+            {"industry": str(self.names[i]), "members": int(self.members[i]), by: float(values[i])}
+            for i in order
+        ]
+
+def _float(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+class SectorAnalyzer:
+    """行业分析器：按快照版本缓存行业统计表"""
+    
+    def __init__(self, min_members: int = 5, cache_size: int = 4):
+        self.min_members = min_members
+        self.cache_size = cache_size
+        self._tables: "OrderedDict[str, SectorTable]" = OrderedDict()
+    
+    def table(self, snapshot: MarketSnapshot) -> SectorTable:
+        """快照对应的行业统计表（同一版本只计算一次）"""
+        table = self._tables.get(snapshot.version)
+        if table is None:
+            table = SectorTable(snapshot, self.min_members)
+            self._tables[snapshot.version] = table
+            while len(self._tables) > self.cache_size:
+                self._tables.popitem(last=False)
+            logger.info(f"行业统计已更新: {len(table)} 个行业，快照版本 {snapshot.version}")
+        else:
+            self._tables.move_to_end(snapshot.version)
+        return table
+    
+    def analyze(self, snapshot: MarketSnapshot, symbol: str) -> Dict[str, Any]:
+        """个股所属行业的表现及个股在行业内的位置"""
+        sector = self.table(snapshot).stock(symbol)
+        if sector is None:
+            return {"data_source": "unavailable", "note": f"快照中没有股票 {symbol} 的行业信息"}
+        
+        # 优先按60日相对强弱判断行业趋势，缺失时用当日
+        trend = "与大盘同步"
+        for horizon in ("60d", "1d"):
+            strength = sector["performance"].get(horizon, {}).get("relative_strength")
+            if strength is not None:
+                band = RELATIVE_STRENGTH_BAND[horizon]
+                if strength > band:
+                    trend = "强于大盘"
+                elif strength < -band:
+                    trend = "弱于大盘"
+                break
+        
+        return {
+            "data_source": "snapshot",
+            "snapshot_version": snapshot.version,
+            **sector,
+            "sector_trend": trend
+        }
+    
+    def ranking(self, snapshot: MarketSnapshot, by: str = "cap_weighted_return",
+                horizon: str = "1d", n: int = 10, ascending: bool = False) -> List[Dict[str, Any]]:
+        """按统计量排序的行业列表"""
+        return self.table(snapshot).ranking(by, horizon, n, ascending)
+
+# 快捷函数
+def analyze_sector(snapshot: MarketSnapshot, symbol: str) -> Dict[str, Any]:
+    """分析个股所属行业"""
+    return SectorAnalyzer().analyze(snapshot, symbol)
@@ -13,6 +13,17 @@ import aiohttp
 import logging
 from stock_data_fetcher import fetch_stock_data, search_stock, StockDataFetcher, get_historical_price
 from technical_analysis import TechnicalAnalyzer
+from config_loader import get_setting
+from market_snapshot import MarketSnapshotProvider, QuoteProvider
+from universe_ranking import UniverseRanker
+from portfolio_optimizer import PortfolioOptimizer, MIN_OBSERVATIONS
+from correlation_service import CorrelationService
+from sector_analysis import SectorAnalyzer, SECTOR_METRICS
+from risk_engine import RiskEngine
+from advice_cache import AdviceCache, RefreshState
+from scoring_rules import scoring_plan
+from progress_stream import SectionStream
+from get_enhanced_investment_advice import EnhancedStockAdvisor, SELECTABLE_SECTIONS
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -28,6 +39,25 @@ args = parser.parse_args()
 # 创建MCP服务器实例
 mcp = FastMCP(name=args.name)
 
+# 全市场行情快照与排名器（跨请求复用，排名结果按快照版本缓存）
+market_snapshots = MarketSnapshotProvider(ttl=get_setting("analysis", "snapshot_ttl", 60))
+# 批量报价（按股票短期缓存，优先复用有效期内的行情快照）
+quote_provider = QuoteProvider(ttl=get_setting("analysis", "quote_ttl", 10),
+                               chunk_size=get_setting("analysis", "quote_batch_size", 100),
+                               concurrency=get_setting("analysis", "quote_concurrency", 4),
+                               snapshots=market_snapshots)
+universe_ranker = UniverseRanker()
+# 滚动相关性矩阵，与排名器共用历史K线存储
+correlation_service = CorrelationService.from_config(universe_ranker.store)
+# 行业统计表，按行情快照版本缓存
+sector_analyzer = SectorAnalyzer()
+# 风险指标引擎，按 (股票, 最后交易日) 缓存，同一交易日内重复查询不再计算
+risk_engine = RiskEngine.from_config()
+# 按输入指纹缓存的建议报告，跨请求共享
+advice_cache = AdviceCache.from_config()
+# 增强版建议的增量刷新状态（上一次报告及各阶段输入指纹）
+refresh_state = RefreshState()
+
 # 模拟股票数据（实际使用时需要替换为真实API）
 MOCK_STOCK_DATA = {
     "AAPL": {
@@ -97,8 +127,8 @@ async def get_stock_price(symbol: str, ctx: Context) -> Dict[str, Any]:
     await ctx.info(f"正在从实时数据源查询股票 {symbol} 的价格信息...")
     
     try:
-        # 首先尝试获取真实数据
-        comprehensive_data = await fetch_stock_data(symbol)
+        # 首先尝试获取真实数据（只需行情与新闻，不获取K线、财务等其他数据）
+        comprehensive_data = await fetch_stock_data(symbol, parts=["basic_info", "news"])
         
         if comprehensive_data.get('basic_info'):
             basic_info = comprehensive_data['basic_info']
@@ -149,11 +179,64 @@ async def get_stock_price(symbol: str, ctx: Context) -> Dict[str, Any]:
         await ctx.error(f"获取股票数据时发生错误: {str(e)}")
         return {"error": f"获取股票数据失败: {str(e)}"}
 
+# 单次批量报价的股票数上限
+MAX_PRICE_SYMBOLS = 500
+
+@mcp.tool
+async def get_stock_prices(symbols: List[str], ctx: Context) -> Dict[str, Any]:
+    """
+    批量获取多只A股的最新价格（一次最多500只）
+    使用批量行情接口分批并发请求，并复用短期报价缓存与全市场行情快照
+    
+    Args:
+        symbols: 6位A股代码列表，如 ["000001", "600036"]（重复代码只查询一次）
+    
+    Returns:
+        {"prices": 股票代码 -> {name, price, change_percent, volume, amount, market_cap, pe_ratio}
+         或 {"error": ...}, "count": 股票数, "errors": 失败数, "timestamp": 时间}
+    """
+    symbols = list(dict.fromkeys(str(s).strip() for s in symbols if str(s).strip()))
+    if not symbols:
+        return {"error": "股票代码列表不能为空"}
+    if len(symbols) > MAX_PRICE_SYMBOLS:
+        return {"error": f"单次最多查询 {MAX_PRICE_SYMBOLS} 只股票"}
+    
+    valid = [s for s in symbols if len(s) == 6 and s.isdigit()]
+    await ctx.info(f"正在批量查询 {len(valid)} 只股票的价格...")
+    
+    try:
+        quotes = {}
+        if valid:
+            async with StockDataFetcher() as fetcher:
+                quotes = await quote_provider.get(valid, fetcher)
+        
+        prices = {}
+        for symbol in symbols:
+            quote = quotes.get(symbol, {"error": "仅支持6位A股代码"})
+            prices[symbol] = {k: v for k, v in quote.items() if k != "symbol"}
+        errors = sum(1 for quote in prices.values() if "error" in quote)
+        
+        await ctx.info(f"完成 {len(symbols)} 只股票的价格查询，失败 {errors} 只")
+        return {
+            "prices": prices,
+            "count": len(symbols),
+            "errors": errors,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    except Exception as e:
+        await ctx.error(f"批量获取股票价格时发生错误: {str(e)}")
+        return {"error": f"批量获取股票价格失败: {str(e)}"}
+
 @mcp.tool
 async def get_professional_investment_advice(symbol: str, ctx: Context) -> Dict[str, Any]:
     """
     获取专业投资建议，包括基本面分析、情绪分析、资金流分析和技术指标分析
     
+    报告各部分完成后立即以 MCP 进度通知推送（message 为 {"section", "data"} 的JSON）：
+    先推送行情（quote），再按数据到达顺序推送基本面、技术面、资金流与情绪分析，
+    最后推送综合建议（investment_recommendation）；返回值为汇总的完整报告。
+    
     Args:
         symbol: 股票代码
     
@@ -164,68 +247,53 @@ async def get_professional_investment_advice(symbol: str, ctx: Context) -> Dict[
     
     try:
         async with StockDataFetcher() as fetcher:
-            # 获取基础数据
-            await ctx.info(f"获取 {symbol} 基础数据...")
             basic_info = await fetcher.get_stock_info_from_eastmoney(symbol)
             if not basic_info:
                 await ctx.error(f"无法获取股票 {symbol} 的基础数据")
                 return {"error": f"无法获取股票 {symbol} 的基础数据"}
             
-            await ctx.info(f"成功获取基础数据: {basic_info.get('name', 'N/A')}")
-            
-            # 获取专业分析数据
-            await ctx.info("获取专业分析数据...")
-            
-            # 逐个获取数据，避免并发问题
-            financial_data = None
-            money_flow = None
-            tech_indicators = None
-            sentiment = None
-            news = None
-            
-            try:
-                financial_data = await fetcher.get_stock_financial_data(symbol)
-                await ctx.info("财务数据获取完成")
-            except Exception as e:
-                await ctx.error(f"财务数据获取失败: {e}")
-                financial_data = {}
+            stream = SectionStream(ctx, ["quote", *PROFESSIONAL_SECTIONS, "investment_recommendation"])
+            await stream.emit("quote", _quote_section(basic_info))
             
+            # 各项数据并发获取，每到达一项即生成并推送数据已齐备的分析部分
+            data = {"basic_info": basic_info}
+            tasks = {asyncio.create_task(getattr(fetcher, method)(symbol)): name
+                     for name, (method, _) in PROFESSIONAL_DATA.items()}
+            pending = set(tasks)
             try:
-                money_flow = await fetcher.get_money_flow_data(symbol)
-                await ctx.info("资金流数据获取完成")
-            except Exception as e:
-                await ctx.error(f"资金流数据获取失败: {e}")
-                money_flow = {}
-            
-            try:
-                tech_indicators = await fetcher.get_technical_indicators(symbol)
-                await ctx.info("技术指标获取完成")
-            except Exception as e:
-                await ctx.error(f"技术指标获取失败: {e}")
-                tech_indicators = {}
-            
-            try:
-                sentiment = await fetcher.get_market_sentiment(symbol)
-                await ctx.info("市场情绪获取完成")
-            except Exception as e:
-                await ctx.error(f"市场情绪获取失败: {e}")
-                sentiment = {}
-            
-            try:
-                news = await fetcher.get_stock_news(symbol)
-                await ctx.info(f"新闻数据获取完成，共{len(news) if news else 0}条")
-            except Exception as e:
-                await ctx.error(f"新闻数据获取失败: {e}")
-                news = []
-            
-            # 生成专业投资建议
-            await ctx.info("开始生成专业投资建议...")
-            advice = await _generate_professional_advice(
-                basic_info, financial_data, money_flow, tech_indicators, sentiment, news, ctx
-            )
-            
-            await ctx.info(f"成功生成 {symbol} 的专业投资建议")
-            return advice
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        name = tasks[task]
+                        default = PROFESSIONAL_DATA[name][1]
+                        try:
+                            result = task.result()
+                        except Exception as e:
+                            await ctx.error(f"{name} 获取失败: {e}")
+                            result = None
+                        data[name] = result if result is not None else default
+                    
+                    for section in stream.pending():
+                        required = PROFESSIONAL_SECTIONS.get(section, (None, None))[1]
+                        if required is not None and all(name in data for name in required):
+                            await stream.emit(section, _professional_section(section, data))
+            finally:
+                for task in pending:
+                    task.cancel()
+        
+        # 综合建议
+        scores = {PROFESSIONAL_SECTIONS[name][0]: stream.results[name]["score"] for name in PROFESSIONAL_SECTIONS}
+        await stream.emit("investment_recommendation",
+                          _recommendation_section(scores, basic_info.get("price", 0)))
+        
+        await ctx.info(f"成功生成 {symbol} 的专业投资建议")
+        return {
+            "symbol": symbol,
+            "current_price": basic_info.get("price", 0),
+            "change_percent": basic_info.get("change_percent", 0),
+            "analysis_timestamp": datetime.now().isoformat(),
+            **{name: stream.results[name] for name in stream.sections}
+        }
             
     except Exception as e:
         await ctx.error(f"生成专业投资建议时发生错误: {str(e)}")
@@ -233,272 +301,470 @@ async def get_professional_investment_advice(symbol: str, ctx: Context) -> Dict[
         await ctx.error(f"错误详情: {traceback.format_exc()}")
         return {"error": f"生成专业投资建议失败: {str(e)}"}
 
-async def _generate_professional_advice(basic_info: Dict, financial_data: Dict, money_flow: Dict, 
-                                      tech_indicators: Dict, sentiment: Dict, news: List, ctx: Context) -> Dict[str, Any]:
-    """生成专业投资建议"""
+@mcp.tool
+async def top_recommendations(ctx: Context, n: int = 20,
+                              filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    全市场评分前N名的A股推荐
     
-    # 安全获取数据
-    symbol = basic_info.get('symbol', '') if isinstance(basic_info, dict) else ''
-    current_price = basic_info.get('price', 0) if isinstance(basic_info, dict) else 0
-    change_percent = basic_info.get('change_percent', 0) if isinstance(basic_info, dict) else 0
+    Args:
+        n: 返回数量（1-100）
+        filters: 筛选条件，如 {"min_price": 5, "max_pe": 30, "min_market_cap": 1e10,
+                 "industry": "银行", "symbol_prefix": "60", "exclude_st": true,
+                 "recommendation": ["强烈推荐", "推荐"]}
     
-    await ctx.info(f"开始分析 {symbol} 的专业投资建议...")
+    Returns:
+        按总评分排序的推荐列表
+    """
+    if n < 1 or n > 100:
+        return {"error": "n 必须在 1 到 100 之间"}
     
-    # 1. 基本面分析
     try:
-        fundamental_score = _analyze_fundamentals(basic_info, financial_data)
-        await ctx.info(f"基本面分析完成，评分: {fundamental_score}")
-    except Exception as e:
-        await ctx.error(f"基本面分析失败: {e}")
-        fundamental_score = 50
+        async with StockDataFetcher() as fetcher:
+            snapshot = await market_snapshots.get(fetcher)
+            if snapshot is None or len(snapshot) == 0:
+                return {"error": "无法获取全市场行情快照"}
+            
+            await ctx.info(f"行情快照 {len(snapshot)} 只股票，版本 {snapshot.version}")
+            result = await universe_ranker.top_recommendations(snapshot, fetcher, n, filters)
+        
+        await ctx.info(f"筛选后 {result['matched']} 只股票，返回前 {len(result['results'])} 名")
+        return {
+            **result,
+            "snapshot_time": datetime.fromtimestamp(snapshot.timestamp).isoformat(),
+            "timestamp": datetime.now().isoformat()
+        }
     
-    # 2. 技术面分析
-    try:
-        technical_score = _analyze_technical_indicators(tech_indicators, basic_info)
-        await ctx.info(f"技术面分析完成，评分: {technical_score}")
+    except ValueError as e:
+        return {"error": str(e)}
     except Exception as e:
-        await ctx.error(f"技术面分析失败: {e}")
-        technical_score = 50
+        await ctx.error(f"生成全市场推荐时发生错误: {str(e)}")
+        return {"error": f"生成全市场推荐失败: {str(e)}"}
+
+@mcp.tool
+async def get_sector_ranking(ctx: Context, by: str = "cap_weighted_return",
+                             horizon: str = "1d", n: int = 10,
+                             ascending: bool = False) -> Dict[str, Any]:
+    """
+    全市场行业排名
+    
+    Args:
+        by: 排序统计量（cap_weighted_return/equal_weighted_return/relative_strength/
+            advance_ratio/main_net_inflow/inflow_ratio）
+        horizon: 收益统计周期（1d/60d/ytd，仅收益类统计量使用）
+        n: 返回数量（1-100）
+        ascending: 为True时按升序（最弱的行业在前）
+    
+    Returns:
+        按统计量排序的行业列表
+    """
+    if n < 1 or n > 100:
+        return {"error": "n 必须在 1 到 100 之间"}
+    if by not in SECTOR_METRICS:
+        return {"error": f"不支持的行业统计量: {by}"}
     
-    # 3. 资金流分析
     try:
-        money_flow_score = _analyze_money_flow(money_flow, basic_info)
-        await ctx.info(f"资金流分析完成，评分: {money_flow_score}")
+        async with StockDataFetcher() as fetcher:
+            snapshot = await market_snapshots.get(fetcher)
+        if snapshot is None or len(snapshot) == 0:
+            return {"error": "无法获取全市场行情快照"}
+        
+        table = sector_analyzer.table(snapshot)
+        await ctx.info(f"行情快照 {len(snapshot)} 只股票，共 {len(table)} 个行业")
+        return {
+            "by": by,
+            "horizon": horizon,
+            "market_return": table.market_returns.get(horizon),
+            "results": table.ranking(by, horizon, n, ascending),
+            "snapshot_version": snapshot.version,
+            "snapshot_time": datetime.fromtimestamp(snapshot.timestamp).isoformat(),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    except ValueError as e:
+        return {"error": str(e)}
     except Exception as e:
-        await ctx.error(f"资金流分析失败: {e}")
-        money_flow_score = 50
+        await ctx.error(f"生成行业排名时发生错误: {str(e)}")
+        return {"error": f"生成行业排名失败: {str(e)}"}
+
+@mcp.tool
+async def get_enhanced_investment_advice(symbol: str, ctx: Context,
+                                         investment_horizon: str = "medium",
+                                         risk_tolerance: str = "moderate",
+                                         include: Optional[List[str]] = None,
+                                         incremental: bool = False) -> Dict[str, Any]:
+    """
+    获取增强版投资建议，可只生成指定部分以减少计算量与返回内容
+    
+    Args:
+        symbol: 股票代码
+        investment_horizon: 投资期限（short/medium/long）
+        risk_tolerance: 风险偏好（conservative/moderate/aggressive）
+        include: 只生成的报告部分，如 ["scenario_analysis", "personalized_advice"]，
+                 可选 base_analysis、enhanced_analysis、personalized_advice、scenario_analysis、
+                 portfolio_advice、advanced_metrics、market_timing、sector_analysis、
+                 competitive_analysis、valuation_models 及增强分析的各子分析（见 SELECTABLE_SECTIONS），
+                 含其他名称时不获取数据，直接返回错误；默认全部
+        incremental: 增量刷新，只重算输入数据变化的部分，并在 refresh.changes 中返回
+                     相对上一次报告的差异（JSON Patch 格式），便于客户端局部更新
+    
+    Returns:
+        增强版投资建议报告
+    """
+    if investment_horizon not in ("short", "medium", "long"):
+        return {"error": f"不支持的投资期限: {investment_horizon}"}
+    if risk_tolerance not in ("conservative", "moderate", "aggressive"):
+        return {"error": f"不支持的风险偏好: {risk_tolerance}"}
+    unknown = [name for name in include or [] if name not in SELECTABLE_SECTIONS]
+    if unknown:
+        return {"error": f"不支持的报告部分: {', '.join(unknown)}，可选: {', '.join(SELECTABLE_SECTIONS)}"}
+    
+    sections = ", ".join(include) if include else "全部"
+    await ctx.info(f"正在生成股票 {symbol} 的增强版投资建议（{sections}）...")
     
-    # 4. 情绪分析
     try:
-        sentiment_score = _analyze_market_sentiment(sentiment, news)
-        await ctx.info(f"情绪分析完成，评分: {sentiment_score}")
+        async with StockDataFetcher() as fetcher:
+            advisor = EnhancedStockAdvisor(data_fetcher=fetcher, correlation_service=correlation_service,
+                                           market_snapshots=market_snapshots, sector_analyzer=sector_analyzer,
+                                           advice_cache=advice_cache, refresh_state=refresh_state)
+            advice = await advisor.get_enhanced_advice(symbol, investment_horizon, risk_tolerance,
+                                                       include=include, incremental=incremental)
+        
+        if "error" in advice:
+            await ctx.error(f"生成增强版投资建议失败: {advice['error']}")
+        elif advice.get("cached"):
+            await ctx.info(f"{symbol} 的输入数据未变化，返回已生成的增强版投资建议")
+        elif "refresh" in advice:
+            refresh = advice["refresh"]
+            await ctx.info(f"增量刷新 {symbol}：重算 {len(refresh['recomputed'])} 个部分，"
+                           f"复用 {len(refresh['reused'])} 个部分")
+        else:
+            await ctx.info(f"成功生成 {symbol} 的增强版投资建议")
+        return advice
+    
     except Exception as e:
-        await ctx.error(f"情绪分析失败: {e}")
-        sentiment_score = 50
+        await ctx.error(f"生成增强版投资建议时发生错误: {str(e)}")
+        return {"error": f"生成增强版投资建议失败: {str(e)}"}
+
+@mcp.tool
+async def optimize_portfolio(symbols: List[str], ctx: Context,
+                             method: str = "min_variance",
+                             max_position_size: Optional[float] = None,
+                             sector_caps: Optional[Dict[str, float]] = None,
+                             max_sector_weight: Optional[float] = None,
+                             risk_aversion: float = 3.0,
+                             lookback: int = 250) -> Dict[str, Any]:
+    """
+    投资组合优化：由历史收益估计收缩协方差矩阵，求解组合权重
     
-    # 5. 综合评分
-    total_score = (fundamental_score * 0.3 + technical_score * 0.3 + 
-                  money_flow_score * 0.25 + sentiment_score * 0.15)
+    Args:
+        symbols: 股票代码列表（2-500只）
+        method: 优化方法（min_variance/mean_variance/risk_parity）
+        max_position_size: 单只股票仓位上限，默认取配置 risk_management.max_position_size
+        sector_caps: 行业仓位上限，如 {"银行": 0.3, "白酒": 0.2}
+        max_sector_weight: 未在 sector_caps 中列出的行业的统一上限
+        risk_aversion: 风险厌恶系数（仅均值-方差使用）
+        lookback: 估计协方差使用的交易日数
     
-    await ctx.info(f"综合评分计算完成: {total_score:.2f}")
+    Returns:
+        组合权重、预期收益与风险，以及各股票的边际风险贡献
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if len(symbols) < 2 or len(symbols) > 500:
+        return {"error": "symbols 数量必须在 2 到 500 之间"}
+    if lookback < 60 or lookback > 1000:
+        return {"error": "lookback 必须在 60 到 1000 之间"}
     
-    # 6. 生成投资建议
     try:
-        investment_advice = _generate_final_recommendation(total_score, {
-            'fundamental': fundamental_score,
-            'technical': technical_score, 
-            'money_flow': money_flow_score,
-            'sentiment': sentiment_score
-        })
-        await ctx.info("投资建议生成完成")
-    except Exception as e:
-        await ctx.error(f"投资建议生成失败: {e}")
-        investment_advice = {
-            'recommendation': '观望',
-            'confidence': '中等',
-            'target_multiplier': 1.02,
-            'stop_loss_multiplier': 0.98,
-            'position_size': '空仓',
-            'time_horizon': '观望',
-            'reasons': ['数据分析异常'],
-            'risks': ['建议等待系统恢复正常']
-        }
+        optimizer = PortfolioOptimizer(method, max_position_size=max_position_size,
+                                       sector_caps=sector_caps, max_sector_weight=max_sector_weight,
+                                       risk_aversion=risk_aversion, lookback=lookback)
+    except ValueError as e:
+        return {"error": str(e)}
     
-    return {
-        "symbol": symbol,
-        "current_price": current_price,
-        "change_percent": change_percent,
-        "analysis_timestamp": datetime.now().isoformat(),
-        
-        # 详细分析
-        "fundamental_analysis": {
-            "score": fundamental_score,
-            "pe_ratio": basic_info.get('pe_ratio', 0),
-            "market_cap": basic_info.get('market_cap', 0),
-            "financial_health": "良好" if financial_data and isinstance(financial_data, dict) else "数据不足",
-            "assessment": _get_fundamental_assessment(fundamental_score)
-        },
-        
-        "technical_analysis": {
-            "score": technical_score,
-            "indicators": tech_indicators if isinstance(tech_indicators, dict) else {},
-            "trend": "上涨" if change_percent > 0 else "下跌" if change_percent < 0 else "横盘",
-            "assessment": _get_technical_assessment(technical_score)
-        },
-        
-        "money_flow_analysis": {
-            "score": money_flow_score,
-            "main_net_inflow": money_flow.get('main_net_inflow', 0) if isinstance(money_flow, dict) else 0,
-            "volume_ratio": tech_indicators.get('volume_ratio', 0) if isinstance(tech_indicators, dict) else 0,
-            "assessment": _get_money_flow_assessment(money_flow_score)
-        },
-        
-        "sentiment_analysis": {
-            "score": sentiment_score,
-            "news_count": len(news) if isinstance(news, list) else 0,
-            "market_attention": sentiment.get('market_attention', 'medium') if isinstance(sentiment, dict) else 'medium',
-            "assessment": _get_sentiment_assessment(sentiment_score)
-        },
-        
-        # 综合建议
-        "investment_recommendation": {
-            "total_score": round(total_score, 2),
-            "recommendation": investment_advice['recommendation'],
-            "confidence_level": investment_advice['confidence'],
-            "target_price": round(current_price * investment_advice['target_multiplier'], 2),
-            "stop_loss": round(current_price * investment_advice['stop_loss_multiplier'], 2),
-            "position_size": investment_advice['position_size'],
-            "time_horizon": investment_advice['time_horizon'],
-            "key_reasons": investment_advice['reasons'],
-            "risk_warnings": investment_advice['risks']
-        }
-    }
-
-def _analyze_fundamentals(basic_info: Dict, financial_data: Dict) -> float:
-    """基本面分析评分 (0-100)"""
-    score = 50  # 基础分
+    await ctx.info(f"正在优化 {len(symbols)} 只股票的组合（{method}）...")
     
     try:
-        pe_ratio = basic_info.get('pe_ratio', 0)
-        market_cap = basic_info.get('market_cap', 0)
-        
-        # PE估值分析
-        if 0 < pe_ratio < 15:
-            score += 20  # 低估值
-        elif 15 <= pe_ratio < 25:
-            score += 10  # 合理估值
-        elif pe_ratio >= 40:
-            score -= 15  # 高估值
+        store = universe_ranker.store
+        async with StockDataFetcher() as fetcher:
+            missing = [s for s in symbols if s not in store]
+            if missing:
+                loaded = await store.load(missing, fetcher, days=lookback + 1)
+                await ctx.info(f"加载 {len(missing)} 只股票的历史K线，成功 {loaded} 只")
+            
+            sectors = None
+            if sector_caps or max_sector_weight is not None:
+                snapshot = await market_snapshots.get(fetcher)
+                if snapshot is None:
+                    return {"error": "无法获取行业数据，不能应用行业上限"}
+                industry = snapshot.column("industry")
+                sectors = {s: str(industry[i]) for s, i in zip(symbols, snapshot.index_of(symbols)) if i >= 0}
         
-        # 市值稳定性
-        if market_cap > 50000000000:  # 500亿以上
-            score += 10
-        elif market_cap > 10000000000:  # 100亿以上
-            score += 5
+        # 协方差取自相关性服务的滚动矩阵（同一股票组合重复优化时只增量追加新交易日）
+        estimate = correlation_service.shrunk_covariance(symbols, window=lookback,
+                                                         min_observations=MIN_OBSERVATIONS)
+        result = optimizer.optimize_covariance(
+            estimate["symbols"], estimate["mean"], estimate["covariance"], sectors,
+            shrinkage=estimate["shrinkage"], observations=estimate["observations"],
+            excluded=estimate["excluded"] + [s for s in symbols if s not in store]
+        )
+        if "error" in result:
+            await ctx.error(f"组合优化失败: {result['error']}")
+            return result
         
-        # 财务数据分析
-        if isinstance(financial_data, dict) and financial_data:
-            if financial_data.get('roe'):
-                score += 10  # 有ROE数据
-            if financial_data.get('profit'):
-                score += 5   # 有利润数据
-    
-    except Exception:
-        pass
+        await ctx.info(f"组合优化完成：持有 {len(result['holdings'])} 只，"
+                       f"预期年化波动率 {result['expected_volatility']:.2%}")
+        return {**result, "timestamp": datetime.now().isoformat()}
     
-    return max(0, min(100, score))
+    except Exception as e:
+        await ctx.error(f"组合优化时发生错误: {str(e)}")
+        return {"error": f"组合优化失败: {str(e)}"}
 
-def _analyze_technical_indicators(tech_indicators: Dict, basic_info: Dict) -> float:
-    """技术指标分析评分 (0-100)"""
-    score = 50  # 基础分
+@mcp.tool
+async def find_correlated_stocks(symbol: str, ctx: Context, n: int = 10,
+                                 least: bool = False,
+                                 window: Optional[int] = None,
+                                 basket: Optional[str] = None) -> Dict[str, Any]:
+    """
+    查找与指定股票日收益最相关（或最不相关）的股票
+    
+    Args:
+        symbol: 股票代码
+        n: 返回数量（1-50）
+        least: 为True时返回相关性最低的股票（用于分散化）
+        window: 滚动窗口交易日数，默认取配置 correlation.default_window
+        basket: 配置中的股票篮子名，默认在已加载历史的全部股票中查找
+    
+    Returns:
+        按相关系数排序的股票列表
+    """
+    if n < 1 or n > 50:
+        return {"error": "n 必须在 1 到 50 之间"}
     
     try:
-        if not isinstance(tech_indicators, dict):
-            return score
-        
-        current_price = basic_info.get('price', 0)
-        
-        # 移动平均线分析
-        ma5 = tech_indicators.get('ma5', 0)
-        ma10 = tech_indicators.get('ma10', 0)
-        ma20 = tech_indicators.get('ma20', 0)
-        
-        if ma5 > 0 and ma10 > 0 and ma20 > 0:
-            if current_price > ma5 > ma10 > ma20:
-                score += 20  # 多头排列
-            elif current_price > ma5 > ma10:
-                score += 10  # 短期向好
-            elif current_price < ma5 < ma10 < ma20:
-                score -= 20  # 空头排列
-        
-        # RSI分析
-        rsi = tech_indicators.get('rsi', 50)
-        if 30 <= rsi <= 70:
-            score += 10  # RSI正常区间
-        elif rsi < 30:
-            score += 15  # 超卖，可能反弹
-        elif rsi > 70:
-            score -= 10  # 超买，注意风险
-        
-        # MFI分析
-        mfi = tech_indicators.get('mfi', 50)
-        if 20 <= mfi <= 80:
-            score += 5   # MFI正常
-        elif mfi < 20:
-            score += 10  # 资金超卖
-        elif mfi > 80:
-            score -= 10  # 资金超买
+        window = window or correlation_service.default_window
+        universe = [symbol] + (correlation_service.resolve(basket) if basket else [])
+        store = correlation_service.store
+        missing = [s for s in dict.fromkeys(universe) if s not in store]
+        if missing:
+            async with StockDataFetcher() as fetcher:
+                loaded = await store.load(missing, fetcher, days=window + 1)
+            await ctx.info(f"加载 {len(missing)} 只股票的历史K线，成功 {loaded} 只")
         
-    except Exception:
-        pass
+        result = correlation_service.correlated(symbol, n, basket, window, least)
+        if "error" not in result:
+            await ctx.info(f"在 {result['universe']} 只股票中完成 {symbol} 的相关性查询")
+        return result
     
-    return max(0, min(100, score))
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        await ctx.error(f"相关性查询时发生错误: {str(e)}")
+        return {"error": f"相关性查询失败: {str(e)}"}
 
-def _analyze_money_flow(money_flow: Dict) -> float:
-    """资金流分析评分 (0-100)"""
-    score = 50  # 基础分
+@mcp.tool
+async def assess_risk(symbols: List[str], ctx: Context,
+                      weights: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    风险评估：计算波动率、下行偏差、最大回撤以及多个持有期的历史模拟法与参数法 VaR/CVaR
+    
+    Args:
+        symbols: 股票代码列表（1-3000只）
+        weights: 组合权重，如 {"600519": 0.6, "000001": 0.4}；提供时额外计算组合风险与成分VaR贡献
+    
+    Returns:
+        各股票的风险指标（以及组合风险），并对照配置中的止损比例与最大回撤阈值
+    """
+    symbols = list(dict.fromkeys(list(symbols) + list(weights or {})))
+    if len(symbols) < 1 or len(symbols) > 3000:
+        return {"error": "symbols 数量必须在 1 到 3000 之间"}
     
     try:
-        if not isinstance(money_flow, dict):
-            return score
-        
-        main_net_inflow = money_flow.get('main_net_inflow', 0)
-        super_large_net = money_flow.get('super_large_net', 0)
-        large_net = money_flow.get('large_net', 0)
-        
-        # 主力资金流入分析
-        if main_net_inflow > 0:
-            score += 20  # 主力净流入
-            if main_net_inflow > 10000000:  # 1000万以上
-                score += 10
-        else:
-            score -= 15  # 主力净流出
+        store = universe_ranker.store
+        missing = [s for s in symbols if s not in store]
+        if missing:
+            async with StockDataFetcher() as fetcher:
+                loaded = await store.load(missing, fetcher, days=risk_engine.lookback + 1)
+            await ctx.info(f"加载 {len(missing)} 只股票的历史K线，成功 {loaded} 只")
         
-        # 超大单分析
-        if super_large_net > 0:
-            score += 15  # 超大单净流入
-        elif super_large_net < -5000000:  # 500万以上流出
-            score -= 10
+        panel = store.panel(symbols, fields=("close",))
+        stocks = risk_engine.evaluate_many(panel)
+        for s in symbols:
+            stocks.setdefault(s, {"error": "没有历史数据"})
         
-        # 大单分析
-        if large_net > 0:
-            score += 10  # 大单净流入
+        result = {"stocks": stocks, "timestamp": datetime.now().isoformat()}
+        if weights:
+            result["portfolio"] = risk_engine.portfolio(weights, panel)
         
-    except Exception:
-        pass
+        breached = [s for s, m in stocks.items() if m.get("drawdown_breached")]
+        await ctx.info(f"完成 {len(symbols)} 只股票的风险评估，{len(breached)} 只最大回撤超过阈值")
+        return result
     
-    return max(0, min(100, score))
+    except Exception as e:
+        await ctx.error(f"风险评估时发生错误: {str(e)}")
+        return {"error": f"风险评估失败: {str(e)}"}
 
-def _analyze_market_sentiment(sentiment: Dict, news: List) -> float:
-    """市场情绪分析评分 (0-100)"""
-    score = 50  # 基础分
+@mcp.tool
+async def get_advice_cache_stats(ctx: Context, clear: bool = False) -> Dict[str, Any]:
+    """
+    查看建议报告缓存的命中率与容量
+    
+    Args:
+        clear: 为True时在返回统计后清空缓存
     
+    Returns:
+        缓存条目数、命中/未命中次数、命中率、淘汰次数与代码版本
+    """
+    stats = advice_cache.stats()
+    if clear:
+        advice_cache.clear()
+        await ctx.info(f"已清空建议缓存（{stats['entries']} 条）")
+    return stats
+
+# 专业投资建议使用的数据项：数据项 -> (StockDataFetcher 方法, 获取失败时的默认值)
+PROFESSIONAL_DATA = {
+    "financial_data": ("get_stock_financial_data", {}),
+    "money_flow": ("get_money_flow_data", {}),
+    "tech_indicators": ("get_technical_indicators", {}),
+    "sentiment": ("get_market_sentiment", {}),
+    "news": ("get_stock_news", [])
+}
+
+# 分析部分 -> (评分部分, 除基础数据外所需的数据项)
+PROFESSIONAL_SECTIONS = {
+    "fundamental_analysis": ("fundamental", ("financial_data",)),
+    "technical_analysis": ("technical", ("tech_indicators",)),
+    "money_flow_analysis": ("money_flow", ("money_flow", "tech_indicators")),
+    "sentiment_analysis": ("sentiment", ("sentiment", "news"))
+}
+
+# 各评分部分的评价：(最低分, 评价)，取第一个达到的
+SECTION_ASSESSMENTS = {
+    "fundamental": [(70, "基本面优秀"), (55, "基本面良好"), (40, "基本面一般"), (0, "基本面偏弱")],
+    "technical": [(70, "技术面强势"), (55, "技术面偏强"), (40, "技术面震荡"), (0, "技术面偏弱")],
+    "money_flow": [(70, "资金大幅流入"), (55, "资金流入"), (40, "资金进出平衡"), (0, "资金流出")],
+    "sentiment": [(70, "市场情绪高涨"), (55, "市场情绪积极"), (40, "市场情绪中性"), (0, "市场情绪低迷")]
+}
+
+def _assessment(component: str, score: float) -> str:
+    """评分对应的文字评价"""
+    for threshold, label in SECTION_ASSESSMENTS[component]:
+        if score >= threshold:
+            return label
+    return SECTION_ASSESSMENTS[component][-1][1]
+
+def _quote_section(basic_info: Dict) -> Dict[str, Any]:
+    """行情部分（基础数据到达后立即推送）"""
+    return {
+        "symbol": basic_info.get("symbol", ""),
+        "name": basic_info.get("name", ""),
+        "price": basic_info.get("price", 0),
+        "change_percent": basic_info.get("change_percent", 0),
+        "volume": basic_info.get("volume", 0),
+        "high": basic_info.get("high", 0),
+        "low": basic_info.get("low", 0),
+        "pe_ratio": basic_info.get("pe_ratio", 0),
+        "market_cap": basic_info.get("market_cap", 0)
+    }
+
+def _professional_section(section: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """由已到达的数据生成一个分析部分（各评分部分只读取自身的输入列）"""
+    component = PROFESSIONAL_SECTIONS[section][0]
+    basic_info = data["basic_info"]
+    financial_data = data.get("financial_data")
+    money_flow = data.get("money_flow") if isinstance(data.get("money_flow"), dict) else {}
+    tech_indicators = data.get("tech_indicators") if isinstance(data.get("tech_indicators"), dict) else {}
+    sentiment = data.get("sentiment") if isinstance(data.get("sentiment"), dict) else {}
+    news = data.get("news")
+    
+    row = _professional_score_inputs(basic_info, financial_data, money_flow, tech_indicators, sentiment, news)
+    score = scoring_plan("professional").component(component, row)
+    
+    if section == "fundamental_analysis":
+        details = {
+            "pe_ratio": basic_info.get("pe_ratio", 0),
+            "market_cap": basic_info.get("market_cap", 0),
+            "financial_health": "良好" if financial_data and isinstance(financial_data, dict) else "数据不足"
+        }
+    elif section == "technical_analysis":
+        change_percent = basic_info.get("change_percent", 0)
+        details = {
+            "indicators": tech_indicators,
+            "trend": "上涨" if change_percent > 0 else "下跌" if change_percent < 0 else "横盘"
+        }
+    elif section == "money_flow_analysis":
+        details = {
+            "main_net_inflow": money_flow.get("main_net_inflow", 0),
+            "volume_ratio": tech_indicators.get("volume_ratio", 0)
+        }
+    else:
+        details = {
+            "news_count": len(news) if isinstance(news, list) else 0,
+            "market_attention": sentiment.get("market_attention", "medium")
+        }
+    
+    return {"score": score, **details, "assessment": _assessment(component, score)}
+
+def _recommendation_section(scores: Dict[str, float], current_price: float) -> Dict[str, Any]:
+    """由各部分评分生成综合建议（权重见 config.json 的 scoring.professional）"""
+    total_score = scoring_plan("professional").total(scores)
     try:
-        # 新闻数量分析
-        if isinstance(news, list):
-            news_count = len(news)
-            if news_count > 5:
-                score += 10  # 关注度高
-            elif news_count > 2:
-                score += 5   # 关注度中等
-        
-        # 市场关注度
-        if isinstance(sentiment, dict):
-            attention = sentiment.get('market_attention', 'medium')
-            if attention == 'high':
-                score += 15
-            elif attention == 'low':
-                score -= 5
-        
-    except Exception:
-        pass
+        advice = _generate_final_recommendation(total_score, scores)
+    except Exception as e:
+        logger.error(f"投资建议生成失败: {e}")
+        advice = {
+            'recommendation': '观望',
+            'confidence': '中等',
+            'target_multiplier': 1.02,
+            'stop_loss_multiplier': 0.98,
+            'position_size': '空仓',
+            'time_horizon': '观望',
+            'reasons': ['数据分析异常'],
+            'risks': ['建议等待系统恢复正常']
+        }
     
-    return max(0, min(100, score))
+    return {
+        "total_score": round(total_score, 2),
+        "scores": scores,
+        "recommendation": advice['recommendation'],
+        "confidence_level": advice['confidence'],
+        "target_price": round(current_price * advice['target_multiplier'], 2),
+        "stop_loss": round(current_price * advice['stop_loss_multiplier'], 2),
+        "position_size": advice['position_size'],
+        "time_horizon": advice['time_horizon'],
+        "key_reasons": advice['reasons'],
+        "risk_warnings": advice['risks']
+    }
+
+def _professional_score_inputs(basic_info: Dict, financial_data: Dict, money_flow: Dict,
+                               tech_indicators: Dict, sentiment: Dict, news: List) -> Dict[str, Any]:
+    """将专业分析的各项数据展开为评分输入（非字典的数据视为缺失，缺失项由评分规则取默认值）"""
+    basic_info = basic_info if isinstance(basic_info, dict) else {}
+    financial_data = financial_data if isinstance(financial_data, dict) else {}
+    money_flow = money_flow if isinstance(money_flow, dict) else {}
+    tech_indicators = tech_indicators if isinstance(tech_indicators, dict) else {}
+    sentiment = sentiment if isinstance(sentiment, dict) else {}
+    
+    row = {
+        "pe_ratio": basic_info.get("pe_ratio"),
+        "market_cap": basic_info.get("market_cap"),
+        "current_price": basic_info.get("price"),
+        "roe": financial_data.get("roe"),
+        "profit": financial_data.get("profit"),
+        "news_count": len(news) if isinstance(news, list) else 0,
+        "market_attention": sentiment.get("market_attention")
+    }
+    for name in ("ma5", "ma10", "ma20", "rsi", "mfi"):
+        row[name] = tech_indicators.get(name)
+    for name in ("main_net_inflow", "super_large_net", "large_net"):
+        row[name] = money_flow.get(name)
+    return row
 
 def _generate_final_recommendation(total_score: float, scores: Dict) -> Dict[str, Any]:
-    """生成最终投资建议"""
+    """生成最终投资建议（评级阈值见 config.json 的 recommendation_thresholds）"""
+    thresholds = _recommendation_thresholds()
     
-    if total_score >= 75:
+    if total_score >= thresholds["strong_buy"]:
         recommendation = "强烈推荐"
         confidence = "高"
         target_multiplier = 1.15
@@ -507,7 +773,7 @@ def _generate_final_recommendation(total_score: float, scores: Dict) -> Dict[str
         time_horizon = "中长期"
         reasons = ["基本面优秀", "技术面强势", "资金流入积极"]
         risks = ["注意大盘系统性风险"]
-    elif total_score >= 65:
+    elif total_score >= thresholds["buy"]:
         recommendation = "推荐"
         confidence = "较高"
         target_multiplier = 1.10
@@ -516,7 +782,7 @@ def _generate_final_recommendation(total_score: float, scores: Dict) -> Dict[str
         time_horizon = "中期"
         reasons = ["综合表现良好", "上涨概率较大"]
         risks = ["关注技术面变化", "控制仓位风险"]
-    elif total_score >= 55:
+    elif total_score >= thresholds["watch"]:
         recommendation = "谨慎关注"
         confidence = "中等"
         target_multiplier = 1.05
@@ -525,7 +791,7 @@ def _generate_final_recommendation(total_score: float, scores: Dict) -> Dict[str
         time_horizon = "短期"
         reasons = ["存在一定机会"]
         risks = ["不确定性较大", "建议小仓位试探"]
-    elif total_score >= 45:
+    elif total_score >= thresholds["hold"]:
         recommendation = "观望"
         confidence = "中等"
         target_multiplier = 1.02
@@ -555,5 +821,15 @@ def _generate_final_recommendation(total_score: float, scores: Dict) -> Dict[str
         'risks': risks
     }
 
+# 默认评级阈值（总分不低于阈值即达到对应评级）
+DEFAULT_RECOMMENDATION_THRESHOLDS = {"strong_buy": 75, "buy": 65, "watch": 55, "hold": 45}
+
+def _recommendation_thresholds() -> Dict[str, float]:
+    """读取评级阈值配置，缺失项使用默认值"""
+    return {
+        name: get_setting("recommendation_thresholds", name, default)
+        for name, default in DEFAULT_RECOMMENDATION_THRESHOLDS.items()
+    }
+
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
@@ -11,10 +11,29 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 import logging
 
+from bars import Bars
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 东方财富K线周期代码
+KLINE_PERIODS = {
+    "1m": 1, "5m": 5, "15m": 15, "30m": 30, "60m": 60,
+    "daily": 101, "weekly": 102, "monthly": 103
+}
+
+# 综合数据的组成部分：部分名 -> (获取方法, 获取失败时的默认值)
+STOCK_DATA_PARTS = {
+    "basic_info": ("get_stock_info_from_eastmoney", dict),
+    "financial_data": ("get_stock_financial_data", dict),
+    "money_flow": ("get_money_flow_data", dict),
+    "technical_indicators": ("get_technical_indicators", dict),
+    "sentiment": ("get_market_sentiment", dict),
+    "news": ("get_stock_news", list),
+    "price_history": ("get_historical_bars", lambda: None)
+}
+
 class StockDataFetcher:
     """股票数据获取器"""
     
@@ -32,42 +51,32 @@ class StockDataFetcher:
         if self.session:
             await self.session.close()
     
-    async def fetch_stock_data(self, symbol: str) -> Dict[str, Any]:
-        """获取股票综合数据"""
+    async def fetch_stock_data(self, symbol: str,
+                               parts: Optional[List[str]] = None) -> Dict[str, Any]:
+        """获取股票综合数据，parts指定只获取其中部分数据（其余部分为空值）"""
         if not self.session:
             self.session = aiohttp.ClientSession(timeout=self.timeout)
             
+        parts = list(STOCK_DATA_PARTS) if parts is None else list(parts)
+        unknown = set(parts) - set(STOCK_DATA_PARTS)
+        if unknown:
+            return {"error": f"不支持的数据类型: {', '.join(sorted(unknown))}"}
+        
         try:
             # 并行获取多个数据源
-            tasks = [
-                self.get_stock_info_from_eastmoney(symbol),
-                self.get_stock_financial_data(symbol),
-                self.get_money_flow_data(symbol),
-                self.get_technical_indicators(symbol),
-                self.get_market_sentiment(symbol),
-                self.get_stock_news(symbol)
-            ]
-            
+            tasks = [getattr(self, STOCK_DATA_PARTS[name][0])(symbol) for name in parts]
             results = await asyncio.gather(*tasks, return_exceptions=True)
             
-            basic_info = results[0] if not isinstance(results[0], Exception) else {}
-            financial_data = results[1] if not isinstance(results[1], Exception) else {}
-            money_flow = results[2] if not isinstance(results[2], Exception) else {}
-            technical_indicators = results[3] if not isinstance(results[3], Exception) else {}
-            sentiment = results[4] if not isinstance(results[4], Exception) else {}
-            news = results[5] if not isinstance(results[5], Exception) else []
+            stock_data = {"symbol": symbol}
+            for name, (_, default) in STOCK_DATA_PARTS.items():
+                stock_data[name] = default()
+            for name, result in zip(parts, results):
+                if not isinstance(result, Exception):
+                    stock_data[name] = result
             
-            return {
-                "symbol": symbol,
-                "basic_info": basic_info,
-                "financial_data": financial_data,
-                "money_flow": money_flow,
-                "technical_indicators": technical_indicators,
-                "sentiment": sentiment,
-                "news": news,
-                "data_sources": ["东方财富", "同花顺", "雪球"],
-                "timestamp": datetime.now().isoformat()
-            }
+            stock_data["data_sources"] = ["东方财富", "同花顺", "雪球"]
+            stock_data["timestamp"] = datetime.now().isoformat()
+            return stock_data
             
         except Exception as e:
             logger.error(f"获取股票数据失败: {e}")
@@ -111,6 +120,92 @@ class StockDataFetcher:
         
         return {}
     
+    async def get_historical_bars(self, symbol: str, 
+                                 days: int = 250, 
+                                 period: str = "daily") -> Optional[Bars]:
+        """从东方财富获取历史K线（前复权）"""
+        try:
+            url = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
+            params = {
+                'secid': f"1.{symbol}" if symbol.startswith('6') else f"0.{symbol}",
+                'fields1': 'f1,f2,f3,f4,f5,f6',
+                'fields2': 'f51,f52,f53,f54,f55,f56,f57',
+                'klt': KLINE_PERIODS.get(period, 101),
+                'fqt': 1,
+                'end': '20500101',
+                'lmt': days
+            }
+            
+            async with self.session.get(url, params=params) as response:
+                if response.status == 200:
+                    data = await response.json(content_type=None)
+                    klines = (data.get('data') or {}).get('klines') or []
+                    if klines:
+                        return Bars.from_eastmoney_klines(klines, symbol=symbol)
+        except Exception as e:
+            logger.error(f"获取历史K线失败: {e}")
+        
+        return None
+    
+    async def get_market_snapshot(self, page_size: int = 6000) -> List[Dict[str, Any]]:
+        """从东方财富获取沪深A股全市场行情快照（原始字段记录列表）"""
+        from market_snapshot import CLIST_URL, A_SHARE_MARKETS, SNAPSHOT_FIELDS
+        
+        if not self.session:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        
+        records = []
+        page = 1
+        try:
+            while True:
+                params = {
+                    'pn': page,
+                    'pz': page_size,
+                    'po': 1,
+                    'np': 1,
+                    'fltt': 2,
+                    'invt': 2,
+                    'fid': 'f12',
+                    'fs': A_SHARE_MARKETS,
+                    'fields': ','.join(SNAPSHOT_FIELDS)
+                }
+                async with self.session.get(CLIST_URL, params=params) as response:
+                    if response.status != 200:
+                        break
+                    data = await response.json(content_type=None)
+                
+                payload = data.get('data') or {}
+                rows = payload.get('diff') or []
+                records.extend(rows)
+                if not rows or len(records) >= int(payload.get('total', 0)):
+                    break
+                page += 1
+        except Exception as e:
+            logger.error(f"获取全市场行情快照失败: {e}")
+        
+        return records
+    
+    async def get_quotes(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        """一次请求获取多只A股的最新行情（原始字段记录列表，字段见 market_snapshot.QUOTE_FIELDS）；
+        请求失败时抛出异常，由调用方按股票报告错误"""
+        from market_snapshot import ULIST_URL, QUOTE_FIELDS, to_secid
+        
+        if not self.session:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        
+        params = {
+            'fltt': 2,
+            'invt': 2,
+            'secids': ','.join(to_secid(symbol) for symbol in symbols),
+            'fields': ','.join(QUOTE_FIELDS)
+        }
+        async with self.session.get(ULIST_URL, params=params) as response:
+            if response.status != 200:
+                raise RuntimeError(f"行情接口返回状态码 {response.status}")
+            data = await response.json(content_type=None)
+        
+        return (data.get('data') or {}).get('diff') or []
+    
     async def get_stock_financial_data(self, symbol: str) -> Dict[str, Any]:
         """获取股票财务数据"""
         try:
@@ -254,10 +349,17 @@ class StockDataFetcher:
             logger.error(f"搜索股票失败: {e}")
             return []
 
-async def fetch_stock_data(symbol: str) -> Dict[str, Any]:
-    """获取股票综合数据的快捷函数"""
+async def fetch_stock_data(symbol: str, parts: Optional[List[str]] = None) -> Dict[str, Any]:
+    """获取股票综合数据的快捷函数（parts同 StockDataFetcher.fetch_stock_data）"""
+    async with StockDataFetcher() as fetcher:
+        return await fetcher.fetch_stock_data(symbol, parts)
+
+async def get_historical_price(symbol: str, 
+                               days: int = 250, 
+                               period: str = "daily") -> Optional[Bars]:
+    """获取历史K线的快捷函数"""
     async with StockDataFetcher() as fetcher:
-        return await fetcher.fetch_stock_data(symbol)
+        return await fetcher.get_historical_bars(symbol, days, period)
 
 async def search_stock(keyword: str) -> List[Dict[str, Any]]:
     """搜索股票的快捷函数"""
@@ -265,9 +367,9 @@ async def search_stock(keyword: str) -> List[Dict[str, Any]]:
         return await fetcher.search_stock(keyword)
 
 # 同步包装函数
-def get_stock_data_sync(symbol: str) -> Dict[str, Any]:
+def get_stock_data_sync(symbol: str, parts: Optional[List[str]] = None) -> Dict[str, Any]:
     """同步获取股票数据"""
-    return asyncio.run(fetch_stock_data(symbol))
+    return asyncio.run(fetch_stock_data(symbol, parts))
 
 def search_stock_sync(keyword: str) -> List[Dict[str, Any]]:
     """同步搜索股票"""
@@ -5,28 +5,61 @@
 
 import asyncio
 import math
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Sequence, Union
 from datetime import datetime, timedelta
 import logging
 
+import numpy as np
+
+from bars import Bars
+from indicator_graph import IndicatorGraph, IndicatorEngine, IndicatorContext
+from rolling_stats import rolling_moments, simple_returns
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 指标输入：收盘价序列或K线容器
+PriceInput = Union[List[float], Bars]
+
 class TechnicalAnalyzer:
     """技术分析器"""
     
     def __init__(self):
         self.indicators = {}
+        self.engine = IndicatorEngine(INDICATOR_GRAPH)
     
-    def calculate_ma(self, prices: List[float], period: int) -> float:
+    @staticmethod
+    def _closes(prices: PriceInput):
+        """取收盘价序列（Bars返回收盘价视图，列表原样返回）"""
+        return prices.close if isinstance(prices, Bars) else prices
+    
+    def indicator_context(self, prices: PriceInput, 
+                          volumes: Optional[List[float]] = None, 
+                          symbol: str = "") -> IndicatorContext:
+        """创建指标依赖图的计算上下文，同一上下文内的中间结果只计算一次"""
+        if isinstance(prices, Bars):
+            return self.engine.context(prices)
+        
+        n = len(prices)
+        volume_series = [0.0] * n
+        if volumes is not None and len(volumes) > 0:
+            tail = list(volumes[-n:])
+            volume_series[n - len(tail):] = tail
+        
+        bars = Bars(np.arange(n), prices, prices, prices, prices, volume_series, symbol=symbol)
+        return self.engine.context(bars, has_range=False)
+    
+    def calculate_ma(self, prices: PriceInput, period: int) -> float:
         """计算移动平均线"""
+        prices = self._closes(prices)
         if len(prices) < period:
             return 0.0
         return sum(prices[-period:]) / period
     
-    def calculate_ema(self, prices: List[float], period: int) -> float:
+    def calculate_ema(self, prices: PriceInput, period: int) -> float:
         """计算指数移动平均线"""
+        prices = self._closes(prices)
         if len(prices) < period:
             return 0.0
         
@@ -38,8 +71,9 @@ class TechnicalAnalyzer:
         
         return ema
     
-    def calculate_rsi(self, prices: List[float], period: int = 14) -> float:
+    def calculate_rsi(self, prices: PriceInput, period: int = 14) -> float:
         """计算RSI指标"""
+        prices = self._closes(prices)
         if len(prices) < period + 1:
             return 50.0
         
@@ -69,46 +103,30 @@ class TechnicalAnalyzer:
         
         return min(100, max(0, rsi))
     
-    def calculate_macd(self, prices: List[float], 
+    def calculate_macd(self, prices: PriceInput, 
                       fast_period: int = 12, 
                       slow_period: int = 26, 
                       signal_period: int = 9) -> Dict[str, float]:
         """计算MACD指标"""
+        prices = self._closes(prices)
         if len(prices) < slow_period:
             return {"macd": 0.0, "signal": 0.0, "histogram": 0.0}
         
-        # 计算EMA
-        fast_ema = self.calculate_ema(prices, fast_period)
-        slow_ema = self.calculate_ema(prices, slow_period)
-        
-        macd_line = fast_ema - slow_ema
-        
-        # 计算信号线（MACD的EMA）
-        macd_values = []
-        for i in range(signal_period, len(prices) + 1):
-            if i >= slow_period:
-                fast = self.calculate_ema(prices[:i], fast_period)
-                slow = self.calculate_ema(prices[:i], slow_period)
-                macd_values.append(fast - slow)
-        
-        if len(macd_values) >= signal_period:
-            signal_line = sum(macd_values[-signal_period:]) / signal_period
-        else:
-            signal_line = 0.0
-        
-        histogram = macd_line - signal_line
-        
-        return {
-            "macd": macd_line,
-            "signal": signal_line,
-            "histogram": histogram
-        }
+        ctx = self.indicator_context(prices)
+        return macd_snapshot(ctx.get("macd", fast=fast_period, slow=slow_period, signal=signal_period))
     
-    def calculate_kdj(self, prices: List[float], 
-                     highs: List[float], 
-                     lows: List[float], 
+    def calculate_kdj(self, prices: PriceInput, 
+                     highs: Optional[List[float]] = None, 
+                     lows: Optional[List[float]] = None, 
                      period: int = 9) -> Dict[str, float]:
-        """计算KDJ指标"""
+        """计算KDJ指标（传入Bars时使用真实最高价/最低价）"""
+        if isinstance(prices, Bars):
+            highs = prices.high if highs is None else highs
+            lows = prices.low if lows is None else lows
+            prices = prices.close
+        highs = prices if highs is None else highs
+        lows = prices if lows is None else lows
+        
         if len(prices) < period:
             return {"k": 50.0, "d": 50.0, "j": 50.0}
         
@@ -149,82 +167,70 @@ class TechnicalAnalyzer:
             "j": min(100, max(0, j))
         }
     
-    def calculate_bollinger_bands(self, prices: List[float], 
+    def calculate_bollinger_bands(self, prices: PriceInput, 
                                  period: int = 20, 
                                  std_dev: float = 2.0) -> Dict[str, float]:
         """计算布林带"""
+        prices = self._closes(prices)
         if len(prices) < period:
             return {"upper": 0.0, "middle": 0.0, "lower": 0.0}
         
-        middle_band = self.calculate_ma(prices, period)
+        moments = rolling_moments(prices[-period:], period, std_dev)
         
-        # 计算标准差
-        variance = sum((price - middle_band) ** 2 for price in prices[-period:]) / period
-        std = math.sqrt(variance)
-        
-        upper_band = middle_band + (std * std_dev)
-        lower_band = middle_band - (std * std_dev)
+        return {
+            "upper": float(moments["upper"][-1]),
+            "middle": float(moments["mean"][-1]),
+            "lower": float(moments["lower"][-1])
+        }
+    
+    def calculate_bollinger_series(self, prices: PriceInput, 
+                                  period: int = 20, 
+                                  std_dev: float = 2.0) -> Dict[str, List[float]]:
+        """计算布林带序列（中轨、标准差、Z值、带宽），窗口未满处为None"""
+        prices = self._closes(prices)
+        moments = rolling_moments(prices, period, std_dev)
         
         return {
-            "upper": upper_band,
-            "middle": middle_band,
-            "lower": lower_band
+            key: [None if math.isnan(v) else float(v) for v in series]
+            for key, series in moments.items()
         }
     
-    def calculate_volume_ratio(self, volumes: List[float], period: int = 5) -> float:
+    def calculate_volume_ratio(self, volumes: Union[List[float], Bars], period: int = 5) -> float:
         """计算量比"""
-        if len(volumes) < period + 1:
-            return 1.0
-        
-        current_volume = volumes[-1]
-        avg_volume = sum(volumes[-period-1:-1]) / period
-        
-        if avg_volume == 0:
-            return 1.0
-        
-        return current_volume / avg_volume
+        if isinstance(volumes, Bars):
+            volumes = volumes.volume
+        return _volume_ratio(volumes, period)
     
-    def calculate_mfi(self, prices: List[float], volumes: List[float], period: int = 14) -> float:
-        """计算资金流量指标（MFI）"""
-        if len(prices) < period + 1 or len(volumes) < period + 1:
-            return 50.0
-        
-        typical_prices = [(prices[i] + max(prices[i], prices[i-1]) + min(prices[i], prices[i-1])) / 3 
-                         for i in range(1, len(prices))]
-        
-        positive_flow = []
-        negative_flow = []
+    def calculate_mfi(self, prices: PriceInput, volumes: Optional[List[float]] = None, 
+                     period: int = 14) -> float:
+        """计算资金流量指标（MFI），传入Bars时使用真实典型价格"""
+        bars = prices if isinstance(prices, Bars) else None
+        if bars is not None:
+            prices = bars.close
+            volumes = bars.volume if volumes is None else volumes
+        volumes = [] if volumes is None else volumes
         
-        for i in range(1, len(typical_prices)):
-            if typical_prices[i] > typical_prices[i-1]:
-                positive_flow.append(typical_prices[i] * volumes[i])
-                negative_flow.append(0)
-            else:
-                positive_flow.append(0)
-                negative_flow.append(typical_prices[i] * volumes[i])
-        
-        if len(positive_flow) < period:
+        if len(prices) < period + 1 or len(volumes) < period + 1:
             return 50.0
         
-        positive_money_flow = sum(positive_flow[-period:])
-        negative_money_flow = sum(negative_flow[-period:])
-        
-        if negative_money_flow == 0:
-            return 100.0
-        
-        money_ratio = positive_money_flow / negative_money_flow
-        mfi = 100 - (100 / (1 + money_ratio))
+        if bars is not None:
+            typical_prices = ((bars.high + bars.low + bars.close) / 3)[1:].tolist()
+        else:
+            typical_prices = [(prices[i] + max(prices[i], prices[i-1]) + min(prices[i], prices[i-1])) / 3 
+                             for i in range(1, len(prices))]
         
-        return min(100, max(0, mfi))
+        return _money_flow_index(typical_prices, volumes, period)
     
-    def analyze_trend(self, prices: List[float]) -> Dict[str, Any]:
+    def analyze_trend(self, prices: PriceInput) -> Dict[str, Any]:
         """分析价格趋势"""
+        prices = self._closes(prices)
         if len(prices) < 5:
             return {"trend": "unknown", "strength": 0.0}
         
         # 计算短期和长期趋势
         short_ma = self.calculate_ma(prices, 5)
-        long_ma = self.calculate_ma(prices, 20)
+        band = rolling_moments(prices[-20:], 20) if len(prices) >= 20 else None
+        long_ma = float(band["mean"][-1]) if band else 0.0
         
         current_price = prices[-1]
         
@@ -246,56 +252,59 @@ class TechnicalAnalyzer:
             "trend": trend,
             "strength": strength,
             "price_change": price_change,
-            "volatility": volatility
+            "volatility": volatility,
+            "price_zscore": float(band["zscore"][-1]) if band else 0.0
         }
     
-    def calculate_volatility(self, prices: List[float]) -> float:
+    def calculate_volatility(self, prices: PriceInput) -> float:
         """计算价格波动率"""
+        prices = self._closes(prices)
         if len(prices) < 2:
             return 0.0
         
-        returns = [(prices[i] - prices[i-1]) / prices[i-1] * 100 
-                  for i in range(1, len(prices))]
-        
-        mean_return = sum(returns) / len(returns)
-        variance = sum((r - mean_return) ** 2 for r in returns) / len(returns)
+        returns = simple_returns(prices, percent=True)
+        moments = rolling_moments(returns, len(returns))
         
-        return math.sqrt(variance)
+        return float(moments["std"][-1])
     
     def generate_technical_report(self, symbol: str, 
-                                 prices: List[float], 
-                                 volumes: List[float]) -> Dict[str, Any]:
-        """生成技术分析报告"""
+                                 prices: PriceInput, 
+                                 volumes: Optional[List[float]] = None) -> Dict[str, Any]:
+        """生成技术分析报告（传入Bars时无需单独提供成交量）"""
         if len(prices) < 20:
             return {"error": "数据不足，需要至少20个数据点"}
         
+        # 各指标共享同一计算上下文：MA20、EMA、波动率等中间结果只计算一次
+        ctx = self.indicator_context(prices, volumes, symbol)
+        closes = ctx.bars.close
+        kdj = ctx.get("kdj")
+        bollinger = ctx.get("bollinger")
+        
         report = {
             "symbol": symbol,
             "analysis_date": datetime.now().isoformat(),
             "price_analysis": {
-                "current_price": prices[-1],
-                "price_change": (prices[-1] - prices[0]) / prices[0] * 100,
-                "volatility": self.calculate_volatility(prices)
+                "current_price": float(closes[-1]),
+                "price_change": float((closes[-1] - closes[0]) / closes[0] * 100),
+                "volatility": ctx.get("volatility")
             },
             "moving_averages": {
-                "ma5": self.calculate_ma(prices, 5),
-                "ma10": self.calculate_ma(prices, 10),
-                "ma20": self.calculate_ma(prices, 20),
-                "ma60": self.calculate_ma(prices, 60)
+                f"ma{period}": last_value(ctx.get("ma", period=period), 0.0)
+                for period in (5, 10, 20, 60)
             },
             "momentum_indicators": {
-                "rsi": self.calculate_rsi(prices),
-                "macd": self.calculate_macd(prices),
-                "kdj": self.calculate_kdj(prices, prices, prices)
+                "rsi": last_value(ctx.get("rsi"), 50.0),
+                "macd": macd_snapshot(ctx.get("macd")),
+                "kdj": {key: last_value(kdj[key], 50.0) for key in ("k", "d", "j")}
             },
             "volume_indicators": {
-                "volume_ratio": self.calculate_volume_ratio(volumes),
-                "mfi": self.calculate_mfi(prices, volumes)
+                "volume_ratio": ctx.get("volume_ratio"),
+                "mfi": ctx.get("mfi")
             },
             "volatility_indicators": {
-                "bollinger_bands": self.calculate_bollinger_bands(prices)
+                "bollinger_bands": {key: last_value(bollinger[key], 0.0) for key in ("upper", "middle", "lower")}
             },
-            "trend_analysis": self.analyze_trend(prices)
+            "trend_analysis": ctx.get("trend")
         }
         
         # 生成交易信号
@@ -378,10 +387,249 @@ class TechnicalAnalyzer:
         
         return signals
 
+def last_value(series: np.ndarray, default: float) -> float:
+    """取序列最后一个值，缺失时返回默认值"""
+    if len(series) == 0 or np.isnan(series[-1]):
+        return default
+    return float(series[-1])
+
+def macd_snapshot(macd: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """由MACD序列取最新的MACD、信号线和柱状值"""
+    macd_line = last_value(macd["macd"], 0.0)
+    signal_line = last_value(macd["signal"], 0.0)
+    return {"macd": macd_line, "signal": signal_line, "histogram": macd_line - signal_line}
+
+def _volume_ratio(volumes: Sequence[float], period: int) -> float:
+    """量比：最新成交量与前period日均量之比"""
+    if len(volumes) < period + 1:
+        return 1.0
+    
+    current_volume = volumes[-1]
+    avg_volume = sum(volumes[-period-1:-1]) / period
+    
+    if avg_volume == 0:
+        return 1.0
+    
+    return float(current_volume / avg_volume)
+
+def _money_flow_index(typical_prices: Sequence[float], 
+                      volumes: Sequence[float], 
+                      period: int) -> float:
+    """由典型价格序列和成交量计算MFI"""
+    positive_flow = []
+    negative_flow = []
+    
+    for i in range(1, len(typical_prices)):
+        if typical_prices[i] > typical_prices[i-1]:
+            positive_flow.append(typical_prices[i] * volumes[i])
+            negative_flow.append(0)
+        else:
+            positive_flow.append(0)
+            negative_flow.append(typical_prices[i] * volumes[i])
+    
+    if len(positive_flow) < period:
+        return 50.0
+    
+    positive_money_flow = sum(positive_flow[-period:])
+    negative_money_flow = sum(negative_flow[-period:])
+    
+    if negative_money_flow == 0:
+        return 100.0
+    
+    money_ratio = positive_money_flow / negative_money_flow
+    mfi = 100 - (100 / (1 + money_ratio))
+    
+    return float(min(100, max(0, mfi)))
+
+# 指标依赖图：各节点声明输入与参数，由 IndicatorEngine 按（股票、K线区间、参数）缓存
+INDICATOR_GRAPH = IndicatorGraph()
+
+@INDICATOR_GRAPH.register("moments", inputs=("close",), period=20)
+def _moments_node(ctx: IndicatorContext, period: int) -> Dict[str, np.ndarray]:
+    """滚动均值、标准差与Z值"""
+    return rolling_moments(ctx.field("close"), period)
+
+@INDICATOR_GRAPH.register("ma", inputs=("moments",), period=20)
+def _ma_node(ctx: IndicatorContext, period: int) -> np.ndarray:
+    """移动平均线"""
+    return ctx.get("moments", period=period)["mean"]
+
+@INDICATOR_GRAPH.register("bollinger", inputs=("moments",), period=20, std_dev=2.0)
+def _bollinger_node(ctx: IndicatorContext, period: int, std_dev: float) -> Dict[str, np.ndarray]:
+    """布林带（与均线共享滚动矩）"""
+    moments = ctx.get("moments", period=period)
+    return {
+        "upper": moments["mean"] + moments["std"] * std_dev,
+        "middle": moments["mean"],
+        "lower": moments["mean"] - moments["std"] * std_dev
+    }
+
+@INDICATOR_GRAPH.register("ema", inputs=("close",), period=12)
+def _ema_node(ctx: IndicatorContext, period: int) -> np.ndarray:
+    """指数移动平均（以首日价格为初值）"""
+    closes = ctx.field("close").tolist()
+    result = np.empty(len(closes))
+    if not closes:
+        return result
+    
+    multiplier = 2 / (period + 1)
+    ema = closes[0]
+    result[0] = ema
+    for i in range(1, len(closes)):
+        ema = (closes[i] * multiplier) + (ema * (1 - multiplier))
+        result[i] = ema
+    
+    return result
+
+@INDICATOR_GRAPH.register("macd", inputs=("ema",), fast=12, slow=26, signal=9)
+def _macd_node(ctx: IndicatorContext, fast: int, slow: int, signal: int) -> Dict[str, np.ndarray]:
+    """MACD（信号线为最近signal个MACD值的简单平均）"""
+    macd = ctx.get("ema", period=fast) - ctx.get("ema", period=slow)
+    macd[:slow - 1] = np.nan
+    
+    signal_line = np.full(len(macd), np.nan)
+    start = max(signal, slow) + signal - 2
+    if len(macd) > start:
+        cumsum = np.concatenate(([0.0], np.cumsum(np.nan_to_num(macd, nan=0.0))))
+        ends = np.arange(start + 1, len(macd) + 1)
+        signal_line[start:] = (cumsum[ends] - cumsum[ends - signal]) / signal
+    
+    return {"macd": macd, "signal": signal_line, "histogram": macd - signal_line}
+
+@INDICATOR_GRAPH.register("rsi", inputs=("close",), period=14)
+def _rsi_node(ctx: IndicatorContext, period: int) -> np.ndarray:
+    """RSI（最近period个涨跌幅的简单平均）"""
+    closes = ctx.field("close")
+    result = np.full(len(closes), np.nan)
+    if len(closes) < period + 1:
+        return result
+    
+    change = np.diff(closes)
+    gains = np.concatenate(([0.0], np.cumsum(np.where(change > 0, change, 0.0))))
+    losses = np.concatenate(([0.0], np.cumsum(np.where(change > 0, 0.0, -change))))
+    avg_gain = (gains[period:] - gains[:-period]) / period
+    avg_loss = (losses[period:] - losses[:-period]) / period
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    
+    result[period:] = np.clip(rsi, 0, 100)
+    return result
+
+@INDICATOR_GRAPH.register("kdj", inputs=("close", "high", "low"), period=9)
+def _kdj_node(ctx: IndicatorContext, period: int) -> Dict[str, np.ndarray]:
+    """KDJ（K、D以50为初值按1/3权重平滑）"""
+    closes = ctx.field("close").tolist()
+    highs = ctx.field("high").tolist()
+    lows = ctx.field("low").tolist()
+    n = len(closes)
+    k_series = np.full(n, np.nan)
+    d_series = np.full(n, np.nan)
+    
+    k, d = 50.0, 50.0
+    for i in range(period - 1, n):
+        period_high = max(highs[i-period+1:i+1])
+        period_low = min(lows[i-period+1:i+1])
+        
+        if period_high == period_low:
+            rsv = 50.0
+        else:
+            rsv = ((closes[i] - period_low) / (period_high - period_low)) * 100
+        
+        k = (2/3) * k + (1/3) * rsv
+        d = (2/3) * d + (1/3) * k
+        k_series[i] = k
+        d_series[i] = d
+    
+    j_series = 3 * k_series - 2 * d_series
+    return {
+        "k": np.clip(k_series, 0, 100),
+        "d": np.clip(d_series, 0, 100),
+        "j": np.clip(j_series, 0, 100)
+    }
+
+@INDICATOR_GRAPH.register("returns", inputs=("close",))
+def _returns_node(ctx: IndicatorContext) -> np.ndarray:
+    """百分比收益率序列"""
+    return simple_returns(ctx.field("close"), percent=True)
+
+@INDICATOR_GRAPH.register("volatility", inputs=("returns",))
+def _volatility_node(ctx: IndicatorContext) -> float:
+    """全样本收益率波动率（总体标准差，百分比）"""
+    returns = ctx.get("returns")
+    if len(returns) == 0:
+        return 0.0
+    return float(rolling_moments(returns, len(returns))["std"][-1])
+
+@INDICATOR_GRAPH.register("trend", inputs=("close", "ma", "moments", "volatility"))
+def _trend_node(ctx: IndicatorContext) -> Dict[str, Any]:
+    """价格趋势（与 TechnicalAnalyzer.analyze_trend 口径一致）"""
+    prices = ctx.field("close")
+    if len(prices) < 5:
+        return {"trend": "unknown", "strength": 0.0}
+    
+    short_ma = last_value(ctx.get("ma", period=5), 0.0)
+    band = ctx.get("moments", period=20)
+    long_ma = last_value(band["mean"], 0.0)
+    current_price = float(prices[-1])
+    
+    if current_price > short_ma > long_ma:
+        trend = "bullish"
+    elif current_price < short_ma < long_ma:
+        trend = "bearish"
+    else:
+        trend = "sideways"
+    
+    price_change = float((prices[-1] - prices[0]) / prices[0] * 100)
+    volatility = ctx.get("volatility")
+    strength = min(100, abs(price_change) / (volatility + 0.001) * 10)
+    
+    return {
+        "trend": trend,
+        "strength": strength,
+        "price_change": price_change,
+        "volatility": volatility,
+        "price_zscore": last_value(band["zscore"], 0.0)
+    }
+
+@INDICATOR_GRAPH.register("volume_ratio", inputs=("volume",), period=5)
+def _volume_ratio_node(ctx: IndicatorContext, period: int) -> float:
+    """量比"""
+    return _volume_ratio(ctx.field("volume"), period)
+
+@INDICATOR_GRAPH.register("mfi", inputs=("close", "high", "low", "volume"), period=14)
+def _mfi_node(ctx: IndicatorContext, period: int) -> float:
+    """资金流量指标（无真实高低价时以相邻收盘价近似典型价格）"""
+    closes = ctx.field("close")
+    volumes = ctx.field("volume").tolist()
+    if len(closes) < period + 1 or not any(volumes):
+        return 50.0
+    
+    if ctx.has_range:
+        typical = (ctx.field("high") + ctx.field("low") + closes) / 3
+        typical_prices = typical[1:].tolist()
+    else:
+        prices = closes.tolist()
+        typical_prices = [(prices[i] + max(prices[i], prices[i-1]) + min(prices[i], prices[i-1])) / 3 
+                         for i in range(1, len(prices))]
+    
+    return _money_flow_index(typical_prices, volumes, period)
+
+def history_closes(stock_data: Dict[str, Any]) -> Sequence[float]:
+    """从股票数据中提取历史收盘价序列（无历史数据时返回空列表）"""
+    history = stock_data.get("price_history") if isinstance(stock_data, dict) else None
+    if history is None or len(history) == 0:
+        return []
+    
+    if isinstance(history, Bars):
+        return history.close
+    
+    return [float(p) for p in history]
+
 # 快捷函数
 def analyze_stock_technical(symbol: str, 
-                          prices: List[float], 
-                          volumes: List[float]) -> Dict[str, Any]:
+                          prices: PriceInput, 
+                          volumes: Optional[List[float]] = None) -> Dict[str, Any]:
     """分析股票技术指标"""
     analyzer = TechnicalAnalyzer()
     return analyzer.generate_technical_report(symbol, prices, volumes)
@@ -0,0 +1,133 @@
+"""
+建议结果缓存测试
+验证输入指纹的稳定性、LRU淘汰与命中统计、代码版本变化后失效、命中时跳过计算、
+评分分段按输入复用，以及报告差异
+"""
+
+import asyncio
+
+import numpy as np
+
+from advice_cache import AdviceCache, fingerprint, report_diff
+from bars import Bars
+from get_stock_advice import StockAdvisor
+
+def make_stock_data(last_close: float = 10.0) -> dict:
+    """含历史K线的股票数据"""
+    dates = np.busday_offset("2024-01-01", np.arange(60), roll="forward")
+    closes = np.linspace(9, last_close, 60)
+    return {
+        "symbol": "600519",
+        "timestamp": "2024-03-25T10:00:00",
+        "basic_info": {"price": last_close, "pe_ratio": 25, "volume": 5000000},
+        "technical_indicators": {"rsi": 55, "ma5": 9.9, "ma20": 9.6},
+        "price_history": Bars(dates, closes, closes, closes, closes, np.ones(60))
+    }
+
+def test_fingerprint_stable():
+    """指纹与字典键顺序、时间戳无关，K线内容变化时改变"""
+    data = make_stock_data()
+    reordered = {key: data[key] for key in reversed(list(data))}
+    reordered["timestamp"] = "2024-03-25T10:05:00"
+    assert fingerprint(data, "medium") == fingerprint(reordered, "medium")
+    assert fingerprint(data, "medium") != fingerprint(data, "long")
+    assert fingerprint(data) != fingerprint(make_stock_data(10.5))
+    assert fingerprint({"pe": 1}) != fingerprint({"pe": "1"})
+
+def test_lru_and_stats():
+    """超过容量时淘汰最久未用的条目，统计命中率"""
+    cache = AdviceCache(max_entries=2, ttl=None, version="v1")
+    for name in ("a", "b"):
+        cache.put(cache.key("report", name), {"name": name})
+    assert cache.get(cache.key("report", "a")) == {"name": "a"}
+    cache.put(cache.key("report", "c"), {"name": "c"})
+    assert cache.get(cache.key("report", "b")) is None
+    
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    
+    # 代码版本不同，键不同
+    assert AdviceCache(version="v2").key("report", "a") != cache.key("report", "a")
+
+def test_returned_reports_are_copies():
+    """修改保存前的报告或命中返回的报告都不影响缓存条目"""
+    cache = AdviceCache(ttl=None, version="v1")
+    key = cache.key("report", "a")
+    report = {"advice": {"reasons": ["估值合理"]}}
+    cache.put(key, report)
+    report["advice"]["reasons"].append("保存后修改")
+    
+    hit = cache.get(key)
+    hit["advice"]["reasons"].clear()
+    assert cache.get(key) == {"advice": {"reasons": ["估值合理"]}}
+
+def test_advisor_hit_skips_computation():
+    """输入未变化时第二次请求直接返回缓存报告，数据变化后重新计算"""
+    advisor = StockAdvisor(advice_cache=AdviceCache(ttl=None, version="test"))
+    calls = []
+    original = advisor.generate_investment_advice
+    
+    async def counted(stock_data, *args):
+        calls.append(stock_data["basic_info"]["price"])
+        return await original(stock_data, *args)
+    advisor.generate_investment_advice = counted
+    
+    async def main():
+        first = await advisor.get_professional_advice("600519", make_stock_data())
+        again = await advisor.get_professional_advice("600519", make_stock_data())
+        changed = await advisor.get_professional_advice("600519", make_stock_data(10.5))
+        return first, again, changed
+    
+    first, again, changed = asyncio.run(main())
+    assert calls == [10.0, 10.5]
+    assert (first["cached"], again["cached"], changed["cached"]) == (False, True, False)
+    assert again["advice"] == first["advice"]
+    assert advisor.advice_cache.stats()["hits"] == 1
+
+def test_advisor_reuses_unchanged_score_sections():
+    """只有价格变动时基本面、情绪与资金流评分分段直接复用，评分与整体求值一致"""
+    advisor = StockAdvisor(advice_cache=AdviceCache(ttl=None, version="test"))
+    calls = []
+    original = advisor.section_points
+    
+    def counted(section, stock_data):
+        calls.append(section)
+        return original(section, stock_data)
+    advisor.section_points = counted
+    
+    def with_data(price):
+        data = make_stock_data(price)
+        data["financial_data"] = {"roe": 16, "profit_margin": 12}
+        data["money_flow"] = {"main_net_inflow": -2e6}
+        data["sentiment"] = {"news_sentiment": 0.7, "analyst_rating": "buy"}
+        data["technical_indicators"]["current_price"] = price
+        return data
+    
+    async def main():
+        first = await advisor.get_professional_advice("600519", with_data(10.0))
+        changed = await advisor.get_professional_advice("600519", with_data(10.5))
+        return first, changed
+    
+    first, changed = asyncio.run(main())
+    assert calls == ["fundamental", "technical", "sentiment", "money_flow", "technical"]
+    assert advisor.score_sections(with_data(10.5))[1] == ["fundamental", "technical", "sentiment", "money_flow"]
+    
+    for report, price in ((first, 10.0), (changed, 10.5)):
+        expected = advisor.scoring.score(advisor.score_inputs(with_data(price)))
+        scores = report["advice"]["scores"]
+        for name in ("fundamental", "technical", "sentiment"):
+            assert abs(scores[name] - expected[name]) < 1e-9
+        assert abs(report["advice"]["score"] - expected["total"]) < 1e-9
+
+def test_report_diff():
+    """报告差异按字典逐键给出 JSON Patch 操作"""
+    old = {"price": 10.0, "sections": {"a/b": {"score": 60, "tags": [1, 2]}, "gone": 1}}
+    new = {"price": 10.5, "sections": {"a/b": {"score": 60, "tags": [1, 3]}, "added": {"x": 1}}}
+    assert report_diff(old, new) == [
+        {"op": "replace", "path": "/price", "value": 10.5},
+        {"op": "remove", "path": "/sections/gone"},
+        {"op": "replace", "path": "/sections/a~1b/tags", "value": [1, 3]},
+        {"op": "add", "path": "/sections/added", "value": {"x": 1}}
+    ]
+    assert report_diff(new, new) == []
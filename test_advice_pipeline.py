@@ -0,0 +1,127 @@
+"""
+建议生成流水线测试
+验证阶段只计算一次、受保护阶段的并发上限以及超时/失败状态
+"""
+
+import asyncio
+
+from advice_pipeline import AdvicePipeline
+
+def make_pipeline(calls: dict, active: dict) -> AdvicePipeline:
+    """构造含一个共享上游阶段和多个受保护慢阶段的流水线"""
+    pipeline = AdvicePipeline(external_inputs=("symbol",))
+    
+    @pipeline.register("data", inputs=("symbol",))
+    async def data(run, symbol):
+        calls["data"] = calls.get("data", 0) + 1
+        await asyncio.sleep(0.01)
+        return {"symbol": symbol}
+    
+    async def slow(run, data, delay):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            active["now"] -= 1
+        return {"value": data["symbol"]}
+    
+    for i in range(4):
+        pipeline.register(f"section{i}", inputs=("data",), guarded=True, timeout=1.0)(
+            lambda run, data: slow(run, data, 0.05))
+    
+    @pipeline.register("hanging", inputs=("data",), guarded=True, timeout=0.05)
+    async def hanging(run, data):
+        await asyncio.sleep(10)
+    
+    @pipeline.register("broken", inputs=("data",), guarded=True)
+    def broken(run, data):
+        raise RuntimeError("数据源不可用")
+    
+    @pipeline.register("summary", inputs=("section0", "hanging"))
+    def summary(run, section0, hanging):
+        return [section0["status"], hanging["status"]]
+    
+    return pipeline
+
+def test_stage_computed_once_and_bounded():
+    """共享阶段只计算一次，受保护阶段同时执行数不超过上限"""
+    calls, active = {}, {"now": 0, "max": 0}
+    pipeline = make_pipeline(calls, active)
+    
+    async def main():
+        run = pipeline.start(None, {"symbol": "600519"}, max_concurrency=2)
+        return run, await run.collect([f"section{i}" for i in range(4)])
+    
+    run, results = asyncio.run(main())
+    assert calls["data"] == 1
+    assert active["max"] == 2
+    assert all(r == {"value": "600519", "status": "ok"} for r in results.values())
+    assert set(run.status) == {f"section{i}" for i in range(4)}
+
+def test_timeout_and_failure_do_not_block_report():
+    """超时与失败的阶段带状态返回，下游阶段照常计算"""
+    pipeline = make_pipeline({}, {"now": 0, "max": 0})
+    
+    async def main():
+        run = pipeline.start(None, {"symbol": "600519"})
+        return run, await run.collect(["summary", "broken"])
+    
+    run, results = asyncio.run(main())
+    assert results["summary"] == ["ok", "timed_out"]
+    assert results["broken"]["status"] == "failed"
+    assert "数据源不可用" in results["broken"]["error"]
+    assert run.status["hanging"]["elapsed"] < 1
+
+def test_timeout_override():
+    """运行时可按阶段覆盖默认超时"""
+    pipeline = make_pipeline({}, {"now": 0, "max": 0})
+    
+    async def main():
+        run = pipeline.start(None, {"symbol": "600519"}, timeouts={"section0": 0.01})
+        return await run.get("section0")
+    
+    assert asyncio.run(main())["status"] == "timed_out"
+
+def test_dependencies_order():
+    """依赖按拓扑顺序展开，外部输入不计入"""
+    pipeline = make_pipeline({}, {"now": 0, "max": 0})
+    assert pipeline.dependencies(["summary"]) == ["data", "section0", "hanging", "summary"]
+
+def test_incremental_reuse():
+    """只有输入数据部分未变化的阶段被复用，上游重算时下游随之重算"""
+    pipeline = AdvicePipeline(external_inputs=("data",))
+    calls = []
+    
+    @pipeline.register("quote", inputs=("data",), requires=("price",))
+    def quote(run, data):
+        calls.append("quote")
+        return data["price"]
+    
+    @pipeline.register("flow", inputs=("data",), requires=("money_flow",))
+    def flow(run, data):
+        calls.append("flow")
+        return data["money_flow"] * 2
+    
+    @pipeline.register("summary", inputs=("quote", "flow"))
+    def summary(run, quote, flow):
+        calls.append("summary")
+        return quote + flow
+    
+    async def refresh(data, previous):
+        run = pipeline.start(None, {"data": data})
+        hashes = run.input_hashes(["summary"], data, data_stage="data")
+        reused = run.reuse(previous, hashes)
+        await run.collect(["summary"])
+        stages = {name: {"hash": digest, "value": run.results[name], "status": None, "time": 0}
+                  for name, digest in hashes.items()}
+        return run.results["summary"], reused, stages
+    
+    first, reused, stages = asyncio.run(refresh({"price": 10, "money_flow": 1}, {}))
+    assert (first, reused) == (12, [])
+    
+    calls.clear()
+    second, reused, _ = asyncio.run(refresh({"price": 11, "money_flow": 1}, stages))
+    assert second == 13
+    assert reused == ["flow"]
+    assert calls == ["quote", "summary"]
@@ -0,0 +1,104 @@
+"""
+信号回测测试
+在手工构造的小价格序列上验证次日开盘成交、停牌顺延、仅在交易时扣除成本、
+回撤与换手率，以及综合信号与 generate_trading_signals 一致
+"""
+
+import numpy as np
+
+from backtest import SIGNAL_CODES, TRADING_DAYS, SignalBacktester
+from bars import Bars, BarPanel
+from batch_indicators import BatchIndicatorEngine
+from technical_analysis import TechnicalAnalyzer
+
+DATES = np.busday_offset("2024-01-01", np.arange(8), roll="forward")
+CLOSE = np.array([10, 10, 10, 11, 12, 11, 10, 10.0])
+OPEN = np.array([10, 10, 10, 10.5, 11, 12, 11.5, 10.0])
+COMMISSION, STAMP_DUTY = 0.001, 0.002
+
+def make_panel(suspended=()) -> BarPanel:
+    """3只股票价格相同：A正常交易，B、C在给定的日期停牌"""
+    bars_list = []
+    for symbol, missing in zip(("A", "B", "C"), ((),) + tuple(suspended)):
+        keep = np.setdiff1d(np.arange(8), missing)
+        bars_list.append(Bars(DATES[keep], OPEN[keep], CLOSE[keep], CLOSE[keep], CLOSE[keep], symbol=symbol))
+    return BarPanel.from_bars(bars_list)
+
+def make_indicators(n_symbols: int) -> dict:
+    """第2日收盘两票看多（RSI超卖、MACD多头），第5日收盘两票看空，其余日观望"""
+    shape = (n_symbols, 8)
+    rsi = np.full(shape, 50.0)
+    macd = np.zeros(shape)
+    rsi[:, 2], macd[:, 2] = 20, 0.5
+    rsi[:, 5], macd[:, 5] = 80, -0.5
+    return {"close": np.tile(CLOSE, (n_symbols, 1)), "rsi": rsi, "macd": macd,
+            "macd_signal": np.zeros(shape), "kdj_k": np.full(shape, 50.0), "kdj_d": np.full(shape, 50.0),
+            "ma5": np.full(shape, np.nan), "ma20": np.full(shape, np.nan)}
+
+def run(suspended=((), ())):
+    backtester = SignalBacktester(commission=COMMISSION, stamp_duty=STAMP_DUTY)
+    return backtester.run(make_panel(suspended), make_indicators(3))
+
+def test_next_open_execution_and_costs():
+    """信号次日开盘成交，买入扣佣金、卖出扣佣金与印花税，持有与空仓日不扣成本"""
+    result = run()
+    returns = result["returns"][0]
+    np.testing.assert_array_equal(result["positions"][0], [0, 0, 0, 1, 1, 1, 0, 0])
+    
+    expected = np.zeros(8)
+    expected[3] = 11 / 10.5 - 1 - COMMISSION
+    expected[4] = 12 / 11 - 1
+    expected[5] = 11 / 12 - 1
+    expected[6] = 11.5 / 11 - 1 - COMMISSION - STAMP_DUTY
+    np.testing.assert_allclose(returns, expected, atol=1e-15)
+    
+    # 无成本时总收益等于开盘买入价到开盘卖出价的涨幅
+    free = SignalBacktester(commission=0, stamp_duty=0).run(make_panel(((), ())), make_indicators(3))
+    np.testing.assert_allclose(free["metrics"]["total_return"][0], 11.5 / 10.5 - 1, rtol=1e-12)
+
+def test_suspension_defers_trades():
+    """停牌日无法成交：B在买入日停牌则复牌开盘买入，C在卖出日停牌则持有至复牌开盘卖出"""
+    result = run(suspended=((3,), (6,)))
+    np.testing.assert_array_equal(result["positions"][1], [0, 0, 0, 0, 1, 1, 0, 0])
+    np.testing.assert_array_equal(result["positions"][2], [0, 0, 0, 1, 1, 1, 1, 0])
+    
+    np.testing.assert_allclose(result["returns"][1, 4], 12 / 11 - 1 - COMMISSION)
+    # C停牌日价格不变，复牌日以开盘价相对停牌前收盘价卖出
+    assert result["returns"][2, 6] == 0
+    np.testing.assert_allclose(result["returns"][2, 7], 10 / 11 - 1 - COMMISSION - STAMP_DUTY)
+
+def test_drawdown_turnover_and_hit_rate():
+    """最大回撤、年化换手率、交易笔数与胜率按逐日收益计算"""
+    result = run()
+    metrics = result["metrics"]
+    equity = np.cumprod(1 + result["returns"][0])
+    
+    peak = equity[4]
+    np.testing.assert_allclose(metrics["max_drawdown"][0], 1 - equity[5] / peak)
+    np.testing.assert_allclose(metrics["turnover"][0], 2 * TRADING_DAYS / 8)
+    assert metrics["trades"][0] == 1
+    # 开盘买入10.5、开盘卖出11.5，扣除成本后仍盈利
+    assert metrics["hit_rate"][0] == 1.0
+    np.testing.assert_allclose(metrics["exposure"][0], 3 / 8)
+    np.testing.assert_allclose(metrics["benchmark_return"][0], 0.0)
+
+def test_signals_match_generate_trading_signals():
+    """单只股票逐日的综合信号与 TechnicalAnalyzer.generate_trading_signals 一致"""
+    rng = np.random.default_rng(4)
+    n = 160
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.025, n)))
+    dates = np.busday_offset("2024-01-01", np.arange(n), roll="forward")
+    bars = Bars(dates, close, close * 1.015, close * 0.985, close, np.full(n, 1e6), symbol="600000", dtype="float64")
+    
+    backtester = SignalBacktester()
+    overall = backtester.signals(BatchIndicatorEngine().compute(BarPanel.from_bars([bars])))["overall"][0]
+    analyzer = TechnicalAnalyzer()
+    names = {code: name for name, code in SIGNAL_CODES.items()}
+    
+    seen = set()
+    for t in range(40, n):
+        report = analyzer.generate_technical_report("600000", bars[:t + 1])
+        expected = report["trading_signals"]["overall_signal"]
+        assert names[int(overall[t])] == expected, t
+        seen.add(expected)
+    assert len(seen) >= 3
@@ -0,0 +1,61 @@
+"""
+批量技术指标测试
+验证批量引擎的各指标与 TechnicalAnalyzer 逐只计算一致（含晚上市与停牌缺口），
+以及上市前、停牌日和窗口不足时输出NaN
+"""
+
+import numpy as np
+
+from bars import Bars
+from batch_indicators import BatchIndicatorEngine, forward_fill
+from history_store import HistoryStore
+from technical_analysis import TechnicalAnalyzer
+
+def make_store() -> HistoryStore:
+    """3只股票：完整历史、第40天上市、中间停牌10天"""
+    rng = np.random.default_rng(5)
+    dates = np.busday_offset("2024-01-01", np.arange(120), roll="forward")
+    keeps = [np.arange(120), np.arange(40, 120), np.setdiff1d(np.arange(120), np.arange(60, 70))]
+    store = HistoryStore(dtype="float64")
+    for i, keep in enumerate(keeps):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(keep))))
+        store.put(Bars(dates[keep], close, close * 1.01, close * 0.99, close,
+                       np.full(len(keep), 1e6), symbol=f"60000{i}", dtype="float64"))
+    return store
+
+def test_matches_technical_analyzer():
+    """每只股票在每个交易日的 MA20/RSI/MACD/KDJ 与逐只计算一致"""
+    panel = make_store().panel()
+    indicators = BatchIndicatorEngine().compute(panel)
+    analyzer = TechnicalAnalyzer()
+    close, high, low = (forward_fill(panel.field(name)) for name in ("close", "high", "low"))
+    checked = 0
+    
+    for row in range(len(panel.symbols)):
+        listed = np.flatnonzero(~np.isnan(close[row]))[0]
+        for t in range(listed + 35, len(panel.dates)):
+            if np.isnan(panel.close[row, t]):
+                continue
+            closes = close[row, listed:t + 1]
+            expected_macd = analyzer.calculate_macd(closes)
+            expected_kdj = analyzer.calculate_kdj(closes, high[row, listed:t + 1], low[row, listed:t + 1])
+            
+            np.testing.assert_allclose(indicators["ma20"][row, t], analyzer.calculate_ma(closes, 20), rtol=1e-10)
+            np.testing.assert_allclose(indicators["rsi"][row, t], analyzer.calculate_rsi(closes), rtol=1e-8)
+            np.testing.assert_allclose(indicators["macd"][row, t], expected_macd["macd"], atol=1e-10)
+            np.testing.assert_allclose(indicators["macd_signal"][row, t], expected_macd["signal"], atol=1e-10)
+            np.testing.assert_allclose(indicators["kdj_k"][row, t], expected_kdj["k"], atol=1e-8)
+            np.testing.assert_allclose(indicators["kdj_d"][row, t], expected_kdj["d"], atol=1e-8)
+            checked += 1
+    
+    assert checked > 200
+
+def test_nan_before_listing_suspension_and_warmup():
+    """上市前与停牌日为NaN，上市后数据不足窗口时也为NaN"""
+    panel = make_store().panel()
+    indicators = BatchIndicatorEngine().compute(panel)
+    
+    assert np.isnan(indicators["close"][1, :40]).all()
+    assert np.isnan(indicators["ma20"][1, :59]).all() and not np.isnan(indicators["ma20"][1, 59])
+    assert np.isnan(indicators["rsi"][2, 60:70]).all() and not np.isnan(indicators["rsi"][2, 70])
+    assert np.isnan(indicators["macd"][0, :25]).all() and not np.isnan(indicators["macd"][0, 25])
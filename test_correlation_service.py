@@ -0,0 +1,91 @@
+"""
+相关性服务测试
+验证增量更新与整体重算一致、最相关查询以及为组合优化提供的收缩协方差
+"""
+
+import numpy as np
+import pytest
+
+from bars import Bars
+from history_store import HistoryStore
+from correlation_service import CorrelationService, RollingCovariance
+
+def make_returns(n: int = 8, t: int = 200, seed: int = 0) -> np.ndarray:
+    """含共同因子与缺失值的收益率矩阵 (股票数, 期数)"""
+    rng = np.random.default_rng(seed)
+    returns = np.linspace(0, 1.5, n)[:, None] * rng.normal(0, 0.01, t) + rng.normal(0, 0.01, (n, t))
+    returns[0, :30] = np.nan
+    returns[3, rng.random(t) < 0.1] = np.nan
+    return returns
+
+def pairwise_correlation(returns: np.ndarray) -> np.ndarray:
+    """逐对使用共同有效样本计算的相关系数（参考实现）"""
+    n = len(returns)
+    result = np.empty((n, n))
+    for i in range(n):
+        for j in range(n):
+            both = ~np.isnan(returns[i]) & ~np.isnan(returns[j])
+            result[i, j] = np.corrcoef(returns[i, both], returns[j, both])[0, 1]
+    return result
+
+def test_incremental_matches_rebuild():
+    """逐日滑动更新后的矩阵与按窗口内容重算的结果一致"""
+    returns = make_returns()
+    symbols = [f"00000{i}" for i in range(len(returns))]
+    rolling = RollingCovariance(symbols, window=60)
+    for day, column in enumerate(returns.T):
+        rolling.update(column, np.datetime64("2024-01-01") + day)
+    
+    assert len(rolling) == 60
+    expected = pairwise_correlation(returns[:, -60:])
+    assert np.allclose(rolling.correlation(), expected, atol=1e-10)
+    assert np.allclose(rolling.correlation_row(symbols[2]), expected[2], atol=1e-10)
+    
+    rebuilt = RollingCovariance(symbols, window=60)
+    rebuilt.rebuild(returns[:, :150])
+    rebuilt.extend(returns[:, 150:], list(range(150, 200)))
+    assert np.allclose(rebuilt.covariance(), rolling.covariance(), atol=1e-12)
+
+def make_store(days: int) -> HistoryStore:
+    """由同一组收益的前days天构造存储"""
+    returns = np.nan_to_num(make_returns(t=200))[:, :days]
+    dates = np.busday_offset("2024-01-01", np.arange(days + 1), roll="forward")
+    store = HistoryStore()
+    for i, r in enumerate(returns):
+        closes = 10 * np.cumprod(np.r_[1.0, 1 + r])
+        store.put(Bars(dates, closes, closes, closes, closes, np.ones(days + 1), symbol=f"00000{i}"))
+    return store
+
+def test_service_advances_cached_matrix():
+    """缓存的矩阵在存储追加新交易日后只增量追加"""
+    store = make_store(150)
+    service = CorrelationService(store, windows=(60,))
+    matrix = service.matrix()
+    last = matrix.last_date
+    
+    for symbol, bars in make_store(200)._bars.items():
+        store.put(bars, symbol)
+    assert service.matrix() is matrix
+    assert matrix.last_date > last
+    
+    fresh = CorrelationService(store, windows=(60,)).matrix()
+    assert np.allclose(matrix.correlation(), fresh.correlation(), atol=1e-10)
+
+def test_correlated_queries_and_shrinkage():
+    """最相关/最不相关查询按相关系数排序，收缩协方差可供组合优化"""
+    service = CorrelationService(make_store(200), windows=(120,))
+    most = service.correlated("000007", n=3)
+    least = service.correlated("000007", n=3, least=True)
+    values = [r["correlation"] for r in most["results"]]
+    assert values == sorted(values, reverse=True)
+    assert most["results"][0]["symbol"] == "000006"
+    assert least["results"][0]["correlation"] <= values[-1]
+    assert "error" in service.correlated("999999")
+    
+    estimate = service.shrunk_covariance(["000001", "000002", "000003"])
+    assert estimate["symbols"] == ["000001", "000002", "000003"]
+    assert 0 <= estimate["shrinkage"] <= 1
+    assert np.all(np.linalg.eigvalsh(estimate["covariance"]) > 0)
+    
+    with pytest.raises(ValueError):
+        service.matrix("未配置的篮子")
@@ -0,0 +1,129 @@
+"""
+float32存储精度测试
+验证float32存储下历史K线、批量指标与指标缓存相对float64的误差在可接受范围内，
+且内存占用减半
+"""
+
+import numpy as np
+import pytest
+
+import dtype_policy
+from bars import Bars
+from batch_indicators import BatchIndicatorEngine
+from history_store import HistoryStore
+from indicator_graph import IndicatorEngine
+from technical_analysis import INDICATOR_GRAPH, TechnicalAnalyzer
+
+# 各指标允许的最大误差：价格类指标为相对误差，其余为绝对误差
+RELATIVE_TOLERANCE = {"close": 1e-6, "ma5": 1e-6, "ma10": 1e-6, "ma20": 1e-6, "ma60": 1e-6, "sar": 1e-6}
+ABSOLUTE_TOLERANCE = {"rsi": 1e-2, "kdj_k": 1e-2, "kdj_d": 1e-2, "kdj_j": 5e-2, "ma_alignment": 0}
+# MACD误差相对于价格水平
+MACD_TOLERANCE = 1e-5
+
+def make_bars(n_symbols: int = 50, n_dates: int = 400, seed: int = 11):
+    """生成随机K线，部分股票上市较晚或有停牌"""
+    rng = np.random.default_rng(seed)
+    all_dates = np.arange(np.datetime64("2020-01-01"), np.datetime64("2020-01-01") + n_dates)
+    bars_list = []
+    for i in range(n_symbols):
+        start = 0 if i % 5 else int(rng.integers(1, n_dates // 2))
+        keep = np.sort(rng.choice(np.arange(start, n_dates), size=int((n_dates - start) * 0.95), replace=False))
+        level = rng.uniform(2, 300)
+        close = level * np.exp(np.cumsum(rng.normal(0, 0.02, len(keep))))
+        spread = rng.uniform(0.001, 0.03, len(keep))
+        bars_list.append(Bars(all_dates[keep], close * (1 - spread / 2), close * (1 + spread),
+                              close * (1 - spread), close, rng.uniform(1e5, 1e8, len(keep)),
+                              symbol=f"{i:06d}", dtype="float64"))
+    return bars_list
+
+def make_store(bars_list, dtype: str) -> HistoryStore:
+    store = HistoryStore(dtype=dtype)
+    for bars in bars_list:
+        store.put(bars)
+    return store
+
+def test_storage_dtype_applied():
+    """历史存储、面板与批量指标输出使用指定精度"""
+    bars_list = make_bars(n_symbols=5, n_dates=100)
+    store = make_store(bars_list, "float32")
+    panel = store.panel()
+    indicators = BatchIndicatorEngine(dtype="float32").compute(panel)
+    
+    assert store.get(bars_list[0].symbol).dtype == np.float32
+    assert panel.close.dtype == np.float32
+    assert all(matrix.dtype == np.float32 for matrix in indicators.values())
+    # 原始K线不受影响
+    assert bars_list[0].dtype == np.float64
+
+def test_memory_halved():
+    """float32存储的内存占用约为float64的一半"""
+    bars_list = make_bars(n_symbols=10, n_dates=200)
+    full = make_store(bars_list, "float64")
+    compact = make_store(bars_list, "float32")
+    full_panel, compact_panel = full.panel(), compact.panel()
+    
+    price_bytes = lambda panel: sum(m.nbytes for m in panel.fields.values())
+    assert price_bytes(compact_panel) * 2 == price_bytes(full_panel)
+    assert compact.nbytes < full.nbytes * 0.6
+
+def test_batch_indicator_error_bounded():
+    """float32存储下批量指标与float64的误差有界"""
+    bars_list = make_bars()
+    full = BatchIndicatorEngine(dtype="float64").compute(make_store(bars_list, "float64").panel())
+    compact = BatchIndicatorEngine(dtype="float32").compute(make_store(bars_list, "float32").panel())
+    price_level = np.nanmax(np.abs(full["close"]), axis=1, keepdims=True)
+    
+    for name, expected in full.items():
+        actual = compact[name].astype(np.float64)
+        assert np.array_equal(np.isnan(actual), np.isnan(expected)), name
+        valid = ~np.isnan(expected)
+        error = np.abs(actual - expected)[valid]
+        
+        if name in RELATIVE_TOLERANCE:
+            assert (error / np.abs(expected[valid])).max() <= RELATIVE_TOLERANCE[name], name
+        elif name.startswith("macd"):
+            scale = np.broadcast_to(price_level, expected.shape)[valid]
+            assert (error / scale).max() <= MACD_TOLERANCE, name
+        elif name == "ma_alignment":
+            # 均线非常接近时排列判断可能不同，只允许极少数差异
+            assert (error > 0).mean() < 0.01, name
+        else:
+            assert error.max() <= ABSOLUTE_TOLERANCE[name], name
+
+def test_indicator_cache_error_bounded():
+    """float32指标缓存下单股票技术报告与float64的误差有界"""
+    bars = make_bars(n_symbols=1, n_dates=300)[0]
+    full = TechnicalAnalyzer()
+    compact = TechnicalAnalyzer()
+    compact.engine = IndicatorEngine(INDICATOR_GRAPH, dtype="float32")
+    
+    expected = full.generate_technical_report("000000", bars)
+    actual = compact.generate_technical_report("000000", bars.astype("float32"))
+    price = expected["price_analysis"]["current_price"]
+    
+    for key, value in expected["moving_averages"].items():
+        assert abs(actual["moving_averages"][key] - value) <= value * 1e-6
+    assert abs(actual["momentum_indicators"]["rsi"] - expected["momentum_indicators"]["rsi"]) <= 1e-2
+    for key, value in expected["momentum_indicators"]["macd"].items():
+        assert abs(actual["momentum_indicators"]["macd"][key] - value) <= price * MACD_TOLERANCE
+    for key, value in expected["momentum_indicators"]["kdj"].items():
+        assert abs(actual["momentum_indicators"]["kdj"][key] - value) <= 5e-2
+    
+    cached = [value for value in compact.engine._memo.values() if isinstance(value, np.ndarray)]
+    assert cached and all(value.dtype == np.float32 for value in cached if value.dtype.kind == "f")
+
+def test_default_policy():
+    """默认存储精度可在运行时切换"""
+    try:
+        dtype_policy.set_storage_dtype("float32")
+        assert Bars([0, 1], [1, 2], [1, 2], [1, 2], [1, 2]).dtype == np.float32
+        assert HistoryStore().dtype == np.float32
+        dtype_policy.set_storage_dtype("float64")
+        assert Bars([0, 1], [1, 2], [1, 2], [1, 2], [1, 2]).dtype == np.float64
+    finally:
+        dtype_policy.set_storage_dtype(None)
+
+def test_invalid_dtype():
+    """不支持的精度报错"""
+    with pytest.raises(ValueError):
+        dtype_policy.resolve_dtype("float16")
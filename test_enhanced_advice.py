@@ -0,0 +1,144 @@
+"""
+增强版投资建议测试
+验证一次报告只获取一次股票数据，共享的阶段只计算一次，
+include 只生成所选部分、只计算其依赖并只获取其需要的数据，
+以及增量刷新时只有价格变动不重算基本面、情绪与资金流评分
+"""
+
+import asyncio
+
+import numpy as np
+
+from advice_cache import AdviceCache
+from bars import Bars
+from get_enhanced_investment_advice import EnhancedStockAdvisor, REPORT_SECTIONS
+from stock_data_fetcher import StockDataFetcher, STOCK_DATA_PARTS
+
+def make_fetcher(calls: dict, price: float = 10.0) -> StockDataFetcher:
+    """各数据部分返回固定内容的数据获取器，按部分记录请求次数"""
+    t = np.arange(80)
+    closes = 10 + np.sin(t / 5) + 0.02 * t
+    dates = np.busday_offset("2024-01-01", t, roll="forward")
+    values = {
+        "basic_info": {"price": price, "pe_ratio": 18, "pb_ratio": 2, "volume": 5000000, "industry": "银行"},
+        "financial_data": {"roe": 16, "profit_margin": 20, "debt_ratio": 40},
+        "money_flow": {"main_net_inflow": 1000000},
+        "technical_indicators": {"rsi": 55, "ma5": 9.9, "ma20": 9.6, "current_price": price,
+                                 "macd": {"macd": 0.1, "signal": 0.05}},
+        "sentiment": {"news_sentiment": 0.6, "social_sentiment": 0.6},
+        "news": [{"title": "业绩预增", "sentiment": "positive"}],
+        "price_history": Bars(dates, closes, closes + 0.2, closes - 0.2, closes, np.full(80, 1e6))
+    }
+    
+    fetcher = StockDataFetcher()
+    fetcher.session = object()
+    for name, (method, _) in STOCK_DATA_PARTS.items():
+        async def fake(symbol, name=name):
+            calls[name] = calls.get(name, 0) + 1
+            return values[name]
+        setattr(fetcher, method, fake)
+    return fetcher
+
+def make_advisor(calls: dict, price: float = 10.0) -> EnhancedStockAdvisor:
+    """使用假数据源与独立缓存的增强版建议生成器（基础建议也使用同一数据源，重复获取会被计数）"""
+    fetcher = make_fetcher(calls, price)
+    advisor = EnhancedStockAdvisor(data_fetcher=fetcher, section_timeout=1.0,
+                                   advice_cache=AdviceCache(ttl=None, version="test"))
+    advisor.base_advisor.data_fetcher = fetcher
+    return advisor
+
+def count_calls(advisor, method: str, counts: dict):
+    """包装分析器方法，记录调用次数"""
+    original = getattr(advisor, method)
+    
+    def counted(*args, **kwargs):
+        counts[method] = counts.get(method, 0) + 1
+        return original(*args, **kwargs)
+    setattr(advisor, method, counted)
+
+def test_full_report_fetches_each_part_once():
+    """完整报告中每个数据部分只请求一次，基础建议与个性化建议共用同一风险等级"""
+    calls, counts = {}, {}
+    advisor = make_advisor(calls)
+    count_calls(advisor, "calculate_risk_level", counts)
+    
+    report = asyncio.run(advisor.get_enhanced_advice("600519"))
+    assert "error" not in report
+    assert all(section in report for section in REPORT_SECTIONS)
+    assert calls == {name: 1 for name in STOCK_DATA_PARTS}
+    assert counts == {"calculate_risk_level": 1}
+    assert all(s["status"] == "ok" for s in report["section_status"].values())
+
+def test_include_runs_only_selected_sections():
+    """只选择择时与估值时，报告只含这两部分，只计算它们的上游阶段"""
+    calls, counts = {}, {}
+    advisor = make_advisor(calls)
+    for method in ("analyze_momentum_patterns", "analyze_market_timing", "perform_valuation_analysis",
+                   "analyze_volatility_patterns", "calculate_risk_level", "perform_scenario_analysis",
+                   "analyze_investor_behavior"):
+        count_calls(advisor, method, counts)
+    
+    report = asyncio.run(advisor.get_enhanced_advice("600519", include=["market_timing", "valuation_models"]))
+    sections = [name for name in report if name in REPORT_SECTIONS or name == "momentum_analysis"]
+    assert sections == ["market_timing", "valuation_models"]
+    assert report["section_status"] == {}
+    assert counts == {"analyze_momentum_patterns": 1, "analyze_market_timing": 1,
+                      "perform_valuation_analysis": 1}
+    assert calls == {name: 1 for name in ("basic_info", "financial_data", "technical_indicators", "price_history")}
+    
+    report = asyncio.run(advisor.get_enhanced_advice("600519", include=["valuation_models", "unknown"]))
+    assert "unknown" in report["error"]
+
+def test_price_change_reuses_unaffected_score_stages():
+    """只有价格变动时基本面、情绪与资金流评分阶段复用，技术面评分与基础建议重算"""
+    advisor = make_advisor({})
+    first = asyncio.run(advisor.get_enhanced_advice("600519", incremental=True))
+    
+    advisor.data_fetcher = make_fetcher({}, price=10.5)
+    report = asyncio.run(advisor.get_enhanced_advice("600519", incremental=True))
+    refresh = report["refresh"]
+    for name in ("fundamental_score", "sentiment_score", "money_flow_score", "behavioral_analysis"):
+        assert name in refresh["reused"]
+    for name in ("technical_score", "base_analysis"):
+        assert name in refresh["recomputed"]
+    
+    # 复用分段合成的评分与全部重新计算的评分一致
+    fresh = asyncio.run(make_advisor({}, price=10.5).get_enhanced_advice("600519"))
+    assert report["base_analysis"]["advice"] == fresh["base_analysis"]["advice"]
+    assert report["base_analysis"]["current_price"] == 10.5
+    scores = [r["base_analysis"]["advice"]["scores"] for r in (first, fresh)]
+    assert scores[0]["fundamental"] == scores[1]["fundamental"]
+
+def test_cached_refresh_reports_stage_names():
+    """命中缓存时 refresh 复用列表与正常计算时使用同一套阶段名；非增量请求不读取刷新状态"""
+    advisor = make_advisor({})
+    reads = []
+    original = advisor.refresh_state.get
+    
+    def counted(key):
+        reads.append(key)
+        return original(key)
+    advisor.refresh_state.get = counted
+    
+    asyncio.run(advisor.get_enhanced_advice("600519"))
+    assert reads == []
+    
+    first = asyncio.run(advisor.get_enhanced_advice("600519", include=["market_timing"], incremental=True))
+    again = asyncio.run(advisor.get_enhanced_advice("600519", include=["market_timing"], incremental=True))
+    stages = first["refresh"]["recomputed"] + first["refresh"]["reused"]
+    assert sorted(stages) == ["market_timing", "momentum_analysis"]
+    assert again["cached"] and again["refresh"]["recomputed"] == []
+    assert sorted(again["refresh"]["reused"]) == sorted(stages)
+
+def test_refresh_compares_reports_with_same_sections():
+    """只选部分内容的报告不作为完整报告的上一次报告，差异不含未变化部分的增删"""
+    advisor = make_advisor({})
+    asyncio.run(advisor.get_enhanced_advice("600519", include=["scenario_analysis"], incremental=True))
+    full = asyncio.run(advisor.get_enhanced_advice("600519", incremental=True))
+    assert full["refresh"]["changes"] is None
+    
+    advisor.data_fetcher = make_fetcher({}, price=10.5)
+    partial = asyncio.run(advisor.get_enhanced_advice("600519", include=["scenario_analysis"], incremental=True))
+    ops = {change["op"] for change in partial["refresh"]["changes"]}
+    assert ops <= {"replace"}
+    assert all(not change["path"].startswith("/base_analysis") for change in partial["refresh"]["changes"])
@@ -0,0 +1,153 @@
+"""
+指标计算图测试
+验证技术分析报告与改为计算图之前的实现在固定序列上的输出一致
+"""
+
+import numpy as np
+import pytest
+
+from bars import Bars
+from technical_analysis import TechnicalAnalyzer
+
+# 改为计算图之前的 generate_technical_report 在下列序列上的输出（不含 analysis_date）
+EXPECTED_BARS = {
+    "symbol": "600000",
+    "price_analysis": {
+        "current_price": 23.39231091812868,
+        "price_change": 14.66819077514059,
+        "volatility": 2.728205052385826
+    },
+    "moving_averages": {
+        "ma5": 24.67571433608171,
+        "ma10": 25.576354249694653,
+        "ma20": 24.794436297161596,
+        "ma60": 22.534377345012228
+    },
+    "momentum_indicators": {
+        "rsi": 44.73717717078478,
+        "macd": {
+            "macd": 0.6458147428553254,
+            "signal": 1.104827612946811,
+            "histogram": -0.4590128700914857
+        },
+        "kdj": {
+            "k": 21.14000216917239,
+            "d": 36.842669885949704,
+            "j": 0
+        }
+    },
+    "volume_indicators": {
+        "volume_ratio": 1.1457097327472228,
+        "mfi": 50.04258984293117
+    },
+    "volatility_indicators": {
+        "bollinger_bands": {
+            "upper": 27.958719550090773,
+            "middle": 24.7944362971616,
+            "lower": 21.630153044232426
+        }
+    },
+    "trend_analysis": {
+        "trend": "bearish",
+        "strength": 53.745286607607234,
+        "price_change": 14.66819077514059,
+        "volatility": 2.728205052385826,
+        "price_zscore": -0.8862198905454971
+    },
+    "trading_signals": {
+        "rsi_signal": "hold",
+        "macd_signal": "hold",
+        "kdj_signal": "hold",
+        "ma_signal": "sell",
+        "volume_signal": "",
+        "overall_signal": "hold"
+    }
+}
+
+EXPECTED_LISTS = {
+    "symbol": "600000",
+    "price_analysis": {
+        "current_price": 24.285286496490706,
+        "price_change": 19.045522041621112,
+        "volatility": 2.713253619509546
+    },
+    "moving_averages": {
+        "ma5": 24.62482330714463,
+        "ma10": 24.48461851522096,
+        "ma20": 22.528227390859836,
+        "ma60": 0.0
+    },
+    "momentum_indicators": {
+        "rsi": 76.31663161463783,
+        "macd": {
+            "macd": 1.1264063862758888,
+            "signal": 1.0743477908345416,
+            "histogram": 0.05205859544134728
+        },
+        "kdj": {
+            "k": 52.414515747664694,
+            "d": 74.1230385613307,
+            "j": 8.997470120332679
+        }
+    },
+    "volume_indicators": {
+        "volume_ratio": 1.0116786455079025,
+        "mfi": 74.5074740574529
+    },
+    "volatility_indicators": {
+        "bollinger_bands": {
+            "upper": 27.13606124685097,
+            "middle": 22.528227390859836,
+            "lower": 17.9203935348687
+        }
+    },
+    "trend_analysis": {
+        "trend": "sideways",
+        "strength": 70.16854248521757,
+        "price_change": 19.045522041621112,
+        "volatility": 2.713253619509546,
+        "price_zscore": 0.7626399564499614
+    },
+    "trading_signals": {
+        "rsi_signal": "sell",
+        "macd_signal": "buy",
+        "kdj_signal": "hold",
+        "ma_signal": "hold",
+        "volume_signal": "",
+        "overall_signal": "hold"
+    }
+}
+
+def make_series(n: int = 80):
+    """由正弦与线性趋势叠加而成的确定性K线"""
+    t = np.arange(n)
+    close = 20 + 3 * np.sin(t / 5) + 0.05 * t + 0.4 * np.cos(t * 1.7)
+    high = close + 0.3 + 0.1 * np.abs(np.sin(t))
+    low = close - 0.3 - 0.1 * np.abs(np.cos(t))
+    volume = 1e6 + 2e5 * np.sin(t / 3)
+    dates = np.busday_offset("2024-01-01", t, roll="forward")
+    return dates, close, high, low, volume
+
+def assert_same(actual, expected):
+    """逐键比较报告，浮点数允许舍入误差"""
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected)
+        for key in expected:
+            assert_same(actual[key], expected[key])
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-12)
+    else:
+        assert actual == expected
+
+def test_report_matches_previous_implementation():
+    """使用完整K线与仅收盘价/成交量列表时，报告均与重构前一致"""
+    dates, close, high, low, volume = make_series()
+    analyzer = TechnicalAnalyzer()
+    
+    report = analyzer.generate_technical_report("600000", Bars(dates, close, high, low, close, volume))
+    report.pop("analysis_date")
+    assert_same(report, EXPECTED_BARS)
+    
+    report = analyzer.generate_technical_report("600000", list(close[:45]), list(volume[:45]))
+    report.pop("analysis_date")
+    assert_same(report, EXPECTED_LISTS)
@@ -0,0 +1,121 @@
+"""
+递推指标计算核心的等价性测试
+验证循环版（纯Python/JIT）与NumPy版结果一致，并与单股票实现对照
+"""
+
+import numpy as np
+import pytest
+
+import indicator_kernels as kernels
+from bars import Bars
+from technical_analysis import TechnicalAnalyzer
+
+def make_prices(n_symbols: int = 20, n_dates: int = 200, seed: int = 7,
+                late_listing: bool = True):
+    """生成随机价格矩阵，前几只股票模拟上市较晚"""
+    rng = np.random.default_rng(seed)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_symbols, n_dates)), axis=1))
+    spread = rng.uniform(0.001, 0.03, (n_symbols, n_dates))
+    high = close * (1 + spread)
+    low = close * (1 - spread)
+    for i in range(min(5, n_symbols) if late_listing else 0):
+        close[i, :10 * (i + 1)] = np.nan
+        high[i, :10 * (i + 1)] = np.nan
+        low[i, :10 * (i + 1)] = np.nan
+    return close, high, low
+
+def loop_backends():
+    """循环版后端（安装numba时同时校验JIT编译版本）"""
+    return ["python", "jit"] if kernels.JIT_AVAILABLE else ["python"]
+
+def assert_same(a: np.ndarray, b: np.ndarray):
+    assert a.shape == b.shape
+    assert np.array_equal(np.isnan(a), np.isnan(b))
+    assert np.allclose(a, b, rtol=1e-10, atol=1e-10, equal_nan=True)
+
+def test_ema_backends_equivalent():
+    """EMA各后端结果一致"""
+    close, _, _ = make_prices()
+    expected = kernels.ema(close, 12, backend="numpy")
+    for backend in loop_backends():
+        assert_same(kernels.ema(close, 12, backend=backend), expected)
+
+def test_ema_matches_technical_analyzer():
+    """EMA末值与 TechnicalAnalyzer.calculate_ema 一致"""
+    close, _, _ = make_prices(n_symbols=1, late_listing=False)
+    series = kernels.ema(close, 26)[0]
+    expected = TechnicalAnalyzer().calculate_ema(close[0].tolist(), 26)
+    assert abs(series[-1] - expected) < 1e-9
+
+def test_wilder_rsi_backends_equivalent():
+    """Wilder RSI各后端结果一致"""
+    close, _, _ = make_prices()
+    expected = kernels.wilder_rsi(close, 14, backend="numpy")
+    for backend in loop_backends():
+        assert_same(kernels.wilder_rsi(close, 14, backend=backend), expected)
+
+def test_wilder_rsi_reference():
+    """Wilder RSI与逐步计算的参考值一致"""
+    prices = [44.34, 44.09, 44.15, 43.61, 44.33, 44.83, 45.10, 45.42,
+              45.84, 46.08, 45.89, 46.03, 45.61, 46.28, 46.28, 46.00]
+    changes = np.diff(prices)
+    gains = np.where(changes > 0, changes, 0.0)
+    losses = np.where(changes < 0, -changes, 0.0)
+    avg_gain, avg_loss = gains[:14].mean(), losses[:14].mean()
+    expected = [100 - 100 / (1 + avg_gain / avg_loss)]
+    avg_gain = (avg_gain * 13 + gains[14]) / 14
+    avg_loss = (avg_loss * 13 + losses[14]) / 14
+    expected.append(100 - 100 / (1 + avg_gain / avg_loss))
+    
+    for backend in loop_backends() + ["numpy"]:
+        rsi = kernels.wilder_rsi(prices, 14, backend=backend)[0]
+        assert np.isnan(rsi[:14]).all()
+        assert np.allclose(rsi[14:], expected)
+
+def test_kdj_backends_equivalent():
+    """KDJ平滑各后端结果一致（含RSV缺失）"""
+    close, _, _ = make_prices()
+    rng = np.random.default_rng(3)
+    rsv = np.where(np.isnan(close), np.nan, rng.uniform(0, 100, close.shape))
+    expected_k, expected_d = kernels.kdj_smooth(rsv, backend="numpy")
+    for backend in loop_backends():
+        k, d = kernels.kdj_smooth(rsv, backend=backend)
+        assert_same(k, expected_k)
+        assert_same(d, expected_d)
+
+def test_kdj_matches_technical_analyzer():
+    """KDJ末值与 TechnicalAnalyzer.calculate_kdj 一致"""
+    close, high, low = make_prices(n_symbols=1, late_listing=False)
+    bars = Bars(np.arange(close.shape[1]), close[0], high[0], low[0], close[0])
+    expected = TechnicalAnalyzer().calculate_kdj(bars)
+    
+    period_high = np.array([high[0, max(0, t - 8):t + 1].max() for t in range(close.shape[1])])
+    period_low = np.array([low[0, max(0, t - 8):t + 1].min() for t in range(close.shape[1])])
+    rsv = (close[0] - period_low) / (period_high - period_low) * 100
+    rsv[:8] = np.nan
+    k, d = kernels.kdj_smooth(rsv)
+    
+    assert abs(k[0, -1] - expected["k"]) < 1e-9
+    assert abs(d[0, -1] - expected["d"]) < 1e-9
+
+def test_sar_backends_equivalent():
+    """SAR各后端结果一致"""
+    _, high, low = make_prices()
+    expected = kernels.parabolic_sar(high, low, backend="numpy")
+    for backend in loop_backends():
+        assert_same(kernels.parabolic_sar(high, low, backend=backend), expected)
+
+def test_sar_reverses_on_trend_change():
+    """SAR在上涨时位于最低价下方，转为下跌后位于最高价上方"""
+    up = np.linspace(10, 20, 30)
+    prices = np.concatenate([up, up[::-1]])
+    high, low = prices + 0.1, prices - 0.1
+    for backend in loop_backends() + ["numpy"]:
+        sar = kernels.parabolic_sar(high, low, backend=backend)[0]
+        assert (sar[1:30] <= low[1:30]).all()
+        assert (sar[-10:] >= high[-10:]).all()
+
+def test_invalid_backend():
+    """不支持的后端报错"""
+    with pytest.raises(ValueError):
+        kernels.ema([1.0, 2.0], 3, backend="gpu")
@@ -0,0 +1,99 @@
+"""
+参数寻优测试
+验证滚动前推划分、按训练段选参（测试段只用于报告）、共享内存多进程结果与单进程一致，
+以及结果文件中断后续跑只评估未完成的任务
+"""
+
+import numpy as np
+
+import param_search
+from bars import Bars, BarPanel
+from param_search import (ParameterSearch, params_key, random_combinations, rank_results,
+                          walk_forward_selection, walk_forward_splits)
+
+SPACE = {"rsi_period": [6, 14], "buy_votes": [1, 2]}
+WALK_FORWARD = {"train": 60, "test": 20}
+
+def make_panel(n_symbols: int = 3, n: int = 120) -> BarPanel:
+    rng = np.random.default_rng(8)
+    dates = np.busday_offset("2024-01-01", np.arange(n), roll="forward")
+    bars_list = []
+    for i in range(n_symbols):
+        close = 10 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, n)))
+        bars_list.append(Bars(dates, close * 0.998, close * 1.01, close * 0.99, close,
+                              np.full(n, 1e6), symbol=f"60000{i}", dtype="float64"))
+    return BarPanel.from_bars(bars_list)
+
+def record(key: str, split: int, train: float, test: float) -> dict:
+    return {"key": key, "params": {"name": key}, "split": split, "range": None,
+            "train": {"sharpe": train}, "test": {"sharpe": test}}
+
+def test_walk_forward_splits():
+    """训练段与测试段首尾相接，按步长滚动，不足一个完整划分时停止"""
+    assert walk_forward_splits(100, 50, 20) == [((0, 50), (50, 70)), ((20, 70), (70, 90))]
+    assert walk_forward_splits(100, 50, 20, step=40) == [((0, 50), (50, 70))]
+    assert walk_forward_splits(60, 50, 20) == []
+
+def test_random_combinations_without_grid():
+    """大参数空间按参数独立抽取：结果不重复、有效且可复现，小空间返回全部有效组合"""
+    space = {f"p{i}": list(range(10)) for i in range(8)}
+    space.update({"macd_fast": [5, 12, 30], "macd_slow": [10, 26]})
+    combos = random_combinations(space, 50, seed=3)
+    assert len(combos) == 50
+    assert len({params_key(p) for p in combos}) == 50
+    assert all(p["macd_fast"] < p["macd_slow"] for p in combos)
+    assert combos == random_combinations(space, 50, seed=3)
+    
+    small = {"macd_fast": [5, 12, 30], "macd_slow": [10, 26]}
+    assert random_combinations(small, 100) == param_search.grid_combinations(small)
+    assert len(random_combinations(small, 100)) == 3
+    assert len(random_combinations({"macd_fast": [30], "macd_slow": [10, 26], "rsi_period": [6, 14]}, 3)) == 0
+
+def test_selection_uses_train_segment():
+    """排名与逐段选参只看训练段，测试段指标随所选参数报告"""
+    records = [record("a", 0, 1.0, 0.1), record("b", 0, 0.5, 2.0),
+               record("a", 1, 0.2, 0.3), record("b", 1, 0.4, -1.0)]
+    table = rank_results(records)
+    assert [row["params"]["name"] for row in table] == ["a", "b"]
+    assert table[0]["train_sharpe"] == 0.6 and table[0]["test_sharpe"] == 0.2
+    assert table[1]["worst_test_sharpe"] == -1.0
+    
+    selection = walk_forward_selection(records)
+    assert [s["params"]["name"] for s in selection["splits"]] == ["a", "b"]
+    assert selection["test_sharpe"] == (0.1 - 1.0) / 2
+    
+    # 不划分时按全样本指标排名
+    full = [{"key": k, "params": {"name": k}, "split": 0, "full": {"sharpe": v}} for k, v in (("a", 1), ("b", 2))]
+    assert [row["params"]["name"] for row in rank_results(full)] == ["b", "a"]
+
+def test_shared_memory_workers_match_serial():
+    """多进程（共享内存面板）与单进程的评估结果相同"""
+    panel = make_panel()
+    serial = ParameterSearch(panel, SPACE, walk_forward=WALK_FORWARD, max_workers=1).run()
+    parallel = ParameterSearch(panel, SPACE, walk_forward=WALK_FORWARD, max_workers=2).run()
+    assert parallel == serial
+    assert len(serial) == 4 and serial[0]["splits"] == 3
+
+def test_resume_skips_completed_tasks(tmp_path, monkeypatch):
+    """结果文件中已完成的任务不再评估，写坏的末行被忽略"""
+    panel = make_panel()
+    path = str(tmp_path / "results.jsonl")
+    first = ParameterSearch(panel, SPACE, walk_forward=WALK_FORWARD, results_path=path, max_workers=1).run()
+    
+    # 模拟中断：丢掉最后两条记录，末行只写了一半
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:-2])
+        f.write(lines[-2][:20])
+    
+    calls = []
+    original = param_search.evaluate
+    monkeypatch.setattr(param_search, "evaluate",
+                        lambda *args: calls.append(args[1]) or original(*args))
+    resumed = ParameterSearch(panel, SPACE, walk_forward=WALK_FORWARD, results_path=path, max_workers=1).run()
+    
+    assert len(calls) == 2
+    assert resumed == first
+    # 续跑写入的记录不与损坏的末行连在一起
+    assert len(param_search.load_results(path)) == len(lines)
@@ -0,0 +1,76 @@
+"""
+形态与背离检测测试
+在构造的小序列上验证金叉/死叉位置、局部高低点、顶/底背离、布林带与 TechnicalAnalyzer 一致，
+以及布林带收口与突破事件
+"""
+
+import numpy as np
+
+from pattern_detection import (PatternDetector, bollinger_matrix, crossovers,
+                               divergences, local_extrema)
+from technical_analysis import TechnicalAnalyzer
+
+def test_crossovers():
+    """快线由下向上穿越慢线的K线为金叉，反之为死叉；在慢线上停留一根后穿越只记一次"""
+    slow = np.full(7, 3.0)
+    golden, death = crossovers(np.array([1, 2, 3, 4, 5, 3, 2.0]), slow)
+    assert np.flatnonzero(golden[0]).tolist() == [3]
+    assert np.flatnonzero(death[0]).tolist() == [6]
+    
+    golden, death = crossovers(np.array([1, 3, 5.0]), np.full(3, 3.0))
+    assert np.flatnonzero(golden[0]).tolist() == [2] and not death.any()
+
+def test_local_extrema():
+    """高点高于前order根且不低于后order根，低点反之"""
+    series = np.array([1, 2, 5, 2, 1, 0, 1, 2, 3, 2, 1.0])
+    peaks, troughs = local_extrema(series, order=2)
+    assert np.flatnonzero(peaks[0]).tolist() == [2, 8]
+    assert np.flatnonzero(troughs[0]).tolist() == [5]
+
+def test_divergences():
+    """价格创新高而指标高点降低为顶背离，价格创新低而指标低点抬高为底背离"""
+    price = np.array([1, 2, 5, 2, 1, 2, 6, 2, 1.0])
+    indicator = np.array([50, 60, 80, 60, 50, 55, 70, 55, 50.0])
+    top, bottom = divergences(price, indicator, order=2)
+    assert np.flatnonzero(top[0]).tolist() == [6]
+    assert not bottom.any()
+    
+    # 指标同步创新高时不是背离
+    top, _ = divergences(price, indicator + np.where(np.arange(9) == 6, 20, 0), order=2)
+    assert not top.any()
+    
+    price = np.array([5, 4, 1, 4, 5, 4, 0.5, 4, 5.0])
+    indicator = np.array([50, 40, 20, 40, 50, 40, 30, 40, 50.0])
+    _, bottom = divergences(price, indicator, order=2)
+    assert np.flatnonzero(bottom[0]).tolist() == [6]
+    # 两个低点相距超过max_gap时不比较
+    _, bottom = divergences(price, indicator, order=2, max_gap=3)
+    assert not bottom.any()
+
+def test_bollinger_matches_analyzer():
+    """矩阵布林带在每根K线上与 TechnicalAnalyzer.calculate_bollinger_bands 一致，窗口含NaN时不输出"""
+    close = 20 * np.exp(np.cumsum(np.random.default_rng(2).normal(0, 0.02, 80)))
+    bands = bollinger_matrix(close)
+    analyzer = TechnicalAnalyzer()
+    
+    assert np.isnan(bands["middle"][0, :19]).all()
+    for t in range(19, len(close)):
+        expected = analyzer.calculate_bollinger_bands(close[:t + 1])
+        for key in ("upper", "middle", "lower"):
+            np.testing.assert_allclose(bands[key][0, t], expected[key], rtol=1e-9)
+    
+    gapped = close.copy()
+    gapped[40] = np.nan
+    assert np.isnan(bollinger_matrix(gapped)["middle"][0, 40:60]).all()
+
+def test_squeeze_and_breakouts():
+    """振荡后走平时带宽降至回看期最低记一次收口，跳涨/跳跌突破上/下轨"""
+    t = np.arange(60)
+    swings = 102 + (2 + 0.01 * t) * np.where(t % 2 == 0, -1, 1)
+    close = np.concatenate((swings, np.full(30, 101.0), np.full(10, 110.0), [90.0]))
+    patterns = PatternDetector(squeeze_lookback=40)._bollinger_patterns(np.atleast_2d(close))
+    
+    squeeze = np.flatnonzero(patterns["bollinger_squeeze"][0])
+    assert len(squeeze) == 1 and 60 <= squeeze[0] < 80
+    assert np.flatnonzero(patterns["bollinger_breakout_up"][0]).tolist() == [90]
+    assert np.flatnonzero(patterns["bollinger_breakout_down"][0]).tolist() == [100]
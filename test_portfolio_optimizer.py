@@ -0,0 +1,77 @@
+"""
+投资组合优化测试
+验证仓位/行业约束、风险平价的风险贡献相等，以及收缩协方差的性质
+"""
+
+import numpy as np
+import pytest
+
+from bars import Bars, BarPanel
+from portfolio_optimizer import (PortfolioOptimizer, ledoit_wolf_covariance,
+                                 project_capped_simplex, OPTIMIZATION_METHODS)
+
+def make_returns(n: int = 40, t: int = 250, seed: int = 0) -> np.ndarray:
+    """含共同因子与不同波动率的收益率矩阵 (股票数, 期数)"""
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 0.01, t)
+    scale = rng.uniform(0.5, 2.0, (n, 1))
+    return rng.uniform(0.5, 1.5, (n, 1)) * factor + rng.normal(0.0003, 0.015, (n, t)) * scale
+
+def test_constraints_respected():
+    """各方法权重和为1，且不超过仓位上限与行业上限"""
+    returns = make_returns()
+    symbols = [f"{600000 + i}" for i in range(len(returns))]
+    sectors = {s: f"行业{i % 4}" for i, s in enumerate(symbols)}
+    for method in OPTIMIZATION_METHODS:
+        result = PortfolioOptimizer(method, max_position_size=0.08, sector_caps={"行业0": 0.1},
+                                    max_sector_weight=0.35).optimize_returns(returns, symbols, sectors)
+        weights = np.array([h["weight"] for h in result["holdings"]])
+        assert abs(weights.sum() - 1) < 1e-9
+        assert weights.max() <= 0.08 + 1e-9
+        assert result["sector_weights"]["行业0"] <= 0.1 + 1e-6
+        assert max(result["sector_weights"].values()) <= 0.35 + 1e-6
+        assert abs(sum(h["risk_share"] for h in result["holdings"]) - 1) < 1e-9
+
+def test_min_variance_beats_equal_weight():
+    """最小方差组合的波动率不高于等权组合"""
+    returns = make_returns()
+    symbols = [str(i) for i in range(len(returns))]
+    result = PortfolioOptimizer("min_variance", max_position_size=1.0).optimize_returns(returns, symbols)
+    covariance = PortfolioOptimizer().estimate(returns)[1]
+    equal = np.full(len(symbols), 1 / len(symbols))
+    assert result["converged"]
+    assert result["expected_volatility"] <= np.sqrt(equal @ covariance @ equal)
+
+def test_risk_parity_equal_contributions():
+    """无约束时风险平价组合各股票风险贡献相等"""
+    returns = make_returns(n=20)
+    result = PortfolioOptimizer("risk_parity", max_position_size=1.0).optimize_returns(
+        returns, [str(i) for i in range(20)])
+    shares = [h["risk_share"] for h in result["holdings"]]
+    assert np.allclose(shares, 1 / 20, atol=1e-6)
+
+def test_shrinkage_and_projection():
+    """收缩协方差对称正定；带上界单纯形投影满足约束"""
+    covariance, shrinkage = ledoit_wolf_covariance(make_returns(n=60, t=40))
+    assert 0 < shrinkage <= 1
+    assert np.allclose(covariance, covariance.T)
+    assert np.linalg.eigvalsh(covariance).min() > 0
+    
+    w = project_capped_simplex(np.array([3.0, 1.0, 0.2, -1.0]), 0.4)
+    assert abs(w.sum() - 1) < 1e-12 and w.max() <= 0.4 and w.min() >= 0
+
+def test_panel_and_errors():
+    """面板输入排除历史不足的股票；约束不可行与未知方法报错"""
+    rng = np.random.default_rng(1)
+    dates = np.busday_offset("2024-01-01", np.arange(120), roll="forward")
+    bars_list = []
+    for i, n in enumerate((120, 120, 120, 30)):
+        closes = 10 * np.cumprod(1 + rng.normal(0, 0.02, n))
+        bars_list.append(Bars(dates[-n:], closes, closes, closes, closes, np.ones(n), symbol=f"00000{i}"))
+    result = PortfolioOptimizer(max_position_size=0.5).optimize(BarPanel.from_bars(bars_list))
+    assert result["excluded"] == ["000003"]
+    assert len(result["holdings"]) == 3
+    
+    assert "error" in PortfolioOptimizer(max_position_size=0.2).optimize(BarPanel.from_bars(bars_list))
+    with pytest.raises(ValueError):
+        PortfolioOptimizer("black_litterman")
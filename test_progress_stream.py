@@ -0,0 +1,54 @@
+"""
+分段推送测试
+验证各部分以进度通知按完成顺序推送结构化结果，以及推送失败不影响报告生成
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from progress_stream import SectionStream
+
+class RecordingContext:
+    """记录进度通知的上下文"""
+    
+    def __init__(self, fail: bool = False):
+        self.notifications = []
+        self.fail = fail
+    
+    async def report_progress(self, progress, total=None, message=None):
+        if self.fail:
+            raise ConnectionError("客户端已断开")
+        self.notifications.append((progress, total, json.loads(message)))
+
+def test_sections_streamed_in_completion_order():
+    """先完成的部分先推送，进度为已完成数/总数，消息为部分名与数据"""
+    ctx = RecordingContext()
+    stream = SectionStream(ctx, ["quote", "slow", "fast"])
+    
+    async def section(name, delay):
+        await asyncio.sleep(delay)
+        await stream.emit(name, {"value": name})
+    
+    async def main():
+        await stream.emit("quote", {"price": 10.5})
+        await asyncio.gather(section("slow", 0.05), section("fast", 0.01))
+    
+    asyncio.run(main())
+    assert [(p, t, m["section"]) for p, t, m in ctx.notifications] == [(1, 3, "quote"), (2, 3, "fast"), (3, 3, "slow")]
+    assert ctx.notifications[0][2]["data"] == {"price": 10.5}
+    assert stream.pending() == []
+    assert list(stream.results) == ["quote", "fast", "slow"]
+
+def test_emit_validation_and_failures():
+    """未声明或重复的部分报错；推送失败时结果仍然保留"""
+    stream = SectionStream(RecordingContext(fail=True), ["quote", "summary"])
+    asyncio.run(stream.emit("quote", {"price": 1}))
+    assert stream.results == {"quote": {"price": 1}}
+    assert stream.pending() == ["summary"]
+    
+    with pytest.raises(ValueError):
+        asyncio.run(stream.emit("quote", {}))
+    with pytest.raises(ValueError):
+        asyncio.run(stream.emit("unknown", {}))
@@ -0,0 +1,72 @@
+"""
+批量报价测试
+验证分批并发上限、报价缓存与快照复用，以及按股票返回的错误信息
+"""
+
+import asyncio
+
+from market_snapshot import MarketSnapshot, QuoteProvider, to_secid
+
+class FakeFetcher:
+    """按批返回行情记录的假数据源，记录请求批次与最大并发数"""
+    
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.fail_on = fail_on
+    
+    async def get_quotes(self, symbols):
+        self.calls.append(list(symbols))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if self.fail_on in symbols:
+            raise ConnectionError("连接被重置")
+        # 以 9 结尾的代码视为不存在
+        return [{"f12": s, "f14": f"股票{s}", "f2": 10.5, "f3": "-", "f5": 1000, "f6": 1.05e4,
+                 "f20": 1e9, "f9": 12.3} for s in symbols if not s.endswith("9")]
+
+def test_batches_respect_chunk_size_and_concurrency():
+    """500只股票按批大小分批请求，同时进行的批次不超过并发上限"""
+    symbols = [f"{600000 + i}" for i in range(500)]
+    fetcher = FakeFetcher()
+    provider = QuoteProvider(chunk_size=100, concurrency=2)
+    quotes = asyncio.run(provider.get(symbols, fetcher))
+    
+    assert [len(c) for c in fetcher.calls] == [100] * 5
+    assert fetcher.peak == 2
+    assert list(quotes) == symbols
+    assert quotes["600000"]["price"] == 10.5
+    assert quotes["600000"]["change_percent"] is None
+    assert "error" in quotes["600009"]
+
+def test_cache_and_snapshot_skip_requests():
+    """有效期内的报价与快照中的股票不再请求"""
+    fetcher = FakeFetcher()
+    snapshot = MarketSnapshot.from_records([{"f12": "000001", "f14": "平安银行", "f2": 11.2}])
+    provider = QuoteProvider(ttl=60)
+    provider.snapshots = type("Snapshots", (), {"snapshot": snapshot})()
+    
+    quotes = asyncio.run(provider.get(["000001", "600036"], fetcher))
+    assert fetcher.calls == [["600036"]]
+    assert quotes["000001"]["name"] == "平安银行" and quotes["000001"]["price"] == 11.2
+    
+    asyncio.run(provider.get(["600036", "000001"], fetcher))
+    assert len(fetcher.calls) == 1
+
+def test_failed_batch_reports_per_symbol_errors():
+    """失败的批次只影响该批股票，且错误结果不缓存"""
+    fetcher = FakeFetcher(fail_on="600100")
+    provider = QuoteProvider(chunk_size=2)
+    quotes = asyncio.run(provider.get(["600000", "600001", "600100", "600101"], fetcher))
+    
+    assert "error" not in quotes["600000"]
+    assert quotes["600100"]["error"].startswith("行情请求失败")
+    assert quotes["600101"]["error"].startswith("行情请求失败")
+    
+    fetcher.fail_on = None
+    quotes = asyncio.run(provider.get(["600100"], fetcher))
+    assert quotes["600100"]["price"] == 10.5
+    assert to_secid("600100") == "1.600100" and to_secid("000001") == "0.000001"
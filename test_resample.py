@@ -0,0 +1,61 @@
+"""
+多周期重采样测试
+验证A股交易时段的分组边界，以及批量重采样与增量重采样结果一致
+"""
+
+import numpy as np
+
+from bars import Bars
+from resample import IncrementalResampler, resample
+
+def session_minutes(days):
+    """若干交易日的1分钟K线时间（含9:30集合竞价K线）"""
+    times = []
+    for day in days:
+        base = np.datetime64(day, "m")
+        morning = base + np.arange(9 * 60 + 30, 11 * 60 + 31)
+        afternoon = base + np.arange(13 * 60 + 1, 15 * 60 + 1)
+        times.append(np.concatenate((morning, afternoon)))
+    return np.concatenate(times).astype("datetime64[s]")
+
+def make_bars(dates) -> Bars:
+    n = len(dates)
+    rng = np.random.default_rng(0)
+    close = 10 + np.cumsum(rng.normal(0, 0.01, n))
+    return Bars(dates, close - 0.005, close + 0.01, close - 0.01, close,
+                rng.integers(100, 1000, n).astype(float), close * 100, symbol="600000")
+
+def test_session_boundaries():
+    """60分钟线每日4根且不跨午休，9:30竞价并入首根，周线以周一为起点"""
+    bars = make_bars(session_minutes(["2024-03-07", "2024-03-08"]))
+    hourly = resample(bars, "60m")
+    labels = [str(d)[11:16] for d in hourly.dates]
+    assert labels == ["10:30", "11:30", "14:00", "15:00"] * 2
+    # 首根60分钟K线包含9:30至10:30共61根1分钟K线
+    assert hourly.volume[0] == bars.volume[:61].sum()
+    assert hourly.open[0] == bars.open[0]
+    assert hourly.high[2] == bars.high[121:181].max()
+    
+    # 30分钟线：11:30 与 13:30 分属不同K线
+    half = resample(bars, "30m")
+    assert [str(d)[11:16] for d in half.dates[:5]] == ["10:00", "10:30", "11:00", "11:30", "13:30"]
+    
+    days = np.busday_offset("2024-03-06", np.arange(6), roll="forward")  # 周三至下周三
+    weekly = resample(make_bars(days), "weekly")
+    assert [str(d) for d in weekly.dates.astype("datetime64[D]")] == ["2024-03-08", "2024-03-13"]
+
+def test_incremental_matches_batch():
+    """逐根加入的增量结果与批量重采样相同，未完成的K线单独给出"""
+    bars = make_bars(session_minutes(["2024-03-07", "2024-03-08"]))
+    for timeframe in ("5m", "15m", "60m", "daily"):
+        expected = resample(bars, timeframe)
+        resampler = IncrementalResampler(timeframe, symbol="600000")
+        finished = resampler.extend(bars)
+        
+        result = resampler.bars()
+        assert len(finished) == len(expected) - 1
+        np.testing.assert_array_equal(result.dates, expected.dates)
+        for field in Bars.FIELDS:
+            np.testing.assert_allclose(getattr(result, field), getattr(expected, field), rtol=1e-12)
+        assert resampler.current["date"] == expected.dates[-1]
+        assert len(resampler.bars(include_current=False)) == len(expected) - 1
@@ -0,0 +1,91 @@
+"""
+风险引擎测试
+验证波动率、回撤与历史VaR和numpy参考值一致，批量与单只计算一致，组合成分VaR可加，
+以及置信度配置顺序不影响风险等级
+"""
+
+import math
+
+import numpy as np
+
+from bars import Bars, BarPanel
+from risk_engine import RiskEngine
+from get_stock_advice import StockAdvisor
+
+def make_bars(symbol: str, n: int = 300, seed: int = 0, volatility: float = 0.02) -> Bars:
+    """随机游走日线"""
+    rng = np.random.default_rng(seed)
+    dates = np.busday_offset("2024-01-01", np.arange(n), roll="forward")
+    closes = 10 * np.cumprod(1 + rng.normal(0.0003, volatility, n))
+    return Bars(dates, closes, closes, closes, closes, np.ones(n), symbol=symbol)
+
+def test_single_matches_reference():
+    """年化波动率、最大回撤与1日历史VaR/CVaR和直接计算一致"""
+    bars = make_bars("600000")
+    engine = RiskEngine(lookback=250)
+    result = engine.evaluate(bars)
+    
+    closes = bars.close[-251:].astype(np.float64)
+    returns = closes[1:] / closes[:-1] - 1
+    assert math.isclose(result["annualized_volatility"], returns.std(ddof=1) * math.sqrt(252), rel_tol=1e-9)
+    assert math.isclose(result["max_drawdown"], (1 - closes / np.maximum.accumulate(closes)).max(), rel_tol=1e-9)
+    
+    quantile = np.percentile(returns, 5)
+    assert math.isclose(result["var"]["1d"]["95"]["historical"], -quantile, rel_tol=1e-6)
+    assert math.isclose(result["cvar"]["1d"]["95"]["historical"], -returns[returns <= quantile].mean(), rel_tol=1e-6)
+    assert set(result["var"]) == {"1d", "5d", "21d"}
+    assert result["cvar"]["21d"]["99"]["parametric"] > result["var"]["21d"]["99"]["parametric"] > 0
+    
+    # 同一交易日重复查询命中缓存
+    assert engine.evaluate(bars) is result
+
+def test_batch_matches_single():
+    """面板批量计算（各股票历史长度不同）与逐只计算一致，历史不足时报错"""
+    bars_list = [make_bars(f"00000{i}", n, seed=i) for i, n in enumerate((300, 200, 120, 20))]
+    batch = RiskEngine().evaluate_many(BarPanel.from_bars(bars_list))
+    for bars in bars_list[:3]:
+        single = RiskEngine().evaluate(bars)
+        assert np.isclose(batch[bars.symbol]["annualized_volatility"], single["annualized_volatility"], rtol=1e-9)
+        assert np.isclose(batch[bars.symbol]["cvar"]["5d"]["95"]["historical"],
+                          single["cvar"]["5d"]["95"]["historical"], rtol=1e-9)
+    assert "error" in batch["000003"]
+
+def test_portfolio_component_var():
+    """组合成分VaR贡献之和等于组合VaR，缺失股票单独列出"""
+    bars_list = [make_bars(f"60000{i}", seed=i, volatility=0.01 * (i + 1)) for i in range(4)]
+    weights = {"600000": 0.4, "600001": 0.3, "600002": 0.2, "600003": 0.1, "XXX": 0.1}
+    result = RiskEngine().portfolio(weights, BarPanel.from_bars(bars_list))
+    component = result["component_var"]
+    assert math.isclose(sum(component["contributions"].values()), component["total"], rel_tol=1e-9)
+    assert result["missing"] == ["XXX"]
+    assert math.isclose(sum(result["weights"].values()), 1.0)
+
+def test_advisor_risk_level_uses_history():
+    """有历史行情时风险等级由风险引擎计算，无历史时取中性值并给出提示"""
+    advisor = StockAdvisor()
+    stock_data = {"symbol": "600000", "basic_info": {"pe_ratio": 15, "volume": 20000000},
+                  "technical_indicators": {"rsi": 90}, "price_history": make_bars("600000", volatility=0.05)}
+    risk = advisor.calculate_risk_level(stock_data)
+    assert risk["risk_metrics"]["annualized_volatility"] > 0.6
+    assert risk["risk_factors"]["volatility_risk"] == 100
+    assert risk["warnings"]
+    
+    neutral = advisor.calculate_risk_level({"basic_info": {"pe_ratio": 15, "volume": 20000000},
+                                            "technical_indicators": {"rsi": 90}})
+    assert neutral["risk_metrics"] is None
+    assert neutral["risk_factors"]["volatility_risk"] == 50
+
+def test_confidence_order_does_not_change_tail_loss():
+    """置信度按升序保存，尾部损失始终取最低置信度、最长持有期的CVaR"""
+    advisor = StockAdvisor()
+    stock_data = {"symbol": "600000", "basic_info": {"pe_ratio": 15, "volume": 20000000},
+                  "price_history": make_bars("600000", volatility=0.03)}
+    losses = []
+    for confidences in ([0.95, 0.99], [0.99, 0.95]):
+        advisor.risk_engine = RiskEngine(confidences=confidences, horizons=[21, 1, 5])
+        assert advisor.risk_engine.confidences == (0.95, 0.99)
+        metrics = advisor.calculate_risk_metrics(stock_data)
+        levels = list(metrics["cvar"].values())[-1]
+        assert advisor.tail_loss(metrics) == next(iter(levels.values()))["historical"]
+        losses.append(advisor.tail_loss(metrics))
+    assert losses[0] == losses[1]
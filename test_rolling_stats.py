@@ -0,0 +1,87 @@
+"""
+滚动统计测试
+验证滚动矩与逐窗口直接计算一致、价格水平跳变后的精度，
+以及逐个加入新值的流式计算与批量计算在每个位置一致
+"""
+
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+import indicator_kernels as kernels
+from rolling_stats import RollingMoments, rolling_moments
+
+def loop_backends():
+    """循环版后端（安装numba时同时校验JIT编译版本）"""
+    return ["python", "jit"] if kernels.JIT_AVAILABLE else ["python"]
+
+def level_shift_series(seed: int = 1) -> np.ndarray:
+    """价格从10附近跳到1e8附近的序列"""
+    rng = np.random.default_rng(seed)
+    return np.concatenate((10 + rng.normal(0, 0.01, 40), 1e8 + rng.normal(0, 0.01, 60)))
+
+def direct_moments(x: np.ndarray, window: int, num_std: float = 2.0) -> dict:
+    """逐窗口直接计算（对照，均值按有理数精确求和后舍入）"""
+    windows = [x[i - window + 1:i + 1] for i in range(window - 1, len(x))]
+    mean = np.array([float(sum(map(Fraction, w)) / window) for w in windows])
+    std = np.array([w.std() for w in windows])
+    return {"mean": mean, "std": std, "zscore": (x[window - 1:] - mean) / std,
+            "bandwidth": 2 * num_std * std / mean}
+
+def test_matches_direct_computation():
+    """均值、标准差、Z值、带宽与逐窗口计算一致，窗口未填满处为NaN"""
+    rng = np.random.default_rng(0)
+    x = 10 + np.cumsum(rng.normal(0, 0.2, 120))
+    result = rolling_moments(x, 20)
+    expected = direct_moments(x, 20)
+    
+    assert np.isnan(result["mean"][:19]).all()
+    for key, values in expected.items():
+        np.testing.assert_allclose(result[key][19:], values, rtol=1e-10)
+    np.testing.assert_allclose(result["upper"] - result["lower"], 4 * result["std"], rtol=1e-12, equal_nan=True)
+
+def test_level_shift_keeps_precision():
+    """价格从10跳到1e8后，小幅波动的标准差仍然准确"""
+    x = level_shift_series()
+    expected = direct_moments(x, 20)
+    for backend in loop_backends() + ["numpy"]:
+        result = rolling_moments(x, 20, backend=backend)
+        
+        # 完全位于跳变之后的窗口
+        np.testing.assert_allclose(result["std"][60:], expected["std"][41:], rtol=1e-6)
+        assert (result["std"][60:] < 0.05).all()
+        np.testing.assert_allclose(result["zscore"][60:], expected["zscore"][41:], rtol=1e-5, atol=1e-6)
+
+@pytest.mark.parametrize("series", ["random_walk", "level_shift", "with_nan"])
+def test_streaming_matches_batch(series):
+    """逐个加入新值的流式统计量与批量计算在每个位置一致（含水平跳变与NaN滑出窗口）"""
+    rng = np.random.default_rng(2)
+    if series == "level_shift":
+        x = level_shift_series()
+    else:
+        x = 10 + np.cumsum(rng.normal(0, 0.2, 150))
+        if series == "with_nan":
+            x[30] = np.nan
+    
+    moments = RollingMoments(20)
+    streamed = [moments.update(value) for value in x]
+    streamed = {key: np.array([s[key] for s in streamed]) for key in streamed[0]}
+    assert len(moments) == 20
+    
+    # 循环版与流式计算是同一递推，逐位相同
+    for backend in loop_backends():
+        for key, values in rolling_moments(x, 20, backend=backend).items():
+            np.testing.assert_array_equal(streamed[key], values, err_msg=f"{backend} {key}")
+    
+    # NumPy两遍法的结果可能相差几个ulp：1e8附近1ulp约1.5e-8，除以0.01的标准差后Z值相差约1.5e-6
+    for key, values in rolling_moments(x, 20, backend="numpy").items():
+        atol = {"zscore": 1e-5, "bandwidth": 0}.get(key, 1e-7)
+        np.testing.assert_allclose(streamed[key], values, rtol=1e-9, atol=atol, equal_nan=True, err_msg=key)
+
+def test_invalid_window():
+    """窗口长度必须为正整数"""
+    with pytest.raises(ValueError):
+        rolling_moments([1.0, 2.0], 0)
+    with pytest.raises(ValueError):
+        RollingMoments(0)
@@ -0,0 +1,51 @@
+"""
+蒙特卡洛情景模拟测试
+验证结果可复现、批量与单只一致，以及GBM期望值与解析解相符
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from bars import Bars, BarPanel
+from scenario_simulation import ScenarioSimulator, SIMULATION_MODELS
+
+def make_bars(symbol: str, seed: int = 0, n: int = 250) -> Bars:
+    """生成随机游走日K线"""
+    closes = np.cumprod(1 + np.random.default_rng(seed).normal(0.0005, 0.02, n)) * 10
+    dates = np.busday_offset("2024-01-01", np.arange(n), roll="forward")
+    return Bars(dates, closes, closes, closes, closes, np.ones(n), symbol=symbol)
+
+def test_reproducible_and_probabilities():
+    """同一种子结果相同，三种情景概率之和为100%"""
+    bars = make_bars("600000")
+    for model in SIMULATION_MODELS:
+        simulator = ScenarioSimulator(model=model, n_paths=5000, seed=7)
+        first, second = simulator.simulate(bars), simulator.simulate(bars)
+        assert first == second
+        total = sum(first[name]["probability"] for name in ("bull_scenario", "bear_scenario", "base_scenario"))
+        assert abs(total - 100) < 1e-9
+        bands = first["price_bands"]["63d"]
+        assert bands["p5"] < bands["p50"] < bands["p95"]
+
+def test_batch_matches_single():
+    """批量模拟与逐只模拟结果一致"""
+    bars_list = [make_bars(f"60000{i}", seed=i) for i in range(3)]
+    simulator = ScenarioSimulator(n_paths=2000, seed=1)
+    batch = simulator.simulate_many(BarPanel.from_bars(bars_list))
+    for bars in bars_list:
+        assert batch[bars.symbol] == simulator.simulate(bars)
+
+def test_gbm_expected_value():
+    """GBM终值期望接近 S0·exp(T·(μ+σ²/2))"""
+    result = ScenarioSimulator(n_paths=100000, seed=3).simulate(make_bars("000001"))
+    expected = result["start_price"] * math.exp(
+        result["horizon_days"] * (result["daily_drift"] + result["daily_volatility"] ** 2 / 2))
+    assert abs(result["expected_value"] / expected - 1) < 0.005
+
+def test_insufficient_history_and_invalid_model():
+    """历史不足返回错误，不支持的模型抛出异常"""
+    assert "error" in ScenarioSimulator().simulate([10, 10.5, 11])
+    with pytest.raises(ValueError):
+        ScenarioSimulator(model="garch")
@@ -0,0 +1,99 @@
+"""
+批量评分等价性测试
+验证 StockAdvisor.score_many 与逐只股票评分的结果完全一致
+"""
+
+import random
+
+import numpy as np
+
+from get_stock_advice import StockAdvisor
+
+def make_stock_data(rng: random.Random) -> dict:
+    """生成覆盖各评分分支（含边界值与缺失字段）的随机股票数据"""
+    def pick(*values):
+        return rng.choice(values)
+    
+    basic_info = {
+        "pe_ratio": pick(-5, 0, 10, 20, 25, 30, 40, 50, 80, rng.uniform(-10, 100)),
+        "pb_ratio": pick(0, 1, 2, 3.5, 5, 8, rng.uniform(-1, 10))
+    }
+    financial = {
+        "roe": pick(5, 10, 12, 15, 20, rng.uniform(-5, 30)),
+        "profit_margin": pick(5, 10, 12, 15, 25),
+        "debt_ratio": pick(10, 30, 50, 70, 90)
+    }
+    technical = {
+        "rsi": pick(20, 30, 50, 70, 85, rng.uniform(0, 100)),
+        "macd": {"macd": pick(-1, 0, 0.5, 1), "signal": pick(-0.5, 0, 0.5)},
+        "ma5": pick(9, 10, 11),
+        "ma20": pick(9, 10, 11),
+        "current_price": pick(9, 10, 11)
+    }
+    money_flow = {"main_net_inflow": pick(-1e7, 0, 5e6)}
+    sentiment = {
+        "news_sentiment": rng.uniform(0, 1),
+        "social_sentiment": rng.uniform(0, 1),
+        "analyst_rating": pick("buy", "hold", "sell")
+    }
+    
+    # 随机删除部分字段，验证默认值一致
+    for section in (basic_info, financial, technical, money_flow, sentiment):
+        for key in list(section):
+            if rng.random() < 0.1:
+                del section[key]
+    
+    return {
+        "basic_info": basic_info,
+        "financial_data": financial,
+        "technical_indicators": technical,
+        "money_flow": money_flow,
+        "sentiment": sentiment
+    }
+
+def single_scores(advisor: StockAdvisor, stock_data: dict) -> dict:
+    """单只股票路径的评分"""
+    fundamental = advisor.calculate_fundamental_score(stock_data["basic_info"], stock_data["financial_data"])
+    technical = advisor.calculate_technical_score(stock_data["technical_indicators"])
+    sentiment = advisor.calculate_sentiment_score(stock_data["sentiment"], stock_data["money_flow"])
+    total = fundamental * 0.4 + technical * 0.35 + sentiment * 0.25
+    recommendation, action, confidence = advisor.classify_score(total)
+    return {
+        "fundamental_score": fundamental,
+        "technical_score": technical,
+        "sentiment_score": sentiment,
+        "total_score": total,
+        "recommendation": recommendation,
+        "action": action,
+        "confidence": confidence
+    }
+
+def test_score_many_matches_single_path():
+    """批量评分与逐只评分结果一致"""
+    rng = random.Random(20240101)
+    advisor = StockAdvisor()
+    stock_data_list = [make_stock_data(rng) for _ in range(2000)]
+    batch = advisor.score_stock_data(stock_data_list)
+    
+    for i, stock_data in enumerate(stock_data_list):
+        expected = single_scores(advisor, stock_data)
+        for name, value in expected.items():
+            if isinstance(value, str):
+                assert batch[name][i] == value, (i, name)
+            else:
+                assert abs(batch[name][i] - value) < 1e-9, (i, name)
+
+def test_score_many_defaults():
+    """缺失列与NaN按默认值评分"""
+    advisor = StockAdvisor()
+    batch = advisor.score_many({"pe_ratio": [15, np.nan]})
+    empty = single_scores(advisor, {"basic_info": {}, "financial_data": {}, "technical_indicators": {},
+                                    "money_flow": {}, "sentiment": {}})
+    assert batch["total_score"][1] == empty["total_score"]
+    assert batch["recommendation"][1] == empty["recommendation"]
+    assert batch["fundamental_score"][0] == empty["fundamental_score"] + 15
+
+def test_score_many_empty():
+    """空表返回空结果"""
+    batch = StockAdvisor().score_many({"pe_ratio": []})
+    assert len(batch["total_score"]) == 0
@@ -0,0 +1,95 @@
+"""
+评分规则测试
+验证同一评分计划的标量与向量求值一致、按规则分组求加分后合成的得分一致、权重覆盖，
+以及规则表错误在编译时报出
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from scoring_rules import PROFESSIONAL_RULES, Ref, compile_rules, scoring_plan
+
+def random_row(rng: random.Random) -> dict:
+    """覆盖各阈值边界与缺失值的专业评分输入"""
+    def pick(*values):
+        return rng.choice(values)
+    
+    row = {
+        "pe_ratio": pick(-3, 0, 10, 15, 25, 40, rng.uniform(-10, 80)),
+        "market_cap": pick(0, 1e10, 2e10, 5e10, 1e11),
+        "roe": pick(0, 12.5, None),
+        "profit": pick(0, 1e8),
+        "current_price": pick(9, 10, 11),
+        "ma5": pick(0, 9, 10, 11),
+        "ma10": pick(9, 10, 11),
+        "ma20": pick(9, 10, 11),
+        "rsi": pick(20, 30, 50, 70, 80, float("nan")),
+        "mfi": pick(10, 20, 80, 90),
+        "main_net_inflow": pick(-1e6, 0, 5e6, 1e7, 2e7),
+        "super_large_net": pick(-1e7, -5e6, 0, 1e6),
+        "large_net": pick(-1, 0, 1),
+        "news_count": pick(0, 2, 3, 6),
+        "market_attention": pick("high", "medium", "low", None)
+    }
+    for key in list(row):
+        if rng.random() < 0.1:
+            del row[key]
+    return row
+
+def test_scalar_matches_vector():
+    """逐只标量求值与按列批量求值结果一致"""
+    plan = scoring_plan("professional")
+    rng = random.Random(7)
+    rows = [random_row(rng) for _ in range(2000)]
+    table = {name: [row.get(name) for row in rows] for name in plan.columns}
+    table = {name: [np.nan if v is None and name not in plan.categorical else v for v in values]
+             for name, values in table.items()}
+    batch = plan.score_many(table)
+    
+    for i, row in enumerate(rows):
+        scores = plan.score(row)
+        for name, value in scores.items():
+            assert abs(batch[name][i] - value) < 1e-9, (i, name)
+
+def test_grouped_points_match_component():
+    """同一部分的规则分组分别求加分再合成，与整体求值的得分一致（含截断）"""
+    plan = scoring_plan("professional")
+    rng = random.Random(11)
+    groups = (("main_net_inflow",), ("super_large_net", "large_net"))
+    for _ in range(500):
+        row = random_row(rng)
+        points = sum(plan.points("money_flow", row, rules) for rules in groups)
+        assert abs(plan.combine("money_flow", points) - plan.component("money_flow", row)) < 1e-9
+        assert plan.combine("fundamental", plan.points("fundamental", row)) == plan.component("fundamental", row)
+    
+    assert plan.combine("money_flow", 80) == 100
+    with pytest.raises(ValueError):
+        plan.points("money_flow", {}, ["news_count"])
+
+def test_weight_override():
+    """权重覆盖改变综合分，不改变各部分得分"""
+    row = {"pe_ratio": 10, "main_net_inflow": 2e7, "rsi": 80}
+    default = compile_rules(PROFESSIONAL_RULES).score(row)
+    custom = compile_rules(PROFESSIONAL_RULES, {"fundamental": 1.0, "technical": 0.0,
+                                                "money_flow": 0.0, "sentiment": 0.0}).score(row)
+    assert custom["fundamental"] == default["fundamental"] == 70
+    assert custom["total"] == 70
+    assert default["money_flow"] == 80 and default["technical"] == 45
+
+def test_invalid_rules():
+    """引用未声明的列、未知比较符或权重与评分部分不符时报错"""
+    rules = {"columns": {"x": 0.0},
+             "components": {"a": {"rules": [{"cases": [([("x", ">", Ref("y"))], 1)]}]}},
+             "weights": {"a": 1.0}}
+    with pytest.raises(ValueError):
+        compile_rules(rules)
+    rules["components"]["a"]["rules"][0]["cases"] = [([("x", "~", 1)], 1)]
+    with pytest.raises(ValueError):
+        compile_rules(rules)
+    rules["components"]["a"]["rules"][0]["cases"] = [([("x", ">", 1)], 1)]
+    with pytest.raises(ValueError):
+        compile_rules(rules, {"b": 1.0})
+    with pytest.raises(ValueError):
+        scoring_plan("unknown")
@@ -0,0 +1,71 @@
+"""
+行业分析测试
+验证分组向量化统计与逐行业计算一致、个股行业内分位，以及按快照版本缓存
+"""
+
+import numpy as np
+
+from market_snapshot import MarketSnapshot
+from sector_analysis import SectorAnalyzer, group_median, group_percentile
+
+def make_snapshot(seed: int = 0, n: int = 300) -> MarketSnapshot:
+    """随机生成含行业、涨跌幅、市值的行情快照"""
+    rng = np.random.default_rng(seed)
+    industries = ["银行", "白酒", "半导体", "医药", "证券"]
+    records = [
+        {
+            "f12": f"{600000 + i}", "f14": f"股票{i}",
+            "f100": industries[i % 5] if i % 40 else "-",
+            "f2": 10.0, "f3": round(float(rng.normal(0, 2)), 2), "f24": float(rng.normal(0, 10)),
+            "f6": float(rng.uniform(1e7, 1e9)), "f9": float(rng.normal(20, 15)), "f23": float(rng.uniform(0.5, 5)),
+            "f20": float(rng.lognormal(23, 1)), "f62": float(rng.normal(0, 1e7))
+        }
+        for i in range(n)
+    ]
+    return MarketSnapshot.from_records(records)
+
+def test_sector_statistics_match_loop():
+    """行业加权收益、涨跌家数与市盈率中位数与逐行业计算一致"""
+    snapshot = make_snapshot()
+    table = SectorAnalyzer().table(snapshot)
+    industry = snapshot.column("industry")
+    change = snapshot.column("change_percent")
+    cap = snapshot.column("market_cap")
+    pe = snapshot.column("pe_ratio")
+    
+    market = np.sum(change[industry != ""] * cap[industry != ""]) / np.sum(cap[industry != ""])
+    for name in ("银行", "半导体"):
+        members = industry == name
+        sector = table.sector(name)
+        daily = sector["performance"]["1d"]
+        assert sector["members"] == members.sum()
+        assert np.isclose(daily["cap_weighted_return"], np.sum(change[members] * cap[members]) / np.sum(cap[members]))
+        assert np.isclose(daily["equal_weighted_return"], change[members].mean())
+        assert np.isclose(daily["relative_strength"], daily["cap_weighted_return"] - market)
+        assert sector["breadth"]["advancers"] == np.sum(change[members] > 0)
+        assert np.isclose(sector["valuation"]["median_pe"], np.median(pe[members & (pe > 0)]))
+    assert table.sector("不存在的行业") is None
+
+def test_group_helpers():
+    """分组中位数与组内分位（并列取平均名次，单值组为50）"""
+    values = np.array([3.0, 1.0, 2.0, 2.0, np.nan, 5.0])
+    groups = np.array([0, 0, 0, 0, 1, 1])
+    assert np.allclose(group_median(values, groups, 2), [2.0, 5.0])
+    percentiles = group_percentile(values, groups, 2)
+    assert np.allclose(percentiles[:4], [100.0, 0.0, 50.0, 50.0])
+    assert np.isnan(percentiles[4]) and percentiles[5] == 50.0
+
+def test_analyze_lookup_and_cache():
+    """个股行业分析为查表结果，同一快照版本只计算一次"""
+    snapshot = make_snapshot()
+    analyzer = SectorAnalyzer()
+    result = analyzer.analyze(snapshot, "600001")
+    assert result["data_source"] == "snapshot"
+    assert result["industry"] == "白酒"
+    assert 0 <= result["stock_position"]["return_percentile"]["1d"] <= 100
+    assert analyzer.table(snapshot) is analyzer.table(make_snapshot())
+    assert analyzer.analyze(snapshot, "600000")["data_source"] == "unavailable"
+    
+    ranking = analyzer.ranking(snapshot, "relative_strength", "60d", n=5)
+    values = [r["relative_strength"] for r in ranking]
+    assert len(ranking) == 5 and values == sorted(values, reverse=True)
@@ -0,0 +1,26 @@
+"""
+股票数据获取测试
+验证 parts 只请求指定部分的数据，未请求的部分为空值
+"""
+
+import asyncio
+
+from stock_data_fetcher import StockDataFetcher, STOCK_DATA_PARTS
+
+def test_fetch_only_requested_parts():
+    """只请求行情时不获取K线等其他部分"""
+    calls = []
+    fetcher = StockDataFetcher()
+    fetcher.session = object()
+    for name, (method, _) in STOCK_DATA_PARTS.items():
+        async def fake(symbol, name=name):
+            calls.append(name)
+            return {"price": 10.0} if name == "basic_info" else {"part": name}
+        setattr(fetcher, method, fake)
+    
+    data = asyncio.run(fetcher.fetch_stock_data("600519", parts=["basic_info"]))
+    assert calls == ["basic_info"]
+    assert data["basic_info"] == {"price": 10.0}
+    assert data["price_history"] is None and data["news"] == [] and data["financial_data"] == {}
+    
+    assert "error" in asyncio.run(fetcher.fetch_stock_data("600519", parts=["quote"]))
@@ -0,0 +1,88 @@
+"""
+全市场排名测试
+在合成的行情快照上验证筛选掩码、部分排序与完整排序一致（含同分）、
+按建议等级筛选，以及快照版本未变化时命中缓存
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from market_snapshot import MarketSnapshot
+from universe_ranking import UniverseRanker, filter_mask, top_indices
+
+def make_snapshot(price_shift: float = 0.0) -> MarketSnapshot:
+    """8只股票：含停牌、ST与不同行业、估值"""
+    rows = [
+        ("600000", "浦发银行", "银行", 8.0, 5.0, 2e11, 3e8),
+        ("600036", "招商银行", "银行", 35.0, 6.0, 9e11, -1e8),
+        ("000001", "平安银行", "银行", 11.0, 4.5, 2e11, 5e7),
+        ("000002", "万科A", "房地产", "-", 9.0, 8e10, 0),
+        ("000004", "ST国华", "软件", 15.0, "-", 2e9, 1e6),
+        ("300750", "宁德时代", "电池", 180.0, 20.0, 8e11, 6e8),
+        ("688981", "中芯国际", "半导体", 50.0, 90.0, 4e11, -3e8),
+        ("002594", "比亚迪", "汽车", 230.0, 25.0, 7e11, 2e8),
+    ]
+    records = [{"f12": s, "f14": name, "f100": industry,
+                "f2": price if price == "-" else price + price_shift,
+                "f9": pe, "f23": 1.5, "f20": cap, "f62": inflow}
+               for s, name, industry, price, pe, cap, inflow in rows]
+    return MarketSnapshot.from_records(records)
+
+def selected(snapshot: MarketSnapshot, filters=None) -> list:
+    return snapshot.column("symbol")[filter_mask(snapshot, filters)].tolist()
+
+def test_filter_mask():
+    """默认剔除停牌与ST，数值条件对NaN不成立，支持行业与代码前缀"""
+    snapshot = make_snapshot()
+    assert selected(snapshot) == ["600000", "600036", "000001", "300750", "688981", "002594"]
+    assert "000004" in selected(snapshot, {"exclude_st": False})
+    assert selected(snapshot, {"min_price": 10, "max_pe": 20}) == ["600036", "000001", "300750"]
+    assert selected(snapshot, {"industry": ["银行", "汽车"], "min_market_cap": 5e11}) == ["600036", "002594"]
+    assert selected(snapshot, {"symbol_prefix": ("30", "68")}) == ["300750", "688981"]
+    assert "000004" not in selected(snapshot, {"exclude_st": False, "min_pe": 0})
+    with pytest.raises(ValueError):
+        filter_mask(snapshot, {"min_volume": 1})
+
+def test_top_indices_matches_full_sort():
+    """部分排序结果与完整稳定排序的前n名相同，包括同分与n不小于长度的情况"""
+    rng = np.random.default_rng(3)
+    for scores in (rng.integers(0, 10, 500).astype(float), rng.normal(size=300), np.full(50, 1.0)):
+        expected = np.argsort(-scores, kind="stable")
+        for n in (1, 7, 20, 49, len(scores) - 1, len(scores), len(scores) + 5):
+            np.testing.assert_array_equal(top_indices(scores, n), expected[:n])
+    assert len(top_indices(np.array([1.0, 2.0]), 0)) == 0
+
+def test_recommendation_filter():
+    """按建议等级筛选后只保留对应等级，matched为筛选后的数量"""
+    ranker = UniverseRanker()
+    snapshot = make_snapshot()
+    full = ranker.rank(snapshot, n=10, with_indicators=False)
+    level = full["results"][0]["recommendation"]
+    expected = [r["symbol"] for r in full["results"] if r["recommendation"] == level]
+    
+    result = ranker.rank(snapshot, n=10, filters={"recommendation": [level]}, with_indicators=False)
+    assert [r["symbol"] for r in result["results"]] == expected
+    assert result["matched"] == len(expected)
+    assert ranker.rank(snapshot, n=10, filters={"recommendation": "不存在"}, with_indicators=False)["results"] == []
+
+def test_cache_hit_by_snapshot_version():
+    """快照内容不变时第二次查询命中缓存且不再评分，价格变化后重新计算"""
+    ranker = UniverseRanker()
+    calls = []
+    original = ranker.advisor.score_many
+    ranker.advisor.score_many = lambda table: calls.append(1) or original(table)
+    
+    async def main():
+        first = await ranker.top_recommendations(make_snapshot(), None, n=3)
+        scored = len(calls)
+        again = await ranker.top_recommendations(make_snapshot(), None, n=3)
+        assert len(calls) == scored
+        changed = await ranker.top_recommendations(make_snapshot(price_shift=0.5), None, n=3)
+        return first, again, changed
+    
+    first, again, changed = asyncio.run(main())
+    assert (first["cached"], again["cached"], changed["cached"]) == (False, True, False)
+    assert again["results"] == first["results"]
+    assert changed["snapshot_version"] != first["snapshot_version"]
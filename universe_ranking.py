@@ -0,0 +1,240 @@
+"""
+全市场排名模块
+结合行情快照、批量技术指标与向量化评分，从全部A股中选出评分最高的N只股票
+
+流程：快照数据对全市场粗评分 -> 取前若干倍N的候选股加载历史K线并计算技术指标 ->
+带技术指标重新评分 -> 以部分排序（argpartition）选出前N名。
+结果按 (快照版本, N, 筛选条件) 缓存，快照未变化时重复查询直接返回。
+"""
+
+import json
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+
+import numpy as np
+
+from batch_indicators import BatchIndicatorEngine
+from get_stock_advice import StockAdvisor
+from history_store import HistoryStore
+from market_snapshot import MarketSnapshot
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 筛选条件 -> (快照列, 比较方式)
+FILTER_RULES = {
+    "min_price": ("price", "ge"),
+    "max_price": ("price", "le"),
+    "min_change_percent": ("change_percent", "ge"),
+    "max_change_percent": ("change_percent", "le"),
+    "min_amount": ("amount", "ge"),
+    "min_turnover_rate": ("turnover_rate", "ge"),
+    "min_pe": ("pe_ratio", "ge"),
+    "max_pe": ("pe_ratio", "le"),
+    "max_pb": ("pb_ratio", "le"),
+    "min_market_cap": ("market_cap", "ge"),
+    "max_market_cap": ("market_cap", "le")
+}
+OPTION_FILTERS = ("industry", "symbol_prefix", "exclude_st", "recommendation")
+
+# 快照列 -> 评分列
+SNAPSHOT_SCORE_COLUMNS = {
+    "pe_ratio": "pe_ratio",
+    "pb_ratio": "pb_ratio",
+    "price": "current_price",
+    "main_net_inflow": "main_net_inflow"
+}
+# 技术指标列 -> 评分列
+INDICATOR_SCORE_COLUMNS = ("rsi", "macd", "macd_signal", "ma5", "ma20")
+
+def filters_key(filters: Optional[Dict[str, Any]]) -> str:
+    """筛选条件的规范化键"""
+    return json.dumps(filters or {}, sort_keys=True, ensure_ascii=False, default=str)
+
+def filter_mask(snapshot: MarketSnapshot, filters: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """按筛选条件生成布尔掩码（默认剔除停牌与ST股票）"""
+    filters = dict(filters or {})
+    unknown = set(filters) - set(FILTER_RULES) - set(OPTION_FILTERS)
+    if unknown:
+        raise ValueError(f"不支持的筛选条件: {', '.join(sorted(unknown))}")
+    
+    price = snapshot.column("price")
+    mask = ~np.isnan(price) & (price > 0)
+    
+    with np.errstate(invalid="ignore"):
+        for name, (column, op) in FILTER_RULES.items():
+            if filters.get(name) is None:
+                continue
+            values = snapshot.column(column)
+            threshold = float(filters[name])
+            mask &= (values >= threshold) if op == "ge" else (values <= threshold)
+    
+    names = snapshot.column("name")
+    if filters.get("exclude_st", True):
+        mask &= ~np.array(["ST" in name for name in names], dtype=bool)
+    
+    if filters.get("industry"):
+        industries = filters["industry"]
+        industries = [industries] if isinstance(industries, str) else list(industries)
+        mask &= np.isin(snapshot.column("industry"), industries)
+    
+    if filters.get("symbol_prefix"):
+        prefixes = filters["symbol_prefix"]
+        prefixes = (prefixes,) if isinstance(prefixes, str) else tuple(prefixes)
+        mask &= np.array([symbol.startswith(prefixes) for symbol in snapshot.column("symbol")], dtype=bool)
+    
+    return mask
+
+def top_indices(scores: np.ndarray, n: int) -> np.ndarray:
+    """评分最高的n个下标（部分排序后只对前n名排序）
+    
+    与完整稳定排序的前n名相同：同分时下标小的在前，第n名处的同分股票也按下标取舍。
+    """
+    if n <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    if n >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    cutoff = scores[np.argpartition(-scores, n - 1)[n - 1]]
+    above = np.flatnonzero(scores > cutoff)
+    ties = np.flatnonzero(scores == cutoff)[:n - len(above)]
+    top = np.concatenate((above, ties))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+class UniverseRanker:
+    """全市场评分排名器"""
+    
+    def __init__(self, advisor: Optional[StockAdvisor] = None,
+                 store: Optional[HistoryStore] = None,
+                 engine: Optional[BatchIndicatorEngine] = None,
+                 candidate_factor: int = 5,
+                 max_candidates: int = 200,
+                 history_days: int = 120,
+                 cache_size: int = 64):
+        self.advisor = advisor or StockAdvisor()
+        self.store = store if store is not None else HistoryStore()
+        self.engine = engine or BatchIndicatorEngine.from_config()
+        self.candidate_factor = candidate_factor
+        self.max_candidates = max_candidates
+        self.history_days = history_days
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int, str], Dict[str, Any]]" = OrderedDict()
+    
+    def score_table(self, snapshot: MarketSnapshot, rows: np.ndarray,
+                    indicators: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+        """构造评分输入表：快照提供估值与资金流，技术指标（如有）覆盖技术面列"""
+        table = {target: snapshot.column(source)[rows] for source, target in SNAPSHOT_SCORE_COLUMNS.items()}
+        if indicators:
+            for name in INDICATOR_SCORE_COLUMNS:
+                if name in indicators:
+                    table[name] = indicators[name]
+        return table
+    
+    def indicator_columns(self, symbols: List[str]) -> Dict[str, np.ndarray]:
+        """历史存储中各股票最新一根K线的技术指标（无历史的股票为NaN，评分时取默认值）"""
+        available = [s for s in symbols if s in self.store]
+        columns = {name: np.full(len(symbols), np.nan) for name in INDICATOR_SCORE_COLUMNS}
+        if not available:
+            return columns
+        
+        section = self.engine.cross_section(self.store.panel(available))["table"]
+        position = {symbol: i for i, symbol in enumerate(symbols)}
+        target = np.array([position[s] for s in section["symbol"]], dtype=np.int64)
+        for name in INDICATOR_SCORE_COLUMNS:
+            columns[name][target] = section[name]
+        return columns
+    
+    def rank(self, snapshot: MarketSnapshot, n: int = 20,
+             filters: Optional[Dict[str, Any]] = None,
+             with_indicators: bool = True) -> Dict[str, Any]:
+        """对快照中符合条件的股票评分并返回前n名"""
+        filters = filters or {}
+        rows = np.flatnonzero(filter_mask(snapshot, filters))
+        symbols = snapshot.column("symbol")[rows]
+        
+        # 粗评分：仅使用快照数据
+        scores = self.advisor.score_many(self.score_table(snapshot, rows))
+        rows, symbols, scores = self._filter_recommendation(rows, symbols, scores, filters)
+        matched = int(len(rows))
+        
+        # 精评分：候选股带技术指标重新评分
+        if with_indicators and len(self.store):
+            size = max(min(n * self.candidate_factor, self.max_candidates), n)
+            candidates = top_indices(scores["total_score"], size)
+            rows, symbols = rows[candidates], symbols[candidates]
+            indicators = self.indicator_columns(list(symbols))
+            scores = self.advisor.score_many(self.score_table(snapshot, rows, indicators))
+            rows, symbols, scores = self._filter_recommendation(rows, symbols, scores, filters)
+        
+        top = top_indices(scores["total_score"], n)
+        results = []
+        for rank, i in enumerate(top.tolist(), 1):
+            quote = snapshot.row(int(rows[i]))
+            results.append({
+                "rank": rank,
+                "symbol": quote["symbol"],
+                "name": quote["name"],
+                "industry": quote["industry"],
+                "price": quote["price"],
+                "change_percent": quote["change_percent"],
+                "pe_ratio": quote["pe_ratio"],
+                "pb_ratio": quote["pb_ratio"],
+                "market_cap": quote["market_cap"],
+                "main_net_inflow": quote["main_net_inflow"],
+                "has_history": symbols[i] in self.store,
+                "total_score": round(float(scores["total_score"][i]), 2),
+                "fundamental_score": round(float(scores["fundamental_score"][i]), 2),
+                "technical_score": round(float(scores["technical_score"][i]), 2),
+                "sentiment_score": round(float(scores["sentiment_score"][i]), 2),
+                "recommendation": str(scores["recommendation"][i]),
+                "action": str(scores["action"][i]),
+                "confidence": str(scores["confidence"][i])
+            })
+        
+        return {
+            "snapshot_version": snapshot.version,
+            "universe_size": len(snapshot),
+            "matched": matched,
+            "n": n,
+            "filters": filters,
+            "results": results
+        }
+    
+    @staticmethod
+    def _filter_recommendation(rows: np.ndarray, symbols: np.ndarray,
+                               scores: Dict[str, np.ndarray], filters: Dict[str, Any]):
+        """按建议等级筛选（如只保留"买入"/"强烈买入"）"""
+        if not filters.get("recommendation"):
+            return rows, symbols, scores
+        allowed = filters["recommendation"]
+        allowed = [allowed] if isinstance(allowed, str) else list(allowed)
+        keep = np.isin(scores["recommendation"], allowed)
+        return rows[keep], symbols[keep], {name: values[keep] for name, values in scores.items()}
+    
+    async def top_recommendations(self, snapshot: MarketSnapshot, fetcher,
+                                  n: int = 20,
+                                  filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """全市场前n名推荐（按快照版本缓存），必要时先为候选股加载历史K线"""
+        key = (snapshot.version, n, filters_key(filters))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return {**self._cache[key], "cached": True}
+        
+        # 先按快照粗评分确定候选股，为缺少历史的候选股加载K线
+        size = max(min(n * self.candidate_factor, self.max_candidates), n)
+        preliminary = self.rank(snapshot, size, filters, with_indicators=False)
+        missing = [r["symbol"] for r in preliminary["results"] if r["symbol"] not in self.store]
+        if missing and fetcher is not None:
+            loaded = await self.store.load(missing, fetcher, days=self.history_days)
+            logger.info(f"为 {len(missing)} 只候选股加载历史K线，成功 {loaded} 只")
+        
+        result = self.rank(snapshot, n, filters)
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return {**result, "cached": False}
+    
+    def clear_cache(self):
+        """清空排名缓存"""
+        self._cache.clear()